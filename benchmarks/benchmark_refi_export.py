@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+"""
+REFI-QDA project export benchmark. A developer tool, not part of the qualcoder package.
+Distributed under the same MIT license as QualCoder, see LICENSE.txt.
+"""
+
+import argparse
+import gettext
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from PyQt6 import QtWidgets
+
+from qualcoder.refi import RefiExport
+
+logger = logging.getLogger(__name__)
+
+# REFI-QDA project export benchmark, on a synthetic project with a large number of coded selections.
+# Times the creation of the project.qde xml, which is where the time is spent for large projects.
+# Run from the repository root with: python -m benchmarks.benchmark_refi_export --selections 500000
+# Most selections are text codings, with some image and audio codings.
+
+TEXT_FILES = 100
+IMAGE_FILES = 10
+AUDIO_FILES = 10
+CODES = 500
+USERS = 5
+DATE = "2024-01-01 10:00:00"
+
+
+class BenchmarkApp:
+    """ The App attributes used by RefiExport, for an in-memory project database. """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.project_name = "benchmark.qda"
+        self.project_path = ""
+        self.version = "QualCoder benchmark"
+        self.settings = {'codername': "user0", 'directory': tempfile.gettempdir()}
+
+    def get_annotations(self):
+        return []
+
+
+def create_project(selections):
+    """ Create an in-memory project with text, image and audio files, codes and coded selections.
+    param:
+        selections: Integer total number of coded selections
+    return:
+        sqlite3 connection
+    """
+
+    conn = sqlite3.connect(":memory:")
+    cur = conn.cursor()
+    cur.execute("CREATE TABLE project (databaseversion text, date text, memo text,about text, bookmarkfile integer, "
+                "bookmarkpos integer, codername text)")
+    cur.execute("CREATE TABLE source (id integer primary key, name text, fulltext text, mediapath text, memo text, "
+                "owner text, date text, av_text_id integer, risid integer, unique(name))")
+    cur.execute("CREATE TABLE code_image (imid integer primary key,id integer,x1 integer, y1 integer, width integer, "
+                "height integer, cid integer, memo text, date text, owner text, important integer)")
+    cur.execute("CREATE TABLE code_av (avid integer primary key,id integer,pos0 integer, pos1 integer, cid integer, "
+                "memo text, date text, owner text, important integer)")
+    cur.execute("CREATE TABLE attribute_type (name text primary key, date text, owner text, memo text, "
+                "caseOrFile text, valuetype text)")
+    cur.execute("CREATE TABLE attribute (attrid integer primary key, name text, attr_type text, value text, "
+                "id integer, date text, owner text, unique(name,attr_type,id))")
+    cur.execute("CREATE TABLE case_text (id integer primary key, caseid integer, fid integer, pos0 integer, "
+                "pos1 integer, owner text, date text, memo text)")
+    cur.execute("CREATE TABLE cases (caseid integer primary key, name text, memo text, owner text,date text, "
+                "constraint ucm unique(name))")
+    cur.execute("CREATE TABLE code_cat (catid integer primary key, name text, owner text, date text, memo text, "
+                "supercatid integer, unique(name))")
+    cur.execute("CREATE TABLE code_text (ctid integer primary key, cid integer, fid integer,seltext text, "
+                "pos0 integer, pos1 integer, owner text, date text, memo text, avid integer, important integer, "
+                "unique(cid,fid,pos0,pos1, owner))")
+    cur.execute("CREATE TABLE code_name (cid integer primary key, name text, memo text, catid integer, owner text,"
+                "date text, color text, unique(name))")
+    cur.execute("CREATE TABLE journal (jid integer primary key, name text, jentry text, date text, owner text, "
+                "unique(name))")
+    cur.execute("insert into project (databaseversion, date, memo, about, codername) values (?,?,?,?,?)",
+                ["v7", DATE, "", "", "user0"])
+    cur.execute("create index code_text_fid on code_text (fid)")
+    cur.execute("create index code_image_id on code_image (id)")
+    cur.execute("create index code_av_id on code_av (id)")
+
+    cur.executemany("insert into code_cat (catid, name, owner, date, memo) values (?,?,?,?,'')",
+                    [(i, f"category{i}", "user0", DATE) for i in range(1, 11)])
+    cur.executemany("insert into code_name (cid, name, memo, catid, owner, date, color) values (?,?,'',?,?,?,?)",
+                    [(i, f"code{i}", i % 11 or None, f"user{i % USERS}", DATE, "#F0E68C") for i in range(1, CODES + 1)])
+    text = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 200
+    sources = [(i, f"text{i}.txt", text, None) for i in range(1, TEXT_FILES + 1)]
+    sources += [(TEXT_FILES + i, f"image{i}.png", None, f"/images/image{i}.png") for i in range(1, IMAGE_FILES + 1)]
+    sources += [(TEXT_FILES + IMAGE_FILES + i, f"audio{i}.mp3", None, f"/audio/audio{i}.mp3")
+                for i in range(1, AUDIO_FILES + 1)]
+    cur.executemany("insert into source (id, name, fulltext, mediapath, memo, owner, date) values (?,?,?,?,'',?,?)",
+                    [s + ("user0", DATE) for s in sources])
+
+    media_selections = selections // 10
+    text_selections = selections - 2 * media_selections
+    cur.executemany("insert into code_text (cid, fid, seltext, pos0, pos1, owner, date, memo) "
+                    "values (?,?,?,?,?,?,?,'')",
+                    ((i % CODES + 1, i % TEXT_FILES + 1, "ipsum dolor", i // TEXT_FILES, i // TEXT_FILES + 11,
+                      f"user{i % USERS}", DATE) for i in range(text_selections)))
+    cur.executemany("insert into code_image (id, x1, y1, width, height, cid, memo, date, owner) "
+                    "values (?,?,?,?,?,?,'',?,?)",
+                    ((TEXT_FILES + i % IMAGE_FILES + 1, i % 500, i % 400, 20, 20, i % CODES + 1, DATE,
+                      f"user{i % USERS}") for i in range(media_selections)))
+    cur.executemany("insert into code_av (id, pos0, pos1, cid, memo, date, owner) values (?,?,?,?,'',?,?)",
+                    ((TEXT_FILES + IMAGE_FILES + i % AUDIO_FILES + 1, i * 10, i * 10 + 500, i % CODES + 1, DATE,
+                      f"user{i % USERS}") for i in range(media_selections)))
+    conn.commit()
+    return conn
+
+
+def run(selections):
+    """ Create the synthetic project and time the REFI-QDA project xml.
+    param:
+        selections: Integer total number of coded selections
+    return:
+        Dictionary of setup, indexes and project_xml times in seconds, and xml length
+    """
+
+    start = time.perf_counter()
+    conn = create_project(selections)
+    app = BenchmarkApp(conn)
+    setup_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    # An export_type other than 'codebook' or 'project' only loads the codes, users and sources
+    exporter = RefiExport(app, None, "benchmark")
+    index_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    exporter.project_xml()
+    xml_secs = time.perf_counter() - start
+    conn.close()
+    return {'setup': setup_secs, 'indexes': index_secs, 'project_xml': xml_secs, 'xml_length': len(exporter.xml)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="REFI-QDA project export benchmark")
+    parser.add_argument("--selections", type=int, default=500000, help="Number of coded selections")
+    args = parser.parse_args()
+    gettext.NullTranslations().install()
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    qt_app = QtWidgets.QApplication(sys.argv[:1])
+    result = run(args.selections)
+    print(f"REFI export benchmark. Selections: {args.selections}")
+    print(f"Create project: {result['setup'] * 1000:.0f} ms")
+    print(f"Codes, users and sources: {result['indexes'] * 1000:.0f} ms")
+    print(f"Project xml: {result['project_xml'] * 1000:.0f} ms, {result['xml_length']} characters")
+    qt_app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,7 @@ import gettext
 import json  # To get the latest GitHub release information
 import logging
 from logging.handlers import RotatingFileHandler
+import multiprocessing
 import os
 import platform
 import shutil
@@ -46,53 +47,18 @@ from copy import copy
 import time
 import getpass
 
+# Before other imports, so the --startup-timing report includes them
+from qualcoder import startup_timing
+
 from PyQt6 import QtCore, QtGui, QtWidgets
 
 from qualcoder.error_dlg import UncaughtHook
-from qualcoder.attributes import DialogManageAttributes
-from qualcoder.cases import DialogCases
-from qualcoder.codebook import Codebook
-from qualcoder.code_color_scheme import DialogCodeColorScheme
-from qualcoder.code_organiser import CodeOrganiser
-from qualcoder.code_text import DialogCodeText
-from qualcoder.code_pdf import DialogCodePdf
-from qualcoder.GUI.base64_helper import *
-from qualcoder.GUI.base64_droidsansmono_helper import DroidSansMono
+from qualcoder.db_indexes import update_indexes, INDEX_VERSION
 from qualcoder.GUI.ui_main import Ui_MainWindow
 from qualcoder.helpers import Message, ImportPlainTextCodes
-from qualcoder.import_survey import DialogImportSurvey
-from qualcoder.import_twitter_data import DialogImportTwitterData
-from qualcoder.information import DialogInformation, menu_shortcuts_display, coding_shortcuts_display
-from qualcoder.locale.base64_lang_helper import *
-from qualcoder.journals import DialogJournals
-from qualcoder.manage_files import DialogManageFiles
-from qualcoder.manage_links import DialogManageLinks
-from qualcoder.manage_references import DialogReferenceManager
-from qualcoder.memo import DialogMemo
-from qualcoder.refi import RefiExport, RefiImport
-from qualcoder.reports import DialogReportCoderComparisons, DialogReportCodeFrequencies
-from qualcoder.report_code_summary import DialogReportCodeSummary
-from qualcoder.report_compare_coder_file import DialogCompareCoderByFile
-from qualcoder.report_codes import DialogReportCodes
-from qualcoder.report_file_summary import DialogReportFileSummary
-from qualcoder.report_exact_matches import DialogReportExactTextMatches
-from qualcoder.report_relations import DialogReportRelations
-from qualcoder.report_sql import DialogSQL
-from qualcoder.rqda import RqdaImport
-from qualcoder.settings import DialogSettings
-from qualcoder.special_functions import DialogSpecialFunctions
+# Dialog modules, the base64 icon, font and language data, and VLC are imported on first use,
+# so that opening QualCoder does not load every dialog and its dependencies.
 # from qualcoder.text_mining import DialogTextMining
-from qualcoder.view_av import DialogCodeAV
-from qualcoder.view_charts import ViewCharts
-from qualcoder.view_graph import ViewGraph
-from qualcoder.view_image import DialogCodeImage
-
-# Check if VLC installed, for warning message for code_av
-vlc = None
-try:
-    import vlc
-except Exception as e:
-    print(e)
 
 qualcoder_version = "QualCoder 3.6"
 
@@ -820,18 +786,57 @@ class App(object):
             'codetext_chunksize': 50000,
         }
 
+    def stream_file_texts(self, file_ids=None, batch_size=4):
+        """ Generator of (id, name, fulltext) for text files, ordered by name.
+        Rows are fetched a few at a time, so only the texts in the current batch are held in memory,
+        rather than every text in the project as with get_file_texts.
+        Called by DialogCodeText.search_for_text, code_sentences, auto_code
+        param:
+            file_ids: list of Integer ids, or None for all files
+            batch_size: Integer number of rows per fetch
+        """
+
+        sql = "select id, name, fulltext from source where fulltext is not null"
+        if file_ids is None:
+            id_batches = [None]
+        else:
+            # Keep within the sqlite host parameter limit. Ids are put in name order first,
+            # so that batches follow each other in name order
+            file_ids = set(file_ids)
+            cur = self.conn.cursor()
+            cur.execute("select id from source where fulltext is not null order by name")
+            file_ids = [row[0] for row in cur.fetchall() if row[0] in file_ids]
+            id_batches = [file_ids[i:i + 500] for i in range(0, len(file_ids), 500)]
+        for ids in id_batches:
+            cur = self.conn.cursor()
+            if ids is None:
+                cur.execute(sql + " order by name")
+            else:
+                placeholders = ",".join("?" * len(ids))
+                cur.execute(sql + f" and id in ({placeholders}) order by name", ids)
+            rows = cur.fetchmany(batch_size)
+            while rows:
+                for row in rows:
+                    yield row
+                rows = cur.fetchmany(batch_size)
+            cur.close()
+
     def get_file_texts(self, file_ids=None):
         """ Get the texts of all text files as a list of dictionaries.
-        Called by DialogCodeText.search_for_text
+        For many or large files use stream_file_texts.
+        Called by DialogCodeText.load_file
         param:
             fileids - a list of fileids or None
         """
 
         cur = self.conn.cursor()
         if file_ids is not None:
+            if not file_ids:
+                return []
+            placeholders = ",".join("?" * len(file_ids))
             cur.execute(
                 "select name, id, fulltext, ifnull(memo, ''), owner, date, mediapath from "
-                "source where id in (?) and fulltext is not null order by name", file_ids)
+                f"source where id in ({placeholders}) and fulltext is not null order by name", list(file_ids))
         else:
             cur.execute(
                 "select name, id, fulltext, ifnull(memo,''), owner, date, mediapath "
@@ -851,11 +856,14 @@ class App(object):
 
         cur = self.conn.cursor()
         if file_ids is not None:
+            if not file_ids:
+                return []
+            placeholders = ",".join("?" * len(file_ids))
             cur.execute(
                 "select name, id, fulltext, ifnull(memo, ''), owner, date, mediapath from "
-                "source where id in (?) and fulltext is not null and mediapath is not Null and "
+                f"source where id in ({placeholders}) and fulltext is not null and mediapath is not Null and "
                 "(mediapath like '/docs/%' or mediapath like 'docs:%') and "
-                "(mediapath like '%.pdf' or mediapath like '%.PDF') order by name", file_ids)
+                "(mediapath like '%.pdf' or mediapath like '%.PDF') order by name", list(file_ids))
         else:
             cur.execute(
                 "select name, id, fulltext, ifnull(memo,''), owner, date, mediapath "
@@ -877,15 +885,22 @@ class App(object):
 
         cur = self.conn.cursor()
         if journal_ids is not None:
-            cur.execute(
-                "select name, jid, jentry, owner, date from journal where jid in (?)",
-                journal_ids
-            )
+            # Keep within the sqlite host parameter limit
+            journal_ids = list(journal_ids)
+            rows = []
+            for i in range(0, len(journal_ids), 500):
+                ids = journal_ids[i:i + 500]
+                placeholders = ",".join("?" * len(ids))
+                cur.execute(f"select name, jid, jentry, owner, date from journal where jid in ({placeholders})", ids)
+                rows += cur.fetchall()
+            # Ordered by date desc, as for all journals. Null dates are last
+            rows.sort(key=lambda row: row[4] or "", reverse=True)
         else:
             cur.execute("select name, jid, jentry, owner, date from journal order by date desc")
+            rows = cur.fetchall()
         keys = 'name', 'jid', 'jentry', 'owner', 'date'
         result = []
-        for row in cur.fetchall():
+        for row in rows:
             result.append(dict(zip(keys, row)))
         return result
 
@@ -935,17 +950,18 @@ class App(object):
         if result and suffix == "":
             return f"Backup exists already with this name: {backup}", backup
         msg = ""
+        # The cache folder holds derived data, e.g. PDF layouts, image tiles and waveform peaks, rebuilt when needed
         if self.settings['backup_av_files'] == 'True':
             try:
-                shutil.copytree(self.project_path, backup, ignore=shutil.ignore_patterns('*.lock'))
+                shutil.copytree(self.project_path, backup, ignore=shutil.ignore_patterns('*.lock', 'cache'))
             except FileExistsError as err:
                 msg = _("There is already a backup with this name")
                 print(f"{err}\nmsg")
                 logger.warning(_(msg) + f"\n{err}")
         else:
             shutil.copytree(self.project_path, backup,
-                            ignore=shutil.ignore_patterns('*.lock', '*.mp3', '*.wav', '*.mp4', '*.mov', '*.ogg',
-                                                          '*.wmv', '*.MP3',
+                            ignore=shutil.ignore_patterns('*.lock', 'cache', '*.mp3', '*.wav', '*.mp4', '*.mov',
+                                                          '*.ogg', '*.wmv', '*.MP3',
                                                           '*.WAV', '*.MP4', '*.MOV', '*.OGG', '*.WMV'))
             # self.ui.textEdit.append(_("WARNING: audio and video files NOT backed up. See settings."))
             msg = _("WARNING: audio and video files NOT backed up. See settings.") + "\n"
@@ -1297,6 +1313,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Run SQL statements on database. """
 
         self.ui.label_reports.hide()
+        from qualcoder.report_sql import DialogSQL
         ui = DialogSQL(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_reports, ui)
 
@@ -1312,6 +1329,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Compare two or more coders across all text files using Cohens Kappa. """
 
         self.ui.label_reports.hide()
+        from qualcoder.reports import DialogReportCoderComparisons
         ui = DialogReportCoderComparisons(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_reports, ui)
 
@@ -1319,6 +1337,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Compare two coders selection by file - text, A/V or image. """
 
         self.ui.label_reports.hide()
+        from qualcoder.report_compare_coder_file import DialogCompareCoderByFile
         ui = DialogCompareCoderByFile(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_reports, ui)
 
@@ -1326,6 +1345,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Show code frequencies overall and by coder. """
 
         self.ui.label_reports.hide()
+        from qualcoder.reports import DialogReportCodeFrequencies
         ui = DialogReportCodeFrequencies(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_reports, ui)
 
@@ -1333,6 +1353,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Show code relations in text files. """
 
         self.ui.label_reports.hide()
+        from qualcoder.report_relations import DialogReportRelations
         ui = DialogReportRelations(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_reports, ui)
 
@@ -1340,6 +1361,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Show exact text coding matches in text files. """
 
         self.ui.label_reports.hide()
+        from qualcoder.report_exact_matches import DialogReportExactTextMatches
         ui = DialogReportExactTextMatches(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_reports, ui)
 
@@ -1347,6 +1369,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Report on coding and categories. """
 
         self.ui.label_reports.hide()
+        from qualcoder.report_codes import DialogReportCodes
         ui = DialogReportCodes(self.app, self.ui.textEdit, self.ui.tab_coding)
         self.tab_layout_helper(self.ui.tab_reports, ui)
 
@@ -1354,6 +1377,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Report on file details. """
 
         self.ui.label_reports.hide()
+        from qualcoder.report_file_summary import DialogReportFileSummary
         ui = DialogReportFileSummary(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_reports, ui)
 
@@ -1361,6 +1385,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Report on code details. """
 
         self.ui.label_reports.hide()
+        from qualcoder.report_code_summary import DialogReportCodeSummary
         ui = DialogReportCodeSummary(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_reports, ui)
 
@@ -1368,6 +1393,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Show list or acyclic graph of codes and categories. """
 
         self.ui.label_reports.hide()
+        from qualcoder.view_graph import ViewGraph
         ui = ViewGraph(self.app)
         ui.setAttribute(QtCore.Qt.WidgetAttribute.WA_DeleteOnClose)
         self.tab_layout_helper(self.ui.tab_reports, ui)
@@ -1376,6 +1402,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Show charts of codes and categories. """
 
         self.ui.label_reports.hide()
+        from qualcoder.view_charts import ViewCharts
         ui = ViewCharts(self.app)
         ui.setAttribute(QtCore.Qt.WidgetAttribute.WA_DeleteOnClose)
         self.tab_layout_helper(self.ui.tab_reports, ui)
@@ -1387,6 +1414,7 @@ class MainWindow(QtWidgets.QMainWindow):
         webbrowser.open("https://github.com/ccbogel/QualCoder/wiki")
 
     def display_menu_key_shortcuts(self):
+        from qualcoder.information import menu_shortcuts_display, coding_shortcuts_display
         self.ui.textEdit.append(menu_shortcuts_display)
         self.ui.textEdit.append(coding_shortcuts_display)
         self.ui.tabWidget.setCurrentWidget(self.ui.tab_action_log)
@@ -1394,12 +1422,14 @@ class MainWindow(QtWidgets.QMainWindow):
     def about(self):
         """ About dialog. """
 
+        from qualcoder.information import DialogInformation
         ui = DialogInformation(self.app, "About", "")
         ui.exec()
 
     def special_functions(self):
         """ User requested special functions dialog. """
 
+        from qualcoder.special_functions import DialogSpecialFunctions
         ui = DialogSpecialFunctions(self.app, self.ui.textEdit, self.ui.tab_coding)
         ui.exec()
         if ui.projects_merged:
@@ -1412,6 +1442,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Create, edit, delete, rename attributes. """
 
         self.ui.label_manage.hide()
+        from qualcoder.attributes import DialogManageAttributes
         ui = DialogManageAttributes(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_manage, ui)
 
@@ -1419,6 +1450,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Manage references. Import references. Edit references.
         Link/unlink references to files. """
 
+        from qualcoder.manage_references import DialogReferenceManager
         ui = DialogReferenceManager(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_manage, ui)
 
@@ -1438,6 +1470,7 @@ class MainWindow(QtWidgets.QMainWindow):
         coding and review. Modal dialog. """
 
         self.ui.label_manage.hide()
+        from qualcoder.import_survey import DialogImportSurvey
         ui = DialogImportSurvey(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_manage, ui)
 
@@ -1448,6 +1481,7 @@ class MainWindow(QtWidgets.QMainWindow):
         Assign attributes to cases and files. """
 
         self.ui.label_manage.hide()
+        from qualcoder.import_twitter_data import DialogImportTwitterData
         ui = DialogImportTwitterData(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_manage, ui)
 
@@ -1456,6 +1490,7 @@ class MainWindow(QtWidgets.QMainWindow):
         files, add memos to cases. """
 
         self.ui.label_manage.hide()
+        from qualcoder.cases import DialogCases
         ui = DialogCases(self.app, self.ui.textEdit)
         self.tab_layout_helper(self.ui.tab_manage, ui)
 
@@ -1465,6 +1500,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """
 
         self.ui.label_manage.hide()
+        from qualcoder.manage_files import DialogManageFiles
         ui = DialogManageFiles(self.app, self.ui.textEdit, self.ui.tab_coding, self.ui.tab_reports)
         self.tab_layout_helper(self.ui.tab_manage, ui)
 
@@ -1473,6 +1509,7 @@ class MainWindow(QtWidgets.QMainWindow):
         File names must match but paths can be different. """
 
         self.ui.label_manage.hide()
+        from qualcoder.manage_links import DialogManageLinks
         ui = DialogManageLinks(self.app, self.ui.textEdit, self.ui.tab_coding)
         self.tab_layout_helper(self.ui.tab_manage, ui)
         bad_links = self.app.check_bad_file_links()
@@ -1484,6 +1521,7 @@ class MainWindow(QtWidgets.QMainWindow):
         From version 3.4 in a non-modal window. """
 
         self.ui.label_manage.hide()
+        from qualcoder.journals import DialogJournals
         ui = DialogJournals(self.app, self.ui.textEdit)
         ui.setAttribute(QtCore.Qt.WidgetAttribute.WA_DeleteOnClose)
         self.journal_display = ui
@@ -1498,6 +1536,7 @@ class MainWindow(QtWidgets.QMainWindow):
         files = self.app.get_text_filenames()
         if len(files) > 0:
             self.ui.label_coding.hide()
+            from qualcoder.code_text import DialogCodeText
             ui = DialogCodeText(self.app, self.ui.textEdit, self.ui.tab_reports)
             ui.setAttribute(QtCore.Qt.WidgetAttribute.WA_DeleteOnClose)
             self.tab_layout_helper(self.ui.tab_coding, ui)
@@ -1512,6 +1551,7 @@ class MainWindow(QtWidgets.QMainWindow):
         files = self.app.get_pdf_filenames()
         if len(files) > 0:
             self.ui.label_coding.hide()
+            from qualcoder.code_pdf import DialogCodePdf
             ui = DialogCodePdf(self.app, self.ui.textEdit, self.ui.tab_reports)
             ui.setAttribute(QtCore.Qt.WidgetAttribute.WA_DeleteOnClose)
             self.tab_layout_helper(self.ui.tab_coding, ui)
@@ -1526,6 +1566,7 @@ class MainWindow(QtWidgets.QMainWindow):
         files = self.app.get_image_filenames()
         if len(files) > 0:
             self.ui.label_coding.hide()
+            from qualcoder.view_image import DialogCodeImage
             ui = DialogCodeImage(self.app, self.ui.textEdit, self.ui.tab_reports)
             ui.setAttribute(QtCore.Qt.WidgetAttribute.WA_DeleteOnClose)
             self.tab_layout_helper(self.ui.tab_coding, ui)
@@ -1542,12 +1583,18 @@ class MainWindow(QtWidgets.QMainWindow):
             msg = _("This project contains no audio/video files.")
             Message(self.app, _('No a/v files'), msg).exec()
             return
-        if not vlc:
+        # Check if VLC installed, for warning message for code_av
+        # Imported rather than find_spec, as the import also fails if the VLC library cannot be loaded
+        try:
+            import vlc  # noqa: F401
+        except Exception as err:
+            print(err)
             msg = _("VLC is not installed. Cannot code audio/video files.")
             Message(self.app, _('Install VLC'), msg).exec()
             return
         self.ui.label_coding.hide()
         try:
+            from qualcoder.view_av import DialogCodeAV
             ui = DialogCodeAV(self.app, self.ui.textEdit, self.ui.tab_reports)
             ui.setAttribute(QtCore.Qt.WidgetAttribute.WA_DeleteOnClose)
             self.tab_layout_helper(self.ui.tab_coding, ui)
@@ -1558,6 +1605,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def code_color_scheme(self):
         """ Edit code color scheme. """
 
+        from qualcoder.code_color_scheme import DialogCodeColorScheme
         ui = DialogCodeColorScheme(self.app, self.ui.textEdit, self.ui.tab_reports)
         ui.setAttribute(QtCore.Qt.WidgetAttribute.WA_DeleteOnClose)
         self.tab_layout_helper(self.ui.tab_coding, ui)
@@ -1566,6 +1614,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Organise codes structure. """
 
         self.ui.label_coding.setText("")
+        from qualcoder.code_organiser import CodeOrganiser
         ui = CodeOrganiser(self.app, self.ui.textEdit)
         ui.setAttribute(QtCore.Qt.WidgetAttribute.WA_DeleteOnClose)
         self.tab_layout_helper(self.ui.tab_reports, None)
@@ -1597,12 +1646,14 @@ class MainWindow(QtWidgets.QMainWindow):
         """ Export a text file code book of categories and codes.
         """
 
+        from qualcoder.codebook import Codebook
         Codebook(self.app, self.ui.textEdit)
 
     def codebook_with_memos(self):
         """ Export a text file code book of categories and codes with their memos.
         """
 
+        from qualcoder.codebook import Codebook
         Codebook(self.app, self.ui.textEdit, memos=True)
 
     def refi_project_export(self):
@@ -1611,6 +1662,7 @@ class MainWindow(QtWidgets.QMainWindow):
          NEED TO TEST RELATIVE EXPORTS, TIMESTAMPS AND TRANSCRIPTION
         """
 
+        from qualcoder.refi import RefiExport
         RefiExport(self.app, self.ui.textEdit, "project")
 
     def refi_codebook_export(self):
@@ -1618,6 +1670,7 @@ class MainWindow(QtWidgets.QMainWindow):
         Follows the REFI standard version 1.0. https://www.qdasoftware.org/
         """
         #
+        from qualcoder.refi import RefiExport
         RefiExport(self.app, self.ui.textEdit, "codebook")
 
     def refi_codebook_import(self):
@@ -1625,6 +1678,7 @@ class MainWindow(QtWidgets.QMainWindow):
         Follows the REFI-QDA standard version 1.0. https://www.qdasoftware.org/
          """
 
+        from qualcoder.refi import RefiImport
         RefiImport(self.app, self.ui.textEdit, "qdc")
 
     def refi_project_import(self):
@@ -1644,6 +1698,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.app.project_name == "":
             Message(self.app, _("Project creation"), _("REFI-QDA Project not successfully created"), "warning").exec()
             return
+        from qualcoder.refi import RefiImport
         RefiImport(self.app, self.ui.textEdit, "qdpx")
         self.project_summary_report()
 
@@ -1660,6 +1715,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.app.project_name == "":
             Message(self.app, _('Project creation'), _("Project not successfully created"), "critical").exec()
             return
+        from qualcoder.rqda import RqdaImport
         RqdaImport(self.app, self.ui.textEdit)
         self.project_summary_report()
 
@@ -1875,6 +1931,7 @@ class MainWindow(QtWidgets.QMainWindow):
         all other opened dialogs are destroyed."""
 
         current_coder = self.app.settings['codername']
+        from qualcoder.settings import DialogSettings
         ui = DialogSettings(self.app)
         ret = ui.exec()
         if ret == QtWidgets.QDialog.DialogCode.Rejected:  # Dialog has been canceled
@@ -1910,6 +1967,7 @@ class MainWindow(QtWidgets.QMainWindow):
         cur = self.app.conn.cursor()
         cur.execute("select memo from project")
         memo = cur.fetchone()[0]
+        from qualcoder.memo import DialogMemo
         ui = DialogMemo(self.app, _("Memo for project ") + self.app.project_name,
                         memo)
         ui.exec()
@@ -2280,6 +2338,12 @@ class MainWindow(QtWidgets.QMainWindow):
             cur.execute("select risid from source")
         except sqlite3.OperationalError:
             cur.execute('ALTER TABLE source ADD risid integer')
+        # Secondary indexes, versioned separately from the database version
+        index_changes, index_secs = update_indexes(self.app.conn)
+        if index_changes:
+            self.ui.textEdit.append(_("Updating database indexes to version") + f" {INDEX_VERSION}: " +
+                                    str(len(index_changes)) + _(" changes in ") + f"{index_secs:.2f} " + _("secs"))
+            logger.debug("Index changes: " + ", ".join(index_changes))
 
         # Save a date and 24 hour stamped backup
         if self.app.settings['backup_on_open'] == 'True' and newproject == "no":
@@ -2534,6 +2598,8 @@ class MainWindow(QtWidgets.QMainWindow):
 
 
 def gui():
+    # Needed by the process pool used in Manage files imports, when QualCoder is a frozen executable
+    multiprocessing.freeze_support()
     qual_app = App()
     settings = qual_app.load_settings()
     project_path = qual_app.get_most_recent_projectpath()
@@ -2543,6 +2609,7 @@ def gui():
     stylesheet = qual_app.merge_settings_with_default_stylesheet(settings)
     app.setStyleSheet(stylesheet)
     if sys.platform != 'darwin':
+        from qualcoder.GUI.base64_helper import qualcoder32
         pm = QtGui.QPixmap()
         pm.loadFromData(QtCore.QByteArray.fromBase64(qualcoder32), "png")
         app.setWindowIcon(QtGui.QIcon(pm))
@@ -2615,6 +2682,9 @@ def gui():
         if len(split_) == 2:
             proj_path = split_[1]
         ex.open_project(path_=proj_path)
+    if startup_timing.enabled:
+        # Runs once the event loop has shown the main window
+        QtCore.QTimer.singleShot(0, startup_timing.report)
     sys.exit(app.exec())
 
 
@@ -2625,6 +2695,9 @@ def install_language(lang):
     Install poedit.mo file into folder .qualcoder/lang/LC_MESSAGES/lang.mo
     """
 
+    from qualcoder.locale.base64_lang_helper import de_mo, de_qm, es_mo, es_qm, fr_mo, fr_qm, it_mo, it_qm, \
+        pt_mo, pt_qm
+
     qm = os.path.join(home, '.qualcoder')
     qm = os.path.join(qm, 'app_' + lang + '.qm')
     qm_data = None
@@ -2662,9 +2735,12 @@ def install_language(lang):
 
 
 def install_droid_sans_mono():
-    """ Install DroidSandMono ttf font for wordclouds into .qualcoder folder """
+    """ Install DroidSandMono ttf font for wordclouds into .qualcoder folder, if not already installed. """
 
     qc_folder = os.path.join(home, '.qualcoder', 'DroidSansMono.ttf')
+    if os.path.exists(qc_folder) and os.path.getsize(qc_folder) > 0:
+        return
+    from qualcoder.GUI.base64_droidsansmono_helper import DroidSansMono
     with open(qc_folder, 'wb') as file_:
         decoded_data = base64.decodebytes(DroidSansMono)
         file_.write(decoded_data)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Attribute values for all files, cases or journals, read with one query and pivoted in memory,
+# rather than one query per entity and attribute.
+# Used by: manage_files, cases, journals, report_attributes
+
+
+def attribute_values(conn, attr_type, attribute_names):
+    """ Get attribute values for every entity of this type, as lists ordered by attribute_names.
+    param:
+        conn: sqlite3 connection
+        attr_type: String 'file', 'case' or 'journal'
+        attribute_names: list of String attribute names, e.g. table header order
+    return:
+        Dictionary of id: list of String values, '' where there is no value
+    """
+
+    column = {name: i for i, name in enumerate(attribute_names)}
+    values = {}
+    cur = conn.cursor()
+    cur.execute("select id, name, ifnull(value, '') from attribute where attr_type=? order by id", [attr_type])
+    for id_, name, value in cur.fetchall():
+        if name not in column:
+            continue
+        if id_ not in values:
+            values[id_] = [''] * len(attribute_names)
+        values[id_][column[name]] = value
+    return values
+
+
+def attribute_value_summaries(conn, attr_type=None, max_values=20):
+    """ Summaries of attribute values for tooltips: value type, numeric minimum and maximum,
+    and the first distinct non-empty values. Uses a fixed number of queries for all attributes.
+    param:
+        conn: sqlite3 connection
+        attr_type: String 'file', 'case' or 'journal', or None for all
+        max_values: Integer maximum number of distinct values per attribute
+    return:
+        Dictionary of (attr_type, name): Dictionary of valuetype, min, max, values
+    """
+
+    summaries = {}
+    cur = conn.cursor()
+    where = ""
+    params = []
+    if attr_type is not None:
+        where = " where attr_type=?"
+        params = [attr_type]
+    cur.execute("select attr_type, name, min(cast(value as real)), max(cast(value as real)) from attribute" +
+                where + " group by attr_type, name", params)
+    for type_, name, min_, max_ in cur.fetchall():
+        summaries[(type_, name)] = {'valuetype': "character", 'min': min_, 'max': max_, 'values': []}
+    cur.execute("select name, valuetype, caseOrFile from attribute_type")
+    for name, valuetype, case_or_file in cur.fetchall():
+        if (case_or_file, name) in summaries:
+            summaries[(case_or_file, name)]['valuetype'] = valuetype
+    sql = "select attr_type, name, value from attribute where length(value)>0"
+    if attr_type is not None:
+        sql += " and attr_type=?"
+    cur.execute(sql, params)
+    for type_, name, value in cur.fetchall():
+        values = summaries[(type_, name)]['values']
+        if len(values) < max_values and value not in values:
+            values.append(value)
+    return summaries
+
+
+def value_tooltip(summary, valuetype=None, max_values=20):
+    """ Tooltip text of attribute values.
+    param:
+        summary: Dictionary from attribute_value_summaries, or None if the attribute has no values
+        valuetype: String 'numeric' or 'character', or None to use the summary value type
+        max_values: Integer maximum number of character values to show
+    return:
+        String
+    """
+
+    if summary is None:
+        return ""
+    if valuetype is None:
+        valuetype = summary['valuetype']
+    tt = ""
+    if valuetype == "numeric":
+        tt = _("Minimum: ") + str(summary['min']) + "\n"
+        tt += _("Maximum: ") + str(summary['max'])
+    if valuetype == "character":
+        tt = "\n".join(summary['values'][:max_values])
+    return tt
@@ -40,6 +40,7 @@ from PyQt6.QtCore import Qt
 
 from .add_attribute import DialogAddAttribute
 from .add_item_name import DialogAddItemName
+from .attribute_pivot import attribute_values, attribute_value_summaries, value_tooltip
 from .case_file_manager import DialogCaseFileManager
 from .confirm_delete import DialogConfirmDelete
 from .GUI.base64_helper import *
@@ -47,6 +48,7 @@ from .GUI.ui_dialog_cases import Ui_Dialog_cases
 from .helpers import Message, ExportDirectoryPathDialog
 
 from .memo import DialogMemo
+from .table_paging import TablePager
 from .view_av import DialogViewAV
 from .view_image import DialogViewImage
 
@@ -66,6 +68,7 @@ class DialogCases(QtWidgets.QDialog):
     ATTRIBUTE_START_COLUMN = 4
     header_labels = []
     attribute_labels_ordered = []
+    attribute_summaries = {}  # attribute_pivot.attribute_value_summaries, for header tooltips
     app = None
     parent_text_edit = None
     source = []
@@ -135,6 +138,7 @@ class DialogCases(QtWidgets.QDialog):
         self.ui.tableWidget.horizontalHeader().customContextMenuRequested.connect(self.table_header_menu)
         self.ui.tableWidget.installEventFilter(self)
         self.ui.tableWidget.setTabKeyNavigation(False)
+        self.table_pager = TablePager(self.ui.tableWidget, self.fill_row)
         self.load_cases_data()
         self.fill_table()
         # Initial resize of table columns
@@ -240,6 +244,7 @@ class DialogCases(QtWidgets.QDialog):
         filepath = e.filepath
         if filepath is None:
             return
+        self.table_pager.fetch_all()
         cols = self.ui.tableWidget.columnCount()
         rows = self.ui.tableWidget.rowCount()
         header = [self.ui.tableWidget.horizontalHeaderItem(i).text() for i in range(0, cols)]
@@ -322,13 +327,16 @@ class DialogCases(QtWidgets.QDialog):
             cur.execute(sql, [attribute_name])
             result = cur.fetchall()
 
+        # Files linked to each case, in one query
+        case_files = {}
+        sql = "select distinct case_text.caseid, case_text.fid, source.name from case_text join source on "
+        sql += "case_text.fid=source.id order by source.name asc"
+        cur.execute(sql)
+        for caseid, fid, filename in cur.fetchall():
+            case_files.setdefault(caseid, []).append((fid, filename))
         for row in result:
-            sql = "select distinct case_text.fid, source.name from case_text join source on case_text.fid=source.id "
-            sql += "where caseid=? order by source.name asc"
-            cur.execute(sql, [row[4], ])
-            files_res = cur.fetchall()
             self.cases.append({'name': row[0], 'memo': row[1], 'owner': row[2], 'date': row[3],
-                               'caseid': row[4], 'files': files_res, 'attributes': []})
+                               'caseid': row[4], 'files': case_files.get(row[4], []), 'attributes': []})
         cur.execute("select name from attribute_type where caseOrFile='case'")
         attribute_names_res = cur.fetchall()
         self.header_labels = ["Name", "Memo", "Id", "Files"]
@@ -337,13 +345,9 @@ class DialogCases(QtWidgets.QDialog):
             self.header_labels.append(att_name[0])
             self.attribute_labels_ordered.append(att_name[0])
         # Add list if attribute values to cases, order matches header columns
-        sql = "select ifnull(value, '') from attribute where attr_type='case' and attribute.name=? and id=?"
-        for a in self.attribute_labels_ordered:
-            for i, c in enumerate(self.cases):
-                cur.execute(sql, [a, c['caseid']])
-                res = cur.fetchone()
-                if res:
-                    c['attributes'].append(res[0])
+        case_attributes = attribute_values(self.app.conn, "case", self.attribute_labels_ordered)
+        for c in self.cases:
+            c['attributes'] = case_attributes.get(c['caseid'], [''] * len(self.attribute_labels_ordered))
         self.fill_table()
 
     def update_label(self):
@@ -854,6 +858,7 @@ class DialogCases(QtWidgets.QDialog):
             self.load_cases_data("attribute desc:" + self.header_labels[col])
         if action == action_equals_value:
             # Hide rows that do not match this value
+            self.table_pager.fetch_all()
             item_to_compare = self.ui.tableWidget.item(row, col)
             compare_text = item_to_compare.text()
             for r in range(0, self.ui.tableWidget.rowCount()):
@@ -866,6 +871,7 @@ class DialogCases(QtWidgets.QDialog):
             text_value, ok = QtWidgets.QInputDialog.getText(self, _("Text filter"), _("Show values like:"),
                                                        QtWidgets.QLineEdit.EchoMode.Normal)
             if ok and text_value != '':
+                self.table_pager.fetch_all()
                 for r in range(0, self.ui.tableWidget.rowCount()):
                     if self.ui.tableWidget.item(r, col).text().find(text_value) == -1:
                         self.ui.tableWidget.setRowHidden(r, True)
@@ -882,71 +888,52 @@ class DialogCases(QtWidgets.QDialog):
         self.update_label()
         self.ui.tableWidget.blockSignals(True)
         self.ui.tableWidget.setColumnCount(len(self.header_labels))
-        rows = self.ui.tableWidget.rowCount()
-        for c in range(0, rows):
-            self.ui.tableWidget.removeRow(0)
         self.ui.tableWidget.setHorizontalHeaderLabels(self.header_labels)
-        self.ui.tableWidget.setRowCount(len(self.cases))
-        for row in range(0, len(self.cases)):
-            c = self.cases[row]
-            self.ui.tableWidget.setItem(row, self.NAME_COLUMN,
-                                        QtWidgets.QTableWidgetItem(c['name']))
-            item = QtWidgets.QTableWidgetItem("")
-            if c['memo'] != "":
-                item = QtWidgets.QTableWidgetItem(_("Memo"))
-            item.setToolTip(_("Click to edit memo"))
-            self.ui.tableWidget.setItem(row, self.MEMO_COLUMN, item)
-            item = QtWidgets.QTableWidgetItem(str(c['caseid']))
-            item.setFlags(QtCore.Qt.ItemFlag.ItemIsEnabled)
-            self.ui.tableWidget.setItem(row, self.ID_COLUMN, item)
-            # Number of files assigned to case
-            item = QtWidgets.QTableWidgetItem(str(len(c['files'])))
-            item.setFlags(QtCore.Qt.ItemFlag.ItemIsEnabled)
-            item.setToolTip(_("Click to manage files for this case"))
-            self.ui.tableWidget.setItem(row, self.FILES_COLUMN, item)
-            # Add attribute values to their columns
-            for offset, attribute in enumerate(c['attributes']):
-                item = QtWidgets.QTableWidgetItem(attribute)
-                self.ui.tableWidget.setItem(row, self.ATTRIBUTE_START_COLUMN + offset, item)
+        self.table_pager.reset(self.cases)
         self.ui.tableWidget.verticalHeader().setVisible(False)
         self.ui.tableWidget.resizeRowsToContents()
         self.ui.tableWidget.hideColumn(self.ID_COLUMN)
         if self.app.settings['showids']:
             self.ui.tableWidget.showColumn(self.ID_COLUMN)
         # Add statistics tooltips to table headers for attributes
+        self.attribute_summaries = attribute_value_summaries(self.app.conn, "case", 10)
         for i, attribute_name in enumerate(self.attribute_labels_ordered):
             tt = self.get_tooltip_values(attribute_name)
             self.ui.tableWidget.horizontalHeaderItem(self.ATTRIBUTE_START_COLUMN + i).setToolTip(_("Right click header row to hide columns") + "\n" + tt)
         self.ui.tableWidget.blockSignals(False)
 
+    def fill_row(self, row, c):
+        """ Set the table items for one case. Called by: table_pager, as the table is scrolled.
+        param:
+            row: Integer table row
+            c: Dictionary of case details, from self.cases
+        """
+
+        self.ui.tableWidget.setItem(row, self.NAME_COLUMN,
+                                    QtWidgets.QTableWidgetItem(c['name']))
+        item = QtWidgets.QTableWidgetItem("")
+        if c['memo'] != "":
+            item = QtWidgets.QTableWidgetItem(_("Memo"))
+        item.setToolTip(_("Click to edit memo"))
+        self.ui.tableWidget.setItem(row, self.MEMO_COLUMN, item)
+        item = QtWidgets.QTableWidgetItem(str(c['caseid']))
+        item.setFlags(QtCore.Qt.ItemFlag.ItemIsEnabled)
+        self.ui.tableWidget.setItem(row, self.ID_COLUMN, item)
+        # Number of files assigned to case
+        item = QtWidgets.QTableWidgetItem(str(len(c['files'])))
+        item.setFlags(QtCore.Qt.ItemFlag.ItemIsEnabled)
+        item.setToolTip(_("Click to manage files for this case"))
+        self.ui.tableWidget.setItem(row, self.FILES_COLUMN, item)
+        # Add attribute values to their columns
+        for offset, attribute in enumerate(c['attributes']):
+            item = QtWidgets.QTableWidgetItem(attribute)
+            self.ui.tableWidget.setItem(row, self.ATTRIBUTE_START_COLUMN + offset, item)
+
     def get_tooltip_values(self, attribute_name):
         """ Get values to display in tooltips for the value list column.
         param: attribute_name : String """
 
-        tt = ""
-        cur = self.app.conn.cursor()
-        sql_val_type = 'select valuetype from attribute_type where caseOrFile="case" and name=?'
-        cur.execute(sql_val_type, [attribute_name])
-        res_val_type = cur.fetchone()
-        value_type = "character"
-        if res_val_type is not None:
-            value_type = res_val_type[0]
-        if value_type == "numeric":
-            sql = 'select min(cast(value as real)), max(cast(value as real)) from attribute where name=? and ' \
-                  'attr_type="case"'
-            cur.execute(sql, [attribute_name])
-            res = cur.fetchone()
-            tt = _("Minimum: ") + str(res[0]) + "\n"
-            tt += _("Maximum: ") + str(res[1])
-        if value_type == "character":
-            sql = 'select distinct value from attribute where name=? and attr_type="case" and length(value)>0 limit 10'
-            cur.execute(sql, [attribute_name])
-            res = cur.fetchall()
-            for r in res:
-                tt += "\n" + r[0]
-            if len(tt) > 1:
-                tt = tt[1:]
-        return tt
+        return value_tooltip(self.attribute_summaries.get(("case", attribute_name)), None, 10)
 
     def view_case_files(self):
         """ View all the text associated with this case.
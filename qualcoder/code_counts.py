@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+import logging
+
+from PyQt6 import QtWidgets
+
+logger = logging.getLogger(__name__)
+
+# Coding table and the column holding the source file id
+CODING_TABLES = {"code_text": "fid", "code_image": "id", "code_av": "id"}
+
+
+def code_counts_for_file(conn, table, fid, owner):
+    """ Count codings per code in one file for one coder, using one grouped query.
+    param:
+        conn: sqlite3 connection
+        table: String of code_text, code_image or code_av
+        fid: Integer source id
+        owner: String coder name
+    return:
+        Dictionary of cid: count
+    """
+
+    file_column = CODING_TABLES[table]
+    sql = f"select cid, count(cid) from {table} where {file_column}=? and owner=? group by cid"
+    cur = conn.cursor()
+    cur.execute(sql, [fid, owner])
+    return {row[0]: row[1] for row in cur.fetchall()}
+
+
+class CodeCounts:
+    """ Code counts for the currently loaded file and coder, displayed in column 3 of the code tree.
+    Loaded with one grouped query when the file changes, then updated incrementally when the
+    dialog marks or unmarks a coding.
+    Used by: code_text.DialogCodeText, code_pdf.DialogCodePdf, view_image.DialogCodeImage,
+    view_av.DialogCodeAV
+    """
+
+    def __init__(self, app, table="code_text"):
+        self.app = app
+        self.table = table
+        self.fids = []
+        self.owner = None
+        self.counts = {}
+
+    def load(self, fid, owner, transcript_fid=None):
+        """ Replace the counts with those for this file and coder.
+        param:
+            fid: Integer source id
+            owner: String coder name
+            transcript_fid: Integer id of an A/V transcription text file, or None. Text codings are added in.
+        """
+
+        self.fids = [int(fid)]
+        self.owner = owner
+        self.counts = code_counts_for_file(self.app.conn, self.table, fid, owner)
+        if transcript_fid is not None:
+            self.fids.append(int(transcript_fid))
+            for cid, count in code_counts_for_file(self.app.conn, "code_text", transcript_fid, owner).items():
+                self.counts[cid] = self.counts.get(cid, 0) + count
+
+    def add_codings(self, codings):
+        """ Add new codings to the counts. Codings by other coders or in other files are ignored.
+        param:
+            codings: List of coding dictionaries containing cid, owner and fid or id
+        """
+
+        for coding in codings:
+            if self.counted(coding):
+                cid = int(coding['cid'])
+                self.counts[cid] = self.counts.get(cid, 0) + 1
+
+    def remove_codings(self, codings):
+        """ Remove deleted codings from the counts. Codings by other coders or in other files are ignored.
+        param:
+            codings: List of coding dictionaries containing cid, owner and fid or id
+        """
+
+        for coding in codings:
+            if not self.counted(coding):
+                continue
+            cid = int(coding['cid'])
+            count = self.counts.get(cid, 0) - 1
+            if count > 0:
+                self.counts[cid] = count
+            else:
+                self.counts.pop(cid, None)
+
+    def counted(self, coding):
+        """ Check the coding belongs to the loaded file(s) and coder.
+        param:
+            coding: Dictionary containing cid, owner and fid or id
+        return:
+            Boolean
+        """
+
+        fid = coding.get('fid', coding.get('id'))
+        return coding['owner'] == self.owner and fid is not None and int(fid) in self.fids
+
+    def get(self, cid):
+        """ param: cid Integer code id
+        return: Integer count """
+
+        return self.counts.get(int(cid), 0)
+
+    def fill_tree(self, tree_widget, tooltip=None):
+        """ Show counts in column 3 of code tree items. Code items have cid:n in column 1.
+        param:
+            tree_widget: QTreeWidget of categories and codes
+            tooltip: String tooltip for counted items, or None
+        """
+
+        it = QtWidgets.QTreeWidgetItemIterator(tree_widget)
+        item = it.value()
+        count = 0
+        while item and count < 10000:
+            if item.text(1)[0:4] == "cid:":
+                try:
+                    result = self.counts.get(int(item.text(1)[4:]), 0)
+                except ValueError as err:
+                    logger.debug("Fill code counts error " + item.text(1) + " " + str(err))
+                    result = 0
+                if result > 0:
+                    item.setText(3, str(result))
+                    if tooltip is not None:
+                        item.setToolTip(3, tooltip)
+                else:
+                    item.setText(3, "")
+            it += 1
+            item = it.value()
+            count += 1
@@ -37,6 +37,7 @@ from PyQt6 import QtCore, QtGui, QtWidgets
 
 from .color_selector import TextColor
 from .helpers import msecs_to_mins_and_secs, DialogCodeInAV, DialogCodeInImage, DialogCodeInText
+from .image_thumbnails import ImageThumbnailCache, CODE_IN_ALL_FILES_THUMBNAIL_SIZE
 from .select_items import DialogSelectItems
 
 path = os.path.abspath(os.path.dirname(__file__))
@@ -172,6 +173,8 @@ class DialogCodeInAllFiles(QtWidgets.QDialog):
                'imid'
         for row in results:
             self.image_results.append(dict(zip(keys, row)))
+        image_thumbnails = ImageThumbnailCache(self.app)
+        image_thumbnails.prepare(self.image_results, CODE_IN_ALL_FILES_THUMBNAIL_SIZE)
         # Image - textEdit insertion
         for counter, row in enumerate(self.image_results):
             row['file_or_case'] = self.case_or_file
@@ -187,8 +190,8 @@ class DialogCodeInAllFiles(QtWidgets.QDialog):
             row['textedit_end'] = len(self.te.toPlainText())
             self.te.append("\n")
             img = {'mediapath': row['mediapath'], 'x1': row['x1'], 'y1': row['y1'], 'width': row['width'],
-                   'height': row['height']}
-            self.put_image_into_textedit(img, counter, self.te)
+                   'height': row['height'], 'imid': row['imid']}
+            self.put_image_into_textedit(img, counter, self.te, image_thumbnails)
             self.te.append(_("Memo: ") + row['memo'] + "\n\n")
 
         # Get coded A/V by file for this coder data
@@ -231,8 +234,8 @@ class DialogCodeInAllFiles(QtWidgets.QDialog):
             self.te.append("Memo: " + row['memo'] + "\n\n")
         self.te.blockSignals(False)
 
-    def put_image_into_textedit(self, img, counter, text_edit):
-        """ Scale image, add resource to document, insert image.
+    def put_image_into_textedit(self, img, counter, text_edit, image_thumbnails):
+        """ Add the coded area thumbnail as a resource to the document, insert image.
         A counter is important as each image slice needs a unique name, counter adds
         the uniqueness to the name.
         Called by: coded_media_dialog
@@ -240,27 +243,11 @@ class DialogCodeInAllFiles(QtWidgets.QDialog):
             img: image data dictionary with file location and width, height, position data
             counter: a changing counter is needed to make discrete different images
             text_edit:  the widget that shows the data
+            image_thumbnails: ImageThumbnailCache
         """
 
-        path_ = self.app.project_path
-        if img['mediapath'][0] == "/":
-            path_ = path_ + img['mediapath']
-        else:
-            path_ = img['mediapath'][7:]
         document = text_edit.document()
-        image = QtGui.QImageReader(path_).read()
-        image = image.copy(int(img['x1']), int(img['y1']), int(img['width']), int(img['height']))
-        # scale to max 300 wide or high. perhaps add option to change maximum limit?
-        scaler_w = 1.0
-        scaler_h = 1.0
-        if image.width() > 300:
-            scaler_w = 300 / image.width()
-        if image.height() > 300:
-            scaler_h = 300 / image.height()
-        if scaler_w < scaler_h:
-            scaler = scaler_w
-        else:
-            scaler = scaler_h
+        image = image_thumbnails.thumbnail(img, CODE_IN_ALL_FILES_THUMBNAIL_SIZE)
         # Need unique image names or the same image from the same path is reproduced
         imagename = self.app.project_path + '/images/' + str(counter) + '-' + img['mediapath']
         url = QtCore.QUrl(imagename)
@@ -269,8 +256,8 @@ class DialogCodeInAllFiles(QtWidgets.QDialog):
         # The image can be inserted into the document using the QTextCursor API:
         cursor = text_edit.textCursor()
         image_format = QtGui.QTextImageFormat()
-        image_format.setWidth(image.width() * scaler)
-        image_format.setHeight(image.height() * scaler)
+        image_format.setWidth(image.width())
+        image_format.setHeight(image.height())
         image_format.setName(url.toString())
         cursor.insertImage(image_format)
         text_edit.insertHtml("<br />")
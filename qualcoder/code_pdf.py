@@ -54,19 +54,23 @@ from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QBrush, QColor
 
 from .add_item_name import DialogAddItemName
+from .code_counts import CodeCounts
 from .code_in_all_files import DialogCodeInAllFiles
 from .color_selector import DialogColorSelect
 from .color_selector import colors, TextColor
 from .confirm_delete import DialogConfirmDelete
 from .helpers import Message, ExportDirectoryPathDialog
+from .intervals import IntervalIndex, overlap_regions, regions_in_range
 from .GUI.base64_helper import *
 from .GUI.ui_dialog_code_pdf import Ui_Dialog_code_pdf
 from .memo import DialogMemo
+from .pdf_layout_cache import PdfLayoutCache, PdfPagePrefetchWorker, decode_page_images
 from .report_attributes import DialogSelectAttributeParameters
 from .reports import DialogReportCoderComparisons, DialogReportCodeFrequencies  # for isinstance()
 from .report_codes import DialogReportCodes
 from .report_code_summary import DialogReportCodeSummary  # for isinstance()
 from .select_items import DialogSelectItems  # for isinstance()
+from .text_search import search_candidate_ids
 
 path = os.path.abspath(os.path.dirname(__file__))
 logger = logging.getLogger(__name__)
@@ -128,6 +132,8 @@ class DialogCodePdf(QtWidgets.QWidget):
         self.recent_codes = []
         self.autocode_history = []
         self.undo_deleted_codes = []
+        self.code_counts = CodeCounts(self.app, "code_text")
+        self.code_text_index = IntervalIndex()
         self.journal = False
         self.project_memo = False
         self.code_rule = False
@@ -147,6 +153,8 @@ class DialogCodePdf(QtWidgets.QWidget):
         self.selected_graphic_textboxes = []
         self.pdf_object_info_text = ""  # Contains details of PDF page objects
         self.page_dict = {}  # Temporary variable used when loading PDF pages
+        self.layout_cache = None  # PdfLayoutCache of the loaded PDF
+        self.prefetching_pages = set()  # Page numbers being read by PdfPagePrefetchWorker
 
         # Set up ui
         self.ui = Ui_Dialog_code_pdf()
@@ -626,39 +634,20 @@ class DialogCodePdf(QtWidgets.QWidget):
         self.ui.treeWidget.sortByColumn(0, QtCore.Qt.SortOrder.AscendingOrder)
         self.fill_code_counts_in_tree()
 
-    def fill_code_counts_in_tree(self):
+    def fill_code_counts_in_tree(self, reload=True):
         """ Count instances of each code for current coder and in the selected file.
-        Called by: fill_tree
+        Counts are loaded with one grouped query. After mark and unmark the incrementally updated counts
+        are displayed without reloading.
+        Called by: fill_tree, load_file, mark, unmark
+        param:
+            reload: Boolean, True to query the counts for the file
         """
 
         if self.file_ is None:
             return
-        cur = self.app.conn.cursor()
-        sql = "select count(cid) from code_text where cid=? and fid=? and owner=?"
-        it = QtWidgets.QTreeWidgetItemIterator(self.ui.treeWidget)
-        item = it.value()
-        count = 0
-        while item and count < 10000:
-            if item.text(1)[0:4] == "cid:":
-                cid = str(item.text(1)[4:])
-                try:
-                    cur.execute(sql, [cid, self.file_['id'], self.app.settings['codername']])
-                    result = cur.fetchone()
-                    if result[0] > 0:
-                        item.setText(3, str(result[0]))
-                        item.setToolTip(3, self.app.settings['codername'])
-                    else:
-                        item.setText(3, "")
-                except Exception as e:
-                    msg = "Fill code counts error\n" + str(e) + "\n"
-                    msg += sql + "\n"
-                    msg += "cid " + str(cid) + "\n"
-                    msg += "self.file_['id'] " + str(self.file_['id']) + "\n"
-                    logger.debug(msg)
-                    item.setText(3, "")
-            it += 1
-            item = it.value()
-            count += 1
+        if reload:
+            self.code_counts.load(self.file_['id'], self.app.settings['codername'])
+        self.code_counts.fill_tree(self.ui.treeWidget, self.app.settings['codername'])
 
     def get_codes_and_categories(self):
         """ Called from init, delete category/code.
@@ -708,10 +697,11 @@ class DialogCodePdf(QtWidgets.QWidget):
         if pattern is None:
             return
         self.search_indices = []
-        # Search only this document
+        # Search only this document. Skip the pattern search if the full text search index rules it out.
+        candidate_ids = search_candidate_ids(self.app.conn, "source", self.search_term)
         try:
             displayed_text = self.file_['fulltext']  # self.ui.textEdit.toPlainText()
-            if displayed_text != "":
+            if displayed_text != "" and (candidate_ids is None or self.file_['id'] in candidate_ids):
                 for match in pattern.finditer(displayed_text):
                     # Get result. char position and search string length
                     self.search_indices.append((match.start(), len(match.group(0))))
@@ -1632,7 +1622,7 @@ class DialogCodePdf(QtWidgets.QWidget):
             fmt.setFontWeight(QtGui.QFont.Weight.Bold)
         fmt.setForeground(QBrush(QColor(TextColor(color).recommendation)))
         cursor.setCharFormat(fmt)
-        self.apply_underline_to_overlaps()
+        self.apply_underline_to_overlaps(item['pos0'], item['pos1'])
 
     def overlapping_codes_in_text(self):
         """ When coded text is clicked on.
@@ -1645,10 +1635,9 @@ class DialogCodePdf(QtWidgets.QWidget):
         self.overlaps_at_pos = []
         self.overlaps_at_pos_idx = 0
         pos = self.ui.textEdit.textCursor().position()
-        for item in self.code_text:
-            if item['pos0'] <= pos + self.file_['start'] <= item['pos1']:
-                # logger.debug("Code name for selected pos0:" + str(item['pos0'])+" pos1:"+str(item['pos1'])
-                self.overlaps_at_pos.append(item)
+        if not self.code_text_index.indexes(self.code_text):
+            self.code_text_index = IntervalIndex(self.code_text)
+        self.overlaps_at_pos = self.code_text_index.at(pos + self.file_['start'])
         if len(self.overlaps_at_pos) < 2:
             self.overlaps_at_pos = []
             self.overlaps_at_pos_idx = 0
@@ -2506,6 +2495,8 @@ class DialogCodePdf(QtWidgets.QWidget):
 
     def load_pdf_pages(self):
         """ Load page elements for all pages in the PDF.
+        Page layouts are cached in the project folder. If cached, only the page sizes and text positions are read,
+        each page layout is read when shown, by load_page.
 
                 # next_result is a tuple containing a dictionary of
         # (name, id, fullltext, memo, owner, date) and char position and search string length
@@ -2523,6 +2514,14 @@ class DialogCodePdf(QtWidgets.QWidget):
             print("Cannot open pdf file " + self.file_['mediapath'])
             return
         self.get_pdf_metadata(filepath)
+        self.layout_cache = PdfLayoutCache(self.app, filepath)
+        self.prefetching_pages = set()
+        self.page_num = 0
+        index = self.layout_cache.read_index()
+        if index is not None:
+            self.pages = index['pages']
+            self.check_text_length(index['text_length'])
+            return
         pdf_file = open(filepath, 'rb')
         resource_manager = PDFResourceManager()
         laparams = LAParams()
@@ -2548,12 +2547,23 @@ class DialogCodePdf(QtWidgets.QWidget):
             self.page_dict['plain_text_end'] = self.page_end_index
             self.pages.append(self.page_dict)
             document_text += self.page_text
+        pdf_file.close()
+        self.layout_cache.store(self.pages, len(document_text))
+        self.check_text_length(len(document_text))
+
+    def check_text_length(self, text_length):
+        """ Warn if the parsed PDF text length does not match the database stored plain text.
+        Called by: load_pdf_pages
+        param:
+            text_length: Integer length of the parsed PDF text
+        """
+
         self.different_text_lengths = False
-        if len(document_text) != len(self.file_['fulltext']):
+        if text_length != len(self.file_['fulltext']):
             msg = _("Parsing the PDF text.") + "\n"
             msg += _("Texts do not match. PDF imported before 3.4 QualCodr version or the PDF text has been edited.")
             msg += _("\nView PDF but cannot code. Code positions will appear wrongly.\nCharacter difference: ")
-            msg += str(abs(len(document_text) - len(self.file_['fulltext'])))
+            msg += str(abs(text_length - len(self.file_['fulltext'])))
             Message(self.app, _("Warning"), msg, "warning").exec()
             self.different_text_lengths = True
 
@@ -2593,7 +2603,7 @@ class DialogCodePdf(QtWidgets.QWidget):
                           'stroking_color': lobj.stroking_color, 'non_stroking_color': lobj.non_stroking_color,
                           'is_empty': lobj.is_empty(),  # 'analyze': lobj.analyze(laparams),
                           'evenodd': lobj.evenodd,
-                          'pts': [QtCore.QPointF(p[0], page.mediabox[3] - p[1]) for p in lobj.pts],
+                          'pts': [[p[0], page.mediabox[3] - p[1]] for p in lobj.pts],
                           'depth': depth}
             self.page_dict['curves'].append(curve_dict)
 
@@ -2652,17 +2662,13 @@ class DialogCodePdf(QtWidgets.QWidget):
                     else:
                         cspace.append(v)
                 img_dict['colorspace'] = cspace
-            img_dict['stream'] = lobj.stream
-            img_dict['pixmap'] = None
+            # Image data is decoded when the page is shown, by decode_page_images
+            img_dict['data'] = None
             if lobj.stream:
                 file_stream = lobj.stream.get_rawdata()
                 file_ext = self.get_image_type(file_stream[0:4])
                 img_dict['filetype'] = file_ext
-                qp = QtGui.QPixmap()
-                qp.loadFromData(file_stream)
-                img_dict['pixmap'] = qp.scaled(int(img_dict['w']), int(img_dict['h']))
-                if qp.isNull():
-                    img_dict['pixmap'] = None
+                img_dict['data'] = file_stream
                 '''else:  # Potential to extract some images.
                     file_name = QtWidgets.QFileDialog.getSaveFileName(self, 'Save File', '', '*.jpg')
                     qp.save(file_name[0])  # tuple of path and type'''
@@ -2674,11 +2680,55 @@ class DialogCodePdf(QtWidgets.QWidget):
             for obj in lobj:
                 self.get_pdf_items_and_hierarchy(page, obj, depth=depth + 1)
 
+    def load_page(self, page_num):
+        """ Read the page layout from the layout cache, if not already loaded.
+        Called by: show_page
+        param:
+            page_num: Integer
+        return:
+            Dictionary of page layout
+        """
+
+        page = self.pages[page_num]
+        if 'text_boxes' not in page:
+            page = self.layout_cache.read_page(page)
+            self.pages[page_num] = page
+        return page
+
+    def prefetch_adjacent_pages(self):
+        """ Read the previous and next page layouts, and decode their images, in background threads.
+        Called by: show_page
+        """
+
+        for page_num in (self.page_num + 1, self.page_num - 1):
+            if page_num < 0 or page_num >= len(self.pages) or page_num in self.prefetching_pages:
+                continue
+            if 'text_boxes' in self.pages[page_num]:
+                continue
+            self.prefetching_pages.add(page_num)
+            worker = PdfPagePrefetchWorker(self.layout_cache, self.pages[page_num])
+            worker.signals.finished.connect(self.page_prefetched)
+            QtCore.QThreadPool.globalInstance().start(worker)
+
+    def page_prefetched(self, cache_key, page_num, page):
+        """ Keep the prefetched page layout, unless another PDF has been loaded since.
+        param:
+            cache_key: String PdfLayoutCache key
+            page_num: Integer
+            page: Dictionary of page layout
+        """
+
+        if self.layout_cache is None or cache_key != self.layout_cache.key:
+            return
+        self.prefetching_pages.discard(page_num)
+        if 'text_boxes' not in self.pages[page_num]:
+            self.pages[page_num] = page
+
     def show_page(self):
         """ Display pdf page, using the PDF objects. Only checked pdf objects are displayed.
         Coded text segments are shown in their QGraphicsTextItems. """
 
-        page = self.pages[self.page_num]
+        page = self.load_page(self.page_num)
         # Start and end marks for code positioning in textEdit display
         self.file_['start'] = page['plain_text_start']
         self.file_['end'] = page['plain_text_end']
@@ -2714,8 +2764,9 @@ class DialogCodePdf(QtWidgets.QWidget):
             for c in page['curves']:
                 counter += 1
                 self.pdf_object_info_text += "CURVE: " + str(c) + "\n"
+                points = [QtCore.QPointF(p[0], p[1]) for p in c['pts']]
                 if c['stroke'] and not c['fill']:
-                    item = QtGui.QPolygonF(c['pts'])
+                    item = QtGui.QPolygonF(points)
                     color = self.get_qcolor(c['stroking_color'])
                     brush = QtGui.QBrush(QtCore.Qt.BrushStyle.NoBrush)
                     pen = QtGui.QPen(color, c['linewidth'], QtCore.Qt.PenStyle.SolidLine)  # Border
@@ -2723,19 +2774,21 @@ class DialogCodePdf(QtWidgets.QWidget):
                 if c['fill'] and not c['stroke']:
                     brush = QtGui.QColor(self.get_qcolor(c['non_stroking_color']))  # Fill
                     pen = QtGui.QPen(QtGui.QBrush(QtCore.Qt.BrushStyle.NoBrush), 0)  # Border
-                    item = QtGui.QPolygonF(c['pts'])
+                    item = QtGui.QPolygonF(points)
                     self.scene.addPolygon(item,pen , brush)
         # Images before or after curves?
         # Seems better here, but sometimes overlaps
         if self.ui.checkBox_image.isChecked():
+            decode_page_images(page)
             for img in page['images']:
                 counter += 1
                 self.pdf_object_info_text += "IMAGE:\n"
                 for k in img:
-                    self.pdf_object_info_text += k + ": " + str(img[k]) + "\n"
+                    if k not in ('data', 'qimage'):
+                        self.pdf_object_info_text += k + ": " + str(img[k]) + "\n"
                 self.pdf_object_info_text += "\n"
-                if img['pixmap']:
-                    qpixmap_item = self.scene.addPixmap(img['pixmap'])
+                if img['qimage'] is not None:
+                    qpixmap_item = self.scene.addPixmap(QtGui.QPixmap.fromImage(img['qimage']))
                     qpixmap_item.setPos(img['x'], img['y'])
                 else:
                     # Do not use placeholder question mark icon
@@ -2764,6 +2817,7 @@ class DialogCodePdf(QtWidgets.QWidget):
         self.pdf_object_info_text += _("NUMBER OF CHARACTERS: ") + str(page['plain_text_end'] - page['plain_text_start'])
         self.ui.textEdit.setText(page['plain_text'])
         self.get_coded_text_update_eventfilter_tooltips()
+        self.prefetch_adjacent_pages()
 
     def display_page_text_objects(self):
         """ PDF text graphics objects are shown on scene.
@@ -3120,35 +3174,29 @@ class DialogCodePdf(QtWidgets.QWidget):
                     cursor.mergeCharFormat(format_bold)
         self.apply_underline_to_overlaps()
 
-    def apply_underline_to_overlaps(self):
+    def apply_underline_to_overlaps(self, pos0=None, pos1=None):
         """ Apply underline format to coded text sections which are overlapping.
+        Overlapping regions are calculated with a sorted endpoint sweep, O(n log n).
         Qt underline options: # NoUnderline, SingleUnderline, DashUnderline, DotLine, DashDotLine, WaveUnderline
         Adjust for start of text file, as this may be a smaller portion of the full text file.
+        param:
+            pos0: Integer or None. Optional start of range to underline
+            pos1: Integer or None. Optional end of range to underline
         """
 
         if self.important:
             return
-        overlaps = []
-        for i in self.code_text:
-            for j in self.code_text:
-                if j != i:
-                    if j['pos0'] <= i['pos0'] <= j['pos1']:
-                        if (j['pos0'] >= i['pos0'] and j['pos1'] <= i['pos1']) and (j['pos0'] != j['pos1']):
-                            overlaps.append([j['pos0'], j['pos1']])
-                        elif (i['pos0'] >= j['pos0'] and i['pos1'] <= j['pos1']) and (i['pos0'] != i['pos1']):
-                            overlaps.append([i['pos0'], i['pos1']])
-                        elif j['pos0'] > i['pos0'] and (j['pos0'] != i['pos1']):
-                            overlaps.append([j['pos0'], i['pos1']])
-                        elif j['pos1'] != i['pos0']:  # j['pos0'] < i['pos0']:
-                            overlaps.append([j['pos1'], i['pos0']])
+        overlaps = overlap_regions([[c['pos0'], c['pos1']] for c in self.code_text])
+        if pos0 is not None and pos1 is not None:
+            overlaps = regions_in_range(overlaps, pos0, pos1)
         cursor = self.ui.textEdit.textCursor()
+        fmt = QtGui.QTextCharFormat()
+        fmt.setUnderlineStyle(QtGui.QTextCharFormat.UnderlineStyle.SingleUnderline)
+        if self.app.settings['stylesheet'] == 'dark':
+            fmt.setUnderlineColor(QColor("#000000"))
+        else:
+            fmt.setUnderlineColor(QColor("#FFFFFF"))
         for o in overlaps:
-            fmt = QtGui.QTextCharFormat()
-            fmt.setUnderlineStyle(QtGui.QTextCharFormat.UnderlineStyle.SingleUnderline)
-            if self.app.settings['stylesheet'] == 'dark':
-                fmt.setUnderlineColor(QColor("#000000"))
-            else:
-                fmt.setUnderlineColor(QColor("#FFFFFF"))
             cursor.setPosition(o[0] - self.file_['start'], QtGui.QTextCursor.MoveMode.MoveAnchor)
             cursor.setPosition(o[1] - self.file_['start'], QtGui.QTextCursor.MoveMode.KeepAnchor)
             cursor.mergeCharFormat(fmt)
@@ -3240,7 +3288,8 @@ class DialogCodePdf(QtWidgets.QWidget):
         self.app.delete_backup = False
         # Update filter for tooltip and update code colours
         self.get_coded_text_update_eventfilter_tooltips()
-        self.fill_code_counts_in_tree()
+        self.code_counts.add_codings([coded])
+        self.fill_code_counts_in_tree(reload=False)
 
         # Update recent_codes
         tmp_code = None
@@ -3275,9 +3324,10 @@ class DialogCodePdf(QtWidgets.QWidget):
                                                                    item['owner'],
                                                                    item['memo'], item['date'], item['important']))
         self.app.conn.commit()
+        self.code_counts.add_codings(self.undo_deleted_codes)
         self.undo_deleted_codes = []
         self.get_coded_text_update_eventfilter_tooltips()
-        self.fill_code_counts_in_tree()
+        self.fill_code_counts_in_tree(reload=False)
         self.display_page_text_objects()
 
     def unmark(self, position=None, ctid=None):
@@ -3323,7 +3373,8 @@ class DialogCodePdf(QtWidgets.QWidget):
             self.app.conn.commit()
         # Update filter for tooltip and update code colours
         self.get_coded_text_update_eventfilter_tooltips()
-        self.fill_code_counts_in_tree()
+        self.code_counts.remove_codings(to_unmark)
+        self.fill_code_counts_in_tree(reload=False)
         self.update_file_tooltip()
         self.app.delete_backup = False
         self.display_page_text_objects()
@@ -3504,6 +3555,8 @@ class ToolTipEventFilter(QtCore.QObject):
     codes = None
     code_text = None
     annotations = None
+    code_text_index = None
+    annotations_index = None
     file_id = None
     offset = 0
     app = None
@@ -3526,11 +3579,15 @@ class ToolTipEventFilter(QtCore.QObject):
         self.annotations = annotations
         self.file_id = file_['id']
         self.offset = file_['start']
+        codes_by_cid = {c['cid']: c for c in self.codes}
         for item in self.code_text:
-            for c in self.codes:
-                if item['cid'] == c['cid']:
-                    item['name'] = c['name']
-                    item['color'] = c['color']
+            code_ = codes_by_cid.get(item['cid'])
+            if code_ is not None:
+                item['name'] = code_['name']
+                item['color'] = code_['color']
+        # Position indexes, so hover events are O(log n + k)
+        self.code_text_index = IntervalIndex(self.code_text)
+        self.annotations_index = IntervalIndex([ann for ann in self.annotations if ann['fid'] == self.file_id])
 
     def eventFilter(self, receiver, event):
         # QtGui.QToolTip.showText(QtGui.QCursor.pos(), tip)
@@ -3545,9 +3602,8 @@ class ToolTipEventFilter(QtCore.QObject):
             if self.code_text is None:
                 # Call Base Class Method to Continue Normal Event Processing
                 return super(ToolTipEventFilter, self).eventFilter(receiver, event)
-            for item in self.code_text:
-                if item['pos0'] - self.offset <= pos <= item['pos1'] - self.offset and \
-                        item['seltext'] is not None:
+            for item in self.code_text_index.at(pos + self.offset):
+                if item['seltext'] is not None:
                     seltext = item['seltext']
                     seltext = seltext.replace("\n", "")
                     seltext = seltext.replace("\r", "")
@@ -3584,9 +3640,8 @@ class ToolTipEventFilter(QtCore.QObject):
             if multiple > 1:
                 text_ = multiple_msg + text_
             # Check annotations
-            for ann in self.annotations:
-                if ann['pos0'] - self.offset <= pos <= ann['pos1'] - self.offset and self.file_id == ann['fid']:
-                    text_ += "<p>" + _("ANNOTATED:") + ann['memo'] + "</p>"
+            for ann in self.annotations_index.at(pos + self.offset):
+                text_ += "<p>" + _("ANNOTATED:") + ann['memo'] + "</p>"
             if text_ != "":
                 receiver.setToolTip(text_)
         # Call Base Class Method to Continue Normal Event Processing
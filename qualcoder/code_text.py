@@ -43,11 +43,13 @@ from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QBrush, QColor
 
 from .add_item_name import DialogAddItemName
+from .code_counts import CodeCounts
 from .code_in_all_files import DialogCodeInAllFiles
 from .color_selector import DialogColorSelect
 from .color_selector import colors, TextColor
 from .confirm_delete import DialogConfirmDelete
 from .helpers import Message, DialogGetStartAndEndMarks, ExportDirectoryPathDialog, MarkdownHighlighter
+from .intervals import IntervalIndex, layered_runs, overlap_regions, regions_in_range
 from .GUI.base64_helper import *
 from .GUI.ui_dialog_code_text import Ui_Dialog_code_text
 from .memo import DialogMemo
@@ -56,6 +58,7 @@ from .reports import DialogReportCoderComparisons, DialogReportCodeFrequencies
 from .report_codes import DialogReportCodes
 from .report_code_summary import DialogReportCodeSummary  # for isinstance()
 from .select_items import DialogSelectItems  # for isinstance()
+from .text_search import search_candidate_ids
 
 path = os.path.abspath(os.path.dirname(__file__))
 logger = logging.getLogger(__name__)
@@ -132,6 +135,8 @@ class DialogCodeText(QtWidgets.QWidget):
         self.recent_codes = []
         self.autocode_history = []
         self.undo_deleted_codes = []
+        self.code_counts = CodeCounts(self.app, "code_text")
+        self.code_text_index = IntervalIndex()
         self.project_memo = False
         self.code_rule = False
         self.important = False
@@ -662,39 +667,20 @@ class DialogCodeText(QtWidgets.QWidget):
         self.ui.treeWidget.sortByColumn(0, QtCore.Qt.SortOrder.AscendingOrder)
         self.fill_code_counts_in_tree()
 
-    def fill_code_counts_in_tree(self):
+    def fill_code_counts_in_tree(self, reload=True):
         """ Count instances of each code for current coder and in the selected file.
-        Called by: fill_tree
+        Counts are loaded with one grouped query. After mark and unmark the incrementally updated counts
+        are displayed without reloading.
+        Called by: fill_tree, load_file, mark, unmark
+        param:
+            reload: Boolean, True to query the counts for the file
         """
 
         if self.file_ is None:
             return
-        cur = self.app.conn.cursor()
-        sql = "select count(cid) from code_text where cid=? and fid=? and owner=?"
-        it = QtWidgets.QTreeWidgetItemIterator(self.ui.treeWidget)
-        item = it.value()
-        count = 0
-        while item and count < 10000:
-            if item.text(1)[0:4] == "cid:":
-                cid = str(item.text(1)[4:])
-                try:
-                    cur.execute(sql, [cid, self.file_['id'], self.app.settings['codername']])
-                    result = cur.fetchone()
-                    if result[0] > 0:
-                        item.setText(3, str(result[0]))
-                        item.setToolTip(3, self.app.settings['codername'])
-                    else:
-                        item.setText(3, "")
-                except Exception as e:
-                    msg = "Fill code counts error\n" + str(e) + "\n"
-                    msg += sql + "\n"
-                    msg += "cid " + str(cid) + "\n"
-                    msg += "self.file_['id'] " + str(self.file_['id']) + "\n"
-                    logger.debug(msg)
-                    item.setText(3, "")
-            it += 1
-            item = it.value()
-            count += 1
+        if reload:
+            self.code_counts.load(self.file_['id'], self.app.settings['codername'])
+        self.code_counts.fill_tree(self.ui.treeWidget, self.app.settings['codername'])
 
     def get_codes_and_categories(self):
         """ Called from init, delete category/code.
@@ -809,20 +795,41 @@ class DialogCodeText(QtWidgets.QWidget):
             return
         self.search_indices = []
         if self.ui.checkBox_search_all_files.isChecked():
-            """ Search for this text across all files. """
-            for filedata in self.app.get_file_texts():
+            """ Search for this text across all files.
+            The full text search index narrows the files to those that can contain a match. """
+            candidate_ids = search_candidate_ids(self.app.conn, "source", self.search_term)
+            if candidate_ids is not None:
+                candidate_ids = list(candidate_ids)
+            # Texts are streamed, only the match positions are kept
+            matches = []
+            for id_, name, text_ in self.app.stream_file_texts(candidate_ids):
                 try:
-                    text_ = filedata['fulltext']
                     for match in pattern.finditer(text_):
-                        self.search_indices.append((filedata, match.start(), len(match.group(0))))
+                        matches.append((id_, match.start(), len(match.group(0))))
                 except re.error:
-                    logger.exception('Failed searching text %s for %s', filedata['name'], self.search_term)
+                    logger.exception('Failed searching text %s for %s', name, self.search_term)
+            # File details, without the text, for files containing matches
+            files_data = {}
+            matched_ids = list(dict.fromkeys(match[0] for match in matches))
+            cur = self.app.conn.cursor()
+            keys = 'id', 'name', 'memo', 'owner', 'date', 'mediapath'
+            for i in range(0, len(matched_ids), 500):
+                ids = matched_ids[i:i + 500]
+                placeholders = ",".join("?" * len(ids))
+                cur.execute("select id, name, ifnull(memo,''), owner, date, mediapath from source "
+                            f"where id in ({placeholders})", ids)
+                for row in cur.fetchall():
+                    files_data[row[0]] = dict(zip(keys, row))
+            for id_, start, length in matches:
+                self.search_indices.append((files_data[id_], start, length))
         else:
             try:
                 if self.text:
+                    source_name = None
                     for match in pattern.finditer(self.text):
                         # Get result as first dictionary item
-                        source_name = self.app.get_file_texts([self.file_['id'], ])[0]
+                        if source_name is None:
+                            source_name = self.app.get_file_texts([self.file_['id'], ])[0]
                         self.search_indices.append((source_name, match.start(), len(match.group(0))))
             except re.error:
                 logger.exception('Failed searching current file for %s', self.search_term)
@@ -1857,7 +1864,7 @@ class DialogCodeText(QtWidgets.QWidget):
             fmt.setFontWeight(QtGui.QFont.Weight.Bold)
         fmt.setForeground(QBrush(QColor(TextColor(color).recommendation)))
         cursor.setCharFormat(fmt)
-        self.apply_underline_to_overlaps()
+        self.apply_underline_to_overlaps(item['pos0'], item['pos1'])
 
     def overlapping_codes_in_text(self):
         """ When coded text is clicked on.
@@ -1868,10 +1875,9 @@ class DialogCodeText(QtWidgets.QWidget):
         self.overlaps_at_pos = []
         self.overlaps_at_pos_idx = 0
         pos = self.ui.textEdit.textCursor().position()
-        for item in self.code_text:
-            if item['pos0'] <= pos + self.file_['start'] <= item['pos1']:
-                # logger.debug("Code name for selected pos0:" + str(item['pos0'])+" pos1:"+str(item['pos1'])
-                self.overlaps_at_pos.append(item)
+        if not self.code_text_index.indexes(self.code_text):
+            self.code_text_index = IntervalIndex(self.code_text)
+        self.overlaps_at_pos = self.code_text_index.at(pos + self.file_['start'])
         if len(self.overlaps_at_pos) < 2:
             self.overlaps_at_pos = []
             self.overlaps_at_pos_idx = 0
@@ -3178,9 +3184,12 @@ class DialogCodeText(QtWidgets.QWidget):
         self.ui.checkBox_search_all_files.setEnabled(True)
         # self.search_for_text()
 
-    def get_coded_text_update_eventfilter_tooltips(self):
+    def get_coded_text_update_eventfilter_tooltips(self, pos0=None, pos1=None):
         """ Called by load_file, and from other dialogs on update.
         Tooltips are for all coded_text or only for important if important is flagged.
+        param:
+            pos0: Integer or None. Start of a changed range, re-highlight only this part of the text
+            pos1: Integer or None. End of a changed range
         """
 
         if self.file_ is None:
@@ -3213,6 +3222,9 @@ class DialogCodeText(QtWidgets.QWidget):
         else:
             self.eventFilterTT.set_codes_and_annotations(self.app, self.code_text, self.codes, self.annotations,
                                                          self.file_)
+        if pos0 is not None and pos1 is not None:
+            self.highlight(pos0, pos1)
+            return
         self.unlight()
         self.highlight()
 
@@ -3226,91 +3238,111 @@ class DialogCodeText(QtWidgets.QWidget):
         cursor.setPosition(len(self.text) - 1, QtGui.QTextCursor.MoveMode.KeepAnchor)
         cursor.setCharFormat(QtGui.QTextCharFormat())
 
-    def highlight(self):
+    def highlight(self, pos0=None, pos1=None):
         """ Apply text highlighting to current file.
         If no colour has been assigned to a code, those coded text fragments are coloured gray.
         Each code text item contains: fid, date, pos0, pos1, seltext, cid, status, memo,
         name, owner.
         For defined colours in color_selector, make text light on dark, and conversely dark on light
+        Codings are ordered longest first, so shorter codings are layered on top. The layers are
+        flattened into non-overlapping format runs, and applied in one edit block, so the document
+        is laid out once.
+        If pos0 and pos1 are given, e.g. after mark or unmark, only the text blocks containing
+        that range are cleared and re-formatted.
+        param:
+            pos0: Integer or None. Start of changed range, in full text file positions
+            pos1: Integer or None. End of changed range, in full text file positions
         """
 
         if self.file_ is None or self.ui.textEdit.toPlainText() == "":
             return
+        document = self.ui.textEdit.document()
+        text_length = len(self.ui.textEdit.toPlainText())
+        start = self.file_['start']
+        range_start, range_end = 0, text_length
+        if pos0 is not None and pos1 is not None:
+            # Expand the changed range to the enclosing text blocks
+            range_start = document.findBlock(max(int(pos0) - start, 0)).position()
+            end_block = document.findBlock(min(int(pos1) - start, text_length))
+            range_end = min(end_block.position() + end_block.length() - 1, text_length)
+        cursor = self.ui.textEdit.textCursor()
+        cursor.beginEditBlock()
+        if pos0 is not None and pos1 is not None:
+            cursor.setPosition(range_start, QtGui.QTextCursor.MoveMode.MoveAnchor)
+            cursor.setPosition(range_end, QtGui.QTextCursor.MoveMode.KeepAnchor)
+            cursor.setCharFormat(QtGui.QTextCharFormat())
         # Add coding highlights
         codes = {x['cid']: x for x in self.codes}
-        for item in self.code_text:
-            fmt = QtGui.QTextCharFormat()
-            cursor = self.ui.textEdit.textCursor()
-            cursor.setPosition(int(item['pos0'] - self.file_['start']), QtGui.QTextCursor.MoveMode.MoveAnchor)
-            cursor.setPosition(int(item['pos1'] - self.file_['start']), QtGui.QTextCursor.MoveMode.KeepAnchor)
+        # Use important flag for ONLY showing important codes (button selected)
+        shown = [item for item in self.code_text if not self.important or item['important'] == 1]
+        runs = layered_runs([[int(item['pos0']) - start, int(item['pos1']) - start] for item in shown])
+        formats = {}
+        for run_start, run_end, index in runs:
+            run_start = max(run_start, range_start)
+            run_end = min(run_end, range_end)
+            if run_start >= run_end:
+                continue
+            item = shown[index]
             color = codes.get(item['cid'], {}).get('color', "#777777")  # default gray
-            brush = QBrush(QColor(color))
-            fmt.setBackground(brush)
-            # Foreground depends on the defined need_white_text color in color_selector
-            text_brush = QBrush(QColor(TextColor(color).recommendation))
-            fmt.setForeground(text_brush)
             # Highlight codes with memos - these are italicised
             # Italics also used for overlapping codes
-            if item['memo'] != "":
-                fmt.setFontItalic(True)
-            else:
-                fmt.setFontItalic(False)
             # Bold important codes
-            if item['important']:
-                fmt.setFontWeight(QtGui.QFont.Weight.Bold)
-            # Use important flag for ONLY showing important codes (button selected)
-            if self.important and item['important'] == 1:
-                cursor.setCharFormat(fmt)
-            # Show all codes, as important button not selected
-            if not self.important:
-                cursor.setCharFormat(fmt)
+            format_key = (color, item['memo'] != "", bool(item['important']))
+            fmt = formats.get(format_key)
+            if fmt is None:
+                fmt = QtGui.QTextCharFormat()
+                fmt.setBackground(QBrush(QColor(color)))
+                # Foreground depends on the defined need_white_text color in color_selector
+                fmt.setForeground(QBrush(QColor(TextColor(color).recommendation)))
+                fmt.setFontItalic(item['memo'] != "")
+                if item['important']:
+                    fmt.setFontWeight(QtGui.QFont.Weight.Bold)
+                formats[format_key] = fmt
+            cursor.setPosition(run_start, QtGui.QTextCursor.MoveMode.MoveAnchor)
+            cursor.setPosition(run_end, QtGui.QTextCursor.MoveMode.KeepAnchor)
+            cursor.setCharFormat(fmt)
 
         # Add annotation marks - these are in bold, important codings are also bold
-        for note in self.annotations:
-            if len(self.file_.keys()) > 0:  # will be zero if using autocode and no file is loaded
+        if len(self.file_.keys()) > 0:  # will be zero if using autocode and no file is loaded
+            format_bold = QtGui.QTextCharFormat()
+            format_bold.setFontWeight(QtGui.QFont.Weight.Bold)
+            for note in self.annotations:
                 # Cursor pos could be negative if annotation was for an earlier text portion
-                cursor = self.ui.textEdit.textCursor()
                 if note['fid'] == self.file_['id'] and \
-                        0 <= int(note['pos0']) - self.file_['start'] < int(note['pos1']) - self.file_['start'] <= \
-                        len(self.ui.textEdit.toPlainText()):
-                    cursor.setPosition(int(note['pos0']) - self.file_['start'],
-                                       QtGui.QTextCursor.MoveMode.MoveAnchor)
-                    cursor.setPosition(int(note['pos1']) - self.file_['start'],
-                                       QtGui.QTextCursor.MoveMode.KeepAnchor)
-                    format_bold = QtGui.QTextCharFormat()
-                    format_bold.setFontWeight(QtGui.QFont.Weight.Bold)
+                        0 <= int(note['pos0']) - start < int(note['pos1']) - start <= text_length:
+                    note_start = max(int(note['pos0']) - start, range_start)
+                    note_end = min(int(note['pos1']) - start, range_end)
+                    if note_start >= note_end:
+                        continue
+                    cursor.setPosition(note_start, QtGui.QTextCursor.MoveMode.MoveAnchor)
+                    cursor.setPosition(note_end, QtGui.QTextCursor.MoveMode.KeepAnchor)
                     cursor.mergeCharFormat(format_bold)
-        self.apply_underline_to_overlaps()
+        self.apply_underline_to_overlaps(range_start + start, range_end + start)
+        cursor.endEditBlock()
 
-    def apply_underline_to_overlaps(self):
+    def apply_underline_to_overlaps(self, pos0=None, pos1=None):
         """ Apply underline format to coded text sections which are overlapping.
+        Overlapping regions are calculated with a sorted endpoint sweep, O(n log n).
         Qt underline options: # NoUnderline, SingleUnderline, DashUnderline, DotLine, DashDotLine, WaveUnderline
         Adjust for start of text file, as this may be a smaller portion of the full text file.
+        param:
+            pos0: Integer or None. Optional start of range to underline
+            pos1: Integer or None. Optional end of range to underline
         """
 
         if self.important:
             return
-        overlaps = []
-        for i in self.code_text:
-            for j in self.code_text:
-                if j != i:
-                    if j['pos0'] <= i['pos0'] <= j['pos1']:
-                        if (j['pos0'] >= i['pos0'] and j['pos1'] <= i['pos1']) and (j['pos0'] != j['pos1']):
-                            overlaps.append([j['pos0'], j['pos1']])
-                        elif (i['pos0'] >= j['pos0'] and i['pos1'] <= j['pos1']) and (i['pos0'] != i['pos1']):
-                            overlaps.append([i['pos0'], i['pos1']])
-                        elif j['pos0'] > i['pos0'] and (j['pos0'] != i['pos1']):
-                            overlaps.append([j['pos0'], i['pos1']])
-                        elif j['pos1'] != i['pos0']:  # j['pos0'] < i['pos0']:
-                            overlaps.append([j['pos1'], i['pos0']])
+        overlaps = overlap_regions([[c['pos0'], c['pos1']] for c in self.code_text])
+        if pos0 is not None and pos1 is not None:
+            overlaps = regions_in_range(overlaps, pos0, pos1)
         cursor = self.ui.textEdit.textCursor()
+        fmt = QtGui.QTextCharFormat()
+        fmt.setUnderlineStyle(QtGui.QTextCharFormat.UnderlineStyle.SingleUnderline)
+        if self.app.settings['stylesheet'] == 'dark':
+            fmt.setUnderlineColor(QColor("#000000"))
+        else:
+            fmt.setUnderlineColor(QColor("#FFFFFF"))
         for o in overlaps:
-            fmt = QtGui.QTextCharFormat()
-            fmt.setUnderlineStyle(QtGui.QTextCharFormat.UnderlineStyle.SingleUnderline)
-            if self.app.settings['stylesheet'] == 'dark':
-                fmt.setUnderlineColor(QColor("#000000"))
-            else:
-                fmt.setUnderlineColor(QColor("#FFFFFF"))
             cursor.setPosition(o[0] - self.file_['start'], QtGui.QTextCursor.MoveMode.MoveAnchor)
             cursor.setPosition(o[1] - self.file_['start'], QtGui.QTextCursor.MoveMode.KeepAnchor)
             cursor.mergeCharFormat(fmt)
@@ -3361,8 +3393,9 @@ class DialogCodeText(QtWidgets.QWidget):
         self.app.conn.commit()
         self.app.delete_backup = False
         # Update filter for tooltip and update code colours
-        self.get_coded_text_update_eventfilter_tooltips()
-        self.fill_code_counts_in_tree()
+        self.get_coded_text_update_eventfilter_tooltips(coded['pos0'], coded['pos1'])
+        self.code_counts.add_codings([coded])
+        self.fill_code_counts_in_tree(reload=False)
         # Update recent_codes
         tmp_code = None
         for c in self.codes:
@@ -3395,9 +3428,12 @@ class DialogCodeText(QtWidgets.QWidget):
                                                                    item['owner'],
                                                                    item['memo'], item['date'], item['important']))
         self.app.conn.commit()
+        self.code_counts.add_codings(self.undo_deleted_codes)
+        pos0 = min(item['pos0'] for item in self.undo_deleted_codes)
+        pos1 = max(item['pos1'] for item in self.undo_deleted_codes)
         self.undo_deleted_codes = []
-        self.get_coded_text_update_eventfilter_tooltips()
-        self.fill_code_counts_in_tree()
+        self.get_coded_text_update_eventfilter_tooltips(pos0, pos1)
+        self.fill_code_counts_in_tree(reload=False)
 
     def unmark(self, location):
         """ Remove code marking by this coder from selected text in current file.
@@ -3427,7 +3463,7 @@ class DialogCodeText(QtWidgets.QWidget):
             if not ok:
                 return
             to_unmark = ui.get_selected()
-        if to_unmark is None:
+        if not to_unmark:
             return
         self.undo_deleted_codes = deepcopy(to_unmark)
         # Delete from db, remove from coding and update highlights
@@ -3436,8 +3472,11 @@ class DialogCodeText(QtWidgets.QWidget):
             cur.execute("delete from code_text where ctid=?", [item['ctid']])
             self.app.conn.commit()
         # Update filter for tooltip and update code colours
-        self.get_coded_text_update_eventfilter_tooltips()
-        self.fill_code_counts_in_tree()
+        pos0 = min(item['pos0'] for item in to_unmark)
+        pos1 = max(item['pos1'] for item in to_unmark)
+        self.get_coded_text_update_eventfilter_tooltips(pos0, pos1)
+        self.code_counts.remove_codings(to_unmark)
+        self.fill_code_counts_in_tree(reload=False)
         self.update_file_tooltip()
         self.app.delete_backup = False
 
@@ -3705,22 +3744,22 @@ class DialogCodeText(QtWidgets.QWidget):
         if ending == "":
             return
         ending = ending.replace("\\n", "\n")
-        files = []
+        # Texts are streamed, so only a few are in memory at once
         if all_ == "all":
-            files = self.app.get_file_texts()
+            files = self.app.stream_file_texts()
         else:
-            files = self.app.get_file_texts([self.file_['id'], ])
+            files = self.app.stream_file_texts([self.file_['id'], ])
         cur = self.app.conn.cursor()
         msg = ""
         undo_list = []
         try:
-            for f in files:
-                sentences = f['fulltext'].split(ending)
+            for fid, file_name, fulltext in files:
+                sentences = fulltext.split(ending)
                 pos0 = 0
                 codes_added = 0
                 for sentence in sentences:
                     if text_ in sentence:
-                        i = {'cid': cid, 'fid': int(f['id']), 'seltext': str(sentence),
+                        i = {'cid': cid, 'fid': int(fid), 'seltext': str(sentence),
                             'pos0': pos0, 'pos1': pos0 + len(sentence),
                             'owner': self.app.settings['codername'], 'memo': "",
                             'date': datetime.datetime.now().astimezone().strftime("%Y-%m-%d %H:%M:%S")}
@@ -3742,7 +3781,7 @@ class DialogCodeText(QtWidgets.QWidget):
                             logger.debug(_("Autocode insert error ") + str(e))
                     pos0 += len(sentence) + len(ending)
                 if codes_added > 0:
-                    msg += _("File: ") + f['name'] + " " + str(codes_added) + _(" added codes") + "\n"
+                    msg += _("File: ") + file_name + " " + str(codes_added) + _(" added codes") + "\n"
             self.app.conn.commit()
         except:
             self.app.conn.rollback() # revert all changes
@@ -3756,7 +3795,7 @@ class DialogCodeText(QtWidgets.QWidget):
         self.parent_textEdit.append(_("Automatic code sentence in files:")
                                     + _("\nCode: ") + item.text(0)
                                     + _("\nWith text fragment: ")
-                                    + text.decode("utf-8")
+                                    + text_
                                     + _("\nUsing line ending: ")
                                     + ending + "\n" + msg)
         self.app.delete_backup = False
@@ -3806,52 +3845,48 @@ class DialogCodeText(QtWidgets.QWidget):
             return
         undo_list = []
         cur = self.app.conn.cursor()
+        filenames = ""
+        for f in files:
+            filenames += f['name'] + " "
         try:
-            for txt in texts:
-                filenames = ""
-                for f in files:
-                    filenames += f['name'] + " "
-                    cur.execute("select name, id, fulltext, memo, owner, date from source where id=? and "
-                                "(mediapath is null or mediapath like '/docs/%' or mediapath like 'docs:%')",
-                                [f['id']])
-                    current_file = cur.fetchone()
-                    # Rare but possible no result is returned, hence if statement
-                    if current_file is not None:
-                        text_ = current_file[2]
-                        text_starts = [match.start() for match in re.finditer(re.escape(txt), text_)]
-                        # Trim to first or last instance if option selected
-                        if self.all_first_last == "first" and len(text_starts) > 1:
-                            text_starts = [text_starts[0]]
-                        if self.all_first_last == "last" and len(text_starts) > 1:
-                            text_starts = [text_starts[-1]]
-
-                        # Add new items to database
-                        for startPos in text_starts:
-                            item = {'cid': cid, 'fid': int(f['id']), 'seltext': str(txt),
-                                    'pos0': startPos, 'pos1': startPos + len(txt),
-                                    'owner': self.app.settings['codername'], 'memo': "",
-                                    'date': datetime.datetime.now().astimezone().strftime("%Y-%m-%d %H:%M:%S")}
-                            try:
-                                cur.execute("insert into code_text (cid,fid,seltext,pos0,pos1,\
-                                    owner,memo,date) values(?,?,?,?,?,?,?,?)",
-                                            [item['cid'], item['fid'], item['seltext'], item['pos0'],
-                                            item['pos1'], item['owner'], item['memo'], item['date']])
-                                # Record a list of undo sql
-                                undo = {
-                                    "sql": "delete from code_text where cid=? and fid=? and pos0=? and pos1=? and owner=?",
-                                    "cid": item['cid'], "fid": item['fid'], "pos0": item['pos0'], "pos1": item['pos1'],
-                                    "owner": item['owner']}
-                                undo_list.append(undo)
-                            except sqlite3.IntegrityError as e:
-                                logger.debug(_("Autocode insert error ") + str(e))
-                            self.app.delete_backup = False
-                self.app.conn.commit()
-                self.parent_textEdit.append(_("Automatic coding in files: ") + filenames
-                                          + _(". with text: ") + txt)
+            # Each text is streamed once and searched for all the texts to code
+            for fid, file_name, text_ in self.app.stream_file_texts([f['id'] for f in files]):
+                for txt in texts:
+                    text_starts = [match.start() for match in re.finditer(re.escape(txt), text_)]
+                    # Trim to first or last instance if option selected
+                    if self.all_first_last == "first" and len(text_starts) > 1:
+                        text_starts = [text_starts[0]]
+                    if self.all_first_last == "last" and len(text_starts) > 1:
+                        text_starts = [text_starts[-1]]
+
+                    # Add new items to database
+                    for startPos in text_starts:
+                        item = {'cid': cid, 'fid': int(fid), 'seltext': str(txt),
+                                'pos0': startPos, 'pos1': startPos + len(txt),
+                                'owner': self.app.settings['codername'], 'memo': "",
+                                'date': datetime.datetime.now().astimezone().strftime("%Y-%m-%d %H:%M:%S")}
+                        try:
+                            cur.execute("insert into code_text (cid,fid,seltext,pos0,pos1,\
+                                owner,memo,date) values(?,?,?,?,?,?,?,?)",
+                                        [item['cid'], item['fid'], item['seltext'], item['pos0'],
+                                        item['pos1'], item['owner'], item['memo'], item['date']])
+                            # Record a list of undo sql
+                            undo = {
+                                "sql": "delete from code_text where cid=? and fid=? and pos0=? and pos1=? and owner=?",
+                                "cid": item['cid'], "fid": item['fid'], "pos0": item['pos0'], "pos1": item['pos1'],
+                                "owner": item['owner']}
+                            undo_list.append(undo)
+                        except sqlite3.IntegrityError as e:
+                            logger.debug(_("Autocode insert error ") + str(e))
+                        self.app.delete_backup = False
+            self.app.conn.commit()
         except:
             self.app.conn.rollback() # revert all changes 
             undo_list = []
             raise
+        for txt in texts:
+            self.parent_textEdit.append(_("Automatic coding in files: ") + filenames
+                                        + _(". with text: ") + txt)
         if len(undo_list) > 0:
             name = _("Text coding: ") + _("\nCode: ") + code_item.text(0)
             name += _("\nWith: ") + find_text
@@ -4237,6 +4272,8 @@ class ToolTipEventFilter(QtCore.QObject):
     codes = None
     code_text = None
     annotations = None
+    code_text_index = None
+    annotations_index = None
     file_id = None
     offset = 0
     app = None
@@ -4259,11 +4296,15 @@ class ToolTipEventFilter(QtCore.QObject):
         self.annotations = annotations
         self.file_id = file_['id']
         self.offset = file_['start']
+        codes_by_cid = {c['cid']: c for c in self.codes}
         for item in self.code_text:
-            for c in self.codes:
-                if item['cid'] == c['cid']:
-                    item['name'] = c['name']
-                    item['color'] = c['color']
+            code_ = codes_by_cid.get(item['cid'])
+            if code_ is not None:
+                item['name'] = code_['name']
+                item['color'] = code_['color']
+        # Position indexes, so hover events are O(log n + k)
+        self.code_text_index = IntervalIndex(self.code_text)
+        self.annotations_index = IntervalIndex([ann for ann in self.annotations if ann['fid'] == self.file_id])
 
     def eventFilter(self, receiver, event):
         # QtGui.QToolTip.showText(QtGui.QCursor.pos(), tip)
@@ -4278,9 +4319,8 @@ class ToolTipEventFilter(QtCore.QObject):
             if self.code_text is None:
                 # Call Base Class Method to Continue Normal Event Processing
                 return super(ToolTipEventFilter, self).eventFilter(receiver, event)
-            for item in self.code_text:
-                if item['pos0'] - self.offset <= pos <= item['pos1'] - self.offset and \
-                        item['seltext'] is not None:
+            for item in self.code_text_index.at(pos + self.offset):
+                if item['seltext'] is not None:
                     seltext = item['seltext']
                     seltext = seltext.replace("\n", "")
                     seltext = seltext.replace("\r", "")
@@ -4320,9 +4360,8 @@ class ToolTipEventFilter(QtCore.QObject):
             if multiple > 1:
                 text_ = multiple_msg + text_
             # Check annotations
-            for ann in self.annotations:
-                if ann['pos0'] - self.offset <= pos <= ann['pos1'] - self.offset and self.file_id == ann['fid']:
-                    text_ += "<p>" + _("ANNOTATED:") + ann['memo'] + "</p>"
+            for ann in self.annotations_index.at(pos + self.offset):
+                text_ += "<p>" + _("ANNOTATED:") + ann['memo'] + "</p>"
             if text_ != "":
                 receiver.setToolTip(text_)
         # Call Base Class Method to Continue Normal Event Processing
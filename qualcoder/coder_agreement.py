@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+import logging
+
+from .intervals import intersect_merged, merge_intervals, total_length
+
+logger = logging.getLogger(__name__)
+
+# Two-coder agreement for coded text, calculated from the union of each coder's codings.
+# Character counts come from interval lengths, so the cost depends on the number of codings,
+# not on the length of the texts.
+
+
+def new_total():
+    """ Character counts for a code, added to for each file.
+    coded0 and coded1 are the total characters coded by coder 0 and coder 1.
+    return: Dictionary """
+
+    return {'dual_coded': 0, 'single_coded': 0, 'uncoded': 0, 'characters': 0, 'coded0': 0, 'coded1': 0}
+
+
+def merge_coded(codings, text_length):
+    """ Get the union of one coder's codings in a text, clipped to the text length.
+    param:
+        codings: list of [pos0, pos1]
+        text_length: Integer
+    return:
+        sorted list of non-overlapping [pos0, pos1]
+    """
+
+    clipped = [[max(pos0, 0), min(pos1, text_length)] for pos0, pos1 in codings if pos0 < text_length]
+    return merge_intervals([c for c in clipped if c[0] < c[1]])
+
+
+def add_file_agreement(total, merged0, merged1, text_length):
+    """ Add one file's dual coded, single coded and uncoded character counts to the total.
+    param:
+        total: Dictionary from new_total
+        merged0: coder 0 codings, from merge_coded
+        merged1: coder 1 codings, from merge_coded
+        text_length: Integer
+    return:
+        list of dual coded [pos0, pos1]
+    """
+
+    dual = intersect_merged(merged0, merged1)
+    coded0 = total_length(merged0)
+    coded1 = total_length(merged1)
+    dual_coded = total_length(dual)
+    either_coded = coded0 + coded1 - dual_coded
+    total['coded0'] += coded0
+    total['coded1'] += coded1
+    total['dual_coded'] += dual_coded
+    total['single_coded'] += either_coded - dual_coded
+    total['uncoded'] += text_length - either_coded
+    total['characters'] += text_length
+    return dual
+
+
+def text_agreement(conn, coders, file_lengths, cids=None):
+    """ Calculate two-coder agreement for text codes across files, using one query for all codings.
+    param:
+        conn: sqlite3 connection
+        coders: list of two coder names
+        file_lengths: Dictionary of file id: text length
+        cids: list of Integer code ids, or None for all coded codes
+    return:
+        results: Dictionary of cid: total, with statistics from agreement_statistics
+        errors: list of String messages for codings beyond the end of a text
+    """
+
+    errors = []
+    codings = {}
+    if cids is not None:
+        for cid in cids:
+            codings[cid] = {}
+    cur = conn.cursor()
+    cur.execute("select cid, fid, owner, pos0, pos1 from code_text where owner in (?,?)", coders[:2])
+    for cid, fid, owner, pos0, pos1 in cur.fetchall():
+        if fid not in file_lengths or (cids is not None and cid not in codings):
+            continue
+        if pos1 > file_lengths[fid]:
+            msg = "Coding beyond end of text. fid:" + str(fid) + " len_text:" + str(file_lengths[fid])
+            msg += " pos1:" + str(pos1) + " cid:" + str(cid) + " coder:" + owner
+            logger.error(msg)
+            errors.append(msg)
+        coder_codings = codings.setdefault(cid, {}).setdefault(fid, ([], []))
+        coder_codings[0 if owner == coders[0] else 1].append([pos0, pos1])
+    all_characters = sum(file_lengths.values())
+    results = {}
+    for cid, files in codings.items():
+        total = new_total()
+        for fid, (codings0, codings1) in files.items():
+            text_length = file_lengths[fid]
+            add_file_agreement(total, merge_coded(codings0, text_length), merge_coded(codings1, text_length),
+                               text_length)
+        # Files without codings for this code are uncoded
+        total['uncoded'] += all_characters - total['characters']
+        total['characters'] = all_characters
+        results[cid] = agreement_statistics(total)
+    return results, errors
+
+
+def agreement_statistics(total):
+    """ Add percentage agreement, disagreement and kappa to character counts.
+    param:
+        total: Dictionary from new_total, after add_file_agreement
+    return:
+        total
+    """
+
+    total['agree_coded_only'] = 0.0
+    if total['characters'] != 0:
+        total['agreement'] = round(100 * (total['dual_coded'] + total['uncoded']) / total['characters'], 2)
+        total['dual_percent'] = round(100 * total['dual_coded'] / total['characters'], 2)
+        total['uncoded_percent'] = round(100 * total['uncoded'] / total['characters'], 2)
+        total['disagreement'] = round(100 - total['agreement'], 2)
+        try:
+            total['agree_coded_only'] = round(100 * total['dual_coded'] / (total['dual_coded'] + total['single_coded']),
+                                              2)
+        except ZeroDivisionError:
+            total['agree_coded_only'] = "zero div"
+    else:
+        total['agreement'] = "zero div"
+        total['dual_percent'] = "zero div"
+        total['uncoded_percent'] = "zero div"
+        total['disagreement'] = "zero div"
+        total['agree_coded_only'] = "zero div"
+    # Cohen's Kappa
+    '''
+    https://en.wikipedia.org/wiki/Cohen%27s_kappa
+
+    k = Po - Pe     Po is proportionate agreement (both coders coded this text / all coded text))
+        -------     Pe is probability of random agreement
+        1  - Pe
+
+        Pe = Pyes + Pno
+        Pyes = proportion Yes by A multiplied by proportion Yes by B
+             = total['coded0']/total_coded * total['coded1]/total_coded
+
+        Pno = proportion No by A multiplied by proportion No by B
+            = (total_coded - total['coded0']) / total_coded * (total_coded - total['coded1]) / total_coded
+
+    IMMEDIATE BELOW IS INCORRECT - RESULTS IN THE TOTAL AGREEMENT SCORE
+    Po = total['agreement'] / 100
+    Pyes = total['coded0'] / total['characters'] * total['coded1'] / total['characters']
+    Pno = (total['characters'] - total['coded0']) / total['characters'] * (total['characters'] - total['coded1']) /
+        total['characters']
+
+    BELOW IS BETTER - ONLY LOOKS AT PROPORTIONS OF CODED CHARACTERS
+    NEED TO CONFIRM THIS IS THE CORRECT APPROACH
+    '''
+    total['kappa'] = "zerodiv"
+    unique_codings = 0
+    try:
+        unique_codings = total['coded0'] + total['coded1'] - total['dual_coded']
+        Po = total['dual_coded'] / unique_codings
+        Pyes = total['coded0'] / unique_codings * total['coded1'] / unique_codings
+        Pno = (unique_codings - total['coded0']) / unique_codings * (
+                unique_codings - total['coded1']) / unique_codings
+        Pe = Pyes * Pno
+        kappa = round((Po - Pe) / (1 - Pe), 4)
+        total['kappa'] = kappa
+    except ZeroDivisionError:
+        logger.debug("ZeroDivisionError. unique_codings:" + str(unique_codings))
+    return total
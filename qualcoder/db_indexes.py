@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+import logging
+import sqlite3
+import time
+
+from .text_search import create_search_index
+
+logger = logging.getLogger(__name__)
+
+# Increase INDEX_VERSION whenever INDEXES or CACHE_TABLES changes, so that existing projects are updated on open.
+# The index version is stored in the sqlite user_version pragma, separate from project.databaseversion,
+# so projects remain readable by older QualCoder versions.
+INDEX_VERSION = 3
+INDEX_PREFIX = "qc_idx_"
+
+# name, table, columns
+# Column orders follow the query shapes in code_text, code_pdf, view_image, view_av,
+# report_codes, view_charts, cases and manage_files.
+INDEXES = [
+    # Coding dialogs: where fid=? and owner=? order by pos0. Counts: where cid=? and fid=? and owner=?
+    ("code_text_fid_owner", "code_text", "fid, owner, pos0, pos1"),
+    ("code_text_cid", "code_text", "cid, fid, owner"),
+    ("code_image_id_owner", "code_image", "id, owner"),
+    ("code_image_cid", "code_image", "cid, id, owner"),
+    ("code_av_id_owner", "code_av", "id, owner, pos0"),
+    ("code_av_cid", "code_av", "cid, id, owner"),
+    ("annotation_fid_owner", "annotation", "fid, owner, pos0"),
+    # Cases: files linked to a case, and cases linked to a file
+    ("case_text_fid", "case_text", "fid, caseid"),
+    ("case_text_caseid", "case_text", "caseid, fid, pos0, pos1"),
+    # Attribute tables: where attr_type=? and name=? and id=?, covering value
+    ("attribute_type_name_id", "attribute", "attr_type, name, id, value"),
+    ("code_name_catid", "code_name", "catid"),
+]
+
+# name, create statement
+# Caches of derived data, see image_thumbnails and media_metadata. Not read by older QualCoder versions.
+CACHE_TABLES = [
+    ("image_thumbnail", "create table image_thumbnail (imid integer, size integer, mtime real, bytes integer, "
+                        "image blob, primary key (imid, size))"),
+    # Thumbnails of codings that are moved, resized or deleted
+    ("image_thumbnail_au", "create trigger image_thumbnail_au after update of id, x1, y1, width, height "
+                           "on code_image begin delete from image_thumbnail where imid=old.imid; end"),
+    ("image_thumbnail_ad", "create trigger image_thumbnail_ad after delete on code_image begin "
+                           "delete from image_thumbnail where imid=old.imid; end"),
+    ("media_metadata", "create table media_metadata (mediapath text primary key, mtime real, bytes integer, "
+                       "duration integer, width integer, height integer, error text)"),
+]
+
+
+def get_index_version(conn):
+    """ Get the index version stored in the project database.
+    param:
+        conn: sqlite3 connection
+    return:
+        integer version, 0 if indexes have never been created
+    """
+
+    cur = conn.cursor()
+    cur.execute("pragma user_version")
+    return cur.fetchone()[0]
+
+
+def index_sql(sql):
+    """ Index definition for comparison. sqlite stores the create statement, without 'if not exists'.
+    param:
+        sql: String create index statement, or None
+    return:
+        String lower case, without repeated spaces
+    """
+
+    if sql is None:
+        return ""
+    return " ".join(sql.lower().replace("if not exists ", "").split())
+
+
+def update_indexes(conn, force=False):
+    """ Create and maintain the curated set of secondary indexes.
+    Indexes that are missing are created, and QualCoder indexes no longer in INDEXES are dropped.
+    Indexes whose columns differ from INDEXES are dropped and created again. Missing CACHE_TABLES are created.
+    sqlite query planner statistics are refreshed when indexes change.
+    Full text search tables are also created or dropped, see text_search.
+    Called from MainWindow.open_project, for new and existing projects.
+    param:
+        conn: sqlite3 connection
+        force: boolean, check all indexes even if the index version is current
+    return:
+        changes: list of created and dropped index names
+        elapsed: float of seconds taken
+    """
+
+    start = time.time()
+    changes = []
+    if force or get_index_version(conn) != INDEX_VERSION:
+        changes = update_secondary_indexes(conn)
+    # Checked on every open, as the project may have been opened by a sqlite build without FTS5 trigram
+    changes += create_search_index(conn)
+    return changes, time.time() - start
+
+
+def update_secondary_indexes(conn):
+    """ Create, drop and recreate indexes to match INDEXES, create missing CACHE_TABLES. Set the index version.
+    Called by: update_indexes
+    param:
+        conn: sqlite3 connection
+    return:
+        list of created and dropped index and table names
+    """
+
+    changes = []
+    cur = conn.cursor()
+    cur.execute("select name, sql from sqlite_master where type='index' and name glob ?", [INDEX_PREFIX + "*"])
+    existing = {row[0]: index_sql(row[1]) for row in cur.fetchall()}
+    cur.execute("select name from sqlite_master where type in ('table', 'trigger')")
+    existing_tables = {row[0] for row in cur.fetchall()}
+    wanted = {INDEX_PREFIX + name: index_sql(f"create index {INDEX_PREFIX}{name} on {table} ({columns})")
+              for name, table, columns in INDEXES}
+    try:
+        for name in existing:
+            # Dropped if no longer used, or if the columns have changed, so it is created again below
+            if wanted.get(name) != existing[name]:
+                cur.execute(f"drop index if exists {name}")
+                changes.append(f"-{name}")
+        for name, table, columns in INDEXES:
+            if wanted[INDEX_PREFIX + name] == existing.get(INDEX_PREFIX + name):
+                continue
+            cur.execute(f"create index if not exists {INDEX_PREFIX}{name} on {table} ({columns})")
+            changes.append(f"+{INDEX_PREFIX}{name}")
+        for name, sql in CACHE_TABLES:
+            if name not in existing_tables:
+                cur.execute(sql)
+                changes.append(f"+{name}")
+        if changes:
+            cur.execute("analyze")
+        cur.execute(f"pragma user_version={INDEX_VERSION}")
+        conn.commit()
+    except sqlite3.Error as err:
+        conn.rollback()
+        logger.warning("Index update error: " + str(err))
+        changes = []
+    return changes
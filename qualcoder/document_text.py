@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+
+import logging
+from typing import Iterable, Any
+import zipfile
+
+import ebooklib
+from ebooklib import epub
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LAParams, LTTextLine
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
+
+from .docx import opendocx, getdocumenttext
+from .html_parser import html_to_text
+
+logger = logging.getLogger(__name__)
+
+# Conversion of imported documents to plain text: odt, docx, epub, pdf, html and plain text files.
+# These functions do not use Qt or the project database, so that Manage files can convert many documents
+# at the same time in a process pool. Errors are returned, for the GUI thread to display.
+# Used by: manage_files
+
+
+def extract_document_text(import_file):
+    """ Convert a document to plain text. Called in a process pool worker.
+    Loading pdf text. Additional line breaks are not added.
+    Not adding these allows the pdf to be coded in Code_text and Code_pdf without positional shifting problems.
+    param:
+        import_file: String filepath of the document
+    return:
+        Dictionary of path, text, error. error is an empty String if the text could be read
+    """
+
+    result = {'path': import_file, 'text': "", 'error': ""}
+    try:
+        result['text'] = document_text(import_file)
+    except Exception as err:
+        result['error'] = str(err)
+    return result
+
+
+def document_text(import_file):
+    """ Text of odt, docx, epub, pdf, html or htm. Any other file type is read as a plain text file.
+    param:
+        import_file: String filepath
+    return:
+        String text
+    """
+
+    text_ = ""
+    lower_name = import_file.lower()
+    if lower_name.endswith(".odt"):
+        text_ = convert_odt_to_text(import_file)
+        text_ = text_.replace("\n", "\n\n")  # add line to paragraph spacing for visual format
+    if lower_name.endswith(".docx"):
+        document = opendocx(import_file)
+        list_ = getdocumenttext(document)
+        text_ = "\n\n".join(list_)  # add line to paragraph spacing for visual format
+    if lower_name.endswith(".epub"):
+        book = epub.read_epub(import_file)
+        parts = []
+        for d in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
+            try:
+                bytes_ = d.get_body_content()
+                string = bytes_.decode('utf-8')
+                parts.append(html_to_text(string) + "\n\n")  # add line to paragraph spacing for visual format
+            except TypeError as err:
+                logger.debug("ebooklib get_body_content error " + str(err))
+        text_ = "".join(parts)
+    if lower_name.endswith(".pdf"):
+        text_ = pdf_text(import_file)
+    if lower_name.endswith(".html") or lower_name.endswith(".htm"):
+        with open(import_file, "r", encoding="utf-8", errors="surrogateescape") as sourcefile:
+            text_ = html_to_text(sourcefile.read())
+    # Try importing as a plain text file.
+    if text_ == "":
+        # can get UnicodeDecode Error on Windows so using error handler
+        with open(import_file, "r", encoding="utf-8", errors="backslashreplace") as sourcefile:
+            text_ = sourcefile.read()
+        if text_[0:6] == "\ufeff":  # associated with notepad files
+            text_ = text_[6:]
+    return text_
+
+
+def pdf_text(import_file):
+    """ Text of all pages, from the LTTextLine objects.
+    Use LTextLine as this object can be parsed in Code_pdf for font size and colour.
+    param:
+        import_file: String filepath
+    return:
+        String text
+    """
+
+    resource_manager = PDFResourceManager()
+    laparams = LAParams()
+    device = PDFPageAggregator(resource_manager, laparams=laparams)
+    interpreter = PDFPageInterpreter(resource_manager, device)
+    parts = []
+    with open(import_file, 'rb') as pdf_file:
+        for page in PDFPage.get_pages(pdf_file):  # Generator PDFpage objects
+            interpreter.process_page(page)
+            layout = device.get_result()
+            for lobj in layout:
+                text_lines(lobj, parts)
+    return "".join(parts)
+
+
+def text_lines(lobj: Any, parts):
+    """ Add text of LTTextLine objects, with descendants, to parts.
+    param:
+        lobj: pdfminer layout object
+        parts: list of String
+    """
+
+    if isinstance(lobj, LTTextLine):  # Do not use LTTextBox
+        obj_text = lobj.get_text()
+        # Fix Pdfminer recognising invalid unicode characters.
+        obj_text = obj_text.replace(u"\uE002", "Th")
+        obj_text = obj_text.replace(u"\uFB01", "fi")
+        parts.append(obj_text)
+    if isinstance(lobj, Iterable):
+        for obj in lobj:
+            text_lines(obj, parts)
+
+
+def convert_odt_to_text(import_file):
+    """ Convert odt to very rough equivalent with headings, list items and tables for
+    html display in qTextEdits. """
+
+    odt_file = zipfile.ZipFile(import_file)
+    data = str(odt_file.read('content.xml'))  # bytes class to string
+    # https://stackoverflow.com/questions/18488734/python3-unescaping-non-ascii-characters
+    data = str(bytes([ord(char) for char in data.encode("utf_8").decode("unicode_escape")]), "utf_8")
+    data_start = data.find("</text:sequence-decls>")
+    data_end = data.find("</office:text>")
+    if data_start == -1 or data_end == -1:
+        logger.warning("ODT IMPORT ERROR")
+        return ""
+    data = data[data_start + 22: data_end]
+    data = data.replace('</text:index-title-template>', '')
+    data = data.replace('</text:index-entry-span>', '')
+    data = data.replace('</text:table-of-content-entry-template>', '')
+    data = data.replace('</text:index-title>', '')
+    data = data.replace('</text:index-body>', '')
+    data = data.replace('</text:table-of-contents>', '')
+    data = data.replace('</text:table-of-content-source>', '')
+    data = data.replace('<text:h', '\n<text:h')
+    data = data.replace('</text:h>', '\n\n')
+    data = data.replace('</text:list-item>', '\n')
+    data = data.replace('</text:span>', '')
+    data = data.replace('</text:p>', '\n')
+    data = data.replace('</text:a>', ' ')
+    data = data.replace('</text:list>', '')
+    data = data.replace('</text:sequence>', '')
+    data = data.replace('<text:list-item>', '')
+    data = data.replace('<table:table table:name=', '\n=== TABLE ===\n<table:table table:name=')
+    data = data.replace('</table:table>', '=== END TABLE ===\n')
+    data = data.replace('</table:table-cell>', '\n')
+    data = data.replace('</table:table-row>', '')
+    data = data.replace('<draw:image', '\n=== IMG ===<draw:image')
+    data = data.replace('</draw:frame>', '\n')
+    text_ = ""
+    tagged = False
+    for i in range(0, len(data)):
+        if data[i: i + 6] == "<text:" or data[i: i + 7] == "<table:" or data[i: i + 6] == "<draw:":
+            tagged = True
+        if not tagged:
+            text_ += data[i]
+        if data[i] == ">":
+            tagged = False
+    text_ = text_.replace("&apos;", "'")
+    text_ = text_.replace("&quot;", '"')
+    text_ = text_.replace("&gt;", '>')
+    text_ = text_.replace("&lt;", '<')
+    text_ = text_.replace("&amp;", '&')
+    return text_
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+
+import logging
+
+from PyQt6 import QtCore, QtGui
+
+from .media_metadata import file_stat
+
+logger = logging.getLogger(__name__)
+
+# Thumbnails of coded image areas, shown in Report codes and Code in all files.
+# Cropping a coded area needs the whole source image to be decoded, so thumbnails are cached in the
+# image_thumbnail table of the project database, keyed by imid and the thumbnail size, and checked against the
+# source image modification time and byte size. Triggers on code_image delete the thumbnails of codings that are
+# moved, resized or deleted. The table and triggers are created by db_indexes.update_indexes.
+# Missing thumbnails are made by background workers, each decodes one source image for all of its codings.
+# Report exports use the full resolution coded areas, from coded_area_images.
+# Used by: report_codes, code_in_all_files
+
+REPORT_THUMBNAIL_SIZE = 400  # Pixels, maximum width and height in Report codes
+CODE_IN_ALL_FILES_THUMBNAIL_SIZE = 300  # Pixels, maximum width and height in Code in all files
+SELECT_BATCH_SIZE = 500  # imids per select, below the sqlite variable limit
+
+
+def image_path(app, mediapath):
+    """ Absolute path of an image in the project images folder, or of a linked image.
+    param:
+        app: App
+        mediapath: String source.mediapath, e.g. /images/photo.jpg or images:/linked/path/photo.jpg
+    return:
+        String
+    """
+
+    if mediapath[0:7] == "images:":
+        return mediapath[7:]
+    return app.project_path + mediapath
+
+
+def make_thumbnails(abs_path, codings, size):
+    """ Crop and scale coded areas of one image. Slow, so called from ImageThumbnailWorker.
+    param:
+        abs_path: String
+        codings: List of Dictionaries of imid, x1, y1, width, height
+        size: Integer maximum thumbnail width and height
+    return:
+        List of (imid, encoded image bytes). Empty if the image cannot be read
+    """
+
+    image = QtGui.QImageReader(abs_path).read()
+    if image.isNull():
+        logger.warning("Cannot open image: " + abs_path)
+        return []
+    thumbnails = []
+    for coding in codings:
+        thumbnail = image.copy(int(coding['x1']), int(coding['y1']), int(coding['width']), int(coding['height']))
+        if thumbnail.width() > size or thumbnail.height() > size:
+            thumbnail = thumbnail.scaled(size, size, QtCore.Qt.AspectRatioMode.KeepAspectRatio,
+                                         QtCore.Qt.TransformationMode.SmoothTransformation)
+        byte_array = QtCore.QByteArray()
+        buffer = QtCore.QBuffer(byte_array)
+        buffer.open(QtCore.QIODevice.OpenModeFlag.WriteOnly)
+        thumbnail.save(buffer, "PNG" if thumbnail.hasAlphaChannel() else "JPG", 90)
+        thumbnails.append((coding['imid'], byte_array.data()))
+    return thumbnails
+
+
+def coded_area_images(app, codings):
+    """ Full resolution coded areas, for report exports. Each source image is decoded once.
+    param:
+        app: App
+        codings: List of Dictionaries of imid, mediapath, x1, y1, width, height
+    return:
+        Dictionary of imid: QImage. Codings of images that cannot be read are not included
+    """
+
+    by_path = {}
+    for coding in codings:
+        by_path.setdefault(image_path(app, coding['mediapath']), []).append(coding)
+    images = {}
+    for abs_path, path_codings in by_path.items():
+        image = QtGui.QImageReader(abs_path).read()
+        if image.isNull():
+            logger.warning("Cannot open image: " + abs_path)
+            continue
+        for coding in path_codings:
+            images[coding['imid']] = image.copy(int(coding['x1']), int(coding['y1']), int(coding['width']),
+                                                int(coding['height']))
+    return images
+
+
+class ImageThumbnailCache:
+    """ Coded area thumbnails, cached in the image_thumbnail table of the project database.
+    Call prepare with all codings of a report, then thumbnail for each coding.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.images = {}  # (imid, size): QImage, of the codings from prepare
+        self.pending = set()  # (absolute path, size) of images being read by workers
+        self.waiting = 0  # Calls of load waiting for workers. Events are processed, so load may be re-entered
+
+    def prepare(self, codings, size):
+        """ Get the thumbnails for a report. Thumbnails from an earlier report are released, unless an earlier
+        report is still waiting for its thumbnails.
+        param:
+            codings: List of Dictionaries of imid, mediapath, x1, y1, width, height
+            size: Integer maximum thumbnail width and height
+        """
+
+        if self.waiting == 0:
+            self.images = {}
+        self.load(codings, size)
+
+    def load(self, codings, size):
+        """ Load cached thumbnails and make missing thumbnails, in background threads, one per source image.
+        Events are processed while waiting, so the GUI remains responsive.
+        Called by: prepare, thumbnail
+        param:
+            codings: List of Dictionaries of imid, mediapath, x1, y1, width, height
+            size: Integer maximum thumbnail width and height
+        """
+
+        stats = {}
+        by_imid = {}
+        for coding in codings:
+            abs_path = image_path(self.app, coding['mediapath'])
+            if abs_path not in stats:
+                stats[abs_path] = file_stat(abs_path)
+            by_imid[coding['imid']] = (coding, abs_path)
+        cur = self.app.conn.cursor()
+        imids = list(by_imid)
+        for start in range(0, len(imids), SELECT_BATCH_SIZE):
+            batch = imids[start:start + SELECT_BATCH_SIZE]
+            cur.execute("select imid, mtime, bytes, image from image_thumbnail where size=? and imid in (" +
+                        ",".join("?" * len(batch)) + ")", [size] + batch)
+            for imid, mtime, bytes_, data in cur.fetchall():
+                if stats[by_imid[imid][1]] != (mtime, bytes_):
+                    continue
+                image = QtGui.QImage()
+                if image.loadFromData(data):
+                    self.images[(imid, size)] = image
+        missing = {}
+        for imid, (coding, abs_path) in by_imid.items():
+            if (imid, size) not in self.images and stats[abs_path] is not None:
+                missing.setdefault(abs_path, []).append(coding)
+        pool = QtCore.QThreadPool.globalInstance()
+        for abs_path, path_codings in missing.items():
+            self.pending.add((abs_path, size))
+            worker = ImageThumbnailWorker(abs_path, path_codings, size)
+            worker.signals.finished.connect(self.store)
+            pool.start(worker)
+        self.waiting += 1
+        try:
+            while self.pending:
+                pool.waitForDone(50)
+                QtCore.QCoreApplication.processEvents()
+        finally:
+            self.waiting -= 1
+
+    def store(self, abs_path, size, thumbnails):
+        """ Keep and cache thumbnails made by a worker.
+        param:
+            abs_path: String absolute path of the source image
+            size: Integer maximum thumbnail width and height
+            thumbnails: List of (imid, encoded image bytes)
+        """
+
+        self.pending.discard((abs_path, size))
+        stat = file_stat(abs_path)
+        if stat is None:
+            return
+        for imid, data in thumbnails:
+            image = QtGui.QImage()
+            image.loadFromData(data)
+            self.images[(imid, size)] = image
+        cur = self.app.conn.cursor()
+        cur.executemany("insert or replace into image_thumbnail (imid, size, mtime, bytes, image) values (?,?,?,?,?)",
+                        [(imid, size, stat[0], stat[1], data) for imid, data in thumbnails])
+        self.app.conn.commit()
+
+    def thumbnail(self, coding, size):
+        """ Get the thumbnail of a coded area. Codings not in prepare are made now.
+        param:
+            coding: Dictionary of imid, mediapath, x1, y1, width, height
+            size: Integer maximum thumbnail width and height
+        return:
+            QImage, null if the image cannot be read
+        """
+
+        if (coding['imid'], size) not in self.images:
+            self.load([coding], size)
+        return self.images.get((coding['imid'], size), QtGui.QImage())
+
+
+class ImageThumbnailSignals(QtCore.QObject):
+    """ QRunnable is not a QObject, so signals are held here.
+    finished: absolute path, size, list of (imid, encoded image bytes) """
+
+    finished = QtCore.pyqtSignal(str, int, list)
+
+
+class ImageThumbnailWorker(QtCore.QRunnable):
+    """ Make thumbnails for the codings of one image in a QThreadPool thread. Does not use the database connection. """
+
+    def __init__(self, abs_path, codings, size):
+        super().__init__()
+        self.abs_path = abs_path
+        self.codings = codings
+        self.size = size
+        self.signals = ImageThumbnailSignals()
+
+    def run(self):
+        thumbnails = []
+        try:
+            thumbnails = make_thumbnails(self.abs_path, self.codings, self.size)
+        except Exception as err:
+            logger.warning("Cannot make thumbnails: " + self.abs_path + " " + str(err))
+        finally:
+            # Always emitted, as ImageThumbnailCache.load waits for every worker
+            self.signals.finished.emit(self.abs_path, self.size, thumbnails)
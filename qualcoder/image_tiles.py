@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+
+from PyQt6 import QtCore, QtGui
+
+logger = logging.getLogger(__name__)
+
+# Multi-resolution tiles of large images, for Code image. Shown at a reduced scale, a large scan needs only a few
+# reduced tiles, rather than rescaling the whole image on every zoom.
+# Level 0 is the full resolution image, each further level halves the width and height, until the image fits
+# in one tile. Tiles are built once per image by ImageTilesWorker and cached in the project folder
+# cache/image_tiles directory, keyed by the image mediapath, modification time and size. Tiles of earlier versions
+# of the image are removed when the new tiles are built.
+# Used by: view_image
+
+TILE_SIZE = 512  # Pixels, width and height of tiles
+TILED_IMAGE_PIXELS = 4096 * 4096  # Smaller images are shown as one pixmap
+PREVIEW_SIZE = 2048  # Longest side of the preview shown while tiles are built
+MAX_CACHED_TILES = 256  # Tile pixmaps kept in memory
+TILES_VERSION = 1  # Increase if the tile format changes, so old cached tiles are not used
+
+
+def image_size(abs_path):
+    """ Image width and height, read from the image header.
+    param:
+        abs_path: String
+    return:
+        QSize, invalid if the image cannot be read
+    """
+
+    return QtGui.QImageReader(abs_path).size()
+
+
+def allow_large_images(size):
+    """ Large scans are over the default Qt image allocation limit of 256Mb. The limit is shared by all threads,
+    so it is raised in the GUI thread, before an ImageTilesWorker is started. It is raised only as far as this image
+    needs, so the limit still protects against larger images, e.g. decompression bombs.
+    Called by: view_image.DialogCodeImage.load_file
+    param:
+        size: QSize of the image
+    """
+
+    limit = QtGui.QImageReader.allocationLimit()  # Megabytes, 0 is no limit
+    # Up to 8 bytes a pixel, for images with 16 bits a channel
+    needed = math.ceil(size.width() * size.height() * 8 / 2 ** 20)
+    if limit != 0 and needed > limit:
+        QtGui.QImageReader.setAllocationLimit(needed)
+
+
+class ImageTiles:
+    """ Tiles of one image, cached in the project folder cache/image_tiles/<key> directory.
+    The key is the mediapath hash and the modification time and size hash, so tiles of earlier versions of the
+    image can be found and removed.
+    Tile pixmaps are loaded when first shown and the most recently used are kept in memory.
+    """
+
+    def __init__(self, app, mediapath, abs_path):
+        """ param:
+            app: App
+            mediapath: String source.mediapath
+            abs_path: String absolute path of the image
+        """
+
+        self.abs_path = abs_path
+        stat = os.stat(abs_path)
+        self.mediapath_key = hashlib.sha1(mediapath.encode("utf-8")).hexdigest()
+        version = f"{stat.st_mtime}|{stat.st_size}"
+        self.key = self.mediapath_key + "_" + hashlib.sha1(version.encode("utf-8")).hexdigest()
+        self.tiles_folder = os.path.join(app.project_path, "cache", "image_tiles")
+        self.directory = os.path.join(self.tiles_folder, self.key)
+        self.index_path = os.path.join(self.directory, "tiles.json")
+        size = image_size(abs_path)
+        self.width = size.width()
+        self.height = size.height()
+        self.levels = 1
+        while max(self.width, self.height) / 2 ** (self.levels - 1) > TILE_SIZE:
+            self.levels += 1
+        self.suffix = None  # jpg, or png for images with transparency. Set when built
+        self.pixmaps = OrderedDict()
+        self.read_index()
+
+    def read_index(self):
+        """ Read the tile index, if the tiles have been built.
+        return:
+            True if the tiles are built
+        """
+
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if index.get('version') != TILES_VERSION or index.get('levels') != self.levels:
+            return False
+        self.suffix = index['suffix']
+        return True
+
+    def is_built(self):
+        return self.suffix is not None
+
+    def level_for_scale(self, scale):
+        """ The smallest level that still has at least one tile pixel per screen pixel.
+        param:
+            scale: Float, screen pixels per image pixel
+        return:
+            Integer level
+        """
+
+        level = 0
+        while level + 1 < self.levels and scale <= 1 / 2 ** (level + 1):
+            level += 1
+        return level
+
+    def tile_rect(self, level, col, row):
+        """ Area of the tile in full resolution image pixels. Right and bottom edge tiles are smaller.
+        param:
+            level, col, row: Integers
+        return:
+            QRectF
+        """
+
+        size = TILE_SIZE * 2 ** level
+        x = col * size
+        y = row * size
+        return QtCore.QRectF(x, y, min(size, self.width - x), min(size, self.height - y))
+
+    def tiles_in_rect(self, level, rect):
+        """ Tiles of this level that overlap an area of the image.
+        param:
+            level: Integer
+            rect: QRectF in full resolution image pixels
+        return:
+            List of (level, col, row)
+        """
+
+        size = TILE_SIZE * 2 ** level
+        col0 = max(0, int(rect.left() // size))
+        row0 = max(0, int(rect.top() // size))
+        col1 = min(math.ceil(self.width / size), int(rect.right() // size) + 1)
+        row1 = min(math.ceil(self.height / size), int(rect.bottom() // size) + 1)
+        return [(level, col, row) for row in range(row0, row1) for col in range(col0, col1)]
+
+    def tile_path(self, level, col, row):
+        return os.path.join(self.directory, str(level), f"{col}_{row}.{self.suffix}")
+
+    def tile_pixmap(self, level, col, row):
+        """ Tile pixmap, read from the cache folder if not in memory. Call in the GUI thread.
+        param:
+            level, col, row: Integers
+        return:
+            QPixmap, or None if the tile cannot be read
+        """
+
+        key = (level, col, row)
+        if key in self.pixmaps:
+            self.pixmaps.move_to_end(key)
+            return self.pixmaps[key]
+        pixmap = QtGui.QPixmap(self.tile_path(level, col, row))
+        if pixmap.isNull():
+            logger.warning("Cannot read image tile: " + self.tile_path(level, col, row))
+            return None
+        self.pixmaps[key] = pixmap
+        if len(self.pixmaps) > MAX_CACHED_TILES:
+            self.pixmaps.popitem(last=False)
+        return pixmap
+
+    def preview(self):
+        """ Reduced image, to show while the tiles are built. Image formats such as jpeg are decoded
+        at the reduced size, without reading the full resolution image.
+        return:
+            QImage, null if the image cannot be read
+        """
+
+        reader = QtGui.QImageReader(self.abs_path)
+        reduction = max(1, max(self.width, self.height) / PREVIEW_SIZE)
+        reader.setScaledSize(QtCore.QSize(max(1, int(self.width / reduction)), max(1, int(self.height / reduction))))
+        return reader.read()
+
+    def build(self):
+        """ Read the full resolution image and save the tiles of each level. Slow, so called by ImageTilesWorker.
+        The index is written last, so partly built tiles are not used.
+        Raises OSError if the image cannot be read or tiles cannot be saved.
+        Large images need allow_large_images to be called first.
+        """
+
+        reader = QtGui.QImageReader(self.abs_path)
+        image = reader.read()
+        if image.isNull():
+            raise OSError(reader.errorString())
+        self.remove_earlier_tiles()
+        suffix = "png" if image.hasAlphaChannel() else "jpg"
+        for level in range(self.levels):
+            os.makedirs(os.path.join(self.directory, str(level)), exist_ok=True)
+            for row in range(math.ceil(image.height() / TILE_SIZE)):
+                for col in range(math.ceil(image.width() / TILE_SIZE)):
+                    # Right and bottom edge tiles are smaller
+                    tile = image.copy(col * TILE_SIZE, row * TILE_SIZE,
+                                      min(TILE_SIZE, image.width() - col * TILE_SIZE),
+                                      min(TILE_SIZE, image.height() - row * TILE_SIZE))
+                    path = os.path.join(self.directory, str(level), f"{col}_{row}.{suffix}")
+                    if not tile.save(path, quality=90):
+                        raise OSError("Cannot save image tile: " + path)
+            if level + 1 < self.levels:
+                image = image.scaled(max(1, image.width() // 2), max(1, image.height() // 2),
+                                     QtCore.Qt.AspectRatioMode.IgnoreAspectRatio,
+                                     QtCore.Qt.TransformationMode.SmoothTransformation)
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': TILES_VERSION, 'width': self.width, 'height': self.height, 'levels': self.levels,
+                       'tile_size': TILE_SIZE, 'suffix': suffix}, f)
+        self.suffix = suffix
+
+    def remove_earlier_tiles(self):
+        """ Remove cached tiles of earlier versions of this image, which are no longer used.
+        Called by: build
+        """
+
+        try:
+            names = os.listdir(self.tiles_folder)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(self.mediapath_key + "_") and name != self.key:
+                shutil.rmtree(os.path.join(self.tiles_folder, name), ignore_errors=True)
+
+
+class ImageTilesSignals(QtCore.QObject):
+    """ QRunnable is not a QObject, so signals are held here.
+    finished: tiles key, error message, empty if the tiles were built """
+
+    finished = QtCore.pyqtSignal(str, str)
+
+
+class ImageTilesWorker(QtCore.QRunnable):
+    """ Build image tiles in a QThreadPool thread. Does not use the database connection. """
+
+    def __init__(self, tiles):
+        super().__init__()
+        self.tiles = tiles
+        self.signals = ImageTilesSignals()
+
+    def run(self):
+        error = ""
+        try:
+            self.tiles.build()
+        except OSError as err:
+            logger.warning(str(err))
+            error = str(err)
+        self.signals.finished.emit(self.tiles.key, error)
@@ -46,6 +46,8 @@ from .helpers import Message
 path = os.path.abspath(os.path.dirname(__file__))
 logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 1000  # Rows per executemany call, progress is shown after each batch
+
 
 class DialogImportSurvey(QtWidgets.QDialog):
     """ Import case and file attributes from a csv file. EXTEND LATER
@@ -70,6 +72,9 @@ class DialogImportSurvey(QtWidgets.QDialog):
     preexisting_fields = []  # atribute names already in database
     parent_textEdit = None
     success = False  # ability to load file and has individual ids in first column
+    import_thread = None
+    import_worker = None
+    importing = False  # A SurveyImportWorker is running
 
     def __init__(self, app, parent_text_edit):
         """ Need to comment out the connection accept signal line in ui_Dialog_Import.py.
@@ -322,104 +327,63 @@ class DialogImportSurvey(QtWidgets.QDialog):
             Message(self.app, _("Survey not loaded"), msg, "warning").exec()
             return
         self.insert_data()
-        super(DialogImportSurvey, self).accept()
 
     def insert_data(self):
-        """ Insert case, attributes, attribute values and qualitative text. """
+        """ Insert case, attributes, attribute values and qualitative text.
+        The import runs in a SurveyImportWorker thread, using one transaction.
+        The dialog is closed when the worker has finished. """
 
         now_date = str(datetime.datetime.now().astimezone().strftime("%Y-%m-%d %H:%M:%S"))
-        cur = self.app.conn.cursor()
-        name_and_caseids = []
-        for i, c in enumerate(self.data):
-            try:
-                self.ui.label_msg.setText(_("Inserting cases: " + str(i)))
-                cur.execute("insert into cases (name,memo,owner,date) values(?,?,?,?)",
-                            (c[0], "", self.app.settings['codername'], now_date))
-                self.app.conn.commit()
-                cur.execute("select last_insert_rowid()")
-                name_and_caseids.append([c[0], cur.fetchone()[0]])
-                QtWidgets.QApplication.processEvents()
-            except sqlite3.IntegrityError as e:
-                fail_msg = str(e) + _(
-                    " - Duplicate case names, either in the file, or duplicates with existing cases in the project")
-                logger.error(_("Survey not loaded: ") + fail_msg)
-                Message(self.app, _('Survey not loaded'), fail_msg, "warning").exec()
-                self.parent_textEdit.append(_("Survey not loaded: ") + fail_msg)
-                return
-        # Insert non-qualitative attribute types, except if they are already present
-        sql = "select name from attribute_type where caseOrFile='case'"
-        cur.execute(sql)
-        result = cur.fetchall()
-        existing_attr_names = [r[0] for r in result]
-        '''for r in result:
-            existing_attr_names.append(r[0])'''
-        sql = "insert into attribute_type (name,date,owner,memo, valueType, caseOrFile) values(?,?,?,?,?,?)"
-        for col, name in enumerate(self.fields):
-            if self.fields_type[col] != "qualitative" and col > 0:  # col==0 is the case identifier
-                if name not in existing_attr_names:
-                    logger.debug(name + " is not in case attribute_types. Adding.")
-                    cur.execute(sql, (name, now_date, self.app.settings['codername'], "",
-                                      self.fields_type[col], 'case'))
-        self.app.conn.commit()
-
-        # Look for pre-existing attributes that are not in the survey and insert blank value rows if present
-        survey_field_names = []
-        for col, fld_name in enumerate(self.fields):
-            if self.fields_type[col] != "qualitative" and col > 0:
-                survey_field_names.append(fld_name)
-        for name in existing_attr_names:
-            if name not in survey_field_names:
-                for name_id in name_and_caseids:
-                    sql = "insert into attribute (name, value, id, attr_type, date, owner) values (?,'',?,?,?,?)"
-                    cur.execute(sql, (name, name_id[1], 'case', now_date, self.app.settings['codername']))
-        self.app.conn.commit()
+        self.ui.buttonBox.setEnabled(False)
+        self.ui.tableWidget.setEnabled(False)
+        self.importing = True
+        # The application is the parent, as this dialog may be removed from its tab, and deleted, while importing
+        self.import_thread = QtCore.QThread(QtWidgets.QApplication.instance())
+        self.import_worker = SurveyImportWorker(os.path.join(self.app.project_path, 'data.qda'), self.data,
+                                                self.fields, self.fields_type, self.app.settings['codername'],
+                                                now_date)
+        self.import_worker.moveToThread(self.import_thread)
+        self.import_thread.started.connect(self.import_worker.run)
+        self.import_worker.progress.connect(self.ui.label_msg.setText)
+        self.import_worker.finished.connect(self.import_finished)
+        self.import_worker.finished.connect(self.import_thread.quit)
+        self.import_worker.finished.connect(self.import_worker.deleteLater)
+        self.import_thread.finished.connect(self.import_thread.deleteLater)
+        self.import_thread.start()
+
+    def import_finished(self, fail_msg):
+        """ Report the survey import result and close the dialog.
+        param:
+            fail_msg: String, empty if the survey was imported
+        """
 
-        # Insert non-qualitative values to each case using caseids
-        sql = "insert into attribute (name, value, id, attr_type, date, owner) values (?,?,?,?,?,?)"
-        for i, name_id in enumerate(name_and_caseids):
-            self.ui.label_msg.setText(_("Inserting attributes to cases: ") + str(i))
-            for val in self.data:
-                if name_id[0] == val[0]:
-                    for col in range(1, len(val)):
-                        if self.fields_type[col] != "qualitative":
-                            cur.execute(sql, (self.fields[col], val[col], name_id[1], 'case',
-                                              now_date, self.app.settings['codername']))
-            QtWidgets.QApplication.processEvents()
-        self.app.conn.commit()
-
-        # insert qualitative data into source table
-        self.ui.label_msg.setText(_("Creating qualitative text file"))
-        source_sql = "insert into source(name,fulltext,memo,owner,date, mediapath) values(?,?,?,?,?, Null)"
-        for field in range(1, len(self.fields)):  # column 0 is for identifiers
-            case_text_list = []
-            if self.fields_type[field] == "qualitative":
-                # Create one text file combining each row, prefix [case identifier] to each row.
-                fulltext = ""
-                for row in range(0, len(self.data)):
-                    if self.data[row][field] != "":
-                        fulltext += "[" + str(self.data[row][0]) + "] "
-                        pos0 = len(fulltext) - 1
-                        fulltext += str(self.data[row][field]) + "\n\n"
-                        pos1 = len(fulltext) - 2
-                        case_text = [self.app.settings['codername'], now_date, "", pos0, pos1, name_and_caseids[row][1]]
-                        case_text_list.append(case_text)
-                # add the current time to the file name to ensure uniqueness and to
-                # prevent sqlite Integrity Error. Do not use now_date which contains colons
-                now = str(datetime.datetime.now().astimezone().strftime("%Y-%m-%d %H-%M-%S"))
-                cur.execute(source_sql,
-                            (self.fields[field] + "_" + now, fulltext, "", self.app.settings['codername'], now_date))
-                self.app.conn.commit()
-                cur.execute("select last_insert_rowid()")
-                fid = cur.fetchone()[0]
-                case_text_sql = "insert into case_text (owner, date, memo, pos0, pos1, caseid, fid) values(?,?,?,?,?,?,?)"
-                for case_text in case_text_list:
-                    case_text.append(fid)
-                    cur.execute(case_text_sql, case_text)
-                self.app.conn.commit()
-        logger.info(_("Survey imported"))
-        self.parent_textEdit.append(_("Survey imported."))
-        Message(self.app, _("Survey imported"), _("Survey imported")).exec()
-        self.app.delete_backup = False
+        self.importing = False
+        if fail_msg != "":
+            logger.error(_("Survey not loaded: ") + fail_msg)
+            Message(self.app, _('Survey not loaded'), fail_msg, "warning").exec()
+            self.parent_textEdit.append(_("Survey not loaded: ") + fail_msg)
+        else:
+            logger.info(_("Survey imported"))
+            self.parent_textEdit.append(_("Survey imported."))
+            Message(self.app, _("Survey imported"), _("Survey imported")).exec()
+            self.app.delete_backup = False
+        super(DialogImportSurvey, self).accept()
+
+    def reject(self):
+        """ The import cannot be cancelled, so the dialog stays open while importing. """
+
+        if self.importing:
+            return
+        super(DialogImportSurvey, self).reject()
+
+    def closeEvent(self, event):
+        """ Wait for a running import to finish. The dialog is closed when it is removed from the manage tab,
+        and may then be deleted, with the import worker. """
+
+        while self.importing:
+            self.import_thread.wait(50)
+            QtCore.QCoreApplication.processEvents()
+        super(DialogImportSurvey, self).closeEvent(event)
 
     def options_changed(self):
         """ When import options are changed fill the table.
@@ -531,3 +495,137 @@ class DialogImportSurvey(QtWidgets.QDialog):
         item_txt = self.fields[self.headerIndex] + "\n" + self.fields_type[self.headerIndex]
         item = QtWidgets.QTableWidgetItem(item_txt)
         self.ui.tableWidget.setHorizontalHeaderItem(self.headerIndex, item)
+
+
+class SurveyImportWorker(QtCore.QObject):
+    """ Insert survey cases, attribute values and qualitative texts in a worker thread.
+    Uses its own database connection, as the project connection can only be used in the main thread.
+    All inserts are in one transaction, so a failed import does not leave a partial survey.
+    """
+
+    progress = QtCore.pyqtSignal(str)  # Message for the dialog label
+    finished = QtCore.pyqtSignal(str)  # Fail message, empty if the survey was imported
+
+    def __init__(self, db_path, data, fields, fields_type, codername, now_date):
+        """ param:
+            db_path: String path to the project data.qda
+            data: list of rows, column 0 is the case identifier
+            fields: list of String field names
+            fields_type: list of String 'character', 'numeric' or 'qualitative'
+            codername: String
+            now_date: String date time
+        """
+
+        super().__init__()
+        self.db_path = db_path
+        self.data = data
+        self.fields = fields
+        self.fields_type = fields_type
+        self.codername = codername
+        self.now_date = now_date
+
+    def run(self):
+        fail_msg = ""
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self.insert_data(conn)
+            conn.commit()
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            fail_msg = str(e) + _(
+                " - Duplicate case names, either in the file, or duplicates with existing cases in the project")
+        except Exception as e:
+            # Also malformed survey data, e.g. a ValueError or KeyError
+            if conn is not None:
+                conn.rollback()
+            logger.error(traceback.format_exc())
+            fail_msg = str(e)
+        finally:
+            if conn is not None:
+                conn.close()
+            # Always emitted, so the dialog is enabled and the thread quits
+            self.finished.emit(fail_msg)
+
+    def executemany_batches(self, cur, sql, rows, msg):
+        """ Insert rows in batches, emitting progress after each batch.
+        param:
+            cur: sqlite3 cursor
+            sql: String insert statement
+            rows: list of tuples
+            msg: String progress message prefix
+        """
+
+        for start in range(0, len(rows), BATCH_SIZE):
+            cur.executemany(sql, rows[start:start + BATCH_SIZE])
+            self.progress.emit(msg + str(min(start + BATCH_SIZE, len(rows))) + " / " + str(len(rows)))
+
+    def insert_data(self, conn):
+        """ Insert cases, attribute types, attribute values and qualitative text files.
+        Not committed here. Called by: run
+        param:
+            conn: sqlite3 connection
+        """
+
+        cur = conn.cursor()
+        case_rows = [(row[0], "", self.codername, self.now_date) for row in self.data]
+        self.executemany_batches(cur, "insert into cases (name,memo,owner,date) values(?,?,?,?)", case_rows,
+                                 _("Inserting cases: "))
+        case_names = set(row[0] for row in self.data)
+        cur.execute("select name, caseid from cases")
+        caseids = {name: caseid for name, caseid in cur.fetchall() if name in case_names}
+
+        # Insert non-qualitative attribute types, except if they are already present
+        cur.execute("select name from attribute_type where caseOrFile='case'")
+        existing_attr_names = [r[0] for r in cur.fetchall()]
+        attribute_columns = [col for col in range(1, len(self.fields)) if self.fields_type[col] != "qualitative"]
+        sql = "insert into attribute_type (name,date,owner,memo, valueType, caseOrFile) values(?,?,?,?,?,?)"
+        for col in attribute_columns:
+            if self.fields[col] not in existing_attr_names:
+                logger.debug(self.fields[col] + " is not in case attribute_types. Adding.")
+                cur.execute(sql, (self.fields[col], self.now_date, self.codername, "", self.fields_type[col], 'case'))
+
+        # Pre-existing attributes that are not in the survey get blank values
+        survey_field_names = [self.fields[col] for col in attribute_columns]
+        attribute_rows = []
+        for name in existing_attr_names:
+            if name not in survey_field_names:
+                for caseid in caseids.values():
+                    attribute_rows.append((name, '', caseid, 'case', self.now_date, self.codername))
+        # Non-qualitative values for each case
+        for row in self.data:
+            for col in attribute_columns:
+                attribute_rows.append((self.fields[col], row[col], caseids[row[0]], 'case', self.now_date,
+                                       self.codername))
+        sql = "insert into attribute (name, value, id, attr_type, date, owner) values (?,?,?,?,?,?)"
+        self.executemany_batches(cur, sql, attribute_rows, _("Inserting attributes to cases: "))
+
+        # Insert qualitative data into source table
+        self.progress.emit(_("Creating qualitative text file"))
+        source_sql = "insert into source(name,fulltext,memo,owner,date, mediapath) values(?,?,?,?,?, Null)"
+        case_text_sql = "insert into case_text (owner, date, memo, pos0, pos1, caseid, fid) values(?,?,?,?,?,?,?)"
+        for field in range(1, len(self.fields)):  # column 0 is for identifiers
+            if self.fields_type[field] != "qualitative":
+                continue
+            # Create one text file combining each row, prefix [case identifier] to each row.
+            text_parts = []
+            text_length = 0
+            case_text_list = []
+            for row in self.data:
+                if row[field] == "":
+                    continue
+                prefix = "[" + str(row[0]) + "] "
+                value = str(row[field]) + "\n\n"
+                pos0 = text_length + len(prefix) - 1
+                text_length += len(prefix) + len(value)
+                pos1 = text_length - 2
+                text_parts += [prefix, value]
+                case_text_list.append([self.codername, self.now_date, "", pos0, pos1, caseids[row[0]]])
+            # add the current time to the file name to ensure uniqueness and to
+            # prevent sqlite Integrity Error. Do not use now_date which contains colons
+            now = str(datetime.datetime.now().astimezone().strftime("%Y-%m-%d %H-%M-%S"))
+            cur.execute(source_sql, (self.fields[field] + "_" + now, "".join(text_parts), "", self.codername,
+                                     self.now_date))
+            fid = cur.lastrowid
+            self.executemany_batches(cur, case_text_sql, [case_text + [fid] for case_text in case_text_list],
+                                     _("Linking text to cases: "))
@@ -31,6 +31,7 @@ from PyQt6.QtCore import Qt
 
 import csv
 import datetime
+import json
 import logging
 from openpyxl import load_workbook
 import os
@@ -46,6 +47,8 @@ from .helpers import Message
 path = os.path.abspath(os.path.dirname(__file__))
 logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 500  # Rows per transaction. A checkpoint is recorded after each batch
+
 
 class DialogImportTwitterData(QtWidgets.QDialog):
     """ Import twitter from csv file. csv file created with rtweet.  csv.QUOTE_ALL
@@ -223,14 +226,16 @@ class DialogImportTwitterData(QtWidgets.QDialog):
         """ Fill tweets data. Each tweet is a text file in source.
          The tweet id is the file name.
          The screen_name is the unique user name - used for cases.
+         Rows are committed in batches. After each batch a checkpoint is recorded, so a cancelled or
+         interrupted import of the same file resumes from the checkpoint.
          see: https://developer.twitter.com/en/docs/twitter-api/v1/data-dictionary/object-model/user
          """
 
-        prog_dialog = QtWidgets.QProgressDialog(_("Importing twitter data"), "", 1, len(self.data), None)
+        prog_dialog = QtWidgets.QProgressDialog(_("Importing twitter data"), _("Cancel"), 0, len(self.data), None)
         prog_dialog.setWindowTitle(_("Importing twitter data"))
         prog_dialog.setWindowFlags(self.windowFlags() & ~QtCore.Qt.WindowType.WindowCloseButtonHint)
         prog_dialog.setAutoClose(True)
-        prog_dialog.setValue(1)
+        prog_dialog.setValue(0)
         prog_dialog.show()
         QtCore.QCoreApplication.processEvents()
         now_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -263,70 +268,117 @@ class DialogImportTwitterData(QtWidgets.QDialog):
         cur = self.app.conn.cursor()
         cur.execute("select name from attribute_type where caseOrFile='file' and name not in ('created_at', "
                     "'coordinates', 'retweet_count', 'favorite_count', 'lang')")
-        existing_file_attributes = cur.fetchall()
+        existing_file_attributes = [row[0] for row in cur.fetchall()]
         cur.execute("select name from attribute_type where caseOrFile='case' and name not in ('user_name', 'location', "
                     "'url', 'description', 'followers_count', 'friends_count', 'listed_count', 'favourites_count', "
                     "'statuses_count')")
-        existing_case_attributes = cur.fetchall()
+        existing_case_attributes = [row[0] for row in cur.fetchall()]
+        # Tweets already in the project are skipped, e.g. if the same file is imported twice
+        cur.execute("select name from source")
+        existing_source_names = set(row[0] for row in cur.fetchall())
+        # Screen names to case ids, for existing and new cases
+        cur.execute("select name, caseid from cases")
+        case_ids = {name: caseid for name, caseid in cur.fetchall()}
+        codername = self.app.settings['codername']
         tweets = 0
         cases = 0
-        for i, d in enumerate(self.data):
-            try:
-                cur.execute("insert into source(name,fulltext,mediapath,memo,owner,date) values(?,?,?,?,?,?)",
-                            (str(d[header_pos['id']]), d[header_pos['full_text']], None, '',
-                             self.app.settings['codername'], now_date))
-                self.app.conn.commit()
-                cur.execute("select last_insert_rowid()")
-                id_ = cur.fetchone()[0]
+        start_row = self.read_checkpoint()
+        if start_row > 0:
+            self.parent_textEdit.append(_("Resuming twitter import from row: ") + str(start_row))
+        attribute_sql = "insert into attribute (name, attr_type, value, id, date, owner) values(?,?,?,?,?,?)"
+        case_text_sql = "insert into case_text (caseid, fid, pos0, pos1, owner, date, memo) values (?,?,0,?,?,?,'')"
+        for batch_start in range(start_row, len(self.data), BATCH_SIZE):
+            attribute_rows = []
+            case_text_rows = []
+            for d in self.data[batch_start:batch_start + BATCH_SIZE]:
+                tweet_id = str(d[header_pos['id']])
+                if tweet_id in existing_source_names:
+                    continue
+                try:
+                    cur.execute("insert into source(name,fulltext,mediapath,memo,owner,date) values(?,?,?,?,?,?)",
+                                (tweet_id, d[header_pos['full_text']], None, '', codername, now_date))
+                except sqlite3.IntegrityError:
+                    continue
+                existing_source_names.add(tweet_id)
+                id_ = cur.lastrowid
                 tweets += 1
-                # Insert tweet data attributes
+                # Tweet data attributes and placeholder entries for pre-existing attributes
                 for att_name in attribute_name_list:
-                    cur.execute("insert into attribute (name, attr_type, value, id, date, owner) values(?,'file',?,?,?,?)",
-                                [att_name, d[header_pos[att_name]], id_, now_date, self.app.settings['codername']])
-                    self.app.conn.commit()
-                # Create placeholder entries for pre-existing attributes
+                    attribute_rows.append((att_name, 'file', d[header_pos[att_name]], id_, now_date, codername))
                 for placeholder_attribute in existing_file_attributes:
-                    cur.execute("insert into attribute (name, attr_type, value, id, date, owner) values(?,'file','',?,?,?)",
-                                [placeholder_attribute[0], id_, now_date, self.app.settings['codername']])
-                    self.app.conn.commit()
-
+                    attribute_rows.append((placeholder_attribute, 'file', '', id_, now_date, codername))
                 # Insert cases with unique case name
-                try:
+                screen_name = d[user_header_pos['screen_name']]
+                if screen_name not in case_ids:
                     cur.execute("insert into cases (name, memo , owner,date) values (?,'',?,?)",
-                                [d[user_header_pos['screen_name']], now_date, self.app.settings['codername']])
-                    self.app.conn.commit()
-                    cur.execute("select last_insert_rowid()")
-                    case_id = cur.fetchone()[0]
+                                [screen_name, codername, now_date])
+                    case_ids[screen_name] = cur.lastrowid
                     cases += 1
-                    #  Insert tweet user attributes
                     for att_name in user_attribute_name_list:
-                        cur.execute(
-                            "insert into attribute (name, attr_type, value, id, date, owner) values(?,'case',?,?,?,?)",
-                            [att_name, d[user_header_pos[att_name]], case_id, now_date, self.app.settings['codername']])
-                        self.app.conn.commit()
-                    # Create placeholder entries for pre-existing attributes
+                        attribute_rows.append((att_name, 'case', d[user_header_pos[att_name]], case_ids[screen_name],
+                                               now_date, codername))
                     for placeholder_attribute in existing_case_attributes:
-                        cur.execute(
-                            "insert into attribute (name, attr_type, value, id, date, owner) values(?,'case','',?,?,?)",
-                            [placeholder_attribute[0], case_id, now_date, self.app.settings['codername']])
-                        self.app.conn.commit()
-                except sqlite3.IntegrityError:
-                    pass  # Unique case names constraint
-
-                # Link file to case now that both have been entered into database
-                cur.execute("select caseid from cases where name = ?", [d[user_header_pos['screen_name']]])
-                res = cur.fetchone()
-                if res:
-                    sql = "insert into case_text (caseid, fid, pos0, pos1, owner, date, memo) values (?,?,0,?,?,?,'')"
-                    cur.execute(sql, [res[0], id_, len(d[header_pos['full_text']]), self.app.settings['codername'], now_date])
-                    self.app.conn.commit()
-                QtCore.QCoreApplication.processEvents()
-                prog_dialog.setValue(i)
-            except sqlite3.IntegrityError:
-                # Integrity error if the same file/data is being imported twice
-                pass
+                        attribute_rows.append((placeholder_attribute, 'case', '', case_ids[screen_name], now_date,
+                                               codername))
+                # Link file to case
+                case_text_rows.append((case_ids[screen_name], id_, len(d[header_pos['full_text']]), codername,
+                                       now_date))
+            cur.executemany(attribute_sql, attribute_rows)
+            cur.executemany(case_text_sql, case_text_rows)
+            self.app.conn.commit()
+            rows_done = min(batch_start + BATCH_SIZE, len(self.data))
+            self.write_checkpoint(rows_done)
+            prog_dialog.setValue(rows_done)
+            QtCore.QCoreApplication.processEvents()
+            if prog_dialog.wasCanceled() and rows_done < len(self.data):
+                msg = _("Twitter import cancelled at row: ") + str(rows_done) + ". "
+                msg += _("Select the same file again to resume the import.")
+                self.parent_textEdit.append(msg)
+                return tweets, cases
+        self.remove_checkpoint()
         return tweets, cases
 
+    def checkpoint_path(self):
+        """ The checkpoint file records how many rows of this csv file have been imported.
+        return: String path in the project folder """
+
+        return os.path.join(self.app.project_path, "twitter_import_checkpoint.json")
+
+    def read_checkpoint(self):
+        """ Get the number of rows already imported from this csv file, by an interrupted import.
+        The checkpoint is only used if the file name and size match.
+        return: Integer row number to start from """
+
+        try:
+            with open(self.checkpoint_path(), 'r', encoding='utf-8') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return 0
+        if checkpoint.get('filename') != os.path.basename(self.filepath) or \
+                checkpoint.get('bytes') != os.path.getsize(self.filepath):
+            return 0
+        return min(checkpoint.get('rows', 0), len(self.data))
+
+    def write_checkpoint(self, rows):
+        """ Record the number of committed rows.
+        param: rows : Integer """
+
+        checkpoint = {'filename': os.path.basename(self.filepath), 'bytes': os.path.getsize(self.filepath),
+                      'rows': rows}
+        try:
+            with open(self.checkpoint_path(), 'w', encoding='utf-8') as checkpoint_file:
+                json.dump(checkpoint, checkpoint_file)
+        except OSError as err:
+            logger.warning(str(err))
+
+    def remove_checkpoint(self):
+        """ Remove the checkpoint when the import is complete. """
+
+        try:
+            os.remove(self.checkpoint_path())
+        except FileNotFoundError:
+            pass
+
 
 information = '#  This is an experimental function.\n\
 If you have an existing CSV fully quoted file of tweet data that contains at a minimum these exact headings:\n\
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+from heapq import heappop, heappush
+
+# Coded text, annotations and case text are intervals of pos0 to pos1 character positions.
+# A/V segments are intervals of pos0 to pos1 milliseconds.
+
+
+def overlap_regions(intervals):
+    """ Get the regions covered by two or more intervals, using a sorted endpoint sweep. O(n log n).
+    Intervals that only touch end to start do not overlap. Zero length intervals are ignored.
+    param:
+        intervals: iterable of [pos0, pos1]
+    return:
+        sorted list of non-overlapping [pos0, pos1] regions
+    """
+
+    events = []
+    for pos0, pos1 in intervals:
+        if pos1 < pos0:
+            pos0, pos1 = pos1, pos0
+        if pos0 == pos1:
+            continue
+        events.append((pos0, 1))
+        events.append((pos1, -1))
+    # At the same position, ends sort before starts, so touching intervals do not overlap
+    events.sort()
+    regions = []
+    depth = 0
+    region_start = None
+    for pos, change in events:
+        depth += change
+        if depth >= 2 and region_start is None:
+            region_start = pos
+        elif depth < 2 and region_start is not None:
+            if pos > region_start:
+                if regions and regions[-1][1] == region_start:
+                    regions[-1][1] = pos
+                else:
+                    regions.append([region_start, pos])
+            region_start = None
+    return regions
+
+
+def regions_in_range(regions, pos0, pos1):
+    """ Get the regions that intersect pos0 to pos1, clipped to that range. O(log n + k).
+    param:
+        regions: sorted list of non-overlapping [pos0, pos1], from overlap_regions
+        pos0: Integer
+        pos1: Integer
+    return:
+        list of [pos0, pos1]
+    """
+
+    # Binary search for the first region ending after pos0. Regions do not overlap, so ends are sorted
+    i = 0
+    hi = len(regions)
+    while i < hi:
+        mid = (i + hi) // 2
+        if regions[mid][1] <= pos0:
+            i = mid + 1
+        else:
+            hi = mid
+    clipped = []
+    while i < len(regions) and regions[i][0] < pos1:
+        start = max(regions[i][0], pos0)
+        end = min(regions[i][1], pos1)
+        if start < end:
+            clipped.append([start, end])
+        i += 1
+    return clipped
+
+
+class IntervalIndex:
+    """ Stabbing query index over dictionaries containing interval start and end positions.
+    Items are sorted by start position and stored as an implicit balanced binary tree,
+    with each node holding the maximum end position of its subtree.
+    Finding the items containing a position is O(log n + k).
+    Used for tooltips and overlapping codes in the coding dialogs.
+    """
+
+    def __init__(self, items=None, start_key='pos0', end_key='pos1'):
+        """ param:
+            items: list of dictionaries
+            start_key: String dictionary key for the interval start
+            end_key: String dictionary key for the interval end """
+
+        if items is None:
+            items = []
+        self.source = items
+        self.source_length = len(items)
+        # Remember original order, so results are returned in the order of the source list
+        order = sorted(range(len(items)), key=lambda i_: items[i_][start_key])
+        self.items = [items[i] for i in order]
+        self.order = order
+        self.starts = [item[start_key] for item in self.items]
+        self.ends = [item[end_key] for item in self.items]
+        self.max_ends = list(self.ends)
+        self._build(0, len(self.items))
+
+    def _build(self, lo, hi):
+        """ Calculate the maximum end of the subtree with root (lo + hi) // 2.
+        return: maximum end Integer or None for an empty subtree """
+
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        max_end = self.ends[mid]
+        for child_max in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child_max is not None and child_max > max_end:
+                max_end = child_max
+        self.max_ends[mid] = max_end
+        return max_end
+
+    def __len__(self):
+        return len(self.items)
+
+    def indexes(self, items):
+        """ Check this index is current for the items list.
+        param:
+            items: list of dictionaries
+        return: Boolean """
+
+        return items is self.source and len(items) == self.source_length
+
+    def at(self, pos):
+        """ Get items where start <= pos <= end.
+        param:
+            pos: Integer position
+        return:
+            list of dictionaries, in source list order
+        """
+
+        found = []
+        stack = [(0, len(self.items))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_ends[mid] < pos:
+                continue
+            stack.append((lo, mid))
+            # Items to the right start at or after this item
+            if self.starts[mid] > pos:
+                continue
+            if self.ends[mid] >= pos:
+                found.append(mid)
+            stack.append((mid + 1, hi))
+        found.sort(key=lambda i_: self.order[i_])
+        return [self.items[i] for i in found]
+
+
+def layered_runs(intervals):
+    """ Flatten ordered intervals into non-overlapping runs. Later intervals are layered over earlier ones,
+    giving the same result as applying QTextCursor.setCharFormat for each interval in order.
+    param:
+        intervals: list of [pos0, pos1] in layering order
+    return:
+        sorted list of [pos0, pos1, index], where index is the topmost interval over that run
+    """
+
+    events = []
+    for i, (pos0, pos1) in enumerate(intervals):
+        if pos1 < pos0:
+            pos0, pos1 = pos1, pos0
+        if pos0 == pos1:
+            continue
+        events.append((pos0, i))
+        events.append((pos1, i))
+    events.sort(key=lambda e: e[0])
+    active = []  # heap of negated indexes, so the topmost interval is first
+    started = set()
+    ended = set()
+    runs = []
+    previous = None
+    for pos, i in events:
+        if previous is not None and pos > previous:
+            while active and -active[0] in ended:
+                heappop(active)
+            if active:
+                top = -active[0]
+                if runs and runs[-1][2] == top and runs[-1][1] == previous:
+                    runs[-1][1] = pos
+                else:
+                    runs.append([previous, pos, top])
+        if i in started:
+            ended.add(i)
+        else:
+            started.add(i)
+            heappush(active, -i)
+        previous = pos
+    return runs
+
+
+def merge_intervals(intervals):
+    """ Get the union of intervals. Touching intervals are joined. Zero length intervals are ignored.
+    param:
+        intervals: iterable of [pos0, pos1]
+    return:
+        sorted list of non-overlapping [pos0, pos1]
+    """
+
+    merged = []
+    for pos0, pos1 in sorted((min(i[0], i[1]), max(i[0], i[1])) for i in intervals):
+        if pos0 == pos1:
+            continue
+        if merged and pos0 <= merged[-1][1]:
+            if pos1 > merged[-1][1]:
+                merged[-1][1] = pos1
+        else:
+            merged.append([pos0, pos1])
+    return merged
+
+
+def intersect_merged(merged0, merged1):
+    """ Get the intersection of two interval unions, by walking both lists together. O(n + m).
+    param:
+        merged0: sorted list of non-overlapping [pos0, pos1], from merge_intervals
+        merged1: sorted list of non-overlapping [pos0, pos1], from merge_intervals
+    return:
+        sorted list of non-overlapping [pos0, pos1]
+    """
+
+    intersection = []
+    i = j = 0
+    while i < len(merged0) and j < len(merged1):
+        start = max(merged0[i][0], merged1[j][0])
+        end = min(merged0[i][1], merged1[j][1])
+        if start < end:
+            intersection.append([start, end])
+        if merged0[i][1] < merged1[j][1]:
+            i += 1
+        else:
+            j += 1
+    return intersection
+
+
+def total_length(intervals):
+    """ param: intervals: list of non-overlapping [pos0, pos1]
+    return: Integer sum of interval lengths """
+
+    return sum(pos1 - pos0 for pos0, pos1 in intervals)
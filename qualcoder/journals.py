@@ -38,11 +38,14 @@ import webbrowser
 
 from .add_item_name import DialogAddItemName
 from .add_attribute import DialogAddAttribute
+from .attribute_pivot import attribute_values
 from .confirm_delete import DialogConfirmDelete
 from .GUI.base64_helper import *
 from .GUI.ui_dialog_journals import Ui_Dialog_journals
 from .helpers import Message, ExportDirectoryPathDialog, MarkdownHighlighter
 from .memo import DialogMemo
+from .table_paging import TablePager
+from .text_search import search_candidate_ids
 
 path = os.path.abspath(os.path.dirname(__file__))
 logger = logging.getLogger(__name__)
@@ -107,6 +110,7 @@ class DialogJournals(QtWidgets.QDialog):
         self.search_indices = []
         self.search_index = 0
         self.attribute_labels_ordered = []
+        self.table_pager = TablePager(self.ui.tableWidget, self.fill_row)
         self.load_journals()
         self.ui.tableWidget.itemChanged.connect(self.cell_modified)
         self.ui.tableWidget.itemSelectionChanged.connect(self.table_selection_changed)
@@ -229,13 +233,9 @@ class DialogJournals(QtWidgets.QDialog):
             self.header_value_type.append(att_name[1])
             self.attribute_labels_ordered.append(att_name[0])
         # Add list of attribute values to files, order matches header columns
-        sql = "select ifnull(value, '') from attribute where attr_type='journal' and attribute.name=? and id=?"
+        journal_attributes = attribute_values(self.app.conn, "journal", self.attribute_labels_ordered)
         for j in self.journals:
-            for att_name in self.attribute_labels_ordered:
-                cur.execute(sql, [att_name, j['jid']])
-                res = cur.fetchone()
-                if res:
-                    j['attributes'].append(res[0])
+            j['attributes'] = journal_attributes.get(j['jid'], [''] * len(self.attribute_labels_ordered))
         self.fill_table()
         # To prevent text entry errors, after re-ordering, clear journal area
         self.ui.label_jname.setText(_("Journal: "))
@@ -358,25 +358,7 @@ class DialogJournals(QtWidgets.QDialog):
         self.ui.tableWidget.setHorizontalHeaderLabels(self.header_labels)
         self.ui.tableWidget.horizontalHeader().setStretchLastSection(False)
 
-        rows = self.ui.tableWidget.rowCount()
-        for r in range(0, rows):
-            self.ui.tableWidget.removeRow(0)
-        for row, data in enumerate(self.journals):
-            self.ui.tableWidget.insertRow(row)
-            self.ui.tableWidget.setItem(row, NAME_COLUMN, QtWidgets.QTableWidgetItem(data['name']))
-            item = QtWidgets.QTableWidgetItem(data['date'])
-            item.setFlags(item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
-            self.ui.tableWidget.setItem(row, DATE_COLUMN, item)
-            item = QtWidgets.QTableWidgetItem(data['owner'])
-            item.setFlags(item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
-            self.ui.tableWidget.setItem(row, OWNER_COLUMN, item)
-            item = QtWidgets.QTableWidgetItem(str(data['jid']))
-            item.setFlags(item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
-            self.ui.tableWidget.setItem(row, JID_COLUMN, item)
-            # Add attributes
-            for offset, attribute in enumerate(data['attributes']):
-                item = QtWidgets.QTableWidgetItem(attribute)
-                self.ui.tableWidget.setItem(row, ATTRIBUTE_START_COLUMN + offset, item)
+        self.table_pager.reset(self.journals)
 
         self.ui.tableWidget.verticalHeader().setVisible(False)
         if self.app.settings['showids']:
@@ -391,6 +373,28 @@ class DialogJournals(QtWidgets.QDialog):
         self.ui.textEdit.setText("")
         self.ui.label_jcount.setText(_("Journals: ") + str(len(self.journals)))
 
+    def fill_row(self, row, data):
+        """ Set the table items for one journal. Called by: table_pager, as the table is scrolled.
+        param:
+            row: Integer table row
+            data: Dictionary of journal details, from self.journals
+        """
+
+        self.ui.tableWidget.setItem(row, NAME_COLUMN, QtWidgets.QTableWidgetItem(data['name']))
+        item = QtWidgets.QTableWidgetItem(data['date'])
+        item.setFlags(item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
+        self.ui.tableWidget.setItem(row, DATE_COLUMN, item)
+        item = QtWidgets.QTableWidgetItem(data['owner'])
+        item.setFlags(item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
+        self.ui.tableWidget.setItem(row, OWNER_COLUMN, item)
+        item = QtWidgets.QTableWidgetItem(str(data['jid']))
+        item.setFlags(item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
+        self.ui.tableWidget.setItem(row, JID_COLUMN, item)
+        # Add attributes
+        for offset, attribute in enumerate(data['attributes']):
+            item = QtWidgets.QTableWidgetItem(attribute)
+            self.ui.tableWidget.setItem(row, ATTRIBUTE_START_COLUMN + offset, item)
+
     def table_header_menu(self, position):
 
         if not self.journals:
@@ -520,6 +524,7 @@ class DialogJournals(QtWidgets.QDialog):
                                                             QtWidgets.QLineEdit.EchoMode.Normal, item_text)
             if ok and text_value != '':
                 if ok and text_value != '':
+                    self.table_pager.fetch_all()
                     for r in range(0, self.ui.tableWidget.rowCount()):
                         if self.ui.tableWidget.item(r, NAME_COLUMN).text().find(text_value) == -1:
                             self.ui.tableWidget.setRowHidden(r, True)
@@ -535,6 +540,7 @@ class DialogJournals(QtWidgets.QDialog):
                                                             QtWidgets.QLineEdit.EchoMode.Normal, item_text)
             if ok and text_value != '':
                 if ok and text_value != '':
+                    self.table_pager.fetch_all()
                     for r in range(0, self.ui.tableWidget.rowCount()):
                         if self.ui.tableWidget.item(r, col).text().find(text_value) == -1:
                             self.ui.tableWidget.setRowHidden(r, True)
@@ -557,6 +563,7 @@ class DialogJournals(QtWidgets.QDialog):
             return
         if action == action_show_this_coder:
             coder_selected = self.ui.tableWidget.item(row, OWNER_COLUMN).text()
+            self.table_pager.fetch_all()
             for r in range(0, self.ui.tableWidget.rowCount()):
                 coder_name = self.ui.tableWidget.item(r, OWNER_COLUMN).text()
                 if coder_selected != coder_name:
@@ -678,6 +685,7 @@ class DialogJournals(QtWidgets.QDialog):
         newest = len(self.journals) - 1
         if newest < 0:
             return
+        self.table_pager.fetch_row(newest)
         self.ui.tableWidget.setCurrentCell(newest, 0)
         self.jid = jid
         self.ui.textEdit.setFocus()
@@ -840,8 +848,14 @@ class DialogJournals(QtWidgets.QDialog):
             return
         self.search_indices = []
         if self.ui.checkBox_search_all_journals.isChecked():
-            """ Search for this text across all journals. """
-            for jdata in self.app.get_journal_texts():
+            """ Search for this text across all journals.
+            The full text search index narrows the journals to those that can contain a match. """
+            candidate_ids = search_candidate_ids(self.app.conn, "journal", search_term)
+            if candidate_ids is None:
+                journals_data = self.app.get_journal_texts()
+            else:
+                journals_data = self.app.get_journal_texts(list(candidate_ids))
+            for jdata in journals_data:
                 try:
                     text_ = jdata['jentry']
                     for match in pattern.finditer(text_):
@@ -852,9 +866,11 @@ class DialogJournals(QtWidgets.QDialog):
         else:  # Current journal only
             row = self.ui.tableWidget.currentRow()
             try:
+                j_name = None
                 for match in pattern.finditer(self.journals[row]['jentry']):
                     # Get result as first dictionary item
-                    j_name = self.app.get_journal_texts([self.jid, ])[0]
+                    if j_name is None:
+                        j_name = self.app.get_journal_texts([self.jid, ])[0]
                     self.search_indices.append((j_name, match.start(), len(match.group(0))))
             except Exception as e:
                 print(e)
@@ -878,6 +894,7 @@ class DialogJournals(QtWidgets.QDialog):
         # {name, jid, jentry, owner, date} and char position and search string length
         if self.jid is None or self.jid != prev_result[0]['jid']:
             self.jid = prev_result[0]['jid']
+            self.table_pager.fetch_all()
             for row in range(0, self.ui.tableWidget.rowCount()):
                 if int(self.ui.tableWidget.item(row, JID_COLUMN).text()) == self.jid:
                     self.ui.tableWidget.setCurrentCell(row, NAME_COLUMN)
@@ -902,6 +919,7 @@ class DialogJournals(QtWidgets.QDialog):
         # {name, jid, jentry, owner, date} and char position and search string length
         if self.jid is None or self.jid != next_result[0]['jid']:
             self.jid = next_result[0]['jid']
+            self.table_pager.fetch_all()
             for row in range(0, self.ui.tableWidget.rowCount()):
                 if int(self.ui.tableWidget.item(row, JID_COLUMN).text()) == self.jid:
                     self.ui.tableWidget.setCurrentCell(row, NAME_COLUMN)
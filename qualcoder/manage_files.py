@@ -26,40 +26,35 @@ https://github.com/ccbogel/QualCoder
 https://qualcoder.wordpress.com/
 """
 
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 import csv
 import datetime
-import ebooklib
-from ebooklib import epub
-import PIL
-from PIL import Image
-from typing import Iterable, Any
+import multiprocessing
+import sqlite3
 import webbrowser
-import zipfile
 from shutil import copyfile, move
 from urllib.parse import urlparse
 
 from PyQt6 import QtCore, QtGui, QtWidgets
-from pdfminer.converter import PDFPageAggregator
-from pdfminer.layout import LAParams, LTTextBox, LTTextLine
-from pdfminer.pdfdocument import PDFDocument
-from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
-from pdfminer.pdfpage import PDFPage
-from pdfminer.pdfparser import PDFParser
 
 from .GUI.base64_helper import *
 from .GUI.ui_dialog_manage_files import Ui_Dialog_manage_files
 from .add_attribute import DialogAddAttribute
 from .add_item_name import DialogAddItemName
+from .attribute_pivot import attribute_values, attribute_value_summaries, value_tooltip
 from .code_text import DialogCodeText  # for isinstance()
 from .confirm_delete import DialogConfirmDelete
-from .docx import opendocx, getdocumenttext
+from .document_text import extract_document_text
 from .edit_textfile import DialogEditTextFile
 from .helpers import ExportDirectoryPathDialog, Message, msecs_to_hours_mins_secs
 from .html_parser import *
+from .media_metadata import file_stat, get_icon, get_vlc_instance, MediaMetadataCache, MediaMetadataWorker
 from .memo import DialogMemo
 from .report_codes import DialogReportCodes  # for isInstance()
 from .ris import Ris
 from .select_items import DialogSelectItems
+from .table_paging import TablePager
 from .view_av import DialogViewAV, DialogCodeAV  # for isinstance update files
 from .view_image import DialogViewImage, DialogCodeImage  # for isinstance update files
 from .code_pdf import DialogCodePdf # for isinstance update files
@@ -98,9 +93,10 @@ class DialogManageFiles(QtWidgets.QDialog):
     default_import_directory = os.path.expanduser("~")
     attribute_names = []  # list of dictionary name:value for AddAtribute dialog
     attribute_labels_ordered = []  # helps with filling table data
+    attribute_summaries = {}  # attribute_pivot.attribute_value_summaries, for header tooltips
     av_dialog_open = None  # Used for opened AV dialog
+    media_metadata = None  # MediaMetadataCache
     files_renamed = []  # list of dictionaries of old and new names and fid
-    pdf_page_text = ""  # Used when loading pdf text
 
     def __init__(self, app, parent_text_edit, tab_coding, tab_reports):
 
@@ -115,6 +111,10 @@ class DialogManageFiles(QtWidgets.QDialog):
         self.default_import_directory = self.app.settings['directory']
         self.attribute_labels_ordered = []
         self.av_dialog_open = None
+        self.media_metadata = MediaMetadataCache(self.app)
+        self.media_metadata_pending = {}  # mediapath: MediaMetadataSignals of queued and running workers
+        self.media_metadata_pool = QtCore.QThreadPool()
+        self.media_metadata_pool.setMaxThreadCount(4)
         font = 'font: ' + str(self.app.settings['fontsize']) + 'pt '
         font += '"' + self.app.settings['font'] + '";'
         self.setStyleSheet(font)
@@ -177,6 +177,7 @@ class DialogManageFiles(QtWidgets.QDialog):
         self.ui.tableWidget.horizontalHeader().setContextMenuPolicy(QtCore.Qt.ContextMenuPolicy.CustomContextMenu)
         self.ui.tableWidget.horizontalHeader().customContextMenuRequested.connect(self.table_header_menu)
         self.ui.tableWidget.horizontalHeader().setToolTip(_("Right click header row to hide columns"))
+        self.table_pager = TablePager(self.ui.tableWidget, self.fill_row)
         self.load_file_data()
 
     @staticmethod
@@ -408,6 +409,7 @@ class DialogManageFiles(QtWidgets.QDialog):
             self.load_file_data("attribute desc:" + self.header_labels[col])
         if action == action_equals_value:
             # Hide rows that do not match this value
+            self.table_pager.fetch_all()
             item_to_compare = self.ui.tableWidget.item(row, col)
             compare_text = item_to_compare.text()
             for r in range(0, self.ui.tableWidget.rowCount()):
@@ -421,6 +423,7 @@ class DialogManageFiles(QtWidgets.QDialog):
                                                        QtWidgets.QLineEdit.EchoMode.Normal)
             self.rows_hidden = True
             if ok and text_value != '':
+                self.table_pager.fetch_all()
                 for r in range(0, self.ui.tableWidget.rowCount()):
                     if self.ui.tableWidget.item(r, col).text().find(text_value) == -1:
                         self.ui.tableWidget.setRowHidden(r, True)
@@ -739,6 +742,7 @@ class DialogManageFiles(QtWidgets.QDialog):
         filepath = exp_dlg.filepath
         if filepath is None:
             return
+        self.table_pager.fetch_all()
         cols = self.ui.tableWidget.columnCount()
         rows = self.ui.tableWidget.rowCount()
         header = [self.ui.tableWidget.horizontalHeaderItem(i).text() for i in range(0, cols)]
@@ -760,6 +764,53 @@ class DialogManageFiles(QtWidgets.QDialog):
         Message(self.app, _('Csv file Export'), msg).exec()
         self.parent_text_edit.append(msg)
 
+    def fill_row(self, row, data):
+        """ Set the table items for one file. Called by: table_pager, as the table is scrolled.
+        param:
+            row: Integer table row
+            data: Dictionary of file details, from self.source
+        """
+
+        if data.get('icon') is None:
+            data['icon'], data['metadata'] = self.get_icon_and_metadata(data['id'])
+        if data.get('case') is None:
+            data['case'] = self.get_cases_by_filename(data['name'])
+        icon = data['icon']
+        name_item = QtWidgets.QTableWidgetItem(data['name'])
+        name_item.setIcon(icon)
+        # Having un-editable file names helps with assigning icons
+        name_item.setFlags(name_item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
+        # Externally linked - add link details to tooltip
+        name_item.setToolTip(self.name_tooltip(data))
+        self.ui.tableWidget.setItem(row, self.NAME_COLUMN, name_item)
+        date_item = QtWidgets.QTableWidgetItem(data['date'])
+        date_item.setFlags(date_item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
+        self.ui.tableWidget.setItem(row, self.DATE_COLUMN, date_item)
+        memo_string = ""
+        if data['memo'] != "":
+            memo_string = _("Memo")
+        memo_item = QtWidgets.QTableWidgetItem(memo_string)
+        if data['memo'] != "":
+            memo_item.setToolTip(data['memo'])
+        memo_item.setFlags(date_item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
+        self.ui.tableWidget.setItem(row, self.MEMO_COLUMN, memo_item)
+        fid = data['id']
+        if fid is None:
+            fid = ""
+        iditem = QtWidgets.QTableWidgetItem(str(fid))
+        iditem.setFlags(iditem.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
+        self.ui.tableWidget.setItem(row, self.ID_COLUMN, iditem)
+        case_item = QtWidgets.QTableWidgetItem(data['case'])
+        case_item.setFlags(case_item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
+        self.ui.tableWidget.setItem(row, self.CASE_COLUMN, case_item)
+        # Add the attribute values
+        # TODO consider using role type for numerics
+        for offset, attribute in enumerate(data['attributes']):
+            item = QtWidgets.QTableWidgetItem(attribute)
+            self.ui.tableWidget.setItem(row, self.ATTRIBUTE_START_COLUMN + offset, item)
+            if self.attribute_labels_ordered[offset] in ("Ref_Authors", "Ref_Title", "Ref_Type", "Ref_Year", "Ref_Journal"):
+                item.setFlags(item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
+
     def load_file_data(self, order_by=""):
         """ Documents images and audio contain the filetype suffix.
         No suffix implies the 'file' was imported from a survey question or created internally.
@@ -767,7 +818,7 @@ class DialogManageFiles(QtWidgets.QDialog):
         Db versions < 5: Files with the '.transcribed' suffix mean they are associated with audio and
         video files.
         Db version 5+: av_text_id links the text file to the audio/video
-        Obtain some file metadata to use in table tooltip.
+        File texts are not loaded. File metadata for the table tooltip is read as rows are shown, see fill_row.
         Fills table after data is loaded.
         param:
             order_by: string ""= name asc, "filename desc" = name desc,
@@ -783,16 +834,16 @@ class DialogManageFiles(QtWidgets.QDialog):
         cur = self.app.conn.cursor()
         placeholders = None
         # Default alphabetic order
-        sql = "select name, id, fulltext, mediapath, ifnull(memo,''), owner, date, av_text_id, risid from source order by upper(name)"
+        sql = "select name, id, mediapath, ifnull(memo,''), owner, date, av_text_id, risid from source order by upper(name)"
         if  order_by == "filename desc":
             sql += " desc"
         if order_by == "date":
-            sql = "select name, id, fulltext, mediapath, ifnull(memo,''), owner, date, av_text_id, risid from source order by date, upper(name)"
+            sql = "select name, id, mediapath, ifnull(memo,''), owner, date, av_text_id, risid from source order by date, upper(name)"
         if order_by == "filetype":
-            sql = "select name, id, fulltext, mediapath, ifnull(memo,''), owner, date, av_text_id, risid from source order by mediapath"
+            sql = "select name, id, mediapath, ifnull(memo,''), owner, date, av_text_id, risid from source order by mediapath"
         if order_by == "casename":
-            sql = "select distinct source.name, source.id, source.fulltext, source.mediapath, ifnull(source.memo,''), "
-            sql += "source.owner, source.date, av_text_id "
+            sql = "select distinct source.name, source.id, source.mediapath, ifnull(source.memo,''), "
+            sql += "source.owner, source.date, av_text_id, risid "
             sql += "from source left join case_text on source.id=case_text.fid "
             sql += "left join cases on cases.caseid=case_text.caseid "
             sql += "order by cases.name, source.name "
@@ -802,7 +853,7 @@ class DialogManageFiles(QtWidgets.QDialog):
             # Two types of ordering character or numeric
             cur.execute("select valuetype from attribute_type where name=?", [attribute_name])
             attr_type = cur.fetchone()[0]
-            sql = "select source.name, source.id, fulltext, mediapath, ifnull(source.memo,''), source.owner, "
+            sql = "select source.name, source.id, mediapath, ifnull(source.memo,''), source.owner, "
             sql += "source.date, av_text_id, risid from source join attribute on attribute.id = source.id "
             sql += " where attribute.attr_type = 'file' and attribute.name=? "
             if attr_type == "character":
@@ -816,7 +867,7 @@ class DialogManageFiles(QtWidgets.QDialog):
             # two types of ordering character or numeric
             cur.execute("select valuetype from attribute_type where name=?", [attribute_name])
             attr_type = cur.fetchone()[0]
-            sql = "select source.name, source.id, fulltext, mediapath, ifnull(source.memo,''), source.owner, "
+            sql = "select source.name, source.id, mediapath, ifnull(source.memo,''), source.owner, "
             sql += "source.date, av_text_id, risid from source join attribute on attribute.id = source.id "
             sql += " where attribute.attr_type = 'file' and attribute.name=? "
             if attr_type == "character":
@@ -830,13 +881,11 @@ class DialogManageFiles(QtWidgets.QDialog):
         else:
             cur.execute(sql)
         result = cur.fetchall()
+        # Icon, metadata and case names are read in fill_row, only for rows that are shown
         for row in result:
-            icon, metadata = self.get_icon_and_metadata(row[1])
-            self.source.append({'name': row[0], 'id': row[1], 'fulltext': row[2],
-                                'mediapath': row[3], 'memo': row[4], 'owner': row[5], 'date': row[6],
-                                'av_text_id': row[7], 'risid': row[8], 'metadata': metadata, 'icon': icon,
-                                'case': self.get_cases_by_filename(row[0]),
-                                'attributes': []})
+            self.source.append({'name': row[0], 'id': row[1], 'mediapath': row[2], 'memo': row[3], 'owner': row[4],
+                                'date': row[5], 'av_text_id': row[6], 'risid': row[7], 'metadata': None,
+                                'icon': None, 'case': None, 'attributes': []})
 
         self.header_labels = [_("Name"), _("Memo"), _("Date"), _("Id"), _("Case")]
         # Attributes
@@ -850,17 +899,13 @@ class DialogManageFiles(QtWidgets.QDialog):
             self.attribute_labels_ordered.append(att_name[0])
             self.attribute_names.append({'name': att_name[0]})  # For AddAttribute dialog
         # Add list of attribute values to files, order matches header columns
-        sql = "select ifnull(value, '') from attribute where attr_type='file' and attribute.name=? and id=?"
+        file_attributes = attribute_values(self.app.conn, "file", self.attribute_labels_ordered)
         for s in self.source:
-            for att_name in self.attribute_labels_ordered:
-                cur.execute(sql, [att_name, s['id']])
-                res = cur.fetchone()
-                if res:
-                    tmp = res[0]
-                    # For nicer display
-                    if att_name == "Ref_authors":
-                        tmp = tmp.replace(";", "\n")
-                    s['attributes'].append(tmp)
+            s['attributes'] = file_attributes.get(s['id'], [''] * len(self.attribute_labels_ordered))
+            for i, att_name in enumerate(self.attribute_labels_ordered):
+                # For nicer display
+                if att_name == "Ref_authors":
+                    s['attributes'][i] = s['attributes'][i].replace(";", "\n")
         # Get reference for file, Vancouver and APA style
         # TODO
 
@@ -868,36 +913,33 @@ class DialogManageFiles(QtWidgets.QDialog):
 
     def get_icon_and_metadata(self, id_):
         """ Get metadata used in table tooltip.
-        Called by: create_text_file, load_file_data
+        Media details are read from the media metadata cache. Uncached details are read by a
+        background worker, and the tooltip is updated by media_metadata_ready.
+        Called by: create_text_file, load_file_data, media_metadata_ready
         param:
             id_  : integer source.id
         """
 
         cur = self.app.conn.cursor()
-        cur.execute("select name, fulltext, mediapath from source where id=?", [id_])
+        cur.execute("select name, ifnull(length(fulltext), 0), mediapath from source where id=?", [id_])
         res = cur.fetchone()
         metadata = res[0] + "\n"
-        pm = QtGui.QPixmap()
-        pm.loadFromData(QtCore.QByteArray.fromBase64(text), "png")
-        icon = QtGui.QIcon(pm)
+        icon = get_icon('text')
         # Check if text file is a transcription and add details
         cur.execute("select name from source where av_text_id=?", [id_])
         tr_res = cur.fetchone()
         if tr_res is not None:
             metadata += _("Transcript for: ") + tr_res[0] + "\n"
-            pm.loadFromData(QtCore.QByteArray.fromBase64(transcribed_text_icon), "png")
-            icon = QtGui.QIcon(pm)
-        if res[1] is not None and len(res[1]) > 0 and res[2] is None:
-            metadata += _("Characters: ") + str(len(res[1]))
+            icon = get_icon('transcribed_text_icon')
+        if res[1] > 0 and res[2] is None:
+            metadata += _("Characters: ") + str(res[1])
             return icon, metadata
         if res[2] is None:
             logger.debug("empty media path error")
             return icon, metadata
-        if res[1] is not None and len(res[1]) > 0 and res[2][0:5] == 'docs:':
-            metadata += _("Characters: ") + str(len([res[1]]))
-            pm = QtGui.QPixmap()
-            pm.loadFromData(QtCore.QByteArray.fromBase64(text_link), "png")
-            icon = QtGui.QIcon(pm)
+        if res[1] > 0 and res[2][0:5] == 'docs:':
+            metadata += _("Characters: ") + str(res[1])
+            icon = get_icon('text_link')
             return icon, metadata
 
         abs_path = ""
@@ -909,73 +951,38 @@ class DialogManageFiles(QtWidgets.QDialog):
             abs_path = res[2][7:]
         else:
             abs_path = self.app.project_path + res[2]
-
-        if res[2][:8] == "/images/":
-            pm = QtGui.QPixmap()
-            pm.loadFromData(QtCore.QByteArray.fromBase64(picture), "png")
-            icon = QtGui.QIcon(pm)
-            # w = 0
-            # h = 0
-            try:
-                image = Image.open(abs_path)
-                w, h = image.size
-            except (FileNotFoundError, PIL.UnidentifiedImageError):
-                metadata += _("Cannot locate media. ") + abs_path
+        media_icons = {"/images/": 'picture', "images:": 'picture_link', "/video/": 'play', "video:": 'play_link',
+                       "/audio/": 'sound', "audio:": 'sound_link'}
+        media_type = None
+        for prefix, icon_name in media_icons.items():
+            if res[2].startswith(prefix):
+                icon = get_icon(icon_name)
+                media_type = prefix.strip("/:")
+                if media_type == "images":
+                    media_type = "image"
+        if media_type is not None:
+            if media_type in ("audio", "video") and vlc is None:
+                metadata += _("Cannot get media duration.\nVLC not installed.")
                 return icon, metadata
-            metadata += f"W: {w} x H: {h}"
-        if res[2][:7] == "images:":
-            pm = QtGui.QPixmap()
-            pm.loadFromData(QtCore.QByteArray.fromBase64(picture_link), "png")
-            icon = QtGui.QIcon(pm)
-            # w = 0
-            # h = 0
-            try:
-                image = Image.open(abs_path)
-                w, h = image.size
-            except (FileNotFoundError, PIL.UnidentifiedImageError, AttributeError):
+            if file_stat(abs_path) is None:
                 metadata += _("Cannot locate media. ") + abs_path
                 return icon, metadata
-            metadata += f"W: {w} x H: {h}"
-        if res[2][:7] == "/video/":
-            pm = QtGui.QPixmap()
-            pm.loadFromData(QtCore.QByteArray.fromBase64(play), "png")
-            icon = QtGui.QIcon(pm)
-        if res[2][:6] == "video:":
-            pm = QtGui.QPixmap()
-            pm.loadFromData(QtCore.QByteArray.fromBase64(play_link), "png")
-            icon = QtGui.QIcon(pm)
-        if res[2][:7] == "/audio/":
-            pm = QtGui.QPixmap()
-            pm.loadFromData(QtCore.QByteArray.fromBase64(sound), "png")
-            icon = QtGui.QIcon(pm)
-        if res[2][:6] == "audio:":
-            pm = QtGui.QPixmap()
-            pm.loadFromData(QtCore.QByteArray.fromBase64(sound_link), "png")
-            icon = QtGui.QIcon(pm)
-        if res[2][:6] in ("/audio", "audio:", "/video", "video:"):
-            if not os.path.exists(abs_path):
-                metadata += _("Cannot locate media. ") + abs_path
+            media_data = self.media_metadata.get(res[2], abs_path)
+            if media_data is None:
+                self.read_media_metadata(res[2], abs_path, media_type)
+                metadata += _("Reading media details")
                 return icon, metadata
-            if vlc:
-                try:
-                    try:
-                        instance = vlc.Instance()
-                    except NameError as name_err:
-                        # NameError: no function 'libvlc_new'
-                        logger.error(f"vlc.Instance: {name_err}")
-                        return icon, f"Cannot use vlc. {name_err}"
-                    media = instance.media_new(abs_path)
-                    media.parse()
-                    msecs = media.get_duration()
-                    duration_txt = msecs_to_hours_mins_secs(msecs)
-                    metadata += _("Duration: ") + duration_txt
-                    return icon, metadata
-                except AttributeError as err:
-                    logger.warning(str(err))
-                    metadata += _("Cannot locate media. ") + abs_path + "\n" + str(err)
+            if media_type == "image":
+                if media_data['width'] is None:
+                    metadata += _("Cannot locate media. ") + abs_path
                     return icon, metadata
+                metadata += f"W: {media_data['width']} x H: {media_data['height']}"
             else:
-                metadata += _("Cannot get media duration.\nVLC not installed.")
+                if media_data['duration'] is None:
+                    metadata += _("Cannot locate media. ") + abs_path + "\n" + media_data['error']
+                    return icon, metadata
+                duration_txt = msecs_to_hours_mins_secs(media_data['duration'])
+                metadata += _("Duration: ") + duration_txt
                 return icon, metadata
         bytes_ = 0
         try:
@@ -993,6 +1000,72 @@ class DialogManageFiles(QtWidgets.QDialog):
             metadata += "\n" + _("Case linked:") + "\n" + txt
         return icon, metadata
 
+    def read_media_metadata(self, mediapath, abs_path, media_type):
+        """ Start a background worker to read image or A/V details, unless one has already been started.
+        Called by: get_icon_and_metadata
+        param:
+            mediapath: String source.mediapath
+            abs_path: String absolute file path
+            media_type: String image, audio or video
+        """
+
+        if mediapath in self.media_metadata_pending:
+            return
+        vlc_instance = None
+        if media_type in ("audio", "video"):
+            vlc_instance = get_vlc_instance()
+        worker = MediaMetadataWorker(mediapath, abs_path, media_type, vlc_instance)
+        worker.signals.finished.connect(self.media_metadata_ready)
+        self.media_metadata_pending[mediapath] = worker.signals
+        self.media_metadata_pool.start(worker)
+
+    def media_metadata_ready(self, mediapath, media_data):
+        """ Cache media details read by a background worker, and update the file tooltip.
+        param:
+            mediapath: String source.mediapath
+            media_data: Dictionary from media_metadata.read_media_metadata
+        """
+
+        self.media_metadata_pending.pop(mediapath, None)
+        if self.app.conn is None:
+            return
+        self.media_metadata.store(mediapath, media_data)
+        for data in self.source:
+            if data['mediapath'] != mediapath:
+                continue
+            data['icon'], data['metadata'] = self.get_icon_and_metadata(data['id'])
+            for row in range(self.ui.tableWidget.rowCount()):
+                id_item = self.ui.tableWidget.item(row, self.ID_COLUMN)
+                name_item = self.ui.tableWidget.item(row, self.NAME_COLUMN)
+                if id_item is not None and name_item is not None and id_item.text() == str(data['id']):
+                    name_item.setToolTip(self.name_tooltip(data))
+
+    @staticmethod
+    def name_tooltip(data):
+        """ File name tooltip, of metadata and external link details.
+        Called by: fill_table, media_metadata_ready
+        param:
+            data: Dictionary of file details, from self.source
+        return:
+            String
+        """
+
+        name_tt = data['metadata']
+        if data['mediapath'] is not None and ':' in data['mediapath']:
+            name_tt += _("\nExternally linked file:\n")
+            name_tt += data['mediapath']
+        return name_tt
+
+    def closeEvent(self, event):
+        """ Do not start media details workers that are still queued.
+        Running workers are disconnected, as the dialog is deleted on close. """
+
+        self.media_metadata_pool.clear()
+        for signals in self.media_metadata_pending.values():
+            signals.finished.disconnect(self.media_metadata_ready)
+        self.media_metadata_pending = {}
+        super().closeEvent(event)
+
     def get_cases_by_filename(self, name):
         """ Called by get_icon_and_metadata, get_file_data
         param: name String of filename """
@@ -1165,14 +1238,6 @@ class DialogManageFiles(QtWidgets.QDialog):
                 return
         ui = DialogEditTextFile(self.app, self.source[x]['id'])
         ui.exec()
-        # Get fulltext if changed (for metadata)
-        cur = self.app.conn.cursor()
-        cur.execute("select fulltext from source where id=?", [self.source[x]['id']])
-        res = cur.fetchone()
-        fulltext = ""
-        if res is not None:
-            fulltext = res[0]
-        self.source[x]['fulltext'] = fulltext
 
     def view_av(self, x):
         """ View an audio or video file. Edit the memo. Edit the transcript file.
@@ -1325,12 +1390,13 @@ class DialogManageFiles(QtWidgets.QDialog):
         imports = response[0]
         if not imports:
             return
-        known_file_type = False
         name_split = imports[0].split("/")
         temp_filename = name_split[-1]
         self.default_import_directory = imports[0][0:-len(temp_filename)]
         pdf_msg = ""
+        documents = []  # List of [filepath, mediapath], converted to text after media files are imported
         for f in imports:
+            known_file_type = False
             link_path = ""
             if link:
                 link_path = f
@@ -1342,41 +1408,22 @@ class DialogManageFiles(QtWidgets.QDialog):
             QtWidgets.QApplication.processEvents()
             filename = f.split("/")[-1]
             destination = self.app.project_path
-            if f.split('.')[-1].lower() in ('docx', 'odt', 'txt', 'htm', 'html', 'epub', 'md'):
-                destination += "/documents/" + filename
+            if f.split('.')[-1].lower() in ('docx', 'odt', 'txt', 'htm', 'html', 'epub', 'md', 'pdf'):
                 if link_path == "":
-                    copyfile(f, destination)
-                    self.load_file_text(f)
+                    documents.append([f, "/docs/" + filename])
                 else:
-                    self.load_file_text(f, "docs:" + link_path)
+                    documents.append([f, "docs:" + link_path])
                 known_file_type = True
-            if f.split('.')[-1].lower() == 'pdf':
-                destination += "/documents/" + filename
                 '''# Try and remove encryption from pdf if a simple encryption, for Linux
                 if platform.system() == "Linux":
                     process = subprocess.Popen(["qpdf", "--decrypt", f, destination],
                                                stdout=subprocess.PIPE)
                     process.wait()
-                    if link_path == "":
-                        self.load_file_text(destination)
-                    else:
-                        self.load_file_text(destination, "docs:" + link_path)
-                        try:
-                            os.remove(destination)
-                        except OSError as err:
-                            logger.warning(
-                                "Remove decrypted pdf linked file from /documents\n" + destination + "\n" + str(err))
                 else:
                     # qpdf decrypt not implemented for windows, OSX.  Warn user of encrypted PDF
                     pdf_msg = _(
                         "Sometimes pdfs are encrypted, download and decrypt using qpdf before trying to load the pdf")
                     # Message(self.app, _('If import error occurs'), msg, "warning").exec()'''
-                if link_path == "":
-                    copyfile(f, destination)
-                    self.load_file_text(f)
-                else:
-                    self.load_file_text(f, "docs:" + link_path)
-                known_file_type = True
 
             # Media files
             if f.split('.')[-1].lower() in ('jpg', 'jpeg', 'png'):
@@ -1404,27 +1451,12 @@ class DialogManageFiles(QtWidgets.QDialog):
                     self.load_media_reference("video:" + link_path)
                 known_file_type = True
             if not known_file_type:
-                Message(self.app, _('Unknown file type'),
-                        _("Trying to import as text") + ":\n" + f,
-                        "warning")
-                destination += "/documents/" + filename
+                Message(self.app, _('Unknown file type'), _("Trying to import as text") + ":\n" + f, "warning").exec()
                 if link_path == "":
-                    try:
-                        self.load_file_text(f)
-                    except Exception as err:
-                        print(err)
-                        logger.warning(str(err))
-                    try:
-                        copyfile(f, destination)
-                    except OSError as err:
-                        logger.warning(str(err))
-                        Message(self.app, _('Unknown file type'), _("Cannot import file") + ":\n" + f, "warning")
+                    documents.append([f, "/docs/" + filename])
                 else:
-                    try:
-                        self.load_file_text(f, "docs:" + link_path)
-                    except Exception as err:
-                        logger.warning(str(err))
-                        Message(self.app, _('Unknown file type'), _("Cannot import file") + ":\n" + f, "warning")
+                    documents.append([f, "docs:" + link_path])
+        self.import_documents(documents)
         if pdf_msg != "":
             self.parent_text_edit.append(pdf_msg)
         self.load_file_data()
@@ -1522,215 +1554,129 @@ class DialogManageFiles(QtWidgets.QDialog):
             self.parent_text_edit.append(entry['name'] + _(" created."))
             self.source.append(entry)
 
-    def load_file_text(self, import_file, link_path=""):
-        """ Import from file types of odt, docx pdf, epub, txt, html, htm.
-        Implement character detection for txt imports.
-        Loading pdf text. I have removed additional line breaks. See commented sections below.
-        Removing these allows the pdf to be coded in Code_text and Code_pdf without positional shifting problems.
-
+    def import_documents(self, documents):
+        """ Convert documents to plain text and insert them into the source table, in one transaction.
+        Files are copied into the project documents folder when inserted, linked files are not copied.
+        Files with a duplicated filename, or that cannot be converted, are not imported and are listed in a warning.
+        Called by: import_files
         param:
-            import_file: filepath of file to be imported, String
-            link_path:  filepath of file to be linked, String
+            documents: List of [filepath, mediapath]. mediapath is /docs/filename or docs:linked filepath
         """
 
+        if not documents:
+            return
         if self.av_dialog_open is not None:
             self.av_dialog_open.mediaplayer.stop()
             self.av_dialog_open = None
-        text_ = ""
-        # Import from odt
-        if import_file[-4:].lower() == ".odt":
-            text_ = self.convert_odt_to_text(import_file)
-            text_ = text_.replace("\n", "\n\n")  # add line to paragraph spacing for visual format
-        # Import from docx
-        if import_file[-5:].lower() == ".docx":
-            document = opendocx(import_file)
-            list_ = getdocumenttext(document)
-            text_ = "\n\n".join(list_)  # add line to paragraph spacing for visual format
-        # Import from epub
-        if import_file[-5:].lower() == ".epub":
-            book = epub.read_epub(import_file)
-            for d in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
-                try:
-                    bytes_ = d.get_body_content()
-                    string = bytes_.decode('utf-8')
-                    text_ += html_to_text(string) + "\n\n"  # add line to paragraph spacing for visual format
-                except TypeError as err:
-                    logger.debug("ebooklib get_body_content error " + str(err))
-        # Import PDF
-        if import_file[-4:].lower() == '.pdf':
-            pdf_file = open(import_file, 'rb')
-            resource_manager = PDFResourceManager()
-            laparams = LAParams()
-            # laparams.char_margin = 1.0
-            # laparams.word_margin = 1.0
-            device = PDFPageAggregator(resource_manager, laparams=laparams)
-            interpreter = PDFPageInterpreter(resource_manager, device)
-            pages_generator = PDFPage.get_pages(pdf_file)  # Generator PDFpage objects
-            text_ = ""
-            for i, page in enumerate(pages_generator):
-                self.pdf_page_text = ""
-                interpreter.process_page(page)
-                layout = device.get_result()
-                for lobj in layout:
-                    self.get_item_and_hierarchy(page, lobj)
-                text_ += self.pdf_page_text
-
-        # Import from html
-        if import_file[-5:].lower() == ".html" or import_file[-4:].lower() == ".htm":
-            import_errors = 0
-            with open(import_file, "r", encoding="utf-8", errors="surrogateescape") as sourcefile:
-                html_text = ""
-                while 1:
-                    line = sourcefile.readline()
-                    if not line:
-                        break
-                    html_text += line
-                text_ = html_to_text(html_text)
-                if import_errors > 0:
-                    Message(self.app, _("Warning"), str(import_errors) + _(" lines not imported"), "warning").exec()
-        # Try importing as a plain text file.
-        # TODO https://stackoverflow.com/questions/436220/how-to-determine-the-encoding-of-text
-        # coding = chardet.detect(file.content).get('encoding')
-        # text = file.content[:10000].decode(coding)
-        if text_ == "":
-            import_errors = 0
-            try:
-                # can get UnicodeDecode Error on Windows so using error handler
-                with open(import_file, "r", encoding="utf-8", errors="backslashreplace") as sourcefile:
-                    while 1:
-                        line = sourcefile.readline()
-                        if not line:
-                            break
-                        try:
-                            text_ += line
-                        except Exception as err:
-                            logger.warning("Importing plain text file, line ignored: " + str(err))
-                            import_errors += 1
-                    if text_[0:6] == "\ufeff":  # associated with notepad files
-                        text_ = text_[6:]
-            except Exception as err:
-                logger.warning(str(err))
-                Message(self.app, _("Warning"), _("Cannot import") + str(import_file) + "\n" + str(err),
-                        "warning").exec()
-                return
-            if import_errors > 0:
-                Message(self.app, _("Warning"), str(import_errors) + _(" lines not imported"), "warning").exec()
-                logger.warning(import_file + ": " + str(import_errors) + _(" lines not imported"))
-        # Import of text file did not work
-        if text_ == "":
-            Message(self.app, _("Warning"),
-                    _("Cannot import ") + str(import_file) + "\nPlease check if the file is empty.", "warning").exec()
-            return
-        # Final checks: check for duplicated filename and update model, widget and database
-        name_split = import_file.split("/")
-        filename = name_split[-1]
-        if any(d['name'] == filename for d in self.source):
-            QtWidgets.QMessageBox.warning(self, _('Duplicate file'),
-                                          _("Duplicate filename.\nFile not imported"))
-            return
-
-        # Internal storage
-        mediapath = "/docs/" + filename
-        if link_path != "":
-            mediapath = link_path
-        entry = {'name': filename, 'id': -1, 'fulltext': text_, 'mediapath': mediapath, 'memo': "",
-                 'owner': self.app.settings['codername'], 'date': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        results = self.extract_documents_text([d[0] for d in documents])
+        now_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        owner = self.app.settings['codername']
+        names = set(d['name'] for d in self.source)
         cur = self.app.conn.cursor()
-        # logger.debug("type fulltext: " + str(type(entry['fulltext'])))
-        cur.execute("insert into source(name,fulltext,mediapath,memo,owner,date) values(?,?,?,?,?,?)",
-                    (
-                        entry['name'], entry['fulltext'], entry['mediapath'], entry['memo'], entry['owner'],
-                        entry['date']))
-        self.app.conn.commit()
-        cur.execute("select last_insert_rowid()")
-        id_ = cur.fetchone()[0]
-        entry['id'] = id_
-
-        # Add file attribute placeholders
-        att_sql = 'select name from attribute_type where caseOrFile ="file"'
-        cur.execute(att_sql)
-        attr_types = cur.fetchall()
-        insert_sql = "insert into attribute (name, attr_type, value, id, date, owner) values(?,'file','',?,?,?)"
-        for a in attr_types:
-            placeholders = [a[0], id_, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            self.app.settings['codername']]
-            cur.execute(insert_sql, placeholders)
+        cur.execute('select name from attribute_type where caseOrFile ="file"')
+        attr_types = [row[0] for row in cur.fetchall()]
+        placeholders = []
+        warnings = []
+        cancelled = 0
+        try:
+            for (import_file, mediapath), result in zip(documents, results):
+                if result is None:
+                    cancelled += 1
+                    continue
+                filename = import_file.split("/")[-1]
+                if result['error'] != "":
+                    logger.warning(import_file + ": " + result['error'])
+                    warnings.append(_("Cannot import") + " " + import_file + "\n" + result['error'])
+                    continue
+                if result['text'] == "":
+                    warnings.append(_("Cannot import ") + import_file + "\nPlease check if the file is empty.")
+                    continue
+                if filename in names:
+                    warnings.append(filename + ": " + _("Duplicate filename.\nFile not imported"))
+                    continue
+                if mediapath[:6] == "/docs/":
+                    try:
+                        copyfile(import_file, self.app.project_path + "/documents/" + filename)
+                    except OSError as err:
+                        logger.warning(str(err))
+                        warnings.append(_("Cannot import file") + ":\n" + import_file + "\n" + str(err))
+                        continue
+                entry = {'name': filename, 'id': -1, 'fulltext': result['text'], 'mediapath': mediapath, 'memo': "",
+                         'owner': owner, 'date': now_date}
+                cur.execute("insert into source(name,fulltext,mediapath,memo,owner,date) values(?,?,?,?,?,?)",
+                            (entry['name'], entry['fulltext'], entry['mediapath'], entry['memo'], entry['owner'],
+                             entry['date']))
+                entry['id'] = cur.lastrowid
+                # File attribute placeholders
+                placeholders += [[name, entry['id'], now_date, owner] for name in attr_types]
+                names.add(filename)
+                self.source.append(entry)
+                msg = entry['name']
+                if mediapath[:6] == "/docs/":
+                    msg += _(" imported")
+                else:
+                    msg += _(" linked")
+                self.parent_text_edit.append(msg)
+            cur.executemany("insert into attribute (name, attr_type, value, id, date, owner) "
+                            "values(?,'file','',?,?,?)", placeholders)
             self.app.conn.commit()
-        msg = entry['name']
-        if link_path == "":
-            msg += _(" imported")
-        else:
-            msg += _(" linked")
-        self.parent_text_edit.append(msg)
-        self.source.append(entry)
-
-    # Pdf loading method
-    def get_item_and_hierarchy(self, page, lobj: Any):
-        """ Get text item details add to page_dict, with descendants.
-        Use LTextLine as this object can be parsed in Code_pdf for font size and colour.
+        except sqlite3.Error as err:
+            self.app.conn.rollback()
+            logger.error(str(err))
+            Message(self.app, _("Warning"), _("Files not imported") + "\n" + str(err), "warning").exec()
+            return
+        if cancelled:
+            self.parent_text_edit.append(_("Import cancelled. Files not imported: ") + str(cancelled))
+        if warnings:
+            Message(self.app, _("Warning"), "\n\n".join(warnings), "warning").exec()
+
+    def extract_documents_text(self, filepaths):
+        """ Convert documents to plain text. Several documents are converted at the same time in a process pool.
+        Results are collected in the GUI thread, with a progress dialog that can cancel the remaining conversions.
+        Called by: import_documents
+        param:
+            filepaths: List of String
+        return:
+            List of Dictionaries of path, text, error, in filepaths order. None for cancelled conversions
         """
 
-        if isinstance(lobj, LTTextLine):  # Do not use LTTextBox
-            obj_text = lobj.get_text()
-            # Fix Pdfminer recognising invalid unicode characters.
-            obj_text = obj_text.replace(u"\uE002", "Th")
-            obj_text = obj_text.replace(u"\uFB01", "fi")
-            self.pdf_page_text += obj_text
-        if isinstance(lobj, Iterable):
-            for obj in lobj:
-                self.get_item_and_hierarchy(page, obj)
-
-    def convert_odt_to_text(self, import_file):
-        """ Convert odt to very rough equivalent with headings, list items and tables for
-        html display in qTextEdits. """
-
-        odt_file = zipfile.ZipFile(import_file)
-        data = str(odt_file.read('content.xml'))  # bytes class to string
-        # https://stackoverflow.com/questions/18488734/python3-unescaping-non-ascii-characters
-        data = str(bytes([ord(char) for char in data.encode("utf_8").decode("unicode_escape")]), "utf_8")
-        data_start = data.find("</text:sequence-decls>")
-        data_end = data.find("</office:text>")
-        if data_start == -1 or data_end == -1:
-            logger.warning("ODT IMPORT ERROR")
-            return ""
-        data = data[data_start + 22: data_end]
-        data = data.replace('</text:index-title-template>', '')
-        data = data.replace('</text:index-entry-span>', '')
-        data = data.replace('</text:table-of-content-entry-template>', '')
-        data = data.replace('</text:index-title>', '')
-        data = data.replace('</text:index-body>', '')
-        data = data.replace('</text:table-of-contents>', '')
-        data = data.replace('</text:table-of-content-source>', '')
-        data = data.replace('<text:h', '\n<text:h')
-        data = data.replace('</text:h>', '\n\n')
-        data = data.replace('</text:list-item>', '\n')
-        data = data.replace('</text:span>', '')
-        data = data.replace('</text:p>', '\n')
-        data = data.replace('</text:a>', ' ')
-        data = data.replace('</text:list>', '')
-        data = data.replace('</text:sequence>', '')
-        data = data.replace('<text:list-item>', '')
-        data = data.replace('<table:table table:name=', '\n=== TABLE ===\n<table:table table:name=')
-        data = data.replace('</table:table>', '=== END TABLE ===\n')
-        data = data.replace('</table:table-cell>', '\n')
-        data = data.replace('</table:table-row>', '')
-        data = data.replace('<draw:image', '\n=== IMG ===<draw:image')
-        data = data.replace('</draw:frame>', '\n')
-        text_ = ""
-        tagged = False
-        for i in range(0, len(data)):
-            if data[i: i + 6] == "<text:" or data[i: i + 7] == "<table:" or data[i: i + 6] == "<draw:":
-                tagged = True
-            if not tagged:
-                text_ += data[i]
-            if data[i] == ">":
-                tagged = False
-        text_ = text_.replace("&apos;", "'")
-        text_ = text_.replace("&quot;", '"')
-        text_ = text_.replace("&gt;", '>')
-        text_ = text_.replace("&lt;", '<')
-        text_ = text_.replace("&amp;", '&')
-        return text_
+        results = [None] * len(filepaths)
+        prog_dialog = QtWidgets.QProgressDialog(_("Importing files"), _("Cancel"), 0, len(filepaths), None)
+        prog_dialog.setWindowTitle(_("Import files"))
+        prog_dialog.setMinimumDuration(0)
+        prog_dialog.setValue(0)
+        QtWidgets.QApplication.processEvents()
+        if len(filepaths) == 1:
+            results[0] = extract_document_text(filepaths[0])
+            prog_dialog.close()
+            return results
+        # Spawned, not forked, as this process has Qt, VLC and thread pool threads running
+        executor = ProcessPoolExecutor(max_workers=min(len(filepaths), os.cpu_count() or 1),
+                                       mp_context=multiprocessing.get_context("spawn"))
+        futures = {executor.submit(extract_document_text, filepath): i for i, filepath in enumerate(filepaths)}
+        pending = set(futures)
+        completed = 0
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except BrokenProcessPool as err:
+                    # A worker process ended unexpectedly, convert in this process instead
+                    logger.warning(str(err))
+                    results[i] = extract_document_text(filepaths[i])
+                completed += 1
+            prog_dialog.setValue(completed)
+            QtWidgets.QApplication.processEvents()
+            if prog_dialog.wasCanceled():
+                for future in pending:
+                    future.cancel()
+                break
+        # Do not wait for conversions that are running when the import is cancelled
+        executor.shutdown(wait=False)
+        prog_dialog.close()
+        return results
 
     def export(self):
         """ Export selected file to selected directory.
@@ -1750,8 +1696,11 @@ class DialogManageFiles(QtWidgets.QDialog):
         if len(rows) == 0:
             return
         # Currently single selection mode in tableWidget, 1 row only, so rows[0]
+        cur = self.app.conn.cursor()
+        cur.execute("select fulltext from source where id=?", [self.source[rows[0]]['id']])
+        fulltext = cur.fetchone()[0]
         if self.source[rows[0]]['mediapath'] is not None and ':' in self.source[rows[0]]['mediapath'] \
-                and (self.source[rows[0]]['fulltext'] is None or self.source[rows[0]]['fulltext'] == ""):
+                and (fulltext is None or fulltext == ""):
             msg = _("This is an external linked file") + "\n"
             msg += self.source[rows[0]]['mediapath'].split(':')[1]
             Message(self.app, _('Cannot export'), msg, "warning").exec()
@@ -1761,7 +1710,7 @@ class DialogManageFiles(QtWidgets.QDialog):
         # Warn of export of text representation of linked files (e.g. odt, docx, txt, md, pdf)
         text_rep = False
         if self.source[row]['mediapath'] is not None and (':' in self.source[row]['mediapath']) \
-                and self.source[row]['fulltext'] != "":
+                and fulltext != "":
             msg = _("This is a linked file. Will export text representation.") + "\n"
             msg += self.source[row]['mediapath'].split(':')[1]
             Message(self.app, _("Can export text"), msg, "warning").exec()
@@ -1793,7 +1742,7 @@ class DialogManageFiles(QtWidgets.QDialog):
         if document_stored and (self.source[row]['mediapath'] is None or self.source[row]['mediapath'][0:6] == "/docs/"):
             try:
                 copyfile(self.app.project_path + "/documents/" + self.source[row]['name'], destination)
-                filedata = self.source[row]['fulltext']
+                filedata = fulltext
                 f = open(destination + ".txt", 'w', encoding='utf-8-sig')
                 f.write(filedata)
                 f.close()
@@ -1808,7 +1757,7 @@ class DialogManageFiles(QtWidgets.QDialog):
 
         # Export transcribed files, user created text files, text representations of linked files
         if (self.source[row]['mediapath'] is None or self.source[row]['mediapath'][0:5] == 'docs:') and not document_stored:
-            filedata = self.source[row]['fulltext']
+            filedata = fulltext
             f = open(destination, 'w', encoding='utf-8-sig')
             f.write(filedata)
             f.close()
@@ -2001,30 +1950,7 @@ class DialogManageFiles(QtWidgets.QDialog):
         """ Get values to display in tooltips for the value list column.
         param: attribute_name : String """
 
-        tt = ""
-        cur = self.app.conn.cursor()
-        sql_val_type = 'select valuetype from attribute_type where caseOrFile="file" and name=?'
-        cur.execute(sql_val_type, [attribute_name])
-        res_val_type = cur.fetchone()
-        value_type = "character"
-        if res_val_type is not None:
-            value_type = res_val_type[0]
-        if value_type == "numeric":
-            sql = 'select min(cast(value as real)), max(cast(value as real)) from attribute where name=? and ' \
-                  'attr_type="file"'
-            cur.execute(sql, [attribute_name])
-            res = cur.fetchone()
-            tt = _("Minimum: ") + str(res[0]) + "\n"
-            tt += _("Maximum: ") + str(res[1])
-        if value_type == "character":
-            sql = 'select distinct value from attribute where name=? and attr_type="file" and length(value)>0 limit 10'
-            cur.execute(sql, [attribute_name])
-            res = cur.fetchall()
-            for r in res:
-                tt += "\n" + r[0]
-            if len(tt) > 1:
-                tt = tt[1:]
-        return tt
+        return value_tooltip(self.attribute_summaries.get(("file", attribute_name)), None, 10)
 
     def fill_table(self):
         """ Fill the table widget with file details. """
@@ -2034,50 +1960,7 @@ class DialogManageFiles(QtWidgets.QDialog):
         self.ui.tableWidget.setColumnCount(len(self.header_labels))
         self.ui.tableWidget.setHorizontalHeaderLabels(self.header_labels)
         self.ui.tableWidget.horizontalHeader().setStretchLastSection(False)
-        rows = self.ui.tableWidget.rowCount()
-        for r in range(0, rows):
-            self.ui.tableWidget.removeRow(0)
-        for row, data in enumerate(self.source):
-            self.ui.tableWidget.insertRow(row)
-            icon = data['icon']
-            name_item = QtWidgets.QTableWidgetItem(data['name'])
-            name_item.setIcon(icon)
-            # Having un-editable file names helps with assigning icons
-            name_item.setFlags(name_item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
-            # Externally linked - add link details to tooltip
-            name_tt = data['metadata']
-            if data['mediapath'] is not None and ':' in data['mediapath']:
-                name_tt += _("\nExternally linked file:\n")
-                name_tt += data['mediapath']
-            name_item.setToolTip(name_tt)
-            self.ui.tableWidget.setItem(row, self.NAME_COLUMN, name_item)
-            date_item = QtWidgets.QTableWidgetItem(data['date'])
-            date_item.setFlags(date_item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
-            self.ui.tableWidget.setItem(row, self.DATE_COLUMN, date_item)
-            memo_string = ""
-            if data['memo'] != "":
-                memo_string = _("Memo")
-            memo_item = QtWidgets.QTableWidgetItem(memo_string)
-            if data['memo'] != "":
-                memo_item.setToolTip(data['memo'])
-            memo_item.setFlags(date_item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
-            self.ui.tableWidget.setItem(row, self.MEMO_COLUMN, memo_item)
-            fid = data['id']
-            if fid is None:
-                fid = ""
-            iditem = QtWidgets.QTableWidgetItem(str(fid))
-            iditem.setFlags(iditem.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
-            self.ui.tableWidget.setItem(row, self.ID_COLUMN, iditem)
-            case_item = QtWidgets.QTableWidgetItem(data['case'])
-            case_item.setFlags(case_item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
-            self.ui.tableWidget.setItem(row, self.CASE_COLUMN, case_item)
-            # Add the attribute values
-            # TODO consider using role type for numerics
-            for offset, attribute in enumerate(data['attributes']):
-                item = QtWidgets.QTableWidgetItem(attribute)
-                self.ui.tableWidget.setItem(row, self.ATTRIBUTE_START_COLUMN + offset, item)
-                if self.attribute_labels_ordered[offset] in ("Ref_Authors", "Ref_Title", "Ref_Type", "Ref_Year", "Ref_Journal"):
-                    item.setFlags(item.flags() ^ QtCore.Qt.ItemFlag.ItemIsEditable)
+        self.table_pager.reset(self.source)
         # Resize columns and rows
         self.ui.tableWidget.hideColumn(self.ID_COLUMN)
         if self.app.settings['showids']:
@@ -2089,6 +1972,7 @@ class DialogManageFiles(QtWidgets.QDialog):
         self.ui.tableWidget.resizeRowsToContents()
         #self.ui.tableWidget.verticalHeader().setVisible(False)
         # Add statistics tooltips to table headers for attributes
+        self.attribute_summaries = attribute_value_summaries(self.app.conn, "file", 10)
         for i, attribute_name in enumerate(self.attribute_labels_ordered):
             tt = self.get_tooltip_values(attribute_name)
             self.ui.tableWidget.horizontalHeaderItem(self.ATTRIBUTE_START_COLUMN + i).setToolTip(_("Right click header row to hide columns") + "\n" + tt)
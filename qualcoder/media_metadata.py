@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+import logging
+import os
+
+import PIL
+from PIL import Image
+from PyQt6 import QtCore, QtGui
+
+from .GUI import base64_helper
+
+# If VLC not installed, it will not crash
+vlc = None
+try:
+    import vlc
+except Exception as e:
+    print(e)
+
+logger = logging.getLogger(__name__)
+
+# Media file details for the Manage files table tooltips: byte size, image dimensions and A/V duration.
+# Reading these opens every image and parses every A/V file, so results are cached in the project database,
+# keyed by mediapath and checked against the file modification time and size.
+# Uncached files are read by background workers.
+
+_icons = {}
+_vlc_instance = None
+
+
+def get_icon(icon_name):
+    """ Get a QIcon made from base64_helper data, each icon is only decoded once.
+    param:
+        icon_name: String name of base64 png data in base64_helper, e.g. 'picture'
+    return:
+        QIcon
+    """
+
+    if icon_name not in _icons:
+        pm = QtGui.QPixmap()
+        pm.loadFromData(QtCore.QByteArray.fromBase64(getattr(base64_helper, icon_name)), "png")
+        _icons[icon_name] = QtGui.QIcon(pm)
+    return _icons[icon_name]
+
+
+def get_vlc_instance():
+    """ One VLC instance, shared by all metadata workers.
+    return:
+        vlc.Instance, or None if VLC is not installed or cannot be used
+    """
+
+    global _vlc_instance
+    if _vlc_instance is None and vlc:
+        try:
+            _vlc_instance = vlc.Instance()
+        except NameError as name_err:
+            # NameError: no function 'libvlc_new'
+            logger.error(f"vlc.Instance: {name_err}")
+    return _vlc_instance
+
+
+def file_stat(abs_path):
+    """ param: abs_path String
+    return: (modification time, bytes) or None if the file cannot be found """
+
+    try:
+        stat = os.stat(abs_path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def read_media_metadata(abs_path, media_type, vlc_instance=None):
+    """ Read media details from the file. Slow, so called from MediaMetadataWorker.
+    param:
+        abs_path: String
+        media_type: String 'image', 'audio' or 'video'
+        vlc_instance: vlc.Instance for audio and video
+    return:
+        Dictionary of mtime, bytes, duration (msecs), width, height, error
+    """
+
+    metadata = {'mtime': None, 'bytes': None, 'duration': None, 'width': None, 'height': None, 'error': ""}
+    stat = file_stat(abs_path)
+    if stat is None:
+        metadata['error'] = "Cannot locate media"
+        return metadata
+    metadata['mtime'], metadata['bytes'] = stat
+    if media_type == "image":
+        try:
+            with Image.open(abs_path) as image:
+                metadata['width'], metadata['height'] = image.size
+        except (FileNotFoundError, PIL.UnidentifiedImageError, AttributeError) as err:
+            metadata['error'] = str(err)
+    if media_type in ("audio", "video"):
+        if vlc_instance is None:
+            metadata['error'] = "VLC not installed"
+            return metadata
+        try:
+            media = vlc_instance.media_new(abs_path)
+            media.parse()
+            metadata['duration'] = media.get_duration()
+            media.release()
+        except AttributeError as err:
+            logger.warning(str(err))
+            metadata['error'] = str(err)
+    return metadata
+
+
+class MediaMetadataCache:
+    """ Media details cached in the media_metadata table of the project database.
+    The table is created by db_indexes.update_indexes when the project is opened.
+    Used by: manage_files.DialogManageFiles
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def get(self, mediapath, abs_path):
+        """ Get cached details, if the file has not changed since they were read.
+        param:
+            mediapath: String source.mediapath
+            abs_path: String absolute file path
+        return:
+            Dictionary of mtime, bytes, duration, width, height, error, or None if not cached or out of date
+        """
+
+        stat = file_stat(abs_path)
+        if stat is None:
+            return None
+        cur = self.app.conn.cursor()
+        cur.execute("select mtime, bytes, duration, width, height, ifnull(error,'') from media_metadata "
+                    "where mediapath=?", [mediapath])
+        res = cur.fetchone()
+        if res is None or res[0] != stat[0] or res[1] != stat[1]:
+            return None
+        keys = 'mtime', 'bytes', 'duration', 'width', 'height', 'error'
+        return dict(zip(keys, res))
+
+    def store(self, mediapath, metadata):
+        """ Cache media details. Files that cannot be found are not cached.
+        param:
+            mediapath: String source.mediapath
+            metadata: Dictionary from read_media_metadata
+        """
+
+        if metadata['mtime'] is None:
+            return
+        cur = self.app.conn.cursor()
+        cur.execute("insert or replace into media_metadata (mediapath, mtime, bytes, duration, width, height, "
+                    "error) values (?,?,?,?,?,?,?)",
+                    [mediapath, metadata['mtime'], metadata['bytes'], metadata['duration'], metadata['width'],
+                     metadata['height'], metadata['error']])
+        self.app.conn.commit()
+
+
+class MediaMetadataSignals(QtCore.QObject):
+    """ QRunnable is not a QObject, so signals are held here.
+    finished: mediapath, metadata Dictionary """
+
+    finished = QtCore.pyqtSignal(str, dict)
+
+
+class MediaMetadataWorker(QtCore.QRunnable):
+    """ Read media details in a QThreadPool thread. Does not use the database connection. """
+
+    def __init__(self, mediapath, abs_path, media_type, vlc_instance=None):
+        super().__init__()
+        self.mediapath = mediapath
+        self.abs_path = abs_path
+        self.media_type = media_type
+        self.vlc_instance = vlc_instance
+        self.signals = MediaMetadataSignals()
+
+    def run(self):
+        metadata = read_media_metadata(self.abs_path, self.media_type, self.vlc_instance)
+        self.signals.finished.emit(self.mediapath, metadata)
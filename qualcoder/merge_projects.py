@@ -30,6 +30,7 @@ import logging
 import os
 import shutil
 import sqlite3
+import time
 
 from PyQt6 import QtWidgets
 
@@ -38,6 +39,8 @@ from .helpers import Message
 path = os.path.abspath(os.path.dirname(__file__))
 logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 10000  # Rows per executemany call, the merge can be cancelled between batches
+
 
 class MergeProjects:
     """ Merge one external Qualcoder project (source) database into existing project (destination).
@@ -70,6 +73,11 @@ class MergeProjects:
     attributes_s = []  # values for Case and File attributes
     cases_s = []  # cases
     case_text_s = []  # case text and links to non-text files
+    file_id_map = {}  # Source project file id: destination file id
+    code_id_map = {}  # Source project code id: destination code id
+    case_id_map = {}  # Source project case id: destination case id
+    cancelled = False
+    prog_dialog = None
     projects_merged = False
 
     def __init__(self, app, path_s):
@@ -78,28 +86,91 @@ class MergeProjects:
         self.conn_s = sqlite3.connect(os.path.join(self.path_s, 'data.qda'))
         self.conn_d = self.app.conn
         self.path_d = self.app.project_path
+        self.file_id_map = {}
+        self.code_id_map = {}
+        self.case_id_map = {}
+        self.cancelled = False
+        self.prog_dialog = None
         self.summary_msg = _("Merging: ") + self.path_s + "\n" + _("Into: ") + self.app.project_path + "\n"
+        start_time = time.perf_counter()
         self.copy_source_files_into_destination()
         loaded = self.get_source_data()
-        if loaded:
-            msg, backup_name = self.app.save_backup("_Pre-merge")
-            self.summary_msg += f"\n{msg}"
-            self.insert_sources_get_new_file_ids()
-            self.update_coding_file_ids()
-            self.insert_categories()
-            self.update_code_cid_and_insert_code()
-            self.insert_coding_and_journal_data()
-            self.insert_cases()
-            self.insert_new_attribute_types()
-            self.insert_attributes()
-            self.summary_msg += _("Finished merging " + self.path_s + " into " + self.path_d) + "\n"
-            self.summary_msg += _(
-                "Existing values in destination project are not over-written, apart from blank attribute values.") + "\n"
-            Message(self.app, _('Project merged'), _("Review the action log for details.")).exec()
-            self.projects_merged = True
-            self.app.delete_backup = False
-        else:
+        if not loaded:
             Message(self.app, _('Project not merged'), _("Project not merged")).exec()
+            return
+        msg, backup_name = self.app.save_backup("_Pre-merge")
+        self.summary_msg += f"\n{msg}"
+        merged = self.merge_in_transaction()
+        self.summary_msg += _("Merge time: ") + f"{time.perf_counter() - start_time:.1f} " + _("seconds") + "\n"
+        if not merged:
+            Message(self.app, _('Project not merged'), _("Review the action log for details.")).exec()
+            return
+        self.summary_msg += _("Finished merging " + self.path_s + " into " + self.path_d) + "\n"
+        self.summary_msg += _(
+            "Existing values in destination project are not over-written, apart from blank attribute values.") + "\n"
+        Message(self.app, _('Project merged'), _("Review the action log for details.")).exec()
+        self.projects_merged = True
+        self.app.delete_backup = False
+
+    def merge_in_transaction(self):
+        """ Run the merge steps in one transaction, with a progress dialog.
+        The transaction is rolled back if the merge is cancelled or fails.
+        return: True if merged """
+
+        steps = [(_("Adding files"), self.insert_sources_get_new_file_ids),
+                 (_("Adding files"), self.update_coding_file_ids),
+                 (_("Adding categories"), self.insert_categories),
+                 (_("Adding codes"), self.update_code_cid_and_insert_code),
+                 (_("Adding codings and journals"), self.insert_coding_and_journal_data),
+                 (_("Adding cases"), self.insert_cases),
+                 (_("Adding attributes"), self.insert_new_attribute_types),
+                 (_("Adding attributes"), self.insert_attributes)]
+        self.prog_dialog = QtWidgets.QProgressDialog(_("Merging projects"), _("Cancel"), 0, len(steps), None)
+        self.prog_dialog.setWindowTitle(_("Merge projects"))
+        self.prog_dialog.setMinimumDuration(0)
+        try:
+            for i, (label, step) in enumerate(steps):
+                self.prog_dialog.setLabelText(label)
+                self.prog_dialog.setValue(i)
+                QtWidgets.QApplication.processEvents()
+                if self.prog_dialog.wasCanceled():
+                    self.cancelled = True
+                if self.cancelled:
+                    break
+                step()
+        except sqlite3.Error as err:
+            self.conn_d.rollback()
+            logger.error(str(err))
+            self.summary_msg += _("Merge error: ") + str(err) + "\n" + _("Project not merged") + "\n"
+            return False
+        except Exception:
+            # e.g. KeyError or OSError copying files. Not left open, as a later commit would keep a partial merge
+            self.conn_d.rollback()
+            raise
+        finally:
+            self.prog_dialog.close()
+        if self.cancelled:
+            self.conn_d.rollback()
+            self.summary_msg += _("Merge cancelled. Project not merged") + "\n"
+            return False
+        self.conn_d.commit()
+        return True
+
+    def executemany_batches(self, cur, sql, rows):
+        """ Insert rows in batches. Events are processed between batches, so the merge can be cancelled.
+        param:
+            cur: destination cursor
+            sql: String insert or update statement
+            rows: list of tuples
+        """
+
+        for start in range(0, len(rows), BATCH_SIZE):
+            if self.cancelled:
+                return
+            cur.executemany(sql, rows[start:start + BATCH_SIZE])
+            QtWidgets.QApplication.processEvents()
+            if self.prog_dialog is not None and self.prog_dialog.wasCanceled():
+                self.cancelled = True
 
     def insert_categories(self):
         """ Insert categories into destination code_cat table.
@@ -108,6 +179,8 @@ class MergeProjects:
          """
 
         cur_d = self.conn_d.cursor()
+        cur_d.execute("select name, catid from code_cat")
+        dest_catids = {name: catid for name, catid in cur_d.fetchall()}
         # Insert top level categories
         remove_list = []
         for c in self.categories_s:
@@ -115,7 +188,7 @@ class MergeProjects:
                 self.summary_msg += _("Adding top level category: ") + c['name'] + "\n"
                 cur_d.execute("insert into code_cat (name,memo,owner,date,supercatid) values(?,?,?,?,?)",
                               (c['name'], c['memo'], c['owner'], c['date'], c['supercatid']))
-                self.conn_d.commit()
+                dest_catids[c['name']] = cur_d.lastrowid
                 remove_list.append(c)
         for item in remove_list:
             self.categories_s.remove(item)
@@ -127,13 +200,11 @@ class MergeProjects:
             remove_list = []
             for c in self.categories_s:
                 # This needs to be repeated as it is changes
-                cur_d.execute("select catid from code_cat where name=?", [c['supercatname']])
-                res_category = cur_d.fetchone()
-                if res_category is not None:
+                if c['supercatname'] in dest_catids:
                     remove_list.append(c)
                     sql = "insert into code_cat (name, memo, owner, date, supercatid) values (?,?,?,?,?)"
-                    cur_d.execute(sql, [c['name'], c['memo'], c['owner'], c['date'], res_category[0]])
-                    self.conn_d.commit()
+                    cur_d.execute(sql, [c['name'], c['memo'], c['owner'], c['date'], dest_catids[c['supercatname']]])
+                    dest_catids[c['name']] = cur_d.lastrowid
                     self.summary_msg += _("Adding sub-category: " + c['name']) + " --> " + c['supercatname'] + "\n"
             for item in remove_list:
                 self.categories_s.remove(item)
@@ -151,43 +222,30 @@ class MergeProjects:
 
         cur_d = self.conn_d.cursor()
         cur_d.execute("select name, catid from code_cat")
-        dest_categories = cur_d.fetchall()
-
-        sql = "select cid, name from code_name"
-        cur_d.execute(sql)
-        res = cur_d.fetchall()
-        for code_dest in res:
-            for code_source in self.codes_s:
-                if code_source['name'] == code_dest[1]:
-                    code_source['newcid'] = code_dest[0]
+        dest_categories = {name: catid for name, catid in cur_d.fetchall()}
+        cur_d.execute("select name, cid from code_name")
+        dest_codes = {name: cid for name, cid in cur_d.fetchall()}
+        for code_s in self.codes_s:
+            if code_s['name'] in dest_codes:
+                code_s['newcid'] = dest_codes[code_s['name']]
 
         # Insert unmatched code names
         for code_s in self.codes_s:
             if code_s['newcid'] == -1:
                 # Fill category id using matching category name
-                for cat in dest_categories:
-                    if cat[0] == code_s['catname']:
-                        code_s['catid'] = cat[1]
+                if code_s['catname'] in dest_categories:
+                    code_s['catid'] = dest_categories[code_s['catname']]
                 cur_d.execute("insert into code_name (name,memo,owner,date,catid,color) values(?,?,?,?,?,?)",
                               (code_s['name'], code_s['memo'], code_s['owner'], code_s['date'], code_s['catid'],
                                code_s['color']))
-                self.conn_d.commit()
-                cur_d.execute("select last_insert_rowid()")
-                cid = cur_d.fetchone()[0]
-                code_s['newcid'] = cid
+                code_s['newcid'] = cur_d.lastrowid
                 self.summary_msg += _("Adding code name: ") + code_s['name'] + "\n"
+            self.code_id_map[code_s['cid']] = code_s['newcid']
 
         # Update code_text, code_image, code_av cids to destination values
-        for code_s in self.codes_s:
-            for coding_text in self.code_text_s:
-                if coding_text['cid'] == code_s['cid']:
-                    coding_text['newcid'] = code_s['newcid']
-            for coding_image in self.code_image_s:
-                if coding_image['cid'] == code_s['cid']:
-                    coding_image['newcid'] = code_s['newcid']
-            for coding_av in self.code_av_s:
-                if coding_av['cid'] == code_s['cid']:
-                    coding_av['newcid'] = code_s['newcid']
+        for codings in (self.code_text_s, self.code_image_s, self.code_av_s):
+            for coding in codings:
+                coding['newcid'] = self.code_id_map.get(coding['cid'], -1)
 
     def insert_coding_and_journal_data(self):
         """ Coding fid and cid have been updated, annotation fid has been updated.
@@ -197,112 +255,79 @@ class MergeProjects:
         # Earlier db versions did not have unique journal name
         # Need to identify duplicate journal names and not import them
         cur_d.execute("select name from journal")
-        j_names_res = cur_d.fetchall()
-        j_names = [j[0] for j in j_names_res]
-        '''for j in j_names_res:
-            j_names.append(j[0])'''
+        j_names = set(j[0] for j in cur_d.fetchall())
         for j in self.journals_s:
             # Possible to have two identical journal names in earlier db versions
             if j['name'] not in j_names:
                 cur_d.execute("insert into journal (name, jentry, date, owner) values(?,?,?,?)",
                               (j['name'], j['jentry'], j['date'], j['owner']))
                 self.summary_msg += _("Adding journal: ") + j['name'] + "\n"
-                self.conn_d.commit()
-        for s in self.stored_sql_s:
-            # Cannot have two identical stored_sql titles, using 'or ignore'
-            cur_d.execute("insert or ignore into stored_sql (title, description, grouper, ssql) values(?,?,?,?)",
-                          (s['title'], s['description'], s['grouper'], s['ssql']))
-            self.conn_d.commit()
-        for c in self.code_text_s:
-            cur_d.execute("insert or ignore into code_text (cid,fid,seltext,pos0,pos1,owner,\
-                memo,date, important) values(?,?,?,?,?,?,?,?,?)", (c['newcid'], c['newfid'],
-                                                                   c['seltext'], c['pos0'], c['pos1'], c['owner'],
-                                                                   c['memo'], c['date'], c['important']))
-            self.conn_d.commit()
+        # Cannot have two identical stored_sql titles, using 'or ignore'
+        self.executemany_batches(cur_d, "insert or ignore into stored_sql (title, description, grouper, ssql) "
+                                        "values(?,?,?,?)",
+                                 [(s['title'], s['description'], s['grouper'], s['ssql']) for s in self.stored_sql_s])
+        rows = [(c['newcid'], c['newfid'], c['seltext'], c['pos0'], c['pos1'], c['owner'], c['memo'], c['date'],
+                 c['important']) for c in self.code_text_s]
+        self.executemany_batches(cur_d, "insert or ignore into code_text (cid,fid,seltext,pos0,pos1,owner,memo,date, "
+                                        "important) values(?,?,?,?,?,?,?,?,?)", rows)
         if len(self.code_text_s) > 0:
-            self.summary_msg += _("Merging coded text") + "\n"
-        for a in self.annotations_s:
-            cur_d.execute("insert or ignore into annotation (fid,pos0,pos1,memo,owner,date) values(?,?,?,?,?,?)",
-                          [a["newfid"], a["pos0"], a["pos1"], a["memo"], a["owner"], a["date"]])
-            self.conn_d.commit()
+            self.summary_msg += _("Merging coded text") + ": n=" + str(len(rows)) + "\n"
+        rows = [(a["newfid"], a["pos0"], a["pos1"], a["memo"], a["owner"], a["date"]) for a in self.annotations_s]
+        self.executemany_batches(cur_d, "insert or ignore into annotation (fid,pos0,pos1,memo,owner,date) "
+                                        "values(?,?,?,?,?,?)", rows)
         if len(self.annotations_s) > 0:
-            self.summary_msg += _("Merging annotations") + "\n"
-        for c in self.code_image_s:
-            cur_d.execute(
-                "insert or ignore into code_image (cid, id,x1,y1,width,height,memo,owner,date,important) values(?,?,?,?,?,?,?,?,?,?)",
-                [c["newcid"], c["newfid"], c["x1"], c["y1"], c["width"], c["height"], c["memo"], c["owner"], c["date"],
-                 c["important"]])
-            self.conn_d.commit()
+            self.summary_msg += _("Merging annotations") + ": n=" + str(len(rows)) + "\n"
+        rows = [(c["newcid"], c["newfid"], c["x1"], c["y1"], c["width"], c["height"], c["memo"], c["owner"],
+                 c["date"], c["important"]) for c in self.code_image_s]
+        self.executemany_batches(cur_d, "insert or ignore into code_image (cid, id,x1,y1,width,height,memo,owner,"
+                                        "date,important) values(?,?,?,?,?,?,?,?,?,?)", rows)
         if len(self.code_image_s) > 0:
-            self.summary_msg += _("Merging coded image areas") + "\n"
-        for c in self.code_av_s:
-            cur_d.execute(
-                "insert or ignore into code_av (cid, id,pos0,pos1,memo,owner,date,important) values(?,?,?,?,?,?,?,?)",
-                [c["newcid"], c["newfid"], c["pos0"], c["pos1"], c["memo"], c["owner"], c["date"], c["important"]])
-            self.conn_d.commit()
+            self.summary_msg += _("Merging coded image areas") + ": n=" + str(len(rows)) + "\n"
+        rows = [(c["newcid"], c["newfid"], c["pos0"], c["pos1"], c["memo"], c["owner"], c["date"], c["important"])
+                for c in self.code_av_s]
+        self.executemany_batches(cur_d, "insert or ignore into code_av (cid, id,pos0,pos1,memo,owner,date,important) "
+                                        "values(?,?,?,?,?,?,?,?)", rows)
         if len(self.code_av_s) > 0:
-            self.summary_msg += _("Merging coded audio/video segments") + "\n"
+            self.summary_msg += _("Merging coded audio/video segments") + ": n=" + str(len(rows)) + "\n"
 
     def insert_cases(self):
         """ Insert case data into destination.
         First remove all existing matching case names and the associated case text data.
         """
 
-        cur_d = self.app.conn.cursor()
+        cur_d = self.conn_d.cursor()
         # Remove all duplicate cases and case text lists from source data
         cur_d.execute("select name from cases")
-        res_cases_dest = cur_d.fetchall()
-        existing_case_names = [r[0] for r in res_cases_dest]
-        '''for r in res_cases_dest:
-            existing_case_names.append(r[0])'''
-        remove_case_list = []
-        for case_s in self.cases_s:
-            if case_s['name'] in existing_case_names:
-                remove_case_list.append(case_s)
-        removed_case_text_list = []
-        for removed_case in remove_case_list:
-            self.cases_s.remove(removed_case)
-            for case_text in self.case_text_s:
-                if case_text['caseid'] == removed_case['caseid']:
-                    removed_case_text_list.append(case_text)
-        for removed_case_text in removed_case_text_list:
-            self.case_text_s.remove(removed_case_text)
+        existing_case_names = set(r[0] for r in cur_d.fetchall())
+        removed_case_ids = set(case_s['caseid'] for case_s in self.cases_s if case_s['name'] in existing_case_names)
+        self.cases_s = [case_s for case_s in self.cases_s if case_s['caseid'] not in removed_case_ids]
+        self.case_text_s = [case_text for case_text in self.case_text_s if case_text['caseid'] not in removed_case_ids]
 
         # Insert new cases into destination
         new_case_ids = []
         for case_s in self.cases_s:
             cur_d.execute("insert into cases (name, memo, owner, date) values (?,?,?,?)",
                           [case_s['name'], case_s['memo'], case_s['owner'], case_s['date']])
-            self.app.conn.commit()
-            cur_d.execute("select last_insert_rowid()")
-            case_id = cur_d.fetchone()[0]
-            case_s['newcaseid'] = case_id
-            new_case_ids.append(case_id)
+            case_s['newcaseid'] = cur_d.lastrowid
+            self.case_id_map[case_s['caseid']] = case_s['newcaseid']
+            new_case_ids.append(case_s['newcaseid'])
             self.summary_msg += _("Adding case: ") + case_s['name'] + "\n"
         # Update newcaseid and newfid in case_text
         for case_text in self.case_text_s:
-            for case_s in self.cases_s:
-                if case_s['caseid'] == case_text['caseid']:
-                    case_text['newcaseid'] = case_s['newcaseid']
-            for file_ in self.source_s:
-                if case_text['fid'] == file_['newid']:
-                    case_text['newfid'] = file_['newid']
+            case_text['newcaseid'] = self.case_id_map.get(case_text['caseid'], -1)
+            case_text['newfid'] = self.file_id_map.get(case_text['fid'], -1)
         # Insert case text if newfileid is not -1 and newcaseid is not -1
-        for c in self.case_text_s:
-            if c['newcaseid'] > -1 and c['newfid'] > -1:
-                cur_d.execute("insert into case_text (caseid,fid,pos0,pos1) values(?,?,?,?)",
-                              [c['newcaseid'], c['newfid'], c['pos0'], c['pos1']])
-                self.app.conn.commit()
+        rows = [(c['newcaseid'], c['newfid'], c['pos0'], c['pos1']) for c in self.case_text_s
+                if c['newcaseid'] > -1 and c['newfid'] > -1]
+        self.executemany_batches(cur_d, "insert into case_text (caseid,fid,pos0,pos1) values(?,?,?,?)", rows)
         # Create attribute placeholders for the destination case attributes
         now_date = datetime.datetime.now().astimezone().strftime("%Y-%m-%d %H:%M:%S")
-        sql_attribute_types = 'select name from attribute_type where caseOrFile ="case"'
-        cur_d.execute(sql_attribute_types)
+        cur_d.execute('select name from attribute_type where caseOrFile ="case"')
         res_attr_types = cur_d.fetchall()
-        sql_attribute = "insert into attribute (name, attr_type, value, id, date, owner) values(?,'file','',?,?,?)"
-        for id_ in new_case_ids:
-            for attribute_name in res_attr_types:
-                cur_d.execute(sql_attribute, [attribute_name[0], id_, now_date, self.app.settings['codername']])
-                self.app.conn.commit()
+        rows = [(attribute_name[0], id_, now_date, self.app.settings['codername']) for id_ in new_case_ids
+                for attribute_name in res_attr_types]
+        self.executemany_batches(cur_d, "insert into attribute (name, attr_type, value, id, date, owner) "
+                                        "values(?,'case','',?,?,?)", rows)
 
     def insert_sources_get_new_file_ids(self):
         """ Insert Source.source into Destination.source, unless source file name is already present.
@@ -312,65 +337,48 @@ class MergeProjects:
 
         new_source_file_ids = []
         cur_d = self.conn_d.cursor()
+        cur_d.execute("select name, id, length(fulltext) from source")
+        dest_sources = {name: (id_, text_length) for name, id_, text_length in cur_d.fetchall()}
         for src in self.source_s:
-            cur_d.execute("select id, length(fulltext) from source where name=?", [src['name']])
-            res = cur_d.fetchone()
-            if res is not None:
+            if src['name'] in dest_sources:
                 # Existing same named source file is in the destination database
-                src['newid'] = res[0]
+                src['newid'], text_length = dest_sources[src['name']]
                 # Warn user if the source and destination fulltexts are different lengths
                 # Occurs if one of the texts was edited or replaced
-                if len(src['fulltext']) != res[1]:
+                if src['fulltext'] is not None and len(src['fulltext']) != text_length:
                     msg = _("Warning! Inaccurate coding positions. Text lengths different for same text file: ")
                     msg += src['name'] + "\n"
                     msg += _("Import project file text length: ") + str(len(src['fulltext'])) + "  "
-                    msg += _("Destination project file text length: ") + str(res[1]) + "\n"
+                    msg += _("Destination project file text length: ") + str(text_length) + "\n"
                     self.summary_msg += msg
             else:
                 # To update the av_text_id after all new ids have been generated
                 cur_d.execute(
                     "insert into source(name,fulltext,mediapath,memo,owner,date, av_text_id) values(?,?,?,?,?,?,?)",
                     (src['name'], src['fulltext'], src['mediapath'], src['memo'], src['owner'], src['date'], None))
-                self.conn_d.commit()
-                cur_d.execute("select last_insert_rowid()")
-                id_ = cur_d.fetchone()[0]
-                src['newid'] = id_
-                new_source_file_ids.append(id_)
+                src['newid'] = cur_d.lastrowid
+                dest_sources[src['name']] = (src['newid'], None)
+                new_source_file_ids.append(src['newid'])
+            self.file_id_map[src['id']] = src['newid']
         # Need to find matching av_text_filename to get its id to link as the av_text_id
-        for src in self.source_s:
-            if src['av_text_filename'] != "":
-                cur_d.execute("select id from source where name=?", [src['av_text_filename']])
-                res = cur_d.fetchone()
-                if res is not None:
-                    cur_d.execute("update source set av_text_id=? where id=?", [res[0], src['id']])
-                    self.conn_d.commit()
+        rows = [(dest_sources[src['av_text_filename']][0], src['newid']) for src in self.source_s
+                if src['av_text_filename'] != "" and src['av_text_filename'] in dest_sources]
+        self.executemany_batches(cur_d, "update source set av_text_id=? where id=?", rows)
         # Create attribute placeholders for the destination file attributes
         now_date = datetime.datetime.now().astimezone().strftime("%Y-%m-%d %H:%M:%S")
-        sql_attribute_types = 'select name from attribute_type where caseOrFile ="file"'
-        cur_d.execute(sql_attribute_types)
+        cur_d.execute('select name from attribute_type where caseOrFile ="file"')
         res_attr_types = cur_d.fetchall()
-        sql_attribute = "insert into attribute (name, attr_type, value, id, date, owner) values(?,'file','',?,?,?)"
-        for id_ in new_source_file_ids:
-            for attribute_name in res_attr_types:
-                cur_d.execute(sql_attribute, [attribute_name[0], id_, now_date, self.app.settings['codername']])
-                self.app.conn.commit()
+        rows = [(attribute_name[0], id_, now_date, self.app.settings['codername']) for id_ in new_source_file_ids
+                for attribute_name in res_attr_types]
+        self.executemany_batches(cur_d, "insert into attribute (name, attr_type, value, id, date, owner) "
+                                        "values(?,'file','',?,?,?)", rows)
 
     def update_coding_file_ids(self):
         """ Update the file ids in the codings and annotations data. """
 
-        for src in self.source_s:
-            for c_text in self.code_text_s:
-                if c_text['fid'] == src['id']:
-                    c_text['newfid'] = src['newid']
-            for an in self.annotations_s:
-                if an['fid'] == src['id']:
-                    an['newfid'] = src['newid']
-            for c_img in self.code_image_s:
-                if c_img['fid'] == src['id']:
-                    c_img['newfid'] = src['newid']
-            for c_av in self.code_av_s:
-                if c_av['fid'] == src['id']:
-                    c_av['newfid'] = src['newid']
+        for codings in (self.code_text_s, self.annotations_s, self.code_image_s, self.code_av_s):
+            for coding in codings:
+                coding['newfid'] = self.file_id_map.get(coding['fid'], -1)
 
     def copy_source_files_into_destination(self):
         """ Copy source files into destination project.
@@ -397,28 +405,24 @@ class MergeProjects:
         To be performed after Cases and files have been inserted.
         """
 
-        cur_d = self.app.conn.cursor()
+        cur_d = self.conn_d.cursor()
         cur_d.execute("select id from source")
         res_file_ids = cur_d.fetchall()
         cur_d.execute("select caseid from cases")
         res_case_ids = cur_d.fetchall()
+        sql = "insert into attribute (name, value, id, attr_type, date, owner) values (?,?,?,?,?,?)"
         # Insert new attribute type and placeholder in attribute table
         for a in self.attribute_types_s:
             cur_d.execute("insert into attribute_type (name,date,owner,memo,caseOrFile, valuetype) values(?,?,?,?,?,?)",
                           (a['name'], a['date'], a['owner'], a['memo'], a['caseOrFile'], a['valuetype']))
-            self.app.conn.commit()
             self.summary_msg += _("Adding attribute (") + a['caseOrFile'] + "): " + a['name'] + "\n"
             # Create attribute placeholders for new attributes, does NOT create for existing destination attributes
             if a['caseOrFile'] == "file":
-                for id_ in res_file_ids:
-                    sql = "insert into attribute (name, value, id, attr_type, date, owner) values (?,?,?,?,?,?)"
-                    cur_d.execute(sql, (a['name'], "", id_[0], "file", a['date'], a['owner']))
-                    self.app.conn.commit()
+                self.executemany_batches(cur_d, sql, [(a['name'], "", id_[0], "file", a['date'], a['owner'])
+                                                      for id_ in res_file_ids])
             if a['caseOrFile'] == "case":
-                for id_ in res_case_ids:
-                    sql = "insert into attribute (name, value, id, attr_type, date, owner) values (?,?,?,?,?,?)"
-                    cur_d.execute(sql, (a['name'], "", id_[0], "case", a['date'], a['owner']))
-                    self.app.conn.commit()
+                self.executemany_batches(cur_d, sql, [(a['name'], "", id_[0], "case", a['date'], a['owner'])
+                                                      for id_ in res_case_ids])
 
     def insert_attributes(self):
         """ Insert new attribute values for files and cases.
@@ -431,30 +435,27 @@ class MergeProjects:
         sql_update = "update attribute set value=? where name=? and id=? and attr_type=? and value=''"
         # Insert if a placeholder is missing
         sql_insert = "insert into attribute (name,id,attr_type,value,date,owner) values (?,?,?,?,?,?)"
-        attribute_count = 0
-        cur_d = self.app.conn.cursor()
+        cur_d = self.conn_d.cursor()
+        cur_d.execute("select name, id, attr_type from attribute")
+        existing_attributes = set(cur_d.fetchall())
+        insert_rows = []
+        update_rows = []
         for a in self.attributes_s:
             if a['attr_type'] == "file":
-                source_dict = next((item for item in self.source_s if item["id"] == a['id']), {'newid': -1})
-                a['newid'] = source_dict['newid']
+                a['newid'] = self.file_id_map.get(a['id'], -1)
             if a['attr_type'] == "case":
-                case_dict = next((item for item in self.cases_s if item["caseid"] == a['id']), {'newcaseid': -1})
-                a['newid'] = case_dict['newcaseid']
+                a['newid'] = self.case_id_map.get(a['id'], -1)
             # Only update or insert value does not over-write an existing placeholder attribute value
             if a['newid'] != -1:
                 # Check placeholder exists, if not then insert values
-                cur_d.execute("select * from attribute where name=? and id=? and attr_type=?",
-                              [a['name'], a['newid'], a['attr_type']])
-                res = cur_d.fetchall()
-                if not res:
-                    cur_d.execute(sql_insert,
-                                  (a['name'], a['newid'], a['attr_type'], a['value'], a['date'], a['owner']))
-                    self.app.conn.commit()
-                    attribute_count += 1
+                if (a['name'], a['newid'], a['attr_type']) not in existing_attributes:
+                    insert_rows.append((a['name'], a['newid'], a['attr_type'], a['value'], a['date'], a['owner']))
+                    existing_attributes.add((a['name'], a['newid'], a['attr_type']))
                 else:
-                    cur_d.execute(sql_update, (a['value'], a['name'], a['newid'], a['attr_type']))
-                    self.app.conn.commit()
-                    attribute_count += 1
+                    update_rows.append((a['value'], a['name'], a['newid'], a['attr_type']))
+        self.executemany_batches(cur_d, sql_insert, insert_rows)
+        self.executemany_batches(cur_d, sql_update, update_rows)
+        attribute_count = len(insert_rows) + len(update_rows)
         if attribute_count > 0:
             self.summary_msg += _("Added attribute values for cases and files: n=") + str(attribute_count) + "\n"
 
@@ -467,6 +468,7 @@ class MergeProjects:
 
         self.journals_s = []
         self.stored_sql_s = []
+        self.source_s = []
         self.codes_s = []
         self.categories_s = []
         self.code_text_s = []
@@ -511,12 +513,10 @@ class MergeProjects:
                    "owner": i[5], "date": i[6], "av_text_id": i[7], "av_text_filename": ""}
             self.source_s.append(src)
         # The av_text_id is not enough to recreate linkages. Need the referenced text file name.
+        source_names = {i[0]: i[1] for i in res_source}
         for i in self.source_s:
-            if i['av_text_id'] is not None:
-                cur_s.execute("select name from source where id=?", [i['av_text_id']])
-                res = cur_s.fetchone()
-                if res is not None:
-                    i['av_text_filename'] = res[0]
+            if i['av_text_id'] is not None and i['av_text_id'] in source_names:
+                i['av_text_filename'] = source_names[i['av_text_id']]
         # Category data
         sql_codecats = "select catid, supercatid, name, memo, owner, date from code_cat"
         cur_s.execute(sql_codecats)
@@ -538,11 +538,10 @@ class MergeProjects:
                 temp_source_cats.append(cat)
         self.categories_s = temp_source_cats
         # Add reference to linked supercat using category name
+        category_names = {i[0]: i[2] for i in res_codecats}
         for cat in self.categories_s:
-            cur_s.execute("select name from code_cat where catid=?", [cat['supercatid']])
-            res = cur_s.fetchone()
-            if res is not None:
-                cat['supercatname'] = res[0]
+            if cat['supercatid'] in category_names:
+                cat['supercatname'] = category_names[cat['supercatid']]
         # Code data
         sql_codenames = "select cid, name, memo, owner, date, color, catid from code_name"
         cur_s.execute(sql_codenames)
@@ -553,10 +552,8 @@ class MergeProjects:
             self.codes_s.append(code_s)
         # Get and fill category name if code is in a category
         for code_s in self.codes_s:
-            cur_s.execute("select name from code_cat where catid=?", [code_s['catid']])
-            res = cur_s.fetchone()
-            if res is not None:
-                code_s['catname'] = res[0]
+            if code_s['catid'] in category_names:
+                code_s['catname'] = category_names[code_s['catid']]
         # Code text data
         sql_codetext = "select cid, fid, seltext, pos0, pos1, owner, date, memo, important from code_text"
         cur_s.execute(sql_codetext)
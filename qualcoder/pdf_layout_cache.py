@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+
+import base64
+import hashlib
+import json
+import logging
+import os
+
+from PyQt6 import QtCore, QtGui
+
+logger = logging.getLogger(__name__)
+
+# PDF page layouts for Code PDF, cached in the project folder, keyed by a hash of the PDF file contents.
+# Running the pdfminer interpreter over every page is slow, so on first opening the page layouts are stored:
+# an index file of page sizes and page text character positions, and a pages file of one JSON document per page.
+# On later openings only the index is read, each page is read from the pages file when it is shown.
+# Embedded images are stored as raw data and only decoded for the shown page.
+# Used by: code_pdf
+
+LAYOUT_VERSION = 1  # Increase when the page dictionary format changes, so old cached layouts are not used
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(filepath):
+    """ SHA-256 of the file contents, read in chunks.
+    param:
+        filepath: String
+    return:
+        String hex digest
+    """
+
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def decode_page_images(page):
+    """ Decode the embedded image data of a page into QImages, scaled to the image size on the page.
+    QImage can be used outside the GUI thread, so this is also called by PdfPagePrefetchWorker.
+    param:
+        page: Dictionary of page layout, images are updated in place
+    """
+
+    for img in page['images']:
+        if 'qimage' in img:
+            continue
+        img['qimage'] = None
+        if not img.get('data'):
+            continue
+        image = QtGui.QImage()
+        image.loadFromData(img['data'])
+        if not image.isNull():
+            img['qimage'] = image.scaled(int(img['w']), int(img['h']))
+
+
+class PdfLayoutCache:
+    """ Page layouts of one PDF file, cached in the project folder cache/pdf_layouts directory.
+    File names are the hash of the PDF contents, so a changed PDF is laid out again.
+    """
+
+    def __init__(self, app, filepath):
+        """ param:
+            app: App
+            filepath: String absolute path of the PDF file
+        """
+
+        self.directory = os.path.join(app.project_path, "cache", "pdf_layouts")
+        self.key = file_hash(filepath)
+        self.index_path = os.path.join(self.directory, self.key + ".json")
+        self.pages_path = os.path.join(self.directory, self.key + ".pages")
+
+    def read_index(self):
+        """ Read the cached page index.
+        return:
+            Dictionary of text_length and pages, a list of Dictionaries of pagenum, mediabox, plain_text_start,
+            plain_text_end, offset, length. None if not cached or from an older layout version
+        """
+
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get('version') != LAYOUT_VERSION or not os.path.exists(self.pages_path):
+            return None
+        return index
+
+    def read_page(self, page_entry):
+        """ Read one page layout from the pages file.
+        param:
+            page_entry: Dictionary from the index pages list
+        return:
+            Dictionary of page layout, with mediabox, text_boxes, lines, curves, images, rect, plain_text
+        """
+
+        with open(self.pages_path, 'rb') as f:
+            f.seek(page_entry['offset'])
+            page = json.loads(f.read(page_entry['length']).decode('utf-8'))
+        for text_box in page['text_boxes']:
+            text_box['graphic_item_ref'] = None
+        for img in page['images']:
+            if img.get('data'):
+                img['data'] = base64.b64decode(img['data'])
+        page.update({k: v for k, v in page_entry.items() if k not in ('offset', 'length')})
+        return page
+
+    def store(self, pages, text_length):
+        """ Write the page layouts. Colors and other pdfminer values that are not JSON types are stored as text.
+        Any error is logged, as the cache is not required to display the PDF.
+        param:
+            pages: List of page layout Dictionaries
+            text_length: Integer length of the whole PDF text
+        """
+
+        index = {'version': LAYOUT_VERSION, 'text_length': text_length, 'pages': []}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.pages_path, 'wb') as f:
+                for page in pages:
+                    page_json = {k: v for k, v in page.items() if k not in ('pagenum', 'plain_text_start',
+                                                                         'plain_text_end')}
+                    page_json['text_boxes'] = [{k: v for k, v in tb.items() if k != 'graphic_item_ref'}
+                                               for tb in page['text_boxes']]
+                    page_json['images'] = []
+                    for img in page['images']:
+                        img_json = {k: v for k, v in img.items() if k not in ('pixmap', 'qimage')}
+                        if img.get('data'):
+                            img_json['data'] = base64.b64encode(img['data']).decode('ascii')
+                        page_json['images'].append(img_json)
+                    data = json.dumps(page_json, default=str).encode('utf-8')
+                    index['pages'].append({'pagenum': page['pagenum'], 'mediabox': list(page['mediabox']),
+                                           'plain_text_start': page['plain_text_start'],
+                                           'plain_text_end': page['plain_text_end'],
+                                           'offset': f.tell(), 'length': len(data)})
+                    f.write(data)
+            # Index is written last, so an incomplete pages file is never used
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, default=str)
+        except (OSError, TypeError, ValueError) as err:
+            logger.warning(f"PDF layout cache not stored: {err}")
+
+
+class PdfPagePrefetchSignals(QtCore.QObject):
+    """ QRunnable is not a QObject, so signals are held here.
+    finished: cache key, page number, page Dictionary. Sent as object, to keep the image data and QImages """
+
+    finished = QtCore.pyqtSignal(str, int, object)
+
+
+class PdfPagePrefetchWorker(QtCore.QRunnable):
+    """ Read a cached page layout and decode its images in a QThreadPool thread.
+    Does not use the database connection. """
+
+    def __init__(self, cache, page_entry):
+        super().__init__()
+        self.cache = cache
+        self.page_entry = page_entry
+        self.signals = PdfPagePrefetchSignals()
+
+    def run(self):
+        try:
+            page = self.cache.read_page(self.page_entry)
+        except (OSError, ValueError) as err:
+            logger.warning(f"PDF page prefetch: {err}")
+            return
+        decode_page_images(page)
+        self.signals.finished.emit(self.cache.key, self.page_entry['pagenum'], page)
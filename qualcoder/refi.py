@@ -29,6 +29,7 @@ https://qualcoder.wordpress.com/
 from copy import copy
 import datetime
 import html
+import io
 import logging
 from operator import itemgetter
 import os
@@ -66,6 +67,8 @@ except Exception as e:
 path = os.path.abspath(os.path.dirname(__file__))
 logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 10000  # Coding rows per executemany call when importing a project
+
 
 class RefiImport:
     """ Import Rotterdam Exchange Format Initiative (refi) xml documents for codebook.xml
@@ -81,12 +84,15 @@ class RefiImport:
     """
 
     file_path = None
-    folder_name = ""  # Temporary extract folder name
+    project_zip = None  # zipfile.ZipFile of the qdpx, source files are read from it
+    zip_names = set()  # Set of file names in the qdpx zipfile
     codes = []
+    code_ids = {}  # Dictionary of code guid: cid
     users = []
+    user_names = {}  # Dictionary of user guid: name
     cases = []
     sources = []  # List of Dictionary of mediapath, guid, memo, owner, date, id, fulltext
-    sources_name = "/Sources"  # Sources folder can be named Sources or sources
+    sources_name = "Sources"  # Sources folder can be named Sources or sources
     # List of Dictionaries of Variable guid, name, variable application (cases or files), last_insert_id, text or other
     variables = []
     file_vars = []  # Values for each variable for each file Found within Cases Case tag
@@ -102,6 +108,9 @@ class RefiImport:
     # Progress dialog
     pd = None
     pd_value = 0
+    # Coding inserts are batched, Dictionary of sql: list of values
+    insert_batches = {}
+    duplicated_codings = {}  # Table name: count of ignored duplicated rows
 
     def __init__(self, app, parent_textedit, import_type):
 
@@ -110,7 +119,13 @@ class RefiImport:
         self.import_type = import_type
         self.tree = None
         self.codes = []
+        self.code_ids = {}
         self.users = []
+        self.user_names = {}
+        self.links = []
+        self.annotations = []
+        self.insert_batches = {}
+        self.duplicated_codings = {}
         self.cases = []
         # Sources: name id fulltext mediapath memo owner date
         self.sources = []
@@ -317,37 +332,32 @@ class RefiImport:
 
         Or they can be Absolute paths
         path="absolute:///hiome/username/Documents/DF370983‐F009‐4D47‐8615‐711633FA9DE6.m4a"
+
+        The qdpx is not extracted. The project.qde xml is parsed with iterparse, in two passes, see
+        parse_project_elements and parse_sources, and source files are read from the zipfile.
         """
 
-        # Create temporary extract folder
-        self.folder_name = self.file_path[:-4] + "_temporary"
         self.parent_textedit.append(_("Reading from: ") + self.file_path)
-        self.parent_textedit.append(_("Creating temporary directory: ") + self.folder_name)
-        # Unzip qpdx folder
-        project_zip = zipfile.ZipFile(self.file_path)
-        project_zip.extractall(self.folder_name)
-        project_zip.close()
+        self.project_zip = zipfile.ZipFile(self.file_path)
+        self.zip_names = set(self.project_zip.namelist())
 
         # Set up progress dialog
         # Source loading can be slow, so use this for the progress dialog
         # Sources folder name can be capital or lower case, check and get the correct one
-        contents = os.listdir(self.folder_name)
-        self.sources_name = "/Sources"
-        for i in contents:
-            if i == "sources":
-                self.sources_name = "/sources"
-        num_sources = len(os.listdir(self.folder_name + self.sources_name))
+        self.sources_name = "Sources"
+        for zip_name in self.zip_names:
+            if zip_name.startswith("sources/"):
+                self.sources_name = "sources"
+                break
+        num_sources = len([n for n in self.zip_names if n.startswith(self.sources_name + "/")])
         self.pd = QtWidgets.QProgressDialog(_("Project Import"), "", 0, num_sources, None)
         self.pd.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
         self.pd_value = 0
 
         # Parse xml for users, codebook, sources, journals, project description, variable names
-        with open(self.folder_name + "/project.qde", "r", encoding="utf8") as xml_file:
-            self.xml = xml_file.read()
         result = self.xml_validation("project")
         self.parent_textedit.append("Project XML parsing successful: " + str(result))
-        tree = etree.parse(self.folder_name + "/project.qde")  # get element tree object
-        root = tree.getroot()
+        root = self.parse_project_elements()
         # Must parse Project tag first to get software_name
         # This is used when importing - especially from ATLAS.ti
         self.parse_project_tag(root)
@@ -364,6 +374,7 @@ class RefiImport:
                 for code in codes:
                     # Recursive search through each Code in Codes
                     count += self.sub_codes(code, None)
+                self.code_ids = {c['guid']: c['cid'] for c in self.codes}
                 self.parent_textedit.append(_("Parse codes and categories. Loaded: " + str(count)))
             if c.tag == "{urn:QDA-XML:project:1.0}Variables":
                 count = self.parse_variables(c)
@@ -390,8 +401,16 @@ class RefiImport:
         children = list(root)  # root.getchildren()
         for c in children:
             if c.tag == "{urn:QDA-XML:project:1.0}Sources":
-                count = self.parse_sources(c)
+                count = self.parse_sources()
                 self.parent_textedit.append(_("Parsing sources. Loaded: " + str(count)))
+                for table, count in self.duplicated_codings.items():
+                    if count == 0:
+                        continue
+                    if table == "code_text":
+                        self.parent_textedit.append(_("Duplicated text coding for code and coder. Only one loaded.") +
+                                                    " " + str(count))
+                    else:
+                        self.parent_textedit.append(_("Duplicated rows ignored") + " " + table + ": " + str(count))
 
         # Parse Notes after sources. Notes contain journals and also text annotations
         for c in children:
@@ -423,11 +442,7 @@ class RefiImport:
 
         # Wrap up
         self.parent_textedit.append(self.file_path + _(" loaded."))
-        # Remove temporary extract folder
-        try:
-            shutil.rmtree(self.folder_name)
-        except OSError as err:
-            logger.debug(str(err) + " " + self.folder_name)
+        self.project_zip.close()
         # Change the username to an owner name from the import
         if len(self.users) > 0:
             self.app.settings['codername'] = self.users[0]['name']
@@ -443,6 +458,112 @@ class RefiImport:
         msg += _("Select a coder name in Settings dropbox, otherwise coded text and media may appear uncoded.")
         Message(self.app, _('REFI-QDA Project import'), msg, "warning").exec()
 
+    def project_qde_name(self):
+        """ The name of the .qde project xml file in the qdpx zipfile, usually project.qde """
+
+        for zip_name in self.zip_names:
+            if zip_name.lower().endswith(".qde") and "/" not in zip_name:
+                return zip_name
+        return "project.qde"
+
+    def parse_project_elements(self):
+        """ First pass through the project xml with iterparse.
+        Keeps the Project element and its children, apart from the contents of the Sources element.
+        Each source, with its selections, is discarded once parsed, sources are loaded in the second pass by
+        parse_sources. So memory use does not grow with the number of coded selections.
+        Called by: import_project
+
+        return: Project root element
+        """
+
+        root = None
+        sources_element = None
+        depth = 0
+        with self.project_zip.open(self.project_qde_name()) as qde:
+            for event, el in etree.iterparse(qde, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        root = el
+                    if depth == 2 and el.tag == "{urn:QDA-XML:project:1.0}Sources":
+                        sources_element = el
+                    continue
+                if depth == 3 and sources_element is not None:
+                    sources_element.remove(el)
+                if depth == 2:
+                    sources_element = None
+                depth -= 1
+        return root
+
+    def open_source_file(self, path_):
+        """ Open an internal source file from the qdpx zipfile, or an external file, for binary reading.
+
+        param path_: String zipfile name e.g. Sources/guid.txt, or file system path
+        return: binary file object
+        """
+
+        if path_ in self.zip_names:
+            return self.project_zip.open(path_)
+        return open(path_, "rb")
+
+    def read_source_text(self, path_, errors="replace"):
+        """ Read a utf-8 text file from the qdpx zipfile, or an external file.
+
+        param path_: String zipfile name or file system path
+        param errors: String unicode decode error handler
+        return: String of text
+        """
+
+        with io.TextIOWrapper(self.open_source_file(path_), encoding="utf-8", errors=errors) as f:
+            return f.read()
+
+    def copy_source_file(self, path_, destination):
+        """ Copy a source file from the qdpx zipfile, or an external file, into the project folder.
+
+        param path_: String zipfile name or file system path
+        param destination: String file system path
+        """
+
+        with self.open_source_file(path_) as source_file, open(destination, "wb") as destination_file:
+            shutil.copyfileobj(source_file, destination_file)
+
+    def user_name(self, element):
+        """ Get the name of the creating, or if missing the modifying, user of this element.
+
+        param element: xml element with a creatingUser or modifyingUser attribute
+        return: String user name, or 'default' if not found
+        """
+
+        creating_user_guid = element.get("creatingUser")
+        if creating_user_guid is None:
+            creating_user_guid = element.get("modifyingUser")
+        return self.user_names.get(creating_user_guid, "default")
+
+    def batch_insert(self, sql, values):
+        """ Add a row to a batch of inserts. Codings are inserted with executemany, in batches.
+        Duplicated codings are ignored and counted for each table.
+
+        param sql: String insert or ignore sql
+        param values: tuple of values
+        """
+
+        batch = self.insert_batches.setdefault(sql, [])
+        batch.append(values)
+        if len(batch) >= BATCH_SIZE:
+            self.flush_inserts()
+
+    def flush_inserts(self):
+        """ Insert all batched rows and commit. """
+
+        cur = self.app.conn.cursor()
+        for sql, batch in self.insert_batches.items():
+            if batch:
+                cur.executemany(sql, batch)
+                table = sql.split(" into ")[1].split()[0]
+                self.duplicated_codings[table] = self.duplicated_codings.get(table, 0) + len(batch) - cur.rowcount
+        self.app.conn.commit()
+        self.insert_batches = {}
+
     def parse_links(self, element):
         """ Parse Links element for each Link and add to list.
         Nvivo - Links PlainTextSelection to Note. Note contains the plaintext.txt annotation text.
@@ -465,18 +586,17 @@ class RefiImport:
             if source_path is not None:
                 try:
                     source_path = source_path.split('internal:/')[1]
-                    source_path = self.folder_name + self.sources_name + source_path
+                    source_path = self.sources_name + source_path
                 except IndexError:
                     print("IndexError notinternal: source path", source_path)
                     source_path = None
             if source_path:
                 try:
-                    with open(source_path, encoding='utf-8', errors='replace') as f:
-                        fulltext = f.read()
-                        for lnk in self.links:
-                            #print(lnk['originGUID'], " link --- note", note_guid)
-                            if note_guid == lnk['originGUID']:
-                                lnk['text'] = fulltext
+                    fulltext = self.read_source_text(source_path)
+                    for lnk in self.links:
+                        #print(lnk['originGUID'], " link --- note", note_guid)
+                        if note_guid == lnk['originGUID']:
+                            lnk['text'] = fulltext
                 except Exception as err:
                     print("Error Note text source", source_path, err)
                     logger.warning(str(err))
@@ -749,7 +869,7 @@ class RefiImport:
             cur.execute(sql, c)
             self.app.conn.commit()
 
-    def parse_sources(self, element):
+    def parse_sources(self):
         """ Parse the Sources element.
         This contains text and media sources as well as variables describing the source and coding information.
         Example format:
@@ -766,37 +886,66 @@ class RefiImport:
         In MAXQDA qdpx folder - there has been one example of text sources wit hthe same name.
         To work around this: Add a suffix to the text source.
 
-        param element: Sources element object
+        Second pass through the project xml with iterparse. Each source element is loaded when it has been
+        parsed and then discarded. Codings are batched, see batch_insert.
+        Called by: import_project
 
         return: count of sources
         """
 
         count = 0
-        for el in list(element):  # element.getchildren():
-            # print(e.tag, e.get("name"))
-            if el.tag == "{urn:QDA-XML:project:1.0}TextSource":
-                self.pd_value += 1
-                self.pd.setValue(self.pd_value)
-                self.load_text_source(el)
-            if el.tag == "{urn:QDA-XML:project:1.0}PictureSource":
-                self.pd_value += 1
-                self.pd.setValue(self.pd_value)
-                self.load_picture_source(el)
-            if el.tag == "{urn:QDA-XML:project:1.0}AudioSource":
-                self.pd_value += 1
-                self.pd.setValue(self.pd_value)
-                self.load_audio_source(el)
-            if el.tag == "{urn:QDA-XML:project:1.0}VideoSource":
-                self.pd_value += 1
-                self.pd.setValue(self.pd_value)
-                self.load_video_source(el)
-            if el.tag == "{urn:QDA-XML:project:1.0}PDFSource":
-                self.pd_value += 1
-                self.pd.setValue(self.pd_value)
-                self.load_pdf_source(el)
-            count += 1
+        root = None
+        sources_element = None
+        depth = 0
+        with self.project_zip.open(self.project_qde_name()) as qde:
+            for event, el in etree.iterparse(qde, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        root = el
+                    if depth == 2 and el.tag == "{urn:QDA-XML:project:1.0}Sources":
+                        sources_element = el
+                    continue
+                if depth == 3 and sources_element is not None:
+                    self.load_source(el)
+                    sources_element.remove(el)
+                    count += 1
+                if depth == 2:
+                    # Other top level elements were parsed in the first pass
+                    sources_element = None
+                    root.remove(el)
+                depth -= 1
+        self.flush_inserts()
         return count
 
+    def load_source(self, el):
+        """ Load a TextSource, PictureSource, AudioSource, VideoSource or PDFSource element.
+        Called by: parse_sources
+
+        param el: source element object
+        """
+
+        if el.tag == "{urn:QDA-XML:project:1.0}TextSource":
+            self.pd_value += 1
+            self.pd.setValue(self.pd_value)
+            self.load_text_source(el)
+        if el.tag == "{urn:QDA-XML:project:1.0}PictureSource":
+            self.pd_value += 1
+            self.pd.setValue(self.pd_value)
+            self.load_picture_source(el)
+        if el.tag == "{urn:QDA-XML:project:1.0}AudioSource":
+            self.pd_value += 1
+            self.pd.setValue(self.pd_value)
+            self.load_audio_source(el)
+        if el.tag == "{urn:QDA-XML:project:1.0}VideoSource":
+            self.pd_value += 1
+            self.pd.setValue(self.pd_value)
+            self.load_video_source(el)
+        if el.tag == "{urn:QDA-XML:project:1.0}PDFSource":
+            self.pd_value += 1
+            self.pd.setValue(self.pd_value)
+            self.load_pdf_source(el)
+
     def name_creating_user_create_date_source_path_helper(self, element):
         """ Helper method to obtain name, guid, creating user, create date, path type from each source.
          The sources folder can be named: sources or Sources
@@ -806,13 +955,7 @@ class RefiImport:
         """
 
         name = element.get("name")
-        creating_user_guid = element.get("creatingUser")
-        if creating_user_guid is None:
-            creating_user_guid = element.get("modifyingUser")
-        creating_user = "default"
-        for u in self.users:
-            if u['guid'] == creating_user_guid:
-                creating_user = u['name']
+        creating_user = self.user_name(element)
         create_date = element.get("creationDateTime")
         if create_date is None:
             create_date = element.get("modifiedDateTime")
@@ -823,26 +966,21 @@ class RefiImport:
         create_date = create_date.replace('Z', '')
         # path_ starts with internal:// or relative:// (with<Project basePath or absolute
         path_ = element.get("path")
-        # Sources folder name can be capital or lower case, check and get the correct one
-        contents = os.listdir(self.folder_name)
-        self.sources_name = "/Sources"
-        for i in contents:
-            if i == "sources":
-                self.sources_name = "/sources"
         # Determine internal or external path
+        # Internal paths are file names in the qdpx zipfile, in the Sources or sources folder
         source_path = ""
         rich_text_path = ""
         path_type = ""
         if path_ is None:
-            source_path = self.folder_name + self.sources_name + element.get("plainTextPath").split('internal:/')[1]
+            source_path = self.sources_name + element.get("plainTextPath").split('internal:/')[1]
             if element.get("richTextPath") is not None:
-                rich_text_path = self.folder_name + self.sources_name + element.get("richTextPath").split('internal:/')[1]
+                rich_text_path = self.sources_name + element.get("richTextPath").split('internal:/')[1]
             path_type = "internal"
         if path_ is not None and path_.find("internal://") == 0:
             path_ = element.get("path").split('internal:/')[1]
-            source_path = self.folder_name + self.sources_name + path_
+            source_path = self.sources_name + path_
             if element.get("richTextPath") is not None:
-                rich_text_path = self.folder_name + self.sources_name + element.get("richTextPath").split('internal:/')[1]
+                rich_text_path = self.sources_name + element.get("richTextPath").split('internal:/')[1]
             path_type = "internal"
         if path_ is not None and path_.find("relative://") == 0:
             source_path = self.base_path + path_.split('relative://')[1]
@@ -870,7 +1008,7 @@ class RefiImport:
             destination = os.path.join(self.app.project_path, "images", name)
             media_path = "/images/" + name
             try:
-                shutil.copyfile(source_path, destination)
+                self.copy_source_file(source_path, destination)
             except (FileNotFoundError, PermissionError, shutil.SameFileError) as err:
                 self.parent_textedit.append(
                     _('Cannot copy Image file from: ') + source_path + "\nto: " + destination + '\n' + str(err))
@@ -924,29 +1062,15 @@ class RefiImport:
             create_date = element.get("modifiedDateTime")
         create_date = create_date.replace('T', ' ')
         create_date = create_date.replace('Z', '')
-        creating_user_guid = element.get("creatingUser")
-        if creating_user_guid is None:
-            creating_user_guid = element.get("modifyingUser")
-        creating_user = "default"
-        for u in self.users:
-            if u['guid'] == creating_user_guid:
-                creating_user = u['name']
-        cur = self.app.conn.cursor()
+        creating_user = self.user_name(element)
         for el in element:
             if el.tag == "{urn:QDA-XML:project:1.0}Coding":
                 # Get the code id from the CodeRef guid
-                cid = None
                 code_ref = list(el)[0]  # el.getchildren()[0]
-                for c in self.codes:
-                    if c['guid'] == code_ref.get("targetGUID"):
-                        cid = c['cid']
-                try:
-                    cur.execute("insert into code_image (id,x1,y1,width,height,cid,memo,\
-                        date, owner) values(?,?,?,?,?,?,?,?,?)", (id_, first_x, first_y,
-                                                                  width, height, cid, memo, create_date, creating_user))
-                    self.app.conn.commit()
-                except sqlite3.IntegrityError:
-                    pass
+                cid = self.code_ids.get(code_ref.get("targetGUID"))
+                self.batch_insert("insert or ignore into code_image (id,x1,y1,width,height,cid,memo,date,owner) "
+                                  "values(?,?,?,?,?,?,?,?,?)",
+                                  (id_, first_x, first_y, width, height, cid, memo, create_date, creating_user))
 
     def load_audio_source(self, element):
         """ Load audio source into .
@@ -966,7 +1090,7 @@ class RefiImport:
             destination = os.path.join(self.app.project_path, "audio", name)
             media_path = "/audio/" + name
             try:
-                shutil.copyfile(source_path, destination)
+                self.copy_source_file(source_path, destination)
             except Exception as err:
                 self.parent_textedit.append(
                     _('Cannot copy Audio file from: ') + source_path + "\nto: " + destination + '\n' + str(err))
@@ -1028,7 +1152,7 @@ class RefiImport:
             destination = os.path.join(self.app.project_path, "video", name)
             media_path = "/video/" + name
             try:
-                shutil.copyfile(source_path, destination)
+                self.copy_source_file(source_path, destination)
             except (FileNotFoundError, PermissionError, shutil.SameFileError) as err:
                 self.parent_textedit.append(
                     _('Cannot copy Video file from: ') + source_path + "\nto: " + destination + '\n' + str(err))
@@ -1092,13 +1216,7 @@ class RefiImport:
 
         # Change transcript filename to match the audio/video name, unless .srt
         # Add ".transcribed" suffix so qualcoder can interpret as a transcription for this a/v file.
-        creating_user_guid = element.get("creatingUser")
-        if creating_user_guid is None:
-            creating_user_guid = element.get("modifyingUser")
-        creating_user = "default"
-        for u in self.users:
-            if u['guid'] == creating_user_guid:
-                creating_user = u['name']
+        creating_user = self.user_name(element)
         create_date = element.get("creationDateTime")
         if create_date is None:
             create_date = element.get("modifiedDateTime")
@@ -1128,16 +1246,14 @@ class RefiImport:
             destination = self.app.project_path + "/audio/" + name
         else:
             destination = self.app.project_path + "/documents/" + name
-        # Sources folder name can be capital or lower case, check and get the correct one
-        # Not Used: contents = os.listdir(self.folder_name)
-        source_path = self.folder_name + self.sources_name
+        source_path = self.sources_name
         if source_path[-1] != "/":
             source_path += "/"
         source_path += plain_text_path
         # print("Source path: ", source_path)
         # print("Destination: ", destination)
         try:
-            shutil.copyfile(source_path, destination)
+            self.copy_source_file(source_path, destination)
         except shutil.Error as err:
             msg = _('Cannot copy transcript file from: ') + source_path + "\nto: " + destination + '\n' + str(err)
             logger.debug(msg)
@@ -1222,16 +1338,14 @@ class RefiImport:
                 for el_child in list(el):  # el.getchildren():
                     if el_child.tag == "{urn:QDA-XML:project:1.0}Coding":
                         code_ref = list(el_child)[0]  # el_child.getchildren()[0]
-                        for c in self.codes:
-                            if c['guid'] == code_ref.get("targetGUID"):
-                                cid = c['cid']
-                                value_list.append(
-                                    [cid, fid, text[pos0:pos1], pos0, pos1, creating_user, create_date, memo, av_id])
+                        cid = self.code_ids.get(code_ref.get("targetGUID"))
+                        if cid is not None:
+                            value_list.append(
+                                [cid, fid, text[pos0:pos1], pos0, pos1, creating_user, create_date, memo, av_id])
         sql = "insert into code_text (cid, fid, seltext, pos0, pos1, owner, date, memo, avid) "
         sql += " values (?,?,?,?,?,?,?,?,?)"
         cur = self.app.conn.cursor()
-        for v in value_list:
-            cur.execute(sql, v)
+        cur.executemany(sql, value_list)
         self.app.conn.commit()
 
     def load_codings_for_audio_video(self, id_, element):
@@ -1259,15 +1373,8 @@ class RefiImport:
             create_date = datetime.datetime.now().astimezone().strftime("%Y-%m-%d_%H:%M:%S")
         create_date = create_date.replace('T', ' ')
         create_date = create_date.replace('Z', '')
-        creating_user_guid = element.get("creatingUser")
-        if creating_user_guid is None:
-            creating_user_guid = element.get("modifyingUser")
-        creating_user = "default"
-        for u in self.users:
-            if u['guid'] == creating_user_guid:
-                creating_user = u['name']
+        creating_user = self.user_name(element)
 
-        cur = self.app.conn.cursor()
         memo = ""
         for el in element:
             if el.tag == "{urn:QDA-XML:project:1.0}Description":
@@ -1277,18 +1384,11 @@ class RefiImport:
         for el in element:
             if el.tag == "{urn:QDA-XML:project:1.0}Coding":
                 # Get the code id from the CodeRef guid
-                cid = None
                 code_ref = list(el)[0]  # el.getchildren()[0]
-                for c in self.codes:
-                    if c['guid'] == code_ref.get("targetGUID"):
-                        cid = c['cid']
-                try:
-                    cur.execute("insert into code_av (id,pos0,pos1,cid,memo,\
-                        date, owner) values(?,?,?,?,?,?,?)", (id_, seg_start, seg_end,
-                                                              cid, memo, create_date, creating_user))
-                    self.app.conn.commit()
-                except sqlite3.IntegrityError:
-                    pass
+                cid = self.code_ids.get(code_ref.get("targetGUID"))
+                self.batch_insert("insert or ignore into code_av (id,pos0,pos1,cid,memo,date,owner) "
+                                  "values(?,?,?,?,?,?,?)",
+                                  (id_, seg_start, seg_end, cid, memo, create_date, creating_user))
 
     def load_pdf_source(self, element):
         """ Load the pdf and text representation into sqlite.
@@ -1312,7 +1412,7 @@ class RefiImport:
             destination = os.path.join(self.app.project_path, "documents", name)
             #print("destination: ", destination)
             try:
-                shutil.copyfile(source_path, destination)
+                self.copy_source_file(source_path, destination)
                 # print("PDF IMPORT", source_path, destination)
             except Exception as err:
                 self.parent_textedit.append(
@@ -1386,7 +1486,7 @@ class RefiImport:
 
         # Check plain text file line endings for Windows 2 character \r\n
         add_ending = False
-        with open(source_path, "rb") as f:
+        with self.open_source_file(source_path) as f:
             while True:
                 c = f.read(1)
                 if not c or c == b'\n':
@@ -1408,24 +1508,23 @@ class RefiImport:
 
         # Read the text and enter into sqlite source table
         try:
-            with open(source_path, encoding='utf-8', errors='replace') as f:
-                fulltext = f.read()
-                # Replace fixes mismatched coding with line endings on import from Windows text files.
-                # Due to 2 character line endings
-                if fulltext is not None and add_ending:
-                    fulltext = fulltext.replace('\n', '\n ')
-                source['fulltext'] = fulltext
-                # Adding split()- DOnt know why ?? - Removed
-                # OLD CODE: name + "." + source_path.split('.')[-1]
-                # NEW CODE: name
-                cur.execute("insert into source(name,fulltext,mediapath,memo,owner,date) values(?,?,?,?,?,?)",
-                            (name, fulltext, source['mediapath'], memo,
-                             creating_user, create_date))
-                self.app.conn.commit()
-                cur.execute("select last_insert_rowid()")
-                id_ = cur.fetchone()[0]
-                source['id'] = id_
-                self.sources.append(source)
+            fulltext = self.read_source_text(source_path)
+            # Replace fixes mismatched coding with line endings on import from Windows text files.
+            # Due to 2 character line endings
+            if fulltext is not None and add_ending:
+                fulltext = fulltext.replace('\n', '\n ')
+            source['fulltext'] = fulltext
+            # Adding split()- DOnt know why ?? - Removed
+            # OLD CODE: name + "." + source_path.split('.')[-1]
+            # NEW CODE: name
+            cur.execute("insert into source(name,fulltext,mediapath,memo,owner,date) values(?,?,?,?,?,?)",
+                        (name, fulltext, source['mediapath'], memo,
+                         creating_user, create_date))
+            self.app.conn.commit()
+            cur.execute("select last_insert_rowid()")
+            id_ = cur.fetchone()[0]
+            source['id'] = id_
+            self.sources.append(source)
         except Exception as err:
             print("Error text source", err)
             logger.warning(str(err))
@@ -1437,7 +1536,7 @@ class RefiImport:
             #print("source", source_path)
             #print("dest", destination)
             try:
-                shutil.copyfile(source_path, destination)
+                self.copy_source_file(source_path, destination)
             except Exception as err:
                 logger.warning(str(err))
                 self.parent_textedit.append(
@@ -1450,7 +1549,7 @@ class RefiImport:
                 cur.execute("update source set mediapath=? where id=?", ["/docs/" + name + '.' + rich_text_path.split('.')[-1], source['id']])
                 self.app.conn.commit()
                 try:
-                    shutil.copyfile(rich_text_path, rtf_destination)
+                    self.copy_source_file(rich_text_path, rtf_destination)
                 except Exception as err:
                     logger.warning(str(err))
                     self.parent_textedit.append(
@@ -1536,7 +1635,6 @@ class RefiImport:
         :param element - the PlainTextSelection element
         """
 
-        cur = self.app.conn.cursor()
         pos0 = int(element.get("startPosition"))
         pos1 = int(element.get("endPosition"))
         create_date = element.get("creationDateTime")
@@ -1544,13 +1642,7 @@ class RefiImport:
             create_date = element.get("modifiedDateTime")
         create_date = create_date.replace('T', ' ')
         create_date = create_date.replace('Z', '')
-        creating_user_guid = element.get("creatingUser")
-        if creating_user_guid is None:
-            creating_user_guid = element.get("modifyingUser")
-        creating_user = "default"
-        for u in self.users:
-            if u['guid'] == creating_user_guid:
-                creating_user = u['name']
+        creating_user = self.user_name(element)
         seltext = source['fulltext'][pos0:pos1]
 
         # The Description element text inside a PlainTextSelection is a coding memo
@@ -1563,20 +1655,12 @@ class RefiImport:
             if el.tag == "{urn:QDA-XML:project:1.0}Coding":
                 annotation = False
                 # Get the code id from the CodeRef guid
-                cid = None
                 code_ref = list(el)[0]  # el.getchildren()[0]
-                for c in self.codes:
-                    if c['guid'] == code_ref.get("targetGUID"):
-                        cid = c['cid']
-                try:
-                    cur.execute("insert into code_text (cid,fid,seltext,pos0,pos1,owner,\
-                        memo,date) values(?,?,?,?,?,?,?,?)", (cid, source['id'],
-                                                              seltext, pos0, pos1, creating_user, memo, create_date))
-                    self.app.conn.commit()
-                except sqlite3.IntegrityError:
-                    self.parent_textedit.append(_("Duplicated text coding for code and coder. Only one loaded.") +
-                                                " cid:" + str(cid) + " fid: " + str(source['id']) + _(" Positions:") +
-                                                str(pos0) + " - " + str(pos1))
+                cid = self.code_ids.get(code_ref.get("targetGUID"))
+                # Duplicated codings for code and coder are ignored and counted
+                self.batch_insert("insert or ignore into code_text (cid,fid,seltext,pos0,pos1,owner,memo,date) "
+                                  "values(?,?,?,?,?,?,?,?)",
+                                  (cid, source['id'], seltext, pos0, pos1, creating_user, memo, create_date))
         if annotation:
             if memo == "":
                 """ Nvivo stores text annotations as txt/docx documents. These are references in a Note.
@@ -1590,9 +1674,8 @@ class RefiImport:
                             memo = lnk['text']
                         except KeyError:
                             pass
-            sql = "insert into annotation (fid,pos0,pos1,memo,owner,date) values (?,?,?,?,?,?)"
-            cur.execute(sql, [source['id'], int(pos0), int(pos1), memo, creating_user, create_date])
-            self.app.conn.commit()
+            self.batch_insert("insert or ignore into annotation (fid,pos0,pos1,memo,owner,date) values (?,?,?,?,?,?)",
+                              (source['id'], int(pos0), int(pos1), memo, creating_user, create_date))
 
     def parse_notes(self, notes_element):
         """ Parse the Notes element.
@@ -1632,13 +1715,7 @@ class RefiImport:
                 create_date = el.get("modifiedDateTime")
             create_date = create_date.replace('T', ' ')
             create_date = create_date.replace('Z', '')
-            creating_user_guid = el.get("creatingUser")
-            if creating_user_guid is None:
-                creating_user_guid = el.get("modifyingUser")
-            creating_user = "default"
-            for u in self.users:
-                if u['guid'] == creating_user_guid:
-                    creating_user = u['name']
+            creating_user = self.user_name(el)
 
             # Check if the Note is a TextSource Annotation with Text stored in the Note
             # Text annotation can be as a plainTextPath from the note. This is obtained when getting Links
@@ -1658,11 +1735,10 @@ class RefiImport:
             if el.get("plainTextPath") is not None and not annotation and name != "":
                 path_ = el.get("plainTextPath").split('internal:/')[1]
                 # Folder can be named: sources or Sources
-                path_ = self.folder_name + self.sources_name + path_
+                path_ = self.sources_name + path_
                 jentry = ""
                 try:
-                    with open(path_) as f:
-                        jentry = f.read()
+                    jentry = self.read_source_text(path_, errors="strict")
                 except Exception as err:
                     self.parent_textedit.append(_('Trying to read Note element: ') + path_ + '\n' + str(err))
                 # Check journal name does not exist. If it exists, add 3 random numbers, fix for Integrity Error
@@ -1687,16 +1763,9 @@ class RefiImport:
         param: element The Note element
         """
 
-        user_guid = element.get("modifyingUser")
-        owner = None
-        for u in self.users:
-            if u['guid'] == user_guid:
-                owner = u['name']
+        owner = self.user_names.get(element.get("modifyingUser"))
         if owner is None:
-            user_guid = element.get("creatingUser")
-            for u in self.users:
-                if u['guid'] == user_guid:
-                    owner = u['name']
+            owner = self.user_names.get(element.get("creatingUser"))
         if owner is None:
             owner = self.app.settings['codername']
         date = element.get("modifiedDateTime")
@@ -1838,6 +1907,7 @@ class RefiImport:
         for el in list(element):  # element.getchildren():
             # print(e.tag, el.get("name"), el.get("guid"))
             self.users.append({"name": el.get("name"), "guid": el.get("guid")})
+            self.user_names[el.get("guid")] = el.get("name")
             count += 1
         return count
 
@@ -1883,7 +1953,9 @@ class RefiExport(QtWidgets.QDialog):
     codes = []
     users = []
     sources = []
-    guids = []
+    guids = set()  # Set of allocated guids, for constant time duplicate checks
+    user_guids = {}  # Dictionary of username: guid
+    code_guids = {}  # Dictionary of cid: guid
     note_files = []  # List of Dictionaries of guid.txt name and note text
     annotations = []  # List of Dictionaries of anid, fid, pos0, pos1, memo, owner, date
     variables = []  # List of Dictionaries of variable xml, guid, name
@@ -1900,6 +1972,7 @@ class RefiExport(QtWidgets.QDialog):
         self.parent_textedit = parent_textedit
         self.export_type = export_type
         self.xml = ""
+        self.guids = set()
         self.get_categories()
         self.get_codes()
         self.get_users()
@@ -1910,12 +1983,11 @@ class RefiExport(QtWidgets.QDialog):
             self.xml_validation("codebook")
             self.export_codebook()
         if self.export_type == "project":
-            self.project_xml()
-            self.xml_validation("project")
+            # The project xml is written in parts into the .qdpx zipfile, see export_project
             self.export_project()
 
     def export_project(self):
-        """ Create a REFI-QDA project folder project.qdpx zipfile
+        """ Create a REFI-QDA project.qdpx zipfile
         This contains the .qde project xml and a Sources folder.
 
         Source types:
@@ -1923,101 +1995,43 @@ class RefiExport(QtWidgets.QDialog):
         Images must be jpeg or png
         mp3, ogg, mp4, mov, wav
 
-        Create an unzipped folder with a /Sources folder and project.qde xml document
-        Then create zip wih suffix .qdpx
+        The zipfile is written directly, see write_project_archive. It is written to a .part file
+        first, which is renamed when complete, so a failed export does not leave a partial .qdpx.
 
         #TODO put file variables inside Cases.Case elements as with Quirkos
         """
 
-        project_name = self.app.project_name[:-4]
-        prep_path = os.path.join(os.path.expanduser('~'), '.qualcoder', project_name)
-        try:
-            shutil.rmtree(prep_path)
-        except FileNotFoundError:
-            pass
-        try:
-            os.mkdir(prep_path)
-            os.mkdir(os.path.join(prep_path, "Sources"))
-        except Exception as err:
-            logger.error(_("Project export error ") + str(err))
-            Message(self.app, _("Project"), _("Project not exported. Exiting. ") + str(err), "warning").exec()
-            return
-        try:
-            with open(os.path.join(prep_path, 'project.qde'), 'w', encoding="utf-8-sig") as f:
-                f.write(self.xml)
-        except Exception as err:
-            Message(self.app, _("Project"), _("Project not exported. Exiting. ") + str(err), "warning").exec()
-            logger.debug(str(err))
-            return
-
         add_line_ending_for_maxqda = False
         ui = RefiLineEndings(self.app)
         ui.exec()
         if ui.ui.radioButton_maxqda.isChecked():
             add_line_ending_for_maxqda = True
-        txt_errors = ""
-        for s in self.sources:
-            #print(s['id'], s['name'], s['mediapath'], s['filename'], s['plaintext_filename'], s['external'])
-            destination = '/Sources/' + s['filename']
-            if s['mediapath'] is not None and s['mediapath'] != "" and s['external'] is None:
-                #print("Source\n", self.app.project_path + s['mediapath'].replace("/docs/", "/documents/"))
-                #print("dest\n", prep_path + destination)
-                try:
-                    shutil.copyfile(self.app.project_path + s['mediapath'].replace("/docs/", "/documents/"),
-                                prep_path + destination)
-                except FileNotFoundError as err:
-                    print(err)
-                    logger.warning(err)
-
-            if (s['mediapath'] is None or s['mediapath'] == "") and s['external'] is None:  # an internal document
-                try:
-                    shutil.copyfile(os.path.join(self.app.project_path, 'documents', s['name']),
-                                    prep_path + destination)
-                except FileNotFoundError:
-                    with open(prep_path + destination, 'w', encoding="utf-8-sig") as f:
-                        f.write(s['fulltext'])
-            # Also need to export a plain text file as a source
-            # plaintext has different guid from richtext, and also might be associated with media - eg transcripts
-            if s['plaintext_filename'] is not None:
-                with open(os.path.join(prep_path, 'Sources', s['plaintext_filename']), "w", encoding="utf-8-sig") as f:
-                    try:
-                        if add_line_ending_for_maxqda:
-                            f.write(s['fulltext'].replace("\n", "\r\n"))
-                        else:
-                            f.write(s['fulltext'])
-                    except Exception as err:
-                        #txt_errors += '\nIn plaintext file export: ' + s['plaintext_filename'] + "\n" + str(err)
-                        logger.error(str(err) + '\nIn plaintext file export: ' + s['plaintext_filename'])
-                        print(err)
-
-        for notefile in self.note_files:
-            with open(os.path.join(prep_path, 'Sources', notefile[0]), "w", encoding="utf-8-sig") as f:
-                f.write(notefile[1])
         options = QtWidgets.QFileDialog.Option.DontResolveSymlinks | QtWidgets.QFileDialog.Option.ShowDirsOnly
         directory = QtWidgets.QFileDialog.getExistingDirectory(None,
                                                                _("Select directory to save file"),
                                                                self.app.settings['directory'], options)
-
-        export_path = directory + "/" + self.app.project_name[:-4]
-        shutil.make_archive(prep_path, 'zip', prep_path)
-        os.rename(prep_path + ".zip", prep_path + ".qdpx")
-
+        if directory == "":
+            return
+        export_path = os.path.join(directory, self.app.project_name[:-4])
         # Add suffix to project name if it already exists
+        filename = export_path + ".qdpx"
         counter = 0
-        while os.path.exists(export_path + ".qdpx"):
-            extension = ""
-            if counter > 0:
-                extension = "_" + str(counter)
-            export_path = export_path + extension
+        while os.path.exists(filename):
             counter += 1
-
-        shutil.copyfile(prep_path + ".qdpx", export_path + ".qdpx")
+            filename = f"{export_path}_{counter}.qdpx"
+        part_filename = filename + ".part"
         try:
-            shutil.rmtree(prep_path)
-            os.remove(prep_path + ".qdpx")
-        except FileNotFoundError as err:
-            logger.warning(str(err))
-        msg = export_path + ".qpdx\n"
+            txt_errors = self.write_project_archive(part_filename, add_line_ending_for_maxqda)
+            os.replace(part_filename, filename)
+        except Exception as err:
+            logger.error(_("Project export error ") + str(err))
+            try:
+                os.remove(part_filename)
+            except FileNotFoundError:
+                pass
+            Message(self.app, _("Project"), _("Project not exported. Exiting. ") + str(err), "warning").exec()
+            return
+        msg = filename + "\n"
         msg += _("REFI-QDA PROJECT EXPORT EXPERIMENTAL FUNCTION.\n")
         msg += _("This project exchange is not guaranteed compliant with the exchange standard.\n")
         if txt_errors != "":
@@ -2026,6 +2040,67 @@ class RefiExport(QtWidgets.QDialog):
         Message(self.app, _("Project exported"), _(msg)).exec()
         self.parent_textedit.append(_("Project exported") + "\n" + msg)
 
+    def write_project_archive(self, filename, add_line_ending_for_maxqda=False):
+        """ Write the project.qde xml and the Sources folder into a new zipfile.
+        The xml is written into the zip entry in parts, as it is created, and source files are read
+        from the project folder into the zipfile. There is no staging folder and the whole xml
+        document is not held in memory.
+        Called by: export_project
+
+        :param filename: String path of the zipfile to create
+        :param add_line_ending_for_maxqda: Boolean, use Windows line endings in plain text files
+
+        :returns String of errors, empty if none
+        """
+
+        txt_errors = ""
+        with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            # force_zip64, as the xml size is not known in advance and may be over 2GiB
+            with io.TextIOWrapper(zip_file.open('project.qde', 'w', force_zip64=True), encoding="utf-8-sig") as f:
+                for xml in self.project_xml_parts():
+                    f.write(xml)
+            for s in self.sources:
+                destination = 'Sources/' + s['filename']
+                if s['mediapath'] is not None and s['mediapath'] != "" and s['external'] is None:
+                    try:
+                        zip_file.write(self.app.project_path + s['mediapath'].replace("/docs/", "/documents/"),
+                                       destination)
+                    except FileNotFoundError as err:
+                        print(err)
+                        logger.warning(err)
+                if (s['mediapath'] is None or s['mediapath'] == "") and s['external'] is None:  # an internal document
+                    try:
+                        zip_file.write(os.path.join(self.app.project_path, 'documents', s['name']), destination)
+                    except FileNotFoundError:
+                        self.write_text_to_archive(zip_file, destination, s['fulltext'])
+                # Also need to export a plain text file as a source
+                # plaintext has different guid from richtext, and also might be associated with media - eg transcripts
+                if s['plaintext_filename'] is not None:
+                    try:
+                        if add_line_ending_for_maxqda:
+                            text = s['fulltext'].replace("\n", "\r\n")
+                        else:
+                            text = s['fulltext']
+                        self.write_text_to_archive(zip_file, 'Sources/' + s['plaintext_filename'], text)
+                    except Exception as err:
+                        logger.error(str(err) + '\nIn plaintext file export: ' + s['plaintext_filename'])
+                        print(err)
+            for notefile in self.note_files:
+                self.write_text_to_archive(zip_file, 'Sources/' + notefile[0], notefile[1])
+        return txt_errors
+
+    @staticmethod
+    def write_text_to_archive(zip_file, name, text):
+        """ Write text as a utf-8-sig file entry in the zipfile.
+
+        :param zip_file: zipfile.ZipFile open for writing
+        :param name: String name of the entry, e.g. Sources/guid.txt
+        :param text: String
+        """
+
+        with io.TextIOWrapper(zip_file.open(name, 'w', force_zip64=True), encoding="utf-8-sig") as f:
+            f.write(text)
+
     def export_codebook(self):
         """ Export REFI format codebook. """
 
@@ -2053,54 +2128,61 @@ class RefiExport(QtWidgets.QDialog):
     def user_guid(self, username):
         """ Requires a username. returns matching guid """
 
-        for u in self.users:
-            if u['name'] == username:
-                return u['guid']
-        return ""
+        return self.user_guids.get(username, "")
 
     def code_guid(self, code_id):
         """ Requires a code id. returns matching guid """
 
-        for c in self.codes:
-            if c['cid'] == code_id:
-                return c['guid']
-        return ""
+        return self.code_guids.get(code_id, "")
 
     def project_xml(self):
-        """ Creates the xml for the .qde file.
+        """ Creates the xml for the .qde file, as one String in self.xml.
         External files will be exported using absolute path
         So base path for external sources is not required.
         ? PDFSources ?
         No sets, No graphs.
         """
 
-        self.xml = '<?xml version="1.0" encoding="utf-8"?>\n'
-        self.xml += '<Project '
-        self.xml += 'xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
-        self.xml += 'name="' + html.escape(self.app.project_name) + '" '
-        self.xml += 'origin="' + self.app.version + '" '
+        self.xml = "".join(self.project_xml_parts())
+
+    def project_xml_parts(self):
+        """ Creates the xml for the .qde file in parts, so that large projects can be written to the
+        export file without holding the whole document in memory.
+        Sources and their coded selections are yielded one element at a time.
+        Called by: project_xml, write_project_archive
+
+        :returns generator of xml Strings
+        """
+
+        xml = '<?xml version="1.0" encoding="utf-8"?>\n'
+        xml += '<Project '
+        xml += 'xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        xml += 'name="' + html.escape(self.app.project_name) + '" '
+        xml += 'origin="' + self.app.version + '" '
         # There is no creating user in QualCoder
         guid = self.create_guid()
-        self.xml += 'creatingUserGUID="' + guid + '" '
+        xml += 'creatingUserGUID="' + guid + '" '
         cur = self.app.conn.cursor()
         cur.execute("select date from project")
         result = cur.fetchone()
-        self.xml += 'creationDateTime="' + self.convert_timestamp(result[0]) + '" '
-        # self.xml += 'basePath="' + self.app.settings['directory'] + '" '
-        self.xml += 'xmlns="urn:QDA-XML:project:1.0"'
-        self.xml += '>\n'
+        xml += 'creationDateTime="' + self.convert_timestamp(result[0]) + '" '
+        # xml += 'basePath="' + self.app.settings['directory'] + '" '
+        xml += 'xmlns="urn:QDA-XML:project:1.0"'
+        xml += '>\n'
         # add users
-        self.xml += "<Users>\n"
+        xml += "<Users>\n"
         for row in self.users:
-            self.xml += '<User guid="' + row['guid'] + '" name="' + html.escape(row['name']) + '" />\n'
-        self.xml += "</Users>\n"
-        self.xml += self.codebook_xml()
-        self.xml += self.variables_xml()
-        self.xml += self.cases_xml()
-        self.xml += self.sources_xml()
-        self.xml += self.notes_xml()
-        self.xml += self.project_description_xml()
-        self.xml += '</Project>'
+            xml += '<User guid="' + row['guid'] + '" name="' + html.escape(row['name']) + '" />\n'
+        xml += "</Users>\n"
+        yield xml
+        yield self.codebook_xml()
+        yield self.variables_xml()
+        yield self.cases_xml()
+        yield from self.sources_xml_parts()
+        # Notes are created after sources, as sources set the annotation NoteRef guids
+        yield self.notes_xml()
+        yield self.project_description_xml()
+        yield '</Project>'
 
     def variables_xml(self):
         """ Variables are associated with Sources and Cases.
@@ -2225,12 +2307,7 @@ class RefiExport(QtWidgets.QDialog):
             ann['NoteRef_guid'] = self.create_guid()
 
         xml = '<Note guid="' + ann['NoteRef_guid'] + '" '
-        user = ""
-        for u in self.users:
-            if u['name'] == ann['owner']:
-                user = u['guid']
-                break
-        xml += 'creatingUser="' + user + '" '
+        xml += 'creatingUser="' + self.user_guid(ann['owner']) + '" '
         xml += 'creationDateTime="' + self.convert_timestamp(ann['date']) + '" >\n'
         xml += f"<PlainTextContent>{ann['memo']}</PlainTextContent>\n"
         guid = self.create_guid()
@@ -2383,8 +2460,18 @@ class RefiExport(QtWidgets.QDialog):
         return xml
 
     def sources_xml(self):
+        """ Create xml for sources: text, pictures, pdf, audio, video.
+        Called by: project_xml
+
+        :returns xml String
+        """
+
+        return "".join(self.sources_xml_parts())
+
+    def sources_xml_parts(self):
         """ Create xml for sources: text, pictures, pdf, audio, video.
          Also add selections to each source.
+         Each source and each selection is yielded separately, so a large project is not held in memory.
 
         Audio and video source file size:
         The maximum size in bytes allowed for an internal file is 2,147,483,647 bytes (2^31−1 bytes, or 2 GiB
@@ -2423,14 +2510,15 @@ class RefiExport(QtWidgets.QDialog):
         Create an unzipped folder with a /Sources folder and project.qde xml document
         Then create zip wih suffix .qdpx
 
-        Called by: project_xml
+        Called by: sources_xml, project_xml_parts
 
-        :returns xml String
+        :returns generator of xml Strings
         """
 
         # TODO after Coding: NoteRef and VariableValue for each Source element
-        xml = "<Sources>\n"
+        yield "<Sources>\n"
         for s in self.sources:
+            xml = ""
             guid = self.create_guid()
             # Text document
             if ((s['mediapath'] is None) and (s['name'][-4:].lower() != '.pdf' and s['name'][-12:] != '.transcribed')) or \
@@ -2451,7 +2539,9 @@ class RefiExport(QtWidgets.QDialog):
                 memo = html.escape(s['memo'])
                 if memo != "":
                     xml += f"<Description>{memo}</Description>\n"
-                xml += self.text_selection_xml(s['id'])
+                yield xml
+                yield from self.text_selection_xml_parts(s['id'])
+                xml = ""
                 xml += self.source_variables_xml(s['id'])
                 for a in self.annotations:
                     if a['fid'] == s['id']:
@@ -2481,7 +2571,9 @@ class RefiExport(QtWidgets.QDialog):
                 xml += 'plainTextPath="internal://' + s['plaintext_filename'] + '" '
                 xml += 'creatingUser="' + self.user_guid(s['owner']) + '" '
                 xml += 'name="' + html.escape(s['name']) + '">\n'
-                xml += self.text_selection_xml(s['id'])
+                yield xml
+                yield from self.text_selection_xml_parts(s['id'])
+                xml = ""
                 for a in self.annotations:
                     if a['fid'] == s['id']:
                         a['NoteRef_guid'] = self.create_guid()
@@ -2504,7 +2596,9 @@ class RefiExport(QtWidgets.QDialog):
                 memo = html.escape(s['memo'])
                 if memo != '':
                     xml += f"<Description>{memo}</Description>\n"
-                xml += self.picture_selection_xml(s['id'])
+                yield xml
+                yield from self.picture_selection_xml_parts(s['id'])
+                xml = ""
                 xml += self.source_variables_xml(s['id'])
                 xml += '</PictureSource>\n'
             # Audio
@@ -2523,7 +2617,9 @@ class RefiExport(QtWidgets.QDialog):
                 if memo != '':
                     xml += f"<Description>{memo}</Description>\n"
                 xml += self.transcript_xml(s)
-                xml += self.av_selection_xml(s['id'], 'Audio')
+                yield xml
+                yield from self.av_selection_xml_parts(s['id'], 'Audio')
+                xml = ""
                 xml += self.source_variables_xml(s['id'])
                 xml += '</AudioSource>\n'
             # Video
@@ -2543,33 +2639,33 @@ class RefiExport(QtWidgets.QDialog):
                 if memo != '':
                     xml += f"<Description>{memo}</Description>\n"
                 xml += self.transcript_xml(s)
-                xml += self.av_selection_xml(s['id'], 'Video')
+                yield xml
+                yield from self.av_selection_xml_parts(s['id'], 'Video')
+                xml = ""
                 xml += self.source_variables_xml(s['id'])
                 xml += '</VideoSource>\n'
-        xml += "</Sources>\n"
-        return xml
+            yield xml
+        yield "</Sources>\n"
 
-    def text_selection_xml(self, id_):
+    def text_selection_xml_parts(self, id_):
         """ Get and complete text selection xml.
         xml is in form:
         <PlainTextSelection><Description></Description><Coding><CodeRef/></Coding></PlainTextSelection>
-        Called by: sources_xml
+        Called by: sources_xml_parts
 
         :param id_ file id integer
 
-        :returns xml string
+        :returns generator of xml Strings, one per selection
         """
 
-        xml = ""
         sql = "select cid, seltext, pos0, pos1, owner, date, ifnull(memo,'') from code_text "
         sql += "where fid=?"
         cur = self.app.conn.cursor()
         cur.execute(sql, [id_, ])
-        results = cur.fetchall()
-        for r in results:
+        for r in cur:
             code_guid = self.code_guid(r[0])
             if code_guid != "":  # Need a coding for this selection
-                xml += '<PlainTextSelection guid="' + self.create_guid() + '" '
+                xml = '<PlainTextSelection guid="' + self.create_guid() + '" '
                 xml += 'startPosition="' + str(r[2]) + '" '
                 xml += 'endPosition="' + str(r[3]) + '" '
                 xml += 'name="' + html.escape(r[1]) + '" '
@@ -2583,26 +2679,24 @@ class RefiExport(QtWidgets.QDialog):
                 xml += '<CodeRef targetGUID="' + code_guid + '" />\n'
                 xml += '</Coding>\n'
                 xml += '</PlainTextSelection>\n'
-        return xml
+                yield xml
 
-    def picture_selection_xml(self, id_):
+    def picture_selection_xml_parts(self, id_):
         """ Get and complete picture selection xml.
-        Called by: sources_xml
+        Called by: sources_xml_parts
         <PictureSelection><Description></Description><Coding><CodeRef/></Coding></PictureSelection>
 
         :param id_ is the source id
 
-        :returns xml string
+        :returns generator of xml Strings, one per selection
         """
 
-        xml = ""
         sql = "select imid, cid, x1,y1, width, height, owner, date, memo from code_image "
         sql += "where id=?"
         cur = self.app.conn.cursor()
         cur.execute(sql, [id_, ])
-        results = cur.fetchall()
-        for r in results:
-            xml += '<PictureSelection guid="' + self.create_guid() + '" '
+        for r in cur:
+            xml = '<PictureSelection guid="' + self.create_guid() + '" '
             xml += 'firstX="' + str(int(r[2])) + '" '
             xml += 'firstY="' + str(int(r[3])) + '" '
             xml += 'secondX="' + str(int(r[2] + r[4])) + '" '
@@ -2620,11 +2714,11 @@ class RefiExport(QtWidgets.QDialog):
                 xml += '<CodeRef targetGUID="' + code_guid + '"/>\n'
             xml += '</Coding>\n'
             xml += '</PictureSelection>\n'
-        return xml
+            yield xml
 
-    def av_selection_xml(self, id_, mediatype):
+    def av_selection_xml_parts(self, id_, mediatype):
         """ Get codings and complete av selection xml.
-        Called by: sources_xml.
+        Called by: sources_xml_parts.
         Video Format:
         <VideoSelection end="17706" modifyingUser="AD68FBE7‐E1EE‐4A82‐A279‐23CC698C89EB"
         begin="14706" creatingUser="AD68FBE7‐E1EE‐4A82‐A279‐23CC698C89EB" creationDateTime="2018‐03‐
@@ -2638,18 +2732,16 @@ class RefiExport(QtWidgets.QDialog):
         </VideoSelection>
 
         :param id_ is the source id Integer
-        :param mediatype : is the String of
-        :returns xml String Audio or Video
+        :param mediatype : is the String Audio or Video
+        :returns generator of xml Strings, one per selection
         """
 
-        xml = ""
         sql = "select avid, cid, pos0, pos1, owner, date, memo from code_av "
         sql += "where id=?"
         cur = self.app.conn.cursor()
         cur.execute(sql, [id_, ])
-        results = cur.fetchall()
-        for r in results:
-            xml += '<' + mediatype + 'Selection guid="' + self.create_guid() + '" '
+        for r in cur:
+            xml = '<' + mediatype + 'Selection guid="' + self.create_guid() + '" '
             xml += 'begin="' + str(int(r[2])) + '" '
             xml += 'end="' + str(int(r[3])) + '" '
             xml += 'name="' + html.escape(r[6]) + '" '
@@ -2664,8 +2756,8 @@ class RefiExport(QtWidgets.QDialog):
             if code_guid != "":
                 xml += '<CodeRef targetGUID="' + code_guid + '"/>\n'
             xml += '</Coding>\n'
-            xml += f"</{mediatype}'Selection>\n"
-        return xml
+            xml += f"</{mediatype}Selection>\n"
+            yield xml
 
     def transcript_xml(self, source):
         """ Find any transcript of media source.
@@ -2996,18 +3088,22 @@ class RefiExport(QtWidgets.QDialog):
         Usernames are drawn from coded text, images and a/v."""
 
         self.users = []
+        self.user_guids = {}
         sql = "select distinct owner from code_image union select owner from code_text union \
         select owner from source union select owner from code_av"
         cur = self.app.conn.cursor()
         cur.execute(sql)
         result = cur.fetchall()
         for row in result:
-            self.users.append({'name': row[0], 'guid': self.create_guid()})
+            user = {'name': row[0], 'guid': self.create_guid()}
+            self.users.append(user)
+            self.user_guids[user['name']] = user['guid']
 
     def get_codes(self):
         """ get all codes and assign guid """
 
         self.codes = []
+        self.code_guids = {}
         cur = self.app.conn.cursor()
         cur.execute("select name, ifnull(memo,''), owner, date, cid, catid, color from code_name")
         result = cur.fetchall()
@@ -3027,6 +3123,7 @@ class RefiExport(QtWidgets.QDialog):
                 xml += ' />\n'
             c['xml'] = xml
             self.codes.append(c)
+            self.code_guids[c['cid']] = c['guid']
 
     def get_categories(self):
         """ get categories and assign guid.
@@ -3130,15 +3227,10 @@ class RefiExport(QtWidgets.QDialog):
 
         v = uuid.uuid4().hex
         guid = "-".join([v[0:8], v[8:12], v[12:16], v[16:20], v[20:33]])
-        duplicated = True
-        while duplicated:
-            duplicated = False
-            if guid in self.guids:
-                duplicated = True
-            if duplicated:
-                v = uuid.uuid4().hex
-                guid = "-".join([v[0:8], v[8:12], v[12:16], v[16:20], v[20:33]])
-        self.guids.append(guid)
+        while guid in self.guids:
+            v = uuid.uuid4().hex
+            guid = "-".join([v[0:8], v[8:12], v[12:16], v[16:20], v[20:33]])
+        self.guids.add(guid)
         return guid
 
     def codebook_exchange_xml(self):
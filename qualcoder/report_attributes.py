@@ -32,6 +32,7 @@ import os
 import sys
 import traceback
 
+from .attribute_pivot import attribute_value_summaries, value_tooltip
 from .GUI.ui_report_attribute_parameters import Ui_Dialog_report_attribute_parameters
 from .helpers import Message
 
@@ -76,6 +77,7 @@ class DialogSelectAttributeParameters(QtWidgets.QDialog):
 
     result_file_ids = []
     result_tooltip_msg = ""
+    attribute_summaries = None  # attribute_pivot.attribute_value_summaries, loaded on first tooltip
 
     def __init__(self, app, limiter="all", parent=None):
         """ limiter can be 'all', 'file' or 'case' This restricts the attributes to be displayed. """
@@ -411,25 +413,12 @@ class DialogSelectAttributeParameters(QtWidgets.QDialog):
         self.ui.tableWidget.blockSignals(False)
 
     def get_tooltip_values(self, name, case_or_file, valuetype):
-        """ Get values to display in tooltips for the value list column. """
+        """ Get values to display in tooltips for the value list column.
+        Summaries for all attributes are loaded once, see attribute_pivot. """
 
-        tt = ""
-        cur = self.app.conn.cursor()
-        if valuetype == "numeric":
-            sql = "select min(cast(value as real)), max(cast(value as real)) from attribute where name=? and attr_type=?"
-            cur.execute(sql, [name, case_or_file])
-            res = cur.fetchone()
-            tt = _("Minimum: ") + str(res[0]) + "\n"
-            tt += _("Maximum: ") + str(res[1])
-        if valuetype == "character":
-            sql = "select distinct value from attribute where name=? and attr_type=? and length(value)>0 limit 20"
-            cur.execute(sql, [name, case_or_file])
-            res = cur.fetchall()
-            for r in res:
-                tt += "\n" + r[0]
-            if len(tt) > 1:
-                tt = tt[1:]
-        return tt
+        if self.attribute_summaries is None:
+            self.attribute_summaries = attribute_value_summaries(self.app.conn)
+        return value_tooltip(self.attribute_summaries.get((case_or_file, name)), valuetype)
 
     def fill_table_widget(self):
         """ Fill the table widget with attribute name and type. """
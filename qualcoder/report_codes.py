@@ -47,6 +47,7 @@ from .GUI.base64_helper import *
 from .GUI.ui_dialog_report_codings import Ui_Dialog_reportCodings
 from .helpers import Message, msecs_to_hours_mins_secs, DialogCodeInImage, DialogCodeInAV, DialogCodeInText, \
     ExportDirectoryPathDialog
+from .image_thumbnails import coded_area_images, ImageThumbnailCache, REPORT_THUMBNAIL_SIZE
 from .report_attributes import DialogSelectAttributeParameters
 from .select_items import DialogSelectItems
 
@@ -94,10 +95,12 @@ class DialogReportCodes(QtWidgets.QDialog):
     # Text positions in the matrix textEdits for right-click context menu to View original file
     # list of dictionaries of row, col, textEdit, list of links
     matrix_links = []
+    image_thumbnails = None  # ImageThumbnailCache
 
     def __init__(self, app, parent_textedit, tab_coding):
         super(DialogReportCodes, self).__init__()
         self.app = app
+        self.image_thumbnails = ImageThumbnailCache(self.app)
         self.parent_textEdit = parent_textedit
         self.tab_coding = tab_coding
         self.get_codes_categories_coders()
@@ -652,10 +655,14 @@ class DialogReportCodes(QtWidgets.QDialog):
 
         if filepath is None:
             return
+        # The report shows thumbnails, the export has the full resolution coded areas
+        document = self.ui.textEdit.document().clone()
+        for imagename, image in self.export_images().items():
+            document.addResource(QtGui.QTextDocument.ResourceType.ImageResource.value, QtCore.QUrl(imagename), image)
         tw = QtGui.QTextDocumentWriter()
         tw.setFileName(filepath)
         tw.setFormat(b'ODF')  # byte array needed for Windows 10
-        tw.write(self.ui.textEdit.document())
+        tw.write(document)
         msg = _("Report exported: ") + filepath
         self.parent_textEdit.append(msg)
         Message(self.app, _('Report exported'), msg, "information").exec()
@@ -884,14 +891,15 @@ class DialogReportCodes(QtWidgets.QDialog):
             return
 
         # Change html links to reference the html folder
+        export_images = self.export_images()
         for item in self.html_links:
             if item['imagename'] is not None:
                 image_name = item['imagename'].replace('/images/', '')
                 # print("IMG NAME: ", item['imagename'])
                 img_path = html_folder_name + "/images/" + image_name
                 # print("IMG PATH", img_path)
-                # item['image'] is  QtGui.QImage object
-                item['image'].save(img_path)
+                # Full resolution coded area, item['image'] is the thumbnail shown in the report
+                export_images.get(item['imagename'], item['image']).save(img_path)
                 html = html.replace(item['imagename'], img_path)
             if item['avname'] is not None:
                 # Add audio/video to html folder
@@ -1872,6 +1880,9 @@ class DialogReportCodes(QtWidgets.QDialog):
         _("Only coded memos"), _("Annotations"), _("Codebook memos")]
         '''
 
+        if memo_choice_index not in (4, 5):  # Only memos, Only coded memos
+            self.image_thumbnails.prepare([r for r in self.results if r['result_type'] == 'image'],
+                                          REPORT_THUMBNAIL_SIZE)
         for i, row in enumerate(self.results):
             self.heading(row)
             if row['coded_memo'] != "" and memo_choice_index in (4, 5):  # Only memos, Only coded memos
@@ -1985,28 +1996,34 @@ class DialogReportCodes(QtWidgets.QDialog):
             self.matrix_by_codes(self.results, file_ids)
         self.ui.splitter.setSizes([100, 100, 500])
 
+    def export_images(self):
+        """ Full resolution coded areas of the report images, rotated as shown in the report.
+        The report shows thumbnails, see put_image_into_textedit.
+        Called by: export_html_file, export_odt_file
+        return:
+            Dictionary of imagename: QImage
+        """
+
+        links = [item for item in self.html_links if item['imagename'] is not None]
+        images = coded_area_images(self.app, [item['coding'] for item in links])
+        export_images = {}
+        for item in links:
+            image = images.get(item['coding']['imid'])
+            if image is None:
+                continue
+            if item['degrees'] != 0:
+                image = image.transformed(QtGui.QTransform().rotate(item['degrees']))
+            export_images[item['imagename']] = image
+        return export_images
+
     def put_image_into_textedit(self, img, counter, text_edit):
-        """ Scale image, add resource to document, insert image.
+        """ Add the coded area thumbnail as a resource to the document, insert image.
+        Thumbnails are scaled to a maximum of REPORT_THUMBNAIL_SIZE wide or high.
         """
 
         text_edit.append("\n")
-        path_ = self.app.project_path + img['mediapath']
-        if img['mediapath'][0:7] == "images:":
-            path_ = img['mediapath'][7:]
         document = text_edit.document()
-        image = QtGui.QImageReader(path_).read()
-        image = image.copy(int(img['x1']), int(img['y1']), int(img['width']), int(img['height']))
-        # Scale to max 300 wide or high. perhaps add option to change maximum limit?
-        scaler_w = 1.0
-        scaler_h = 1.0
-        if image.width() > 400:
-            scaler_w = 400 / image.width()
-        if image.height() > 400:
-            scaler_h = 400 / image.height()
-        if scaler_w < scaler_h:
-            scaler = scaler_w
-        else:
-            scaler = scaler_h
+        image = self.image_thumbnails.thumbnail(img, REPORT_THUMBNAIL_SIZE)
         # Need unique image names or the same image from the same path is reproduced
         # Default for an image  stored in the project folder.
         imagename = str(counter) + '-' + img['mediapath']
@@ -2019,13 +2036,14 @@ class DialogReportCodes(QtWidgets.QDialog):
         cursor = text_edit.textCursor()
         char_pos = cursor.position()
         image_format = QtGui.QTextImageFormat()
-        image_format.setWidth(image.width() * scaler)
-        image_format.setHeight(image.height() * scaler)
+        image_format.setWidth(image.width())
+        image_format.setHeight(image.height())
         image_format.setName(url.toString())
         cursor.insertImage(image_format)
         text_edit.insertHtml("<br />")
+        # coding and degrees are used to export the full resolution coded area
         self.html_links.append({'imagename': imagename, 'image': image, 'image_char_pos': char_pos, 'avname': None,
-                                'av0': None, 'av1': None, 'avtext': None})
+                                'av0': None, 'av1': None, 'avtext': None, 'coding': img, 'degrees': 0})
         if img['coded_memo'] != "":
             text_edit.insertPlainText(_("MEMO: ") + img['coded_memo'] + "\n")
 
@@ -2304,7 +2322,7 @@ class DialogReportCodes(QtWidgets.QDialog):
         Tried to do 90 and 270 degree rotations but could not update the image format width and height.
         param:
             TextImage Format img_fmt
-            Dictionary html_link {imagename, image:QImage, avname, av0, av1, avtext}
+            Dictionary html_link {imagename, image:QImage, avname, av0, av1, avtext, coding, degrees}
         """
 
         document = self.ui.textEdit.document()
@@ -2313,6 +2331,7 @@ class DialogReportCodes(QtWidgets.QDialog):
         transform = QtGui.QTransform().rotate(degrees)
         image = image.transformed(transform)
         html_link['image'] = image
+        html_link['degrees'] = (html_link['degrees'] + degrees) % 360
         document.addResource(QtGui.QTextDocument.ResourceType.ImageResource.value, url, image)
         scaler_w = 1.0
         scaler_h = 1.0
@@ -2590,6 +2609,8 @@ class DialogReportCodes(QtWidgets.QDialog):
             self.te.append(column_list)
         self.matrix_links = []
         memo_choice = self.ui.comboBox_memos.currentText()
+        if memo_choice not in (_("Only memos"), _("Only coded memos")):
+            self.image_thumbnails.prepare([r for r in results if r['result_type'] == 'image'], REPORT_THUMBNAIL_SIZE)
         if self.ui.checkBox_matrix_transpose.isChecked():
             for row in range(len(vertical_labels)):
                 for col in range(len(horizontal_labels)):
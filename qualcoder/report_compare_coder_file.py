@@ -36,6 +36,7 @@ from PyQt6 import QtGui, QtWidgets, QtCore
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QBrush
 
+from .coder_agreement import add_file_agreement, agreement_statistics, merge_coded, new_total
 from .color_selector import TextColor
 from .GUI.base64_helper import *
 from .GUI.ui_dialog_code_context_image import Ui_Dialog_code_context_image
@@ -591,96 +592,27 @@ class DialogCompareCoderByFile(QtWidgets.QDialog):
         """ Calculate the two-coder statistics for this code_
         Percentage agreement, disgreement and kappa.
         Get the start and end position the text file for this cid
-        Each character that is coded by coder 1 or coder 2 is incremented, resulting in a list of 0, 1, 2
-        where 0 is no codings at all, 1 is coded by only one coder and 2 is coded by both coders.
+        Each coder's codings are merged, and compared to find the dual coded, single coded and uncoded
+        character counts. See coder_agreement.
         'Disagree%':'','A not B':'','B not A':'','K':''
         """
 
-        # coded0 and coded1 are the total characters coded by coder 0 and coder 1
-        total = {'dual_coded': 0, 'single_coded': 0, 'uncoded': 0, 'characters': 0, 'coded0': 0, 'coded1': 0}
         cur = self.app.conn.cursor()
         sql = "select fulltext from source where id=?"
         cur.execute(sql, [self.file_['id']])
         fulltext = cur.fetchone()
         if fulltext[0] is None or fulltext[0] == "":
             return None
-        sql = "select pos0,pos1,fid from code_text where fid=? and cid=? and owner=?"
+        text_length = len(fulltext[0])
+        sql = "select pos0,pos1 from code_text where fid=? and cid=? and owner=?"
         cur.execute(sql, [self.file_['id'], self.code_['cid'], self.selected_coders[0]])
-        res0 = cur.fetchall()
+        merged0 = merge_coded(cur.fetchall(), text_length)
         cur.execute(sql, [self.file_['id'], self.code_['cid'], self.selected_coders[1]])
-        res1 = cur.fetchall()
-        # Determine the same characters coded by both coders, by adding 1 to each coded character
-        char_list = [0] * len(fulltext[0])
-        # List of which coders coded this char: 1 = coder 1, 2= coder2, 12 = coders 1 and 2
-        char_list_coders = [''] * len(fulltext[0])
-        for coded in res0:
-            for char in range(coded[0], coded[1]):
-                char_list[char] += 1
-                total['coded0'] += 1
-                char_list_coders[char] = 'y'
-        for coded in res1:
-            for char in range(coded[0], coded[1]):
-                char_list[char] += 1
-                total['coded1'] += 1
-                if char_list_coders[char] == 'y':
-                    char_list_coders[char] = 'g'
-                else:
-                    char_list_coders[char] = 'b'
-        uncoded = 0
-        single_coded = 0
-        dual_coded = 0
-        for char in char_list:
-            if char == 0:
-                uncoded += 1
-            if char == 1:
-                single_coded += 1
-            if char == 2:
-                dual_coded += 1
-        total['dual_coded'] += dual_coded
-        total['single_coded'] += single_coded
-        total['uncoded'] += uncoded
-        total['characters'] += len(fulltext[0])
-
-        total['agreement'] = round(100 * (total['dual_coded'] + total['uncoded']) / total['characters'], 2)
-        total['dual_percent'] = round(100 * total['dual_coded'] / total['characters'], 2)
-        total['uncoded_percent'] = round(100 * total['uncoded'] / total['characters'], 2)
-        total['disagreement'] = round(100 - total['agreement'], 2)
-        # Cohen's Kappa
-        '''
-        https://en.wikipedia.org/wiki/Cohen%27s_kappa
-
-        k = Po - Pe     Po is proportionate agreement (both coders coded this text / all coded text))
-            -------     Pe is probability of random agreement
-            1  - Pe
-
-            Pe = Pyes + Pno
-            Pyes = proportion Yes by A multiplied by proportion Yes by B
-                 = total['coded0']/total_coded * total['coded1]/total_coded
-
-            Pno = proportion No by A multiplied by proportion No by B
-                = (total_coded - total['coded0']) / total_coded * (total_coded - total['coded1]) / total_coded
-
-        IMMEDIATE BELOW IS INCORRECT - RESULTS IN THE TOTAL AGREEMENT SCORE
-        Po = total['agreement'] / 100
-        Pyes = total['coded0'] / total['characters'] * total['coded1'] / total['characters']
-        Pno = (total['characters'] - total['coded0']) / total['characters'] * (total['characters'] - total['coded1']) / total['characters']
-
-        BELOW IS BETTER - ONLY LOOKS AT PROPORTIONS OF CODED CHARACTERS
-        NEED TO CONFIRM THIS IS THE CORRECT APPROACH
-        '''
-        total['kappa'] = "zerodiv"
-        unique_codings = 0
-        try:
-            unique_codings = total['coded0'] + total['coded1'] - total['dual_coded']
-            Po = total['dual_coded'] / unique_codings
-            Pyes = total['coded0'] / unique_codings * total['coded1'] / unique_codings
-            Pno = (unique_codings - total['coded0']) / unique_codings * (unique_codings - total['coded1']) / unique_codings
-            Pe = Pyes * Pno
-            kappa = round((Po - Pe) / (1 - Pe), 4)
-            total['kappa'] = kappa
-        except ZeroDivisionError:
-            msg_ = _("ZeroDivisionError. unique_codings:") + str(unique_codings)
-            logger.debug(msg_)
+        merged1 = merge_coded(cur.fetchall(), text_length)
+        # coded0 and coded1 are the total characters coded by coder 0 and coder 1
+        total = new_total()
+        dual = add_file_agreement(total, merged0, merged1, text_length)
+        agreement_statistics(total)
         overall = "\nOVERALL SUMMARY\n"
         overall += _("Total characters: ") + str(total['characters']) + ", "
         overall += _("Dual coded: ") + str(total['dual_coded']) + ", "
@@ -700,37 +632,19 @@ class DialogCompareCoderByFile(QtWidgets.QDialog):
         pos = cursor.position()
         self.ui.textEdit.append(fulltext[0])
         # Apply brush, yellow for coder 1, blue for coder 2 and green for dual coded
+        # One format per coded run, dual coded runs are layered over the single coder runs
         cursor = self.ui.textEdit.textCursor()
-        fmt = QtGui.QTextCharFormat()
-        # Foreground depends on the defined need_white_text color in color_selector
-        for i, c in enumerate(char_list_coders):
-            if c == 'b':
-                cursor.setPosition(pos + i, QtGui.QTextCursor.MoveMode.MoveAnchor)
-                cursor.setPosition(pos + i + 1, QtGui.QTextCursor.MoveMode.KeepAnchor)
-                color = "#81BEF7"
-                brush = QBrush(QtGui.QColor(color))
-                fmt.setBackground(brush)
-                text_brush = QBrush(QtGui.QColor(TextColor(color).recommendation))
-                fmt.setForeground(text_brush)
-                cursor.setCharFormat(fmt)
-            if c == 'g':
-                cursor.setPosition(pos + i, QtGui.QTextCursor.MoveMode.MoveAnchor)
-                cursor.setPosition(pos + i + 1, QtGui.QTextCursor.MoveMode.KeepAnchor)
-                color = "#81F781"
-                brush = QBrush(QtGui.QColor(color))
-                fmt.setBackground(brush)
-                text_brush = QBrush(QtGui.QColor(TextColor(color).recommendation))
-                fmt.setForeground(text_brush)
-                cursor.setCharFormat(fmt)
-            if c == 'y':
-                cursor.setPosition(pos + i, QtGui.QTextCursor.MoveMode.MoveAnchor)
-                cursor.setPosition(pos + i + 1, QtGui.QTextCursor.MoveMode.KeepAnchor)
-                color = "#F4FA58"
-                brush = QBrush(QtGui.QColor(color))
-                fmt.setBackground(brush)
-                text_brush = QBrush(QtGui.QColor(TextColor(color).recommendation))
-                fmt.setForeground(text_brush)
+        cursor.beginEditBlock()
+        for color, runs in (("#F4FA58", merged0), ("#81BEF7", merged1), ("#81F781", dual)):
+            fmt = QtGui.QTextCharFormat()
+            fmt.setBackground(QBrush(QtGui.QColor(color)))
+            # Foreground depends on the defined need_white_text color in color_selector
+            fmt.setForeground(QBrush(QtGui.QColor(TextColor(color).recommendation)))
+            for pos0, pos1 in runs:
+                cursor.setPosition(pos + pos0, QtGui.QTextCursor.MoveMode.MoveAnchor)
+                cursor.setPosition(pos + pos1, QtGui.QTextCursor.MoveMode.KeepAnchor)
                 cursor.setCharFormat(fmt)
+        cursor.endEditBlock()
 
     def fill_tree(self):
         """ Fill tree widget, top level items are main categories and unlinked codes. """
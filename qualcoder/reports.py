@@ -38,6 +38,7 @@ from PyQt6 import QtGui, QtWidgets, QtCore
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QBrush
 
+from .coder_agreement import text_agreement
 from .color_selector import TextColor
 from .GUI.base64_helper import *
 from .GUI.ui_dialog_report_comparisons import Ui_Dialog_reportComparisons
@@ -565,11 +566,20 @@ class DialogReportCoderComparisons(QtWidgets.QDialog):
 
         self.comparisons = "====" + _("CODER COMPARISON") + "====\n" + _("Selected coders: ")
         self.comparisons += self.selected_coders[0] + ", " + self.selected_coders[1] + "\n"
+        cids = []
         it = QtWidgets.QTreeWidgetItemIterator(self.ui.treeWidget)
         item = it.value()
         while item:
             if item.text(1)[0:4] == 'cid:':
-                agreement = self.calculate_agreement_for_code_name(int(item.text(1)[4:]))
+                cids.append(int(item.text(1)[4:]))
+            it += 1
+            item = it.value()
+        agreements = self.calculate_agreements(cids)
+        it = QtWidgets.QTreeWidgetItemIterator(self.ui.treeWidget)
+        item = it.value()
+        while item:
+            if item.text(1)[0:4] == 'cid:':
+                agreement = agreements[int(item.text(1)[4:])]
                 item.setText(2, str(agreement['agreement']) + "%")
                 item.setText(3, str(agreement['dual_percent']) + "%")
                 item.setText(4, str(agreement['uncoded_percent']) + "%")
@@ -589,123 +599,33 @@ class DialogReportCoderComparisons(QtWidgets.QDialog):
     def calculate_agreement_for_code_name(self, cid):
         """ Calculate the two-coder statistics for this cid
         Percentage agreement.
-        Get the start and end positions in all files (source table) for this cid.
-
         self.file_summaries item [0] = id, [1] = full text length
-        Look at each file separately to ge the commonly coded text.
-        Each character that is coded by coder 1 or coder 2 is incremented, resulting in a list of 0, 1, 2
-        where 0 is no codings at all, 1 is coded by only one coder and 2 is coded by both coders.
+        Each coder's codings in each file are merged, and compared to find the dual coded, single coded and
+        uncoded character counts. See coder_agreement.text_agreement.
         'Disagree%':'','A not B':'','B not A':'', coded only:'' ,'K':''
 
         param:
-            cid : integer source file id
+            cid : integer code id
+        return:
+            Dictionary of character counts and statistics
+        """
+
+        return self.calculate_agreements([cid])[cid]
 
+    def calculate_agreements(self, cids):
+        """ Calculate the two-coder statistics for all these codes, with one query for all codings.
+        Called by: calculate_statistics, calculate_agreement_for_code_name
+        param:
+            cids : list of integer code ids
+        return:
+            Dictionary of cid: Dictionary of character counts and statistics
         """
 
-        # coded0 and coded1 are the total characters coded by coder 0 and coder 1
-        total = {'dual_coded': 0, 'single_coded': 0, 'uncoded': 0, 'characters': 0, 'coded0': 0, 'coded1': 0,
-                 'agree_coded_only': 0.0, 'agreement': 0.0, 'disagreement': 0.0, 'uncoded_percent': 0.0}
-        # Loop through each source file
-        cur = self.app.conn.cursor()
-        sql = "select pos0,pos1,fid from code_text where fid=? and cid=? and owner=?"
-        for f in self.file_summaries:
-            cur.execute(sql, [f[0], cid, self.selected_coders[0]])
-            result0 = cur.fetchall()
-            cur.execute(sql, [f[0], cid, self.selected_coders[1]])
-            result1 = cur.fetchall()
-            # Determine the same characters coded by both coders, by adding 1 to each coded character
-            char_list = [0] * f[1]
-            for coded in result0:
-                for char in range(coded[0], coded[1]):
-                    try:
-                        char_list[char] += 1
-                        total['coded0'] += 1
-                    except IndexError as e_:
-                        msg = "DialogReportCoderComparisons.calculate_agreement_for_code_name "
-                        msg += str(e_) + " fid:" + str(f[0]) + " len_text:" + str(f[1]) + " pos1:" + str(coded[1])
-                        msg += " cid:" + str(cid) + " coder:" + self.selected_coders[0]
-                        print(msg)
-                        logger.error(msg)
-                        self.parent_textEdit.append(msg)
-            for coded in result1:
-                for char in range(coded[0], coded[1]):
-                    try:
-                        char_list[char] += 1
-                        total['coded1'] += 1
-                    except IndexError as e_:
-                        msg = "DialogReportCoderComparisons.calculate_agreement_for_code_name "
-                        msg += str(e_) + " fid:" + str(f[0]) + " len_text:" + str(f[1]) + " pos1:" + str(coded[1])
-                        msg += " cid:" + str(cid) + " coder:" + self.selected_coders[0]
-                        print(msg)
-                        logger.error(msg)
-                        self.parent_textEdit.append(msg)
-            uncoded = 0
-            single_coded = 0
-            dual_coded = 0
-            for char in char_list:
-                if char == 0:
-                    uncoded += 1
-                if char == 1:
-                    single_coded += 1
-                if char == 2:
-                    dual_coded += 1
-            total['dual_coded'] += dual_coded
-            total['single_coded'] += single_coded
-            total['uncoded'] += uncoded
-            total['characters'] += f[1]
-
-        if total['characters'] != 0:
-            total['agreement'] = round(100 * (total['dual_coded'] + total['uncoded']) / total['characters'], 2)
-            total['dual_percent'] = round(100 * total['dual_coded'] / total['characters'], 2)
-            total['uncoded_percent'] = round(100 * total['uncoded'] / total['characters'], 2)
-            total['disagreement'] = round(100 - total['agreement'], 2)
-            try:
-                total['agree_coded_only'] = round(100 * total['dual_coded'] / (total['dual_coded'] + total['single_coded']), 2)
-            except ZeroDivisionError:
-                total['agree_coded_only'] = "zero div"
-        else:
-            total['agreement'] = "zero div"
-            total['dual_percent'] = "zero div"
-            total['uncoded_percent'] = "zero div"
-            total['disagreement'] = "zero div"
-            total['agree_coded_only'] = "zero div"
-        # Cohen's Kappa
-        '''
-        https://en.wikipedia.org/wiki/Cohen%27s_kappa
-
-        k = Po - Pe     Po is proportionate agreement (both coders coded this text / all coded text))
-            -------     Pe is probability of random agreement
-            1  - Pe
-
-            Pe = Pyes + Pno
-            Pyes = proportion Yes by A multiplied by proportion Yes by B
-                 = total['coded0']/total_coded * total['coded1]/total_coded
-
-            Pno = proportion No by A multiplied by proportion No by B
-                = (total_coded - total['coded0']) / total_coded * (total_coded - total['coded1]) / total_coded
-
-        IMMEDIATE BELOW IS INCORRECT - RESULTS IN THE TOTAL AGREEMENT SCORE
-        Po = total['agreement'] / 100
-        Pyes = total['coded0'] / total['characters'] * total['coded1'] / total['characters']
-        Pno = (total['characters'] - total['coded0']) / total['characters'] * (total['characters'] - total['coded1']) / 
-            total['characters']
-
-        BELOW IS BETTER - ONLY LOOKS AT PROPORTIONS OF CODED CHARACTERS
-        NEED TO CONFIRM THIS IS THE CORRECT APPROACH
-        '''
-        total['kappa'] = "zerodiv"
-        try:
-            unique_codings = total['coded0'] + total['coded1'] - total['dual_coded']
-            Po = total['dual_coded'] / unique_codings
-            Pyes = total['coded0'] / unique_codings * total['coded1'] / unique_codings
-            Pno = (unique_codings - total['coded0']) / unique_codings * (
-                        unique_codings - total['coded1']) / unique_codings
-            Pe = Pyes * Pno
-            kappa = round((Po - Pe) / (1 - Pe), 4)
-            total['kappa'] = kappa
-        except ZeroDivisionError:
-            pass
-        return total
+        file_lengths = {f[0]: f[1] for f in self.file_summaries}
+        results, errors = text_agreement(self.app.conn, self.selected_coders, file_lengths, cids)
+        for msg in errors:
+            self.parent_textEdit.append("DialogReportCoderComparisons.calculate_agreements " + msg)
+        return results
 
     def fill_tree(self):
         """ Fill tree widget, top level items are main categories and unlinked codes. """
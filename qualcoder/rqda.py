@@ -32,6 +32,7 @@ import os
 from random import randint
 import sqlite3
 import sys
+import time
 import traceback
 
 from PyQt6 import QtWidgets
@@ -110,181 +111,27 @@ class RqdaImport:
     def import_data(self):
         """ Code colours are randomly created.
          The codername in qualcoder settings is set to the first owner found in RQDA.
+         The RQDA database is attached to the project connection, and each table is copied with one
+         insert ... select statement, all in one transaction. RQDA dates are converted by the
+         rqda_date sql function, which calls convert_date.
 
          Note sqlite3.Integrity error can occur if he same text is coded by the same code and same owner.
-         So adding a check for this. """
+         So these are ignored and counted as duplicates. """
 
-        r_cur = self.conn.cursor()
         q_cur = self.app.conn.cursor()
-        r_cur.execute("select memo from project")
-        res = r_cur.fetchone()
-        q_cur.execute("update project set memo=?", (res[0],))
-        if res[0] is not None:
-            self.parent_textEdit.append(_("Project memo imported"))
-        r_cur.execute("select id,name, file, memo, owner, date from source")
-        res = r_cur.fetchall()
-        i = 0
-        for r in res:
-            try:
-                q_cur.execute("insert into source (id, name, fulltext,memo, owner, date, mediapath) values (?,?,?,?,?,?,?)",
-                              [r[0], r[1], r[2], r[3], r[4], self.convert_date(r[5]), None])
-                self.app.conn.commit()
-            except sqlite3.IntegrityError:
-                # Fix for duplicated RQDA text file names. QualCoder has a Unique constraint on file names
-                new_name = r[1] + "_" + str(randint(0, 9)) + str(randint(0, 9)) + str(randint(0, 9))
-                q_cur.execute("insert into source (id, name, fulltext,memo, owner, date, mediapath) values (?,?,?,?,?,?,?)",
-                              [r[0], new_name, r[2], r[3], r[4], self.convert_date(r[5]), None])
-                self.app.conn.commit()
-                msg = _("Duplicate filename: ") + r[1] + _(" --> Replaced with: ") + new_name
-                self.parent_textEdit.append(msg)
-            i += 1
-        self.parent_textEdit.append(str(i) + _(" files imported"))
-        r_cur.execute("select fid,position,annotation, owner, date from annotation")
-        res = r_cur.fetchall()
-        i = 0
-        for r in res:
-            if r[3] != "" and r[3] is not None:
-                q_cur.execute("insert into annotation (fid, pos0, pos1, memo, owner, date) values (?,?,?,?,?,?)",
-                              [r[0], r[1], r[1] + 1, r[2], r[3], self.convert_date(r[4])])
-                i += 1
-        self.parent_textEdit.append(str(i) + _(" annotations imported"))
-        self.app.conn.commit()
-        r_cur.execute("select name,journal, owner, date from journal")
-        res = r_cur.fetchall()
-        i = 0
-        for r in res:
-            q_cur.execute("insert into journal (name, jentry, owner, date) values (?,?,?,?)",
-                          [r[0], r[1], r[2], self.convert_date(r[3])])
-            i += 1
-        self.parent_textEdit.append(str(i) + _(" journals imported"))
-        r_cur.execute("select id, name, memo, owner, date from cases")
-        res = r_cur.fetchall()
-        i = 0
-        for r in res:
-            try:
-                q_cur.execute("insert into cases (caseid, name, memo, owner, date) values (?,?,?,?,?)",
-                              [r[0], r[1], r[2], r[3], self.convert_date(r[4])])
-                i += 1
-            except sqlite3.IntegrityError:
-                pass
-        self.parent_textEdit.append(str(i) + _(" cases imported"))
-        r_cur.execute("select catid, name, memo, owner, date from codecat")
-        res = r_cur.fetchall()
-        i = 0  # Do not use enumerate as res could be None
-        for r in res:
-            # There are no supercatids in RQDA
-            try:
-                q_cur.execute("insert into code_cat (catid,name, memo, owner, date,supercatid) values (?,?,?,?,?,?)",
-                              [r[0], r[1], r[2], r[3], self.convert_date(r[4]), None])
-                i += 1
-            except sqlite3.IntegrityError:
-                pass
-        self.parent_textEdit.append(str(i) + _(" code categories imported"))
-        # Get catids for each code cid
-        r_cur.execute("select cid, catid from treecode")
-        treecodes = r_cur.fetchall()
-        r_cur.execute("select id, name, memo,color, owner, date from freecode")
-        res = r_cur.fetchall()
-        i = 0
-        for r in res:
-            code_color = colors[randint(0, len(colors) - 1)]
-            treecode = None
-            for t in treecodes:
-                if t[0] == r[0]:
-                    treecode = t[1]  # Corresponding catid
-            try:
-                q_cur.execute("insert into code_name (cid, catid,name, memo,color, owner, date) values (?,?,?,?,?,?,?)",
-                              [r[0], treecode, r[1], r[2], code_color, r[4], self.convert_date(r[5])])
-                i += 1
-            except sqlite3.IntegrityError:
-                pass
-        self.parent_textEdit.append(str(i) + " codes imported")
-        r_cur.execute("select cid, fid, seltext,selfirst,selend,memo, owner, date from coding")
-        res = r_cur.fetchall()
-        i = 0
-        dup = 0
-        for r in res:
-            if r[2] != "" and r[2] is not None:
-                try:
-                    q_cur.execute(
-                        "insert into code_text (cid, fid,seltext, pos0,pos1,memo, owner, date) values (?,?,?,?,?,?,?,?)",
-                        [r[0], r[1], r[2], r[3], r[4], r[5], r[6], self.convert_date(r[7])])
-                    i += 1
-                except sqlite3.IntegrityError:
-                    dup += 1
-        self.parent_textEdit.append(str(i) + _(" codings imported"))
-        if dup > 0:
-            self.parent_textEdit.append(str(dup) + _(" duplicated codings found and ignored"))
-        r_cur.execute("select cid, fid, seltext,selfirst,selend,memo, owner, date from coding2")
-        res = r_cur.fetchall()
-        i = 0
-        dup = 0
-        for r in res:
-            if r[2] != "" and r[2] is not None:
-                try:
-                    q_cur.execute(
-                        "insert into code_text (cid, fid,seltext, pos0,pos1,memo, owner, date) values (?,?,?,?,?,?,?,?)",
-                        [r[0], r[1], r[2], r[3], r[4], r[5], r[6], self.convert_date(r[7])])
-                    i += 1
-                except sqlite3.IntegrityError:
-                    dup += 1
-        self.parent_textEdit.append(str(i) + _(" codings imported from coding2 table"))
-        if dup > 0:
-            self.parent_textEdit.append(str(dup) + _(" duplicated codings found and ignored from coding2 table"))
-        # attribute class = character or numeric
-        r_cur.execute("select distinct variable from caseAttr")
-        case_attr = r_cur.fetchall()
-        r_cur.execute("select name,class,memo, owner, date from attributes")
-        res = r_cur.fetchall()
-        i = 0
-        for r in res:
-            # default to a file attribute unless it is a case attribute
-            case_or_file = "file"
-            for c in case_attr:
-                if c[0] == r[0]:
-                    case_or_file = "case"
-            try:
-                q_cur.execute(
-                    "insert into attribute_type (name, valuetype,caseOrFile,memo, owner, date) values (?,?,?,?,?,?)",
-                    [r[0], r[1], case_or_file, r[2], r[3], self.convert_date(r[4])])
-                i += 1
-            except sqlite3.IntegrityError:
-                pass
-        self.parent_textEdit.append(str(i) + _(" attribute types imported"))
-        r_cur.execute("select variable, value, caseID, owner, date from caseAttr")
-        res = r_cur.fetchall()
-        i = 0
-        for r in res:
-            try:
-                q_cur.execute("insert into attribute (name,value, id, owner,date, attr_type) values(?,?,?,?,?,?)",
-                              [r[0], r[1], r[2], r[3], self.convert_date(r[4]), "case"])
-                i += 1
-            except sqlite3.IntegrityError:
-                pass
-        self.parent_textEdit.append(str(i) + _(" case attribute values imported"))
-        r_cur.execute("select variable, value, fileID, owner, date from fileAttr")
-        res = r_cur.fetchall()
-        i = 0
-        for r in res:
-            try:
-                q_cur.execute("insert into attribute (name,value, id, owner,date, attr_type) values(?,?,?,?,?,?)",
-                              [r[0], r[1], r[2], r[3], self.convert_date(r[4]), "file"])
-                i += 1
-            except sqlite3.IntegrityError:
-                pass
-        self.parent_textEdit.append(str(i) + _(" file attribute values imported"))
-        r_cur.execute("select caseid,fid,selfirst,selend, owner, memo,date from caselinkage")
-        res = r_cur.fetchall()
-        i = 0
-        for r in res:
-            try:
-                q_cur.execute("insert into case_text (caseid,fid,pos0,pos1,owner,memo, date) values(?,?,?,?,?,?,?)",
-                              [r[0], r[1], r[2], r[3], r[4], r[5], self.convert_date(r[6])])
-                i += 1
-            except sqlite3.IntegrityError:
-                pass
-        self.parent_textEdit.append(str(i) + _(" case linked texts imported"))
-        self.app.conn.commit()
+        self.app.conn.commit()  # Attach cannot be used inside a transaction
+        self.app.conn.create_function("rqda_date", 1, self.convert_date)
+        self.app.conn.create_function("random_code_color", 0, lambda: colors[randint(0, len(colors) - 1)])
+        q_cur.execute("attach database ? as rqda", [self.file_path])
+        try:
+            self.import_tables(q_cur)
+            self.app.conn.commit()
+        except Exception:
+            self.app.conn.rollback()
+            raise
+        finally:
+            q_cur.execute("detach database rqda")
+        r_cur = self.conn.cursor()
 
         # Keep a copy of the text sources in the QualCoder documents folder
         r_cur.execute("select name, file from source")
@@ -309,6 +156,95 @@ class RqdaImport:
         self.app.settings['codername'] = result[0]
         self.app.write_config_ini(self.app.settings)
 
+    def import_tables(self, q_cur):
+        """ Copy RQDA tables into the project database, in the current transaction.
+        Reports the number of rows and time taken for each table.
+        Called by: import_data
+        param:
+            q_cur: cursor of the project connection, with the RQDA database attached as rqda
+        """
+
+        q_cur.execute("select memo from rqda.project")
+        res = q_cur.fetchone()
+        q_cur.execute("update project set memo=?", (res[0],))
+        if res[0] is not None:
+            self.parent_textEdit.append(_("Project memo imported"))
+        # Fix for duplicated RQDA text file names. QualCoder has a Unique constraint on file names
+        q_cur.execute("select name, id from (select name, id, row_number() over (partition by name order by id) "
+                      "as n from rqda.source) where n > 1")
+        for name, id_ in q_cur.fetchall():
+            msg = _("Duplicate filename: ") + name + _(" --> Replaced with: ") + name + "_" + str(id_)
+            self.parent_textEdit.append(msg)
+        steps = [
+            (_(" files imported"),
+             "with named_source as (select id, name, file, memo, owner, date, "
+             "row_number() over (partition by name order by id) as n from rqda.source) "
+             "insert into source (id, name, fulltext, memo, owner, date, mediapath) "
+             "select id, case when n > 1 then name || '_' || id else name end, file, memo, owner, rqda_date(date), "
+             "null from named_source"),
+            (_(" annotations imported"),
+             "insert into annotation (fid, pos0, pos1, memo, owner, date) "
+             "select fid, position, position + 1, annotation, owner, rqda_date(date) from rqda.annotation "
+             "where owner is not null and owner != ''"),
+            (_(" journals imported"),
+             "insert into journal (name, jentry, owner, date) "
+             "select name, journal, owner, rqda_date(date) from rqda.journal"),
+            (_(" cases imported"),
+             "insert or ignore into cases (caseid, name, memo, owner, date) "
+             "select id, name, memo, owner, rqda_date(date) from rqda.cases"),
+            # There are no supercatids in RQDA
+            (_(" code categories imported"),
+             "insert or ignore into code_cat (catid, name, memo, owner, date, supercatid) "
+             "select catid, name, memo, owner, rqda_date(date), null from rqda.codecat"),
+            # Get catids for each code cid
+            (_(" codes imported"),
+             "with code_category as (select cid, max(catid) as catid from rqda.treecode group by cid) "
+             "insert or ignore into code_name (cid, catid, name, memo, color, owner, date) "
+             "select freecode.id, code_category.catid, freecode.name, freecode.memo, random_code_color(), "
+             "freecode.owner, rqda_date(freecode.date) from rqda.freecode "
+             "left join code_category on code_category.cid = freecode.id"),
+            (_(" codings imported"),
+             "insert or ignore into code_text (cid, fid, seltext, pos0, pos1, memo, owner, date) "
+             "select cid, fid, seltext, selfirst, selend, memo, owner, rqda_date(date) from rqda.coding "
+             "where seltext is not null and seltext != ''"),
+            (_(" codings imported from coding2 table"),
+             "insert or ignore into code_text (cid, fid, seltext, pos0, pos1, memo, owner, date) "
+             "select cid, fid, seltext, selfirst, selend, memo, owner, rqda_date(date) from rqda.coding2 "
+             "where seltext is not null and seltext != ''"),
+            # attribute class = character or numeric
+            # default to a file attribute unless it is a case attribute
+            (_(" attribute types imported"),
+             "insert or ignore into attribute_type (name, valuetype, caseOrFile, memo, owner, date) "
+             "select name, class, case when name in (select variable from rqda.caseAttr) then 'case' "
+             "else 'file' end, memo, owner, rqda_date(date) from rqda.attributes"),
+            (_(" case attribute values imported"),
+             "insert or ignore into attribute (name, value, id, owner, date, attr_type) "
+             "select variable, value, caseID, owner, rqda_date(date), 'case' from rqda.caseAttr"),
+            (_(" file attribute values imported"),
+             "insert or ignore into attribute (name, value, id, owner, date, attr_type) "
+             "select variable, value, fileID, owner, rqda_date(date), 'file' from rqda.fileAttr"),
+            (_(" case linked texts imported"),
+             "insert or ignore into case_text (caseid, fid, pos0, pos1, owner, memo, date) "
+             "select caseid, fid, selfirst, selend, owner, memo, rqda_date(date) from rqda.caselinkage"),
+        ]
+        coding_tables = {_(" codings imported"): "rqda.coding",
+                         _(" codings imported from coding2 table"): "rqda.coding2"}
+        for msg, sql in steps:
+            start_time = time.perf_counter()
+            q_cur.execute(sql)
+            # Rows inserted by this statement, excluding rows written by triggers, e.g. the full text search index.
+            # Cursor rowcount is -1 for the 'with' statement with python older than 3.11
+            q_cur.execute("select changes()")
+            rows = q_cur.fetchone()[0]
+            msecs = (time.perf_counter() - start_time) * 1000
+            self.parent_textEdit.append(str(rows) + msg + f" ({msecs:.0f} ms)")
+            if msg in coding_tables:
+                q_cur.execute("select count(*) from " + coding_tables[msg] +
+                              " where seltext is not null and seltext != ''")
+                dup = q_cur.fetchone()[0] - rows
+                if dup > 0:
+                    self.parent_textEdit.append(str(dup) + _(" duplicated codings found and ignored"))
+
 
 """
 RQDA database format
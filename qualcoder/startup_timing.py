@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+import builtins
+import importlib.util
+import sys
+import time
+
+# Startup timing report, printed when QualCoder is started with: qualcoder --startup-timing
+# Imported by __main__ before PyQt6 and the QualCoder modules, so their import times are recorded.
+# Dialog modules are imported on first use, their import times are printed when they are first opened.
+FLAG = "--startup-timing"
+enabled = FLAG in sys.argv
+start_time = time.perf_counter()
+# List of [module name, seconds including nested imports, nesting depth], in import order
+import_times = []
+# Only report imports taking at least this many seconds
+MIN_REPORT_SECS = 0.001
+
+_original_import = builtins.__import__
+_depth = 0
+_reported = False
+
+
+def _timed_import(name, globals_=None, locals_=None, fromlist=(), level=0):
+    """ Replacement for builtins.__import__ that records the time taken by the first import of each module. """
+
+    global _depth
+    module_name = name
+    if level > 0:
+        try:
+            module_name = importlib.util.resolve_name("." * level + name, (globals_ or {}).get('__package__'))
+        except (ImportError, ValueError):
+            pass
+    if module_name in sys.modules:
+        return _original_import(name, globals_, locals_, fromlist, level)
+    entry = [module_name, 0.0, _depth]
+    import_times.append(entry)
+    _depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals_, locals_, fromlist, level)
+    finally:
+        _depth -= 1
+        entry[1] = time.perf_counter() - start
+        if _reported and _depth == 0 and entry[1] >= MIN_REPORT_SECS:
+            print(f"Startup timing. First use import: {module_name} {entry[1] * 1000:.1f} ms")
+
+
+def report(label="First window shown"):
+    """ Print import times per module and the time since startup.
+    Called by __main__.gui once the main window is shown.
+    param:
+        label: String description of the time point
+    """
+
+    global _reported
+    if not enabled or _reported:
+        return
+    _reported = True
+    elapsed = time.perf_counter() - start_time
+    print("Startup timing. Module imports (ms, including nested imports):")
+    for module_name, secs, depth in import_times:
+        if secs >= MIN_REPORT_SECS:
+            print(f"{secs * 1000:10.1f}  " + "  " * depth + module_name)
+    top_level_secs = sum(secs for _, secs, depth in import_times if depth == 0)
+    print(f"Startup timing. Imports: {top_level_secs * 1000:.1f} ms")
+    print(f"Startup timing. {label}: {elapsed * 1000:.1f} ms")
+
+
+if enabled:
+    builtins.__import__ = _timed_import
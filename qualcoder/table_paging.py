@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Large tables, e.g. thousands of cases from a survey or files from a Twitter import, are slow to fill,
+# as every cell needs a QTableWidgetItem. Rows are added a page at a time, when the table is scrolled
+# near to the last added row, in the same way as QAbstractItemModel canFetchMore and fetchMore.
+# Row order is set by the SQL query that loads the data, so row numbers match the data list.
+# Used by: manage_files, cases, journals
+
+PAGE_SIZE = 200
+
+
+class TablePager:
+    """ Fill a QTableWidget with rows a page at a time.
+    Code that reads every row of the table, e.g. filters and csv exports, must call fetch_all first.
+    """
+
+    def __init__(self, table_widget, fill_row, page_size=PAGE_SIZE):
+        """ param:
+            table_widget: QTableWidget
+            fill_row: function(row, data) that sets the items for one row
+            page_size: Integer number of rows to add on each fetch
+        """
+
+        self.table_widget = table_widget
+        self.fill_row = fill_row
+        self.page_size = page_size
+        self.data = []
+        self.rows_filled = 0
+        self.table_widget.verticalScrollBar().valueChanged.connect(self.scrolled)
+
+    def reset(self, data):
+        """ Clear the table and add the first page of rows.
+        param:
+            data: list of row data, e.g. list of Dictionaries, in display order
+        """
+
+        self.data = data
+        self.rows_filled = 0
+        self.table_widget.setRowCount(0)
+        self.fetch_more()
+
+    def can_fetch_more(self):
+        return self.rows_filled < len(self.data)
+
+    def fetch_more(self, rows=None):
+        """ Add the next page of rows. Item changed signals are blocked while rows are added.
+        param:
+            rows: Integer number of rows to add, or None for page_size
+        """
+
+        if rows is None:
+            rows = self.page_size
+        start = self.rows_filled
+        end = min(len(self.data), start + rows)
+        if end <= start:
+            return
+        signals_blocked = self.table_widget.blockSignals(True)
+        self.table_widget.setRowCount(end)
+        for row in range(start, end):
+            self.fill_row(row, self.data[row])
+        self.rows_filled = end
+        for row in range(start, end):
+            self.table_widget.resizeRowToContents(row)
+        self.table_widget.blockSignals(signals_blocked)
+
+    def fetch_all(self):
+        """ Add all remaining rows. """
+
+        if self.can_fetch_more():
+            self.fetch_more(len(self.data) - self.rows_filled)
+
+    def fetch_row(self, row):
+        """ Make sure this row has been added, e.g. before selecting it.
+        param:
+            row: Integer row number """
+
+        if row >= self.rows_filled:
+            self.fetch_more(row + 1 - self.rows_filled)
+
+    def scrolled(self, value):
+        """ Add the next page when the table is scrolled to the last page of added rows.
+        param:
+            value: Integer vertical scrollbar position """
+
+        scrollbar = self.table_widget.verticalScrollBar()
+        if self.can_fetch_more() and value >= scrollbar.maximum() - scrollbar.pageStep():
+            self.fetch_more()
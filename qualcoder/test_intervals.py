@@ -0,0 +1,128 @@
+from unittest import TestCase
+import random
+
+from qualcoder.intervals import IntervalIndex, overlap_regions, regions_in_range
+
+
+def pairwise_overlaps(codings):
+    """ The earlier O(n^2) overlap detection of apply_underline_to_overlaps, for comparison.
+    Some regions are returned end to start. """
+
+    overlaps = []
+    for i in codings:
+        for j in codings:
+            if j != i:
+                if j['pos0'] <= i['pos0'] <= j['pos1']:
+                    if (j['pos0'] >= i['pos0'] and j['pos1'] <= i['pos1']) and (j['pos0'] != j['pos1']):
+                        overlaps.append([j['pos0'], j['pos1']])
+                    elif (i['pos0'] >= j['pos0'] and i['pos1'] <= j['pos1']) and (i['pos0'] != i['pos1']):
+                        overlaps.append([i['pos0'], i['pos1']])
+                    elif j['pos0'] > i['pos0'] and (j['pos0'] != i['pos1']):
+                        overlaps.append([j['pos0'], i['pos1']])
+                    elif j['pos1'] != i['pos0']:
+                        overlaps.append([j['pos1'], i['pos0']])
+    return overlaps
+
+
+def covered(regions):
+    """ Character positions underlined by the regions. """
+
+    positions = set()
+    for pos0, pos1 in regions:
+        positions.update(range(min(pos0, pos1), max(pos0, pos1)))
+    return positions
+
+
+def codings_of(spans):
+    # Distinct dictionaries, as the coding dialogs have one per code_text row
+    return [{'pos0': pos0, 'pos1': pos1, 'ctid': i} for i, (pos0, pos1) in enumerate(spans)]
+
+
+class TestOverlapRegions(TestCase):
+
+    def check(self, spans):
+        codings = codings_of(spans)
+        regions = overlap_regions([[c['pos0'], c['pos1']] for c in codings])
+        self.assertEqual(covered(regions), covered(pairwise_overlaps(codings)), spans)
+        self.assertEqual(regions, sorted(regions))
+        for first, second in zip(regions, regions[1:]):
+            self.assertLess(first[1], second[0])
+
+    def test_nested(self):
+        self.check([(0, 100), (10, 20)])
+        self.check([(0, 100), (10, 90), (20, 30)])
+        self.assertEqual(overlap_regions([[0, 100], [10, 20]]), [[10, 20]])
+
+    def test_touching(self):
+        self.check([(0, 10), (10, 20)])
+        self.assertEqual(overlap_regions([[0, 10], [10, 20]]), [])
+
+    def test_identical(self):
+        self.check([(5, 15), (5, 15)])
+        self.assertEqual(overlap_regions([[5, 15], [5, 15]]), [[5, 15]])
+
+    def test_partial(self):
+        self.check([(0, 10), (5, 20)])
+        self.check([(5, 20), (0, 10)])
+        self.assertEqual(overlap_regions([[0, 10], [5, 20]]), [[5, 10]])
+
+    def test_adjacent_regions_joined(self):
+        self.assertEqual(overlap_regions([[0, 10], [5, 15], [10, 20]]), [[5, 15]])
+
+    def test_random(self):
+        rng = random.Random(4)
+        for _ in range(300):
+            spans = []
+            for _ in range(rng.randint(0, 12)):
+                pos0 = rng.randint(0, 60)
+                spans.append((pos0, pos0 + rng.randint(1, 25)))
+            self.check(spans)
+
+
+class TestRegionsInRange(TestCase):
+
+    def test_clipped(self):
+        regions = [[5, 10], [20, 30], [40, 50]]
+        self.assertEqual(regions_in_range(regions, 0, 100), regions)
+        self.assertEqual(regions_in_range(regions, 8, 45), [[8, 10], [20, 30], [40, 45]])
+        self.assertEqual(regions_in_range(regions, 10, 20), [])
+        self.assertEqual(regions_in_range(regions, 25, 26), [[25, 26]])
+        self.assertEqual(regions_in_range([], 0, 10), [])
+
+    def test_random(self):
+        rng = random.Random(5)
+        for _ in range(300):
+            spans = [[p, p + rng.randint(1, 20)] for p in (rng.randint(0, 80) for _ in range(rng.randint(0, 12)))]
+            regions = overlap_regions(spans)
+            pos0 = rng.randint(0, 100)
+            pos1 = pos0 + rng.randint(1, 40)
+            expected = covered(regions) & set(range(pos0, pos1))
+            self.assertEqual(covered(regions_in_range(regions, pos0, pos1)), expected)
+
+
+class TestIntervalIndex(TestCase):
+
+    def test_at(self):
+        codings = codings_of([(0, 100), (10, 20), (20, 30), (20, 30), (50, 50)])
+        index = IntervalIndex(codings)
+        self.assertEqual(index.at(20), codings[0:4])
+        self.assertEqual(index.at(50), [codings[0], codings[4]])
+        self.assertEqual(index.at(101), [])
+        self.assertEqual(IntervalIndex().at(5), [])
+
+    def test_random(self):
+        rng = random.Random(6)
+        for _ in range(200):
+            spans = [(p, p + rng.randint(0, 30)) for p in (rng.randint(0, 100) for _ in range(rng.randint(0, 20)))]
+            codings = codings_of(spans)
+            index = IntervalIndex(codings)
+            for pos in range(0, 135, 3):
+                self.assertEqual(index.at(pos), [c for c in codings if c['pos0'] <= pos <= c['pos1']])
+
+    def test_indexes(self):
+        codings = codings_of([(0, 10)])
+        index = IntervalIndex(codings)
+        self.assertTrue(index.indexes(codings))
+        codings.append({'pos0': 5, 'pos1': 6})
+        self.assertFalse(index.indexes(codings))
+        self.assertFalse(index.indexes(list(codings)))
@@ -0,0 +1,97 @@
+from unittest import TestCase, skipUnless
+import re
+import sqlite3
+
+from qualcoder import text_search
+from qualcoder.text_search import create_search_index, required_literal, search_candidate_ids, \
+    search_index_available
+
+
+class TestRequiredLiteral(TestCase):
+    """ Every match of the search term must contain the required literal. """
+
+    def check(self, search_term, expected, matching_texts=()):
+        literal = required_literal(search_term)
+        self.assertEqual(literal, expected)
+        for text_ in matching_texts:
+            self.assertIsNotNone(re.search(search_term, text_))
+            self.assertIn(literal, text_)
+
+    def test_plain_text(self):
+        self.check("hello world", "hello world", ["say hello world"])
+        self.check("ab", "")
+
+    def test_quantifiers(self):
+        self.check("ab{2}cde", "cde", ["abbcde"])
+        self.check("abc{1,3}defg", "defg", ["abcccdefg", "abcdefg"])
+        self.check("abc{,2}defg", "defg", ["abdefg"])
+        self.check("abcd*efg", "abc", ["abcefg"])
+        self.check("abcd?efgh", "efgh", ["abcefgh"])
+        self.check("abc+defg", "defg", ["abcccdefg"])
+        self.check("abcd{x}", "abcd{x}", ["abcd{x}"])
+
+    def test_classes(self):
+        self.check("[abc]defg", "defg", ["bdefg"])
+        self.check("[^]]abcd", "abcd", ["xabcd"])
+        self.check(r"[\]]abcd", "abcd", ["]abcd"])
+        self.check("[a-z]+xyz", "xyz", ["qqxyz"])
+        self.check("[abc", "")
+
+    def test_escapes(self):
+        self.check(r"a\.bcd", "a.bcd", ["a.bcd"])
+        self.check(r"abc\d+defg", "defg", ["abc12defg"])
+        self.check(r"\bword\b", "word", ["a word."])
+        self.check(r"a\.bcd*", "a.bc", ["a.bc"])
+
+    def test_character_code_escapes(self):
+        self.check(r"\x41bcd", "", ["Abcd"])
+        self.check(r"\101bcd", "", ["Abcd"])
+        self.check(r"\0bcd", "", ["\0bcd"])
+        self.check(r"\u0041bcd", "", ["Abcd"])
+        self.check(r"\U00000041bcd", "", ["Abcd"])
+        self.check(r"\N{LATIN SMALL LETTER A}bc", "", ["abc"])
+
+    def test_backreferences(self):
+        self.check(r"(a)bcd\1", "", ["abcda"])
+        self.check(r"[ab]\1cde", "")
+
+    def test_alternation_and_groups(self):
+        self.check("abcd|efgh", "")
+        self.check("(abc)?defg", "")
+        self.check("xyz(abc)", "")
+
+
+@skipUnless(search_index_available(), "sqlite without FTS5 trigram")
+class TestSearchCandidates(TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("create table source (id integer primary key, name text, fulltext text)")
+        self.conn.execute("create table journal (jid integer primary key, name text, jentry text)")
+        self.conn.executemany("insert into source (id, name, fulltext) values (?,?,?)",
+                              [(1, "one", "abbcde"), (2, "two", "nothing here"), (3, "three", "ABBCDE")])
+        self.conn.commit()
+        create_search_index(self.conn)
+
+    def test_quantifier_matches(self):
+        self.assertEqual(search_candidate_ids(self.conn, "source", "ab{2}cde"), {1, 3})
+
+    def test_index_follows_updates(self):
+        self.conn.execute("update source set fulltext='a new entry' where id=2")
+        self.conn.execute("insert into source (id, name, fulltext) values (4, 'four', 'entry four')")
+        self.conn.commit()
+        self.assertEqual(search_candidate_ids(self.conn, "source", "entry"), {2, 4})
+
+    def test_no_literal_searches_all(self):
+        self.assertIsNone(search_candidate_ids(self.conn, "source", "ab|cd"))
+
+    def test_dropped_without_trigram(self):
+        text_search._search_index_available = False
+        try:
+            self.assertEqual(create_search_index(self.conn), ["-source_fts", "-journal_fts"])
+            self.conn.execute("insert into source (id, name, fulltext) values (5, 'five', 'text')")
+            self.assertIsNone(search_candidate_ids(self.conn, "source", "abbcde"))
+        finally:
+            text_search._search_index_available = None
+        self.assertEqual(create_search_index(self.conn), ["+source_fts", "+journal_fts"])
+        self.assertEqual(search_candidate_ids(self.conn, "source", "text"), {5})
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+import logging
+import re
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Full text search shadow tables over source.fulltext and journal.jentry.
+# FTS5 external content tables with the trigram tokenizer (sqlite 3.34+) match any substring of three or more
+# characters, case-insensitively. detail=none keeps the index small. A match is only a candidate document,
+# the search pattern is always run over candidate texts, so false positives do not matter.
+# The triggers need FTS5 with trigram in every sqlite build that writes to source or journal. Builds without it
+# drop the tables and triggers on project open, and builds with it create them again.
+# QualCoder versions before full text search, with sqlite older than 3.34, cannot add or edit files
+# or journals in an indexed project.
+# fts table name: (content table, rowid column, text column)
+FTS_TABLES = {
+    "source_fts": ("source", "id", "fulltext"),
+    "journal_fts": ("journal", "jid", "jentry"),
+}
+# Enough trigrams for a selective query
+MAX_TRIGRAMS = 32
+
+_search_index_available = None
+
+
+def search_index_available():
+    """ Check that this sqlite build has FTS5 and the trigram tokenizer. Checked once per session.
+    return:
+        True if the full text search tables can be used
+    """
+
+    global _search_index_available
+    if _search_index_available is None:
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute("create virtual table trigram_test using fts5(text, tokenize='trigram')")
+            _search_index_available = True
+        except sqlite3.OperationalError as err:
+            logger.warning("Full text search is not available. " + str(err))
+            _search_index_available = False
+        conn.close()
+    return _search_index_available
+
+
+def search_index_complete(conn, fts_table):
+    """ Check that the full text search table and all of its triggers exist.
+    param:
+        conn: sqlite3 connection
+        fts_table: String name in FTS_TABLES
+    return:
+        True if complete
+    """
+
+    cur = conn.cursor()
+    cur.execute("select count(*) from sqlite_master where (type='table' and name=?) or "
+                "(type='trigger' and name in (?,?,?))",
+                [fts_table, fts_table + "_ai", fts_table + "_ad", fts_table + "_au"])
+    return cur.fetchone()[0] == 4
+
+
+def create_search_index(conn):
+    """ Create full text search tables and the triggers that keep them in sync with source and journal.
+    Complete tables are left in place, incomplete tables are created again.
+    If this sqlite build has no FTS5 trigram tokenizer, existing tables and triggers are dropped,
+    otherwise every insert or update of source and journal would fail.
+    Called by db_indexes.update_indexes on every project open.
+    param:
+        conn: sqlite3 connection
+    return:
+        list of created and dropped fts table names, prefixed with + or -
+    """
+
+    changes = []
+    cur = conn.cursor()
+    available = search_index_available()
+    for fts_table, (table, id_column, text_column) in FTS_TABLES.items():
+        if available and search_index_complete(conn, fts_table):
+            continue
+        cur.execute("select count(*) from sqlite_master where name in (?,?,?,?)",
+                    [fts_table, fts_table + "_ai", fts_table + "_ad", fts_table + "_au"])
+        if cur.fetchone()[0] > 0:
+            # Incomplete, e.g. triggers dropped when opened with a sqlite build without trigram
+            drop_search_index(conn, fts_table)
+            changes.append(f"-{fts_table}")
+        if not available:
+            continue
+        try:
+            cur.execute(f"create virtual table {fts_table} using fts5({text_column}, content='{table}', "
+                        f"content_rowid='{id_column}', tokenize='trigram', detail='none')")
+            cur.execute(f"create trigger {fts_table}_ai after insert on {table} begin "
+                        f"insert into {fts_table}(rowid, {text_column}) values (new.{id_column}, new.{text_column}); "
+                        f"end")
+            cur.execute(f"create trigger {fts_table}_ad after delete on {table} begin "
+                        f"insert into {fts_table}({fts_table}, rowid, {text_column}) "
+                        f"values ('delete', old.{id_column}, old.{text_column}); end")
+            cur.execute(f"create trigger {fts_table}_au after update of {text_column} on {table} begin "
+                        f"insert into {fts_table}({fts_table}, rowid, {text_column}) "
+                        f"values ('delete', old.{id_column}, old.{text_column}); "
+                        f"insert into {fts_table}(rowid, {text_column}) values (new.{id_column}, new.{text_column}); "
+                        f"end")
+            cur.execute(f"insert into {fts_table}({fts_table}) values ('rebuild')")
+            conn.commit()
+            changes.append(f"+{fts_table}")
+        except sqlite3.OperationalError as err:
+            conn.rollback()
+            logger.warning("Cannot create full text search table " + fts_table + ". " + str(err))
+            drop_search_index(conn, fts_table)
+    return changes
+
+
+def drop_search_index(conn, fts_table):
+    """ Remove a full text search table and its triggers.
+    param:
+        conn: sqlite3 connection
+        fts_table: String name in FTS_TABLES
+    """
+
+    cur = conn.cursor()
+    for suffix in ("_ai", "_ad", "_au"):
+        cur.execute(f"drop trigger if exists {fts_table}{suffix}")
+    try:
+        cur.execute(f"drop table if exists {fts_table}")
+    except sqlite3.OperationalError as err:
+        logger.warning(str(err))
+    conn.commit()
+
+
+def class_end(search_term, start):
+    """ Find the end of a regex character class.
+    param:
+        search_term: String regular expression
+        start: Integer position of the opening [
+    return:
+        Integer position of the closing ], or -1 if there is none
+    """
+
+    i = start + 1
+    if i < len(search_term) and search_term[i] == "^":
+        i += 1
+    # A ] directly after [ or [^ is a literal character in the class
+    if i < len(search_term) and search_term[i] == "]":
+        i += 1
+    while i < len(search_term):
+        if search_term[i] == "\\":
+            i += 2
+            continue
+        if search_term[i] == "]":
+            return i
+        i += 1
+    return -1
+
+
+def required_literal(search_term):
+    """ Get the longest run of literal characters that any regex match of the search term must contain.
+    Conservative: returns an empty string for alternations, groups, character code escapes and backreferences,
+    or when no literal run of three characters is found.
+    param:
+        search_term: String regular expression
+    return:
+        String literal, or ""
+    """
+
+    if "|" in search_term:
+        return ""
+    # A quantifier after a group can make the whole group optional
+    if "(" in search_term:
+        return ""
+    runs = []
+    run = ""
+    i = 0
+    while i < len(search_term):
+        char = search_term[i]
+        if char == "\\" and i + 1 < len(search_term):
+            escaped = search_term[i + 1]
+            i += 2
+            if escaped in "xuUN" or escaped.isdigit():
+                # Character code, named character or backreference, the matched text is not known here
+                return ""
+            if escaped.isalnum():
+                # Character class or special sequence such as \d \w \b
+                runs.append(run)
+                run = ""
+            else:
+                run += escaped
+            continue
+        if char == "{":
+            quantifier = re.match(r"\{\d*(,\d*)?\}", search_term[i:])
+            if quantifier is None:
+                # Not a quantifier, { is a literal character
+                run += char
+                i += 1
+                continue
+            # Preceding character is repeated a variable number of times, or not at all
+            run = run[:-1]
+            runs.append(run)
+            run = ""
+            i += len(quantifier.group(0))
+            continue
+        if char in "*?":
+            # Preceding character is optional
+            run = run[:-1]
+            runs.append(run)
+            run = ""
+        elif char == "+":
+            runs.append(run)
+            run = ""
+        elif char == "[":
+            runs.append(run)
+            run = ""
+            # Skip to the end of the character class
+            end = class_end(search_term, i)
+            if end == -1:
+                return ""
+            i = end
+        elif char in ").^$":
+            runs.append(run)
+            run = ""
+        else:
+            run += char
+        i += 1
+    runs.append(run)
+    longest = max(runs, key=len)
+    if len(longest) < 3:
+        return ""
+    return longest
+
+
+def search_candidate_ids(conn, table, search_term):
+    """ Use the full text search index to find the ids of documents that may match the search term.
+    param:
+        conn: sqlite3 connection
+        table: String source or journal
+        search_term: String regular expression
+    return:
+        set of ids, or None if the index cannot be used, in which case all documents must be searched
+    """
+
+    fts_table = f"{table}_fts"
+    literal = required_literal(search_term)
+    if literal == "":
+        return None
+    if not search_index_complete(conn, fts_table):
+        return None
+    cur = conn.cursor()
+    # Phrase queries are not supported with detail=none, so match all trigrams of the literal
+    trigrams = []
+    for i in range(len(literal) - 2):
+        trigram = '"' + literal[i:i + 3].replace('"', '""') + '"'
+        if trigram not in trigrams:
+            trigrams.append(trigram)
+    query = " AND ".join(trigrams[:MAX_TRIGRAMS])
+    try:
+        cur.execute(f"select rowid from {fts_table} where {fts_table} match ?", [query])
+    except sqlite3.OperationalError as err:
+        logger.warning("Full text search error: " + str(err))
+        return None
+    return {row[0] for row in cur.fetchall()}
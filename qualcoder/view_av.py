@@ -47,6 +47,7 @@ from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QBrush, QColor
 
 from .add_item_name import DialogAddItemName
+from .code_counts import CodeCounts
 from .code_in_all_files import DialogCodeInAllFiles
 from .color_selector import DialogColorSelect
 from .color_selector import colors, TextColor
@@ -55,12 +56,14 @@ from .GUI.base64_helper import *
 from .GUI.ui_dialog_code_av import Ui_Dialog_code_av
 from .GUI.ui_dialog_view_av import Ui_Dialog_view_av
 from .helpers import msecs_to_hours_mins_secs, Message, ExportDirectoryPathDialog
+from .intervals import IntervalIndex, overlap_regions, regions_in_range
 from .memo import DialogMemo
 from .report_attributes import DialogSelectAttributeParameters
 from .reports import DialogReportCoderComparisons, DialogReportCodeFrequencies  # for isinstance()
 from .report_codes import DialogReportCodes
 from .select_items import DialogSelectItems
 from .speech_to_text import SpeechToText
+from .waveform_peaks import WaveformPeaks, WaveformPeaksWorker
 
 # If VLC not installed, it will not crash
 vlc = None
@@ -90,6 +93,8 @@ class DialogCodeAV(QtWidgets.QDialog):
     mediaplayer = None
     media = None
     metadata = None
+    waveform = None  # WaveformPeaks of the loaded media
+    waveform_pixmap = None  # Waveform drawn at the scene size
     is_paused = False
     segment = {}
     segments = []
@@ -146,6 +151,8 @@ class DialogCodeAV(QtWidgets.QDialog):
                 'owner': None, 'memo': '', 'date': None, 'avid': None}'''
         self.segment_for_text = None
         self.undo_deleted_codes = []
+        self.code_counts = CodeCounts(self.app, "code_av")
+        self.code_text_index = IntervalIndex()
         self.get_codes_and_categories()
         QtWidgets.QDialog.__init__(self)
         self.ui = Ui_Dialog_code_av()
@@ -461,6 +468,7 @@ class DialogCodeAV(QtWidgets.QDialog):
         # Draw coded segments in scene
         scaler = self.scene_width / self.media.get_duration()
         self.scene.clear()
+        self.draw_waveform()
         for s in self.segments:
             if not self.important:
                 self.scene.addItem(SegmentGraphicsItem(self.app, s, scaler, self))
@@ -621,38 +629,24 @@ class DialogCodeAV(QtWidgets.QDialog):
         self.ui.treeWidget.sortByColumn(0, QtCore.Qt.SortOrder.AscendingOrder)
         self.fill_code_counts_in_tree()
 
-    def fill_code_counts_in_tree(self):
+    def fill_code_counts_in_tree(self, reload=True):
         """ Count instances of each code for current coder and in the selected file.
-        Called by fill_tree """
+        Includes text codings in the transcription, if present.
+        Counts are loaded with grouped queries. After marking and unmarking the incrementally updated counts
+        are displayed without reloading.
+        Called by fill_tree, file_selection_changed, mark, unmark
+        param:
+            reload: Boolean, True to query the counts for the file
+        """
 
         if self.file_ is None:
             return
-        cur = self.app.conn.cursor()
-        sql = "select count(cid) from code_av where cid=? and id=? and owner=?"
-        sql_txt = "select count(cid) from code_text where cid=? and fid=? and owner=?"
-        it = QtWidgets.QTreeWidgetItemIterator(self.ui.treeWidget)
-        item = it.value()
-        count = 0
-        while item and count < 10000:
-            if item.text(1)[0:4] == "cid:":
-                cid = str(item.text(1)[4:])
-                cur.execute(sql, [cid, self.file_['id'], self.app.settings['codername']])
-                result_av = cur.fetchone()
-                result_txt = [0]
-                try:  # May not have a text file
-                    cur.execute(sql_txt, [cid, self.transcription[0], self.app.settings['codername']])
-                    result_txt = cur.fetchone()
-                except Exception as e_:
-                    print(e_)
-                    logger.warning(str(e_))
-                result = result_av[0] + result_txt[0]
-                if result > 0:
-                    item.setText(3, str(result))
-                else:
-                    item.setText(3, "")
-            it += 1
-            item = it.value()
-            count += 1
+        if reload:
+            transcript_fid = None
+            if self.transcription is not None:
+                transcript_fid = self.transcription[0]
+            self.code_counts.load(self.file_['id'], self.app.settings['codername'], transcript_fid)
+        self.code_counts.fill_tree(self.ui.treeWidget)
 
     def file_menu(self, position):
         """ Context menu to select the next image alphabetically, or
@@ -882,6 +876,7 @@ class DialogCodeAV(QtWidgets.QDialog):
         # Draw coded segments in scene
         scaler = self.scene_width / self.media.get_duration()
         self.scene.clear()
+        self.draw_waveform()
         for s in self.segments:
             self.scene.addItem(SegmentGraphicsItem(self.app, s, scaler, self))
         # Set te scene to the top
@@ -894,6 +889,10 @@ class DialogCodeAV(QtWidgets.QDialog):
         self.stop()
         self.media = None
         self.file_ = None
+        if self.waveform is not None:
+            self.waveform.cancel()
+        self.waveform = None
+        self.waveform_pixmap = None
         self.setWindowTitle(_("Media coding"))
         self.ui.pushButton_play.setEnabled(False)
         self.ui.horizontalSlider.setEnabled(False)
@@ -904,6 +903,53 @@ class DialogCodeAV(QtWidgets.QDialog):
         if self.ddialog is not None:
             self.ddialog.hide()
 
+    def get_waveform(self):
+        """ Load the cached waveform peaks of the media, or build them in a background thread.
+        The waveform is drawn behind the coded segments, once the peaks are built.
+        Called by: load_media """
+
+        if self.waveform is not None:
+            self.waveform.cancel()
+        self.waveform = None
+        self.waveform_pixmap = None
+        abs_path = self.app.project_path + self.file_['mediapath']
+        if self.file_['mediapath'][0:6] in ('audio:', 'video:'):
+            abs_path = self.file_['mediapath'][6:]
+        try:
+            self.waveform = WaveformPeaks(self.app, self.file_['mediapath'], abs_path)
+        except OSError as err:
+            logger.warning(str(err))
+            return
+        if not self.waveform.is_built():
+            worker = WaveformPeaksWorker(self.waveform)
+            worker.signals.finished.connect(self.waveform_built)
+            QtCore.QThreadPool.globalInstance().start(worker)
+
+    def waveform_built(self, key, error):
+        """ Draw the waveform when the peaks are built. Peaks of a previously loaded file are ignored.
+        param:
+            key: String WaveformPeaks key
+            error: String, empty if built
+        """
+
+        if self.waveform is None or key != self.waveform.key or error != "":
+            return
+        self.draw_waveform()
+
+    def draw_waveform(self):
+        """ Add the waveform to the scene, behind the coded segments.
+        Called by: load_segments, show_important_coded, waveform_built """
+
+        if self.waveform is None or not self.waveform.is_built() or self.media is None:
+            return
+        if self.waveform_pixmap is None:
+            image = self.waveform.image(self.scene_width, self.scene_height, QtGui.QColor("#a0a0a0"),
+                                        self.media.get_duration())
+            self.waveform_pixmap = QtGui.QPixmap.fromImage(image)
+        item = QtWidgets.QGraphicsPixmapItem(self.waveform_pixmap)
+        item.setZValue(-1)
+        self.scene.addItem(item)
+
     def load_media(self):
         """ Add media to media dialog. """
 
@@ -960,6 +1006,7 @@ class DialogCodeAV(QtWidgets.QDialog):
         msecs = self.media.get_duration()
         self.media_duration_text = " / " + msecs_to_hours_mins_secs(msecs)
         self.ui.label_time.setText("0.00" + self.media_duration_text)
+        self.get_waveform()
         self.timer = QtCore.QTimer(self)
         self.timer.setInterval(100)
         self.timer.timeout.connect(self.update_ui)
@@ -1311,6 +1358,8 @@ class DialogCodeAV(QtWidgets.QDialog):
         self.update_sizes()
         self.ddialog.close()
         self.stop()
+        if self.waveform is not None:
+            self.waveform.cancel()
 
     def update_sizes(self):
         """ Called by splitter resizes and play/pause """
@@ -1343,7 +1392,7 @@ class DialogCodeAV(QtWidgets.QDialog):
 
         if self.ui.pushButton_coding.text() == _("Clear segment"):
             self.clear_segment()
-            self.fill_code_counts_in_tree()
+            self.fill_code_counts_in_tree(reload=False)
             return
         time_ = self.ui.label_time.text()
         time_ = time_.split(" / ")[0]
@@ -1773,10 +1822,11 @@ class DialogCodeAV(QtWidgets.QDialog):
         Highlight the coded text. """
 
         pos = self.ui.textEdit.textCursor().position()
-        codes_here = [c for c in self.code_text if c['pos0'] <= pos <= c['pos1']]
-        '''for i in self.code_text:
-            if i['pos0'] <= pos <= i['pos1']:
-                codes_here.append(i)'''
+        if not self.code_text_index.indexes(self.code_text):
+            self.code_text_index = IntervalIndex(self.code_text)
+        codes_here = self.code_text_index.at(pos)
+        if not codes_here:
+            return
         self.overlap_code_index += 1
         if self.overlap_code_index >= len(codes_here):
             self.overlap_code_index = 0
@@ -1796,7 +1846,7 @@ class DialogCodeAV(QtWidgets.QDialog):
         fmt.setBackground(brush)
         fmt.setForeground(QBrush(QColor(TextColor(item['color']).recommendation)))
         cursor.setCharFormat(fmt)
-        self.apply_underline_to_overlaps()
+        self.apply_underline_to_overlaps(item['pos0'], item['pos1'])
 
     def rewind_30_seconds(self):
         """ Rewind AV by 30 seconds. Alt + R """
@@ -1951,10 +2001,11 @@ class DialogCodeAV(QtWidgets.QDialog):
         cur = self.app.conn.cursor()
         cur.execute(sql, values)
         self.app.conn.commit()
+        self.code_counts.add_codings([{'cid': cid, 'id': self.file_['id'], 'owner': self.app.settings['codername']}])
         self.load_segments()
         self.clear_segment()
         self.app.delete_backup = False
-        self.fill_code_counts_in_tree()
+        self.fill_code_counts_in_tree(reload=False)
 
     def clear_segment(self):
         """ Called by assign_segment_to code. """
@@ -2459,30 +2510,25 @@ class DialogCodeAV(QtWidgets.QDialog):
                 cursor.mergeCharFormat(fmt_bold)
         self.apply_underline_to_overlaps()
 
-    def apply_underline_to_overlaps(self):
-        """ Apply underline format to coded text sections which are overlapping. """
+    def apply_underline_to_overlaps(self, pos0=None, pos1=None):
+        """ Apply underline format to coded text sections which are overlapping.
+        Overlapping regions are calculated with a sorted endpoint sweep, O(n log n).
+        param:
+            pos0: Integer or None. Optional start of range to underline
+            pos1: Integer or None. Optional end of range to underline
+        """
 
-        overlaps = []
-        for i in self.code_text:
-            for j in self.code_text:
-                if j != i:
-                    if j['pos0'] <= i['pos0'] <= j['pos1']:
-                        if j['pos0'] >= i['pos0'] and j['pos1'] <= i['pos1']:
-                            overlaps.append([j['pos0'], j['pos1']])
-                        elif i['pos0'] >= j['pos0'] and i['pos1'] <= j['pos1']:
-                            overlaps.append([i['pos0'], i['pos1']])
-                        elif j['pos0'] > i['pos0']:
-                            overlaps.append([j['pos0'], i['pos1']])
-                        else:  # j['pos0'] < i['pos0']:
-                            overlaps.append([j['pos1'], i['pos0']])
+        overlaps = overlap_regions([[c['pos0'], c['pos1']] for c in self.code_text])
+        if pos0 is not None and pos1 is not None:
+            overlaps = regions_in_range(overlaps, pos0, pos1)
         cursor = self.ui.textEdit.textCursor()
+        fmt = QtGui.QTextCharFormat()
+        fmt.setFontUnderline(True)
+        if self.app.settings['stylesheet'] == 'dark':
+            fmt.setUnderlineColor(QColor("#000000"))
+        else:
+            fmt.setUnderlineColor(QColor("#FFFFFF"))
         for o in overlaps:
-            fmt = QtGui.QTextCharFormat()
-            fmt.setFontUnderline(True)
-            if self.app.settings['stylesheet'] == 'dark':
-                fmt.setUnderlineColor(QColor("#000000"))
-            else:
-                fmt.setUnderlineColor(QColor("#FFFFFF"))
             cursor.setPosition(o[0], QtGui.QTextCursor.MoveMode.MoveAnchor)
             cursor.setPosition(o[1], QtGui.QTextCursor.MoveMode.KeepAnchor)
             cursor.mergeCharFormat(fmt)
@@ -2909,12 +2955,13 @@ class DialogCodeAV(QtWidgets.QDialog):
                                                                    coded['memo'], coded['date'], coded['important']))
             self.app.conn.commit()
             self.app.delete_backup = False
+            self.code_counts.add_codings([coded])
         except Exception as e_:
             logger.debug(str(e_))
             print(e_)
         # update coded, filter for tooltip
         self.get_coded_text_update_eventfilter_tooltips()
-        self.fill_code_counts_in_tree()
+        self.fill_code_counts_in_tree(reload=False)
 
         # Update recent_codes
         tmp_code = None
@@ -2964,9 +3011,10 @@ class DialogCodeAV(QtWidgets.QDialog):
                                                                    item['owner'],
                                                                    item['memo'], item['date'], item['important']))
         self.app.conn.commit()
+        self.code_counts.add_codings(self.undo_deleted_codes)
         self.undo_deleted_codes = []
         self.get_coded_text_update_eventfilter_tooltips()
-        self.fill_code_counts_in_tree()
+        self.fill_code_counts_in_tree(reload=False)
 
     def unmark(self, location):
         """ Remove code marking by this coder from selected text in current file.
@@ -3007,7 +3055,8 @@ class DialogCodeAV(QtWidgets.QDialog):
 
         # Update filter for tooltip and update code colours
         self.get_coded_text_update_eventfilter_tooltips()
-        self.fill_code_counts_in_tree()
+        self.code_counts.remove_codings(to_unmark)
+        self.fill_code_counts_in_tree(reload=False)
         self.app.delete_backup = False
 
     def annotate(self, cursor_pos):
@@ -3193,6 +3242,8 @@ class ToolTipEventFilter(QtCore.QObject):
     codes = None
     code_text = None
     annotations = None
+    code_text_index = None
+    annotations_index = None
     app = None
 
     def set_codes_and_annotations(self, app, code_text, codes, annotations):
@@ -3202,11 +3253,15 @@ class ToolTipEventFilter(QtCore.QObject):
         self.code_text = code_text
         self.codes = codes
         self.annotations = annotations
+        codes_by_cid = {c['cid']: c for c in self.codes}
         for item in self.code_text:
-            for c in self.codes:
-                if item['cid'] == c['cid']:
-                    item['name'] = c['name']
-                    item['color'] = c['color']
+            code_ = codes_by_cid.get(item['cid'])
+            if code_ is not None:
+                item['name'] = code_['name']
+                item['color'] = code_['color']
+        # Position indexes, so hover events are O(log n + k)
+        self.code_text_index = IntervalIndex(self.code_text)
+        self.annotations_index = IntervalIndex(self.annotations)
 
     def eventFilter(self, receiver, event):
         """ Tool tip event filter for textEdit """
@@ -3222,34 +3277,31 @@ class ToolTipEventFilter(QtCore.QObject):
             if self.code_text is None:
                 # Call Base Class Method to Continue Normal Event Processing
                 return super(ToolTipEventFilter, self).eventFilter(receiver, event)
-            for item in self.code_text:
-                if item['pos0'] <= pos <= item['pos1']:
-                    try:
-                        text_ += '<p style="background-color:' + item['color']
-                        text_ += '; color:' + TextColor(item['color']).recommendation + '">' + item['name']
-                        if self.app.settings['showids']:
-                            text_ += " [ctid:" + str(item['ctid']) + "] "
-                        if item['avid'] is not None:
-                            text_ += " [" + msecs_to_hours_mins_secs(item['av_pos0'])
-                            text_ += " - " + msecs_to_hours_mins_secs(item['av_pos1']) + "]"
-                        if item['memo'] != "":
-                            text_ += "<br /><em>" + _("MEMO: ") + item['memo'] + "</em>"
-                        if item['important'] == 1:
-                            text_ += "<br /><em>IMPORTANT</em>"
-                        text_ += "</p>"
-                        multiple += 1
-                    except KeyError as e_:
-                        msg_ = "Codes ToolTipEventFilter " + str(e_) + ". Key error: "
-                        msg_ += str(item) + "\n" + str(self.code_text)
-                        logger.error(msg_)
+            for item in self.code_text_index.at(pos):
+                try:
+                    text_ += '<p style="background-color:' + item['color']
+                    text_ += '; color:' + TextColor(item['color']).recommendation + '">' + item['name']
+                    if self.app.settings['showids']:
+                        text_ += " [ctid:" + str(item['ctid']) + "] "
+                    if item['avid'] is not None:
+                        text_ += " [" + msecs_to_hours_mins_secs(item['av_pos0'])
+                        text_ += " - " + msecs_to_hours_mins_secs(item['av_pos1']) + "]"
+                    if item['memo'] != "":
+                        text_ += "<br /><em>" + _("MEMO: ") + item['memo'] + "</em>"
+                    if item['important'] == 1:
+                        text_ += "<br /><em>IMPORTANT</em>"
+                    text_ += "</p>"
+                    multiple += 1
+                except KeyError as e_:
+                    msg_ = "Codes ToolTipEventFilter " + str(e_) + ". Key error: "
+                    msg_ += str(item) + "\n" + str(self.code_text)
+                    logger.error(msg_)
             if multiple > 1:
                 text_ = multiple_msg + text_
             # Check annotations
-            for ann in self.annotations:
-                # if item['pos0'] - self.offset <= pos and item['pos1'] - self.offset >= pos:
-                if ann['pos0'] <= pos <= ann['pos1']:
-                    text_ += "<p>" + _("ANNOTATED:") + ann['memo'] + "</p>"
-                    break
+            annotations_here = self.annotations_index.at(pos)
+            if annotations_here:
+                text_ += "<p>" + _("ANNOTATED:") + annotations_here[0]['memo'] + "</p>"
             if text_ != "":
                 receiver.setToolTip(text_)
         # Call Base Class Method to Continue Normal Event Processing
@@ -3670,6 +3722,7 @@ class DialogViewAV(QtWidgets.QDialog):
     instance = None
     mediaplayer = None
     media = None
+    waveform = None  # WaveformPeaks
 
     # Variables for searching through text
     search_indices = []  # A list of tuples of (text name, match.start, match length)
@@ -3959,50 +4012,48 @@ class DialogViewAV(QtWidgets.QDialog):
             self.ui.pushButton_speechtotext.setToolTip(_("Speech to text disabled.\nTranscript contains text."))
 
     def get_waveform(self):
-        """ Create waveform image in the audio folder. Apply image to label_waveform.
+        """ Show the waveform in label_waveform. Peaks are cached per media file, if not cached they are
+        built in a background thread by decoding the audio with ffmpeg.
         If a video file has multiple tracks only the first one is used for this method.
-        https://ffmpeg.org/ffmpeg-filters.html
-        Requires installed ffmpeg
-        ffmpeg is much slower on Windows han Ubuntu """
-
-        waveform_path = self.app.project_path + "/audio/waveform.png"
-        if os.path.exists(waveform_path):
-            os.remove(waveform_path)
-        wf_command = 'ffmpeg -i "' + self.abs_path + '"'
-        wf_command += ' -filter_complex'
-        wf_command += ' "aformat=channel_layouts=mono,showwavespic=s=1020x100'
-        if self.app.settings['stylesheet'] in ("dark", "rainbow"):
-            wf_command += ':colors=#f89407"'
-        else:
-            wf_command += ':colors=#0A0A0A"'
-        wf_command += ' -frames:v 1'
-        wf_command += ' "' + waveform_path + '"'
-        try:
-            subprocess.run(wf_command, timeout=15, shell=True)
-        except Exception as e_:
-            logger.error(str(e_))
-            print(str(e_))
-            Message(self.app, "ffmpeg error", str(e_))
-        '''# https://www.cloudacm.com/?p=3105
-        spectrogram_path = self.app.project_path + "/audio/spectrogram.png"
-        if os.path.exists(spectrogram_path):
-            os.remove(spectrogram_path)
-        sp_command = 'ffmpeg -i "' + self.abs_path + '"'
-        sp_command += ' -lavfi showspectrumpic=s=1020x200:legend=disabled'
-        sp_command += ' "' + spectrogram_path + '"'
+        Requires installed ffmpeg """
+
+        self.ui.label_waveform.hide()
         try:
-            subprocess.run(sp_command, timeout=15, shell=True)
-        except Exception as e_:
-            logger.error(str(e_))
-            Message(self.app, "ffmpeg error", str(e_))
-            print(str(e_))
-            #return'''
-        if not os.path.exists(waveform_path):
-            self.ui.label_waveform.hide()
+            self.waveform = WaveformPeaks(self.app, self.file_['mediapath'], self.abs_path)
+        except OSError as err:
+            logger.warning(str(err))
             return
-        pm = QtGui.QPixmap()
-        pm.load(waveform_path)
-        self.ui.label_waveform.setPixmap(QtGui.QPixmap(pm).scaled(1020, 60))
+        if self.waveform.is_built():
+            self.show_waveform()
+            return
+        worker = WaveformPeaksWorker(self.waveform)
+        worker.signals.finished.connect(self.waveform_built)
+        QtCore.QThreadPool.globalInstance().start(worker)
+
+    def waveform_built(self, key, error):
+        """ param:
+            key: String WaveformPeaks key
+            error: String, empty if built
+        """
+
+        if self.waveform is None or key != self.waveform.key or error != "":
+            return
+        self.show_waveform()
+
+    def show_waveform(self):
+        """ Draw the waveform into label_waveform. """
+
+        if not self.waveform.is_built():
+            return
+        color = QtGui.QColor("#0A0A0A")
+        if self.app.settings['stylesheet'] in ("dark", "rainbow"):
+            color = QtGui.QColor("#f89407")
+        duration = None
+        if self.media is not None:
+            duration = self.media.get_duration()
+        image = self.waveform.image(1020, 60, color, duration)
+        self.ui.label_waveform.setPixmap(QtGui.QPixmap.fromImage(image))
+        self.ui.label_waveform.show()
 
     def get_cases_codings_annotations(self):
         """ Get all linked cases, coded text and annotations for this file """
@@ -4534,6 +4585,8 @@ class DialogViewAV(QtWidgets.QDialog):
         self.update_sizes()
         self.ddialog.close()
         self.stop()
+        if self.waveform is not None:
+            self.waveform.cancel()
         cur = self.app.conn.cursor()
         if self.transcription is not None:
             txt = self.ui.textEdit.toPlainText()
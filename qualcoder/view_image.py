@@ -42,6 +42,7 @@ from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QBrush
 
 from .add_item_name import DialogAddItemName
+from .code_counts import CodeCounts
 from .code_in_all_files import DialogCodeInAllFiles
 from .color_selector import DialogColorSelect
 from .color_selector import colors, TextColor
@@ -51,6 +52,7 @@ from .GUI.ui_dialog_code_image import Ui_Dialog_code_image
 from .GUI.ui_dialog_view_image import Ui_Dialog_view_image
 from .move_resize_rectangle import DialogMoveResizeRectangle
 from .helpers import ExportDirectoryPathDialog, Message
+from .image_tiles import allow_large_images, image_size, ImageTiles, ImageTilesWorker, TILED_IMAGE_PIXELS
 from .memo import DialogMemo
 from .report_attributes import DialogSelectAttributeParameters
 from .reports import DialogReportCoderComparisons, DialogReportCodeFrequencies  # for isinstance()
@@ -67,7 +69,12 @@ class DialogCodeImage(QtWidgets.QDialog):
     app = None
     parent_textEdit = None
     tab_reports = None  # Tab widget reports, used for updates to codes
-    pixmap = None
+    pixmap = None  # Whole image, or the preview while tiles of a large image are built
+    image_size = None  # QSize of the full resolution image
+    image_item = None  # QGraphicsPixmapItem of pixmap
+    tiles = None  # ImageTiles, for large images
+    tile_items = {}  # (level, col, row): QGraphicsPixmapItem of shown tiles
+    area_items = {}  # imid: QGraphicsRectItem of shown coded areas
     scene = None
     files = []  # List of Dictionaries
     file_ = None  # Dictionary with name, memo, id, mediapath?
@@ -96,6 +103,7 @@ class DialogCodeImage(QtWidgets.QDialog):
         self.categories = []
         self.files = []
         self.undo_deleted_code = None
+        self.code_counts = CodeCounts(self.app, "code_image")
         self.file_ = None
         self.log = ""
         self.scale = 1.0
@@ -103,6 +111,8 @@ class DialogCodeImage(QtWidgets.QDialog):
         self.important = False
         self.attributes = []
         self.degrees = 0
+        self.tile_items = {}
+        self.area_items = {}
         self.get_codes_and_categories()
         self.get_coded_areas()
         QtWidgets.QDialog.__init__(self)
@@ -116,6 +126,10 @@ class DialogCodeImage(QtWidgets.QDialog):
         # Need this otherwise small images are centred on screen, and affect context menu position points
         self.ui.graphicsView.setAlignment(QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignTop)
         self.scene.installEventFilter(self)
+        # Large images show only the tiles within the view
+        self.ui.graphicsView.viewport().installEventFilter(self)
+        self.ui.graphicsView.horizontalScrollBar().valueChanged.connect(self.view_scrolled)
+        self.ui.graphicsView.verticalScrollBar().valueChanged.connect(self.view_scrolled)
         font = f"font: {self.app.settings['fontsize']}pt "
         font += '"' + self.app.settings['font'] + '";'
         self.setStyleSheet(font)
@@ -455,29 +469,20 @@ class DialogCodeImage(QtWidgets.QDialog):
         self.ui.treeWidget.sortByColumn(0, QtCore.Qt.SortOrder.AscendingOrder)
         self.fill_code_counts_in_tree()
 
-    def fill_code_counts_in_tree(self):
+    def fill_code_counts_in_tree(self, reload=True):
         """ Count instances of each code for current coder and in the selected file.
-        Called by: fill_tree """
+        Counts are loaded with one grouped query. After mark and unmark the incrementally updated counts
+        are displayed without reloading.
+        Called by: fill_tree, load_file, create_code_area, unmark
+        param:
+            reload: Boolean, True to query the counts for the file
+        """
 
         if self.file_ is None:
             return
-        cur = self.app.conn.cursor()
-        sql = "select count(cid) from code_image where cid=? and id=? and owner=?"
-        it = QtWidgets.QTreeWidgetItemIterator(self.ui.treeWidget)
-        item = it.value()
-        count = 0
-        while item and count < 10000:
-            if item.text(1)[0:4] == "cid:":
-                cid = str(item.text(1)[4:])
-                cur.execute(sql, [cid, self.file_['id'], self.app.settings['codername']])
-                result = cur.fetchone()
-                if result[0] > 0:
-                    item.setText(3, str(result[0]))
-                else:
-                    item.setText(3, "")
-            it += 1
-            item = it.value()
-            count += 1
+        if reload:
+            self.code_counts.load(self.file_['id'], self.app.settings['codername'])
+        self.code_counts.fill_tree(self.ui.treeWidget)
 
     def active_file_memo(self):
         """ Send active file to file_memo method.
@@ -650,14 +655,37 @@ class DialogCodeImage(QtWidgets.QDialog):
         self.file_ = None
         self.selection = None
         self.scale = 1.0
-        items = list(self.scene.items())
-        for i in range(items.__len__()):
-            self.scene.removeItem(items[i])
+        self.image_size = None
+        self.pixmap = None
+        self.tiles = None
+        self.clear_scene()
         self.setWindowTitle(_("Image coding"))
         self.ui.pushButton_memo.setEnabled(False)
 
+    def clear_scene(self):
+        """ Remove the image, tiles and coded areas from the scene.
+        Called by: clear_file, load_file """
+
+        self.scene.clear()
+        self.image_item = None
+        self.tile_items = {}
+        self.area_items = {}
+
+    def cannot_open_image(self, source):
+        """ Clear the GUI and variables and warn.
+        Called by: load_file
+        param:
+            source: String image filepath
+        """
+
+        self.clear_file()
+        Message(self.app, _("Image Error"), _("Cannot open: ") + source, "warning").exec()
+        logger.warning("Cannot open image: " + source)
+
     def load_file(self):
         """ Add image to scene if it exists. If not exists clear the GUI and variables.
+        Large images are shown as tiles, see image_tiles. If the tiles are not yet built, a reduced preview is shown
+        while the tiles are built in a background thread.
         Called by: select_image_menu, file_selection_changed
         """
 
@@ -667,37 +695,63 @@ class DialogCodeImage(QtWidgets.QDialog):
         source = self.app.project_path + self.file_['mediapath']
         if self.file_['mediapath'][0:7] == "images:":
             source = self.file_['mediapath'][7:]
-        image = QtGui.QImage(source)
-        if image.isNull():
-            self.clear_file()
-            Message(self.app, _("Image Error"), _("Cannot open: ", "warning") + source).exec()
-            logger.warning("Cannot open image: " + source)
+        size = image_size(source)
+        if not size.isValid():
+            self.cannot_open_image(source)
             return
-        items = list(self.scene.items())
-        for i in range(items.__len__()):
-            self.scene.removeItem(items[i])
+        self.tiles = None
+        self.pixmap = None
+        if size.width() * size.height() > TILED_IMAGE_PIXELS:
+            self.tiles = ImageTiles(self.app, self.file_['mediapath'], source)
+            if not self.tiles.is_built():
+                self.pixmap = QtGui.QPixmap.fromImage(self.tiles.preview())
+                allow_large_images(size)
+                worker = ImageTilesWorker(self.tiles)
+                worker.signals.finished.connect(self.tiles_built)
+                QtCore.QThreadPool.globalInstance().start(worker)
+        else:
+            image = QtGui.QImage(source)
+            if image.isNull():
+                self.cannot_open_image(source)
+                return
+            self.pixmap = QtGui.QPixmap.fromImage(image)
+        self.clear_scene()
+        self.image_size = size
         self.setWindowTitle(_("Image: ") + self.file_['name'])
         self.ui.pushButton_memo.setEnabled(True)
         self.ui.pushButton_export.setEnabled(True)
-        self.pixmap = QtGui.QPixmap.fromImage(image)
-        pixmap_item = QtWidgets.QGraphicsPixmapItem(QtGui.QPixmap.fromImage(image))
-        pixmap_item.setPos(0, 0)
-        self.scene.setSceneRect(QtCore.QRectF(0, 0, self.pixmap.width(), self.pixmap.height()))
-        self.scene.addItem(pixmap_item)
         self.ui.horizontalSlider.setValue(99)
 
         # Scale initial picture by height to mostly fit inside scroll area
         # Tried other methods e.g. sizes of components, but nothing was correct.
         # - 30 - 100   are slider and groupbox approx heights
-        if self.pixmap.height() > self.height() - 30 - 100:
-            scale = (self.height() - 30 - 100) / self.pixmap.height()
+        if self.image_size.height() > self.height() - 30 - 100:
+            scale = (self.height() - 30 - 100) / self.image_size.height()
             slider_value = int(scale * 100)
             if slider_value > 100:
                 slider_value = 100
             self.ui.horizontalSlider.setValue(slider_value)
-        self.draw_coded_areas()
+        self.redraw_scene()
         self.fill_code_counts_in_tree()
 
+    def tiles_built(self, key, error):
+        """ Replace the preview with the tiles. Ignored if another image has been loaded since.
+        param:
+            key: String ImageTiles key
+            error: String, empty if the tiles were built
+        """
+
+        if self.tiles is None or key != self.tiles.key:
+            return
+        if error != "":
+            self.parent_textEdit.append(_("Image tiles not created: ") + self.file_['name'] + "\n" + error)
+            return
+        if self.image_item is not None:
+            self.scene.removeItem(self.image_item)
+            self.image_item = None
+        self.pixmap = None
+        self.redraw_scene()
+
     def update_dialog_codes_and_categories(self):
         """ Update code and category tree here and in DialogReportCodes, ReportCoderComparisons, ReportCodeFrequencies
         Using try except blocks for each instance, as instance may have been deleted. """
@@ -725,73 +779,151 @@ class DialogCodeImage(QtWidgets.QDialog):
         """ Resize image. Triggered by user change in slider. Or resize or move of a coded area.
         Called by unmark, and Menu rotate action, as all items need to be redrawn. """
 
-        if self.pixmap is None:
+        if self.image_size is None:
             return
         self.scale = (self.ui.horizontalSlider.value() + 1) / 100
-        height = int(self.scale * self.pixmap.height())
-        pixmap = self.pixmap.scaledToHeight(height, QtCore.Qt.TransformationMode.FastTransformation)
-        transform = QtGui.QTransform().rotate(self.degrees)
-        pixmap = pixmap.transformed(transform)
-        pixmap_item = QtWidgets.QGraphicsPixmapItem(pixmap)
-        pixmap_item.setPos(0, 0)
-        self.scene.clear()
-        self.scene.addItem(pixmap_item)
+        image_rect = QtCore.QRectF(0, 0, self.image_size.width(), self.image_size.height())
+        self.scene.setSceneRect(self.image_to_scene_rect(image_rect))
+        if self.tiles is not None and self.tiles.is_built():
+            self.show_tiles()
+        elif self.pixmap is not None and not self.pixmap.isNull():
+            if self.image_item is None:
+                self.image_item = self.scene.addPixmap(self.pixmap)
+                self.image_item.setZValue(-1)
+            self.position_pixmap_item(self.image_item, image_rect)
         self.draw_coded_areas()
         scale_text = _("Scale: ") + f"{int(self.scale * 100)}%"
         self.ui.horizontalSlider.setToolTip(scale_text)
-        msg = _("Width") + f": {self.pixmap.width()} " + _("Height") + f": {self.pixmap.height()}\n"
+        msg = _("Width") + f": {self.image_size.width()} " + _("Height") + f": {self.image_size.height()}\n"
         msg += scale_text + " " + _("Rotation") + ": " + str(self.degrees) + "\u00b0"
         self.ui.label_image.setText(msg)
 
+    def image_to_scene_rect(self, rect):
+        """ Scene area of an image area, with scaling and rotation.
+        param:
+            rect: QRectF in full resolution image pixels
+        return:
+            QRectF
+        """
+
+        x, y, width, height = rect.x(), rect.y(), rect.width(), rect.height()
+        if self.degrees == 90:
+            x, y, width, height = self.image_size.height() - y - height, x, height, width
+        if self.degrees == 180:
+            x, y = self.image_size.width() - x - width, self.image_size.height() - y - height
+        if self.degrees == 270:
+            x, y, width, height = y, self.image_size.width() - x - width, height, width
+        return QtCore.QRectF(x * self.scale, y * self.scale, width * self.scale, height * self.scale)
+
+    def scene_to_image_rect(self, rect):
+        """ Image area of a scene area, reverses image_to_scene_rect.
+        param:
+            rect: QRectF in scene coordinates
+        return:
+            QRectF in full resolution image pixels
+        """
+
+        x, y = rect.x() / self.scale, rect.y() / self.scale
+        width, height = rect.width() / self.scale, rect.height() / self.scale
+        if self.degrees == 90:
+            x, y, width, height = y, self.image_size.height() - x - width, height, width
+        if self.degrees == 180:
+            x, y = self.image_size.width() - x - width, self.image_size.height() - y - height
+        if self.degrees == 270:
+            x, y, width, height = self.image_size.width() - y - height, x, height, width
+        return QtCore.QRectF(x, y, width, height)
+
+    def position_pixmap_item(self, item, image_rect):
+        """ Scale, rotate and position a pixmap item, so it covers this area of the image.
+        The pixmap is not rescaled, so zooming only changes the item transform.
+        param:
+            item: QGraphicsPixmapItem of the whole image, the preview, or a tile
+            image_rect: QRectF in full resolution image pixels
+        """
+
+        pixmap_rect = QtCore.QRectF(item.pixmap().rect())
+        pixmap_scale = self.scale * image_rect.width() / pixmap_rect.width()
+        transform = QtGui.QTransform().rotate(self.degrees).scale(pixmap_scale, pixmap_scale)
+        item.setTransform(transform)
+        item.setPos(self.image_to_scene_rect(image_rect).topLeft() - transform.mapRect(pixmap_rect).topLeft())
+
+    def show_tiles(self, all_tiles=False):
+        """ Show the tiles within the graphics view, from the tile level for the current scale.
+        Tiles no longer in the view are removed from the scene.
+        Called by: redraw_scene, graphics view scrolled or resized, export_html_file
+        param:
+            all_tiles: Boolean, show all tiles of the level, e.g. to export the whole image
+        """
+
+        if self.tiles is None or not self.tiles.is_built() or self.image_size is None:
+            return
+        level = self.tiles.level_for_scale(self.scale)
+        image_rect = QtCore.QRectF(0, 0, self.image_size.width(), self.image_size.height())
+        if not all_tiles:
+            view_rect = self.ui.graphicsView.mapToScene(self.ui.graphicsView.viewport().rect()).boundingRect()
+            image_rect = image_rect.intersected(self.scene_to_image_rect(view_rect))
+        keys = set(self.tiles.tiles_in_rect(level, image_rect))
+        for key in list(self.tile_items):
+            if key not in keys:
+                self.scene.removeItem(self.tile_items.pop(key))
+        for key in keys:
+            tile_item = self.tile_items.get(key)
+            if tile_item is None:
+                pixmap = self.tiles.tile_pixmap(*key)
+                if pixmap is None:
+                    continue
+                tile_item = self.scene.addPixmap(pixmap)
+                tile_item.setZValue(-1)
+                self.tile_items[key] = tile_item
+            self.position_pixmap_item(tile_item, self.tiles.tile_rect(*key))
+
+    def view_scrolled(self, value):
+        """ Show tiles scrolled into the view.
+        param:
+            value: Integer scroll bar position, not used
+        """
+
+        self.show_tiles()
+
     def draw_coded_areas(self):
         """ Draw coded areas with scaling. This coder is shown in dashed rectangles.
-        Other coders are shown via dotline rectangles.
-        Remove items first, as this is called after a coded area is unmarked. """
+        Rectangles are kept for each coded area and repositioned, rectangles of coded areas that are no longer
+        shown are removed, e.g. after a coded area is unmarked. """
 
         if self.file_ is None:
             return
+        shown = {}
         for item in self.code_areas:
-            if item['id'] == self.file_['id']:
-                color = None
-                tooltip = ""
-                for c in self.codes:
-                    if c['cid'] == item['cid']:
-                        tooltip = f"{c['name']} ({item['owner']})"
-                        if self.app.settings['showids']:
-                            tooltip += f"[imid:{item['imid']}]"
-                        if item['memo'] != "":
-                            tooltip += f"\nMemo: {item['memo']}"
-                        if item['important'] == 1:
-                            tooltip += "\n" + _("IMPORTANT")
-                        color = QtGui.QColor(c['color'])
-                # Degrees 0
-                x = item['x1'] * self.scale
-                y = item['y1'] * self.scale
-                width = item['width'] * self.scale
-                height = item['height'] * self.scale
-                if self.degrees == 90:
-                    y = (item['x1']) * self.scale
-                    x = (self.pixmap.height() - item['y1'] - item['height']) * self.scale
-                    height = item['width'] * self.scale
-                    width = item['height'] * self.scale
-                if self.degrees == 180:
-                    x = (self.pixmap.width() - item['x1'] - item['width']) * self.scale
-                    y = (self.pixmap.height() - item['y1'] - item['height']) * self.scale
-                    width = item['width'] * self.scale
-                    height = item['height'] * self.scale
-                if self.degrees == 270:
-                    y = (self.pixmap.width() - item['x1'] - item['width']) * self.scale
-                    x = (item['y1']) * self.scale
-                    height = item['width'] * self.scale
-                    width = item['height'] * self.scale
-                rect_item = QtWidgets.QGraphicsRectItem(x, y, width, height)
-                rect_item.setPen(QtGui.QPen(color, 2, QtCore.Qt.PenStyle.DashLine))
-                rect_item.setToolTip(tooltip)
-                if item['owner'] == self.app.settings['codername']:
-                    if self.important and item['important'] == 1:
-                        self.scene.addItem(rect_item)
-                    if not self.important:
-                        self.scene.addItem(rect_item)
+            if item['id'] != self.file_['id'] or item['owner'] != self.app.settings['codername']:
+                continue
+            if self.important and item['important'] != 1:
+                continue
+            color = None
+            tooltip = ""
+            for c in self.codes:
+                if c['cid'] == item['cid']:
+                    tooltip = f"{c['name']} ({item['owner']})"
+                    if self.app.settings['showids']:
+                        tooltip += f"[imid:{item['imid']}]"
+                    if item['memo'] != "":
+                        tooltip += f"\nMemo: {item['memo']}"
+                    if item['important'] == 1:
+                        tooltip += "\n" + _("IMPORTANT")
+                    color = QtGui.QColor(c['color'])
+            rect = QtCore.QRectF(item['x1'], item['y1'], item['width'], item['height'])
+            shown[item['imid']] = (self.image_to_scene_rect(rect), color, tooltip)
+        for imid in list(self.area_items):
+            if imid not in shown:
+                self.scene.removeItem(self.area_items.pop(imid))
+        for imid, (rect, color, tooltip) in shown.items():
+            rect_item = self.area_items.get(imid)
+            if rect_item is None:
+                rect_item = QtWidgets.QGraphicsRectItem()
+                self.scene.addItem(rect_item)
+                self.area_items[imid] = rect_item
+            rect_item.setRect(rect)
+            rect_item.setPen(QtGui.QPen(color, 2, QtCore.Qt.PenStyle.DashLine))
+            rect_item.setToolTip(tooltip)
 
     def export_html_file(self):
         """ Export the QGraphicsScene as a png image with transparent background.
@@ -803,8 +935,8 @@ class DialogCodeImage(QtWidgets.QDialog):
         filepath = export_dir.filepath
         if filepath is None:
             return
-        pic_width = self.pixmap.width() * self.scale
-        pic_height = self.pixmap.height() * self.scale
+        pic_width = self.image_size.width() * self.scale
+        pic_height = self.image_size.height() * self.scale
         if self.degrees in (90, 270):
             pic_width, pic_height = pic_height, pic_width
         rect_area = QtCore.QRectF(0.0, 0.0, pic_width, pic_height)
@@ -812,8 +944,10 @@ class DialogCodeImage(QtWidgets.QDialog):
         painter = QtGui.QPainter(image)
         painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
         # Render method requires QRectF NOT QRect
+        self.show_tiles(all_tiles=True)
         self.scene.render(painter, QtCore.QRectF(image.rect()), rect_area)
         painter.end()
+        self.show_tiles()
         # Convert to base64 as String not bytes
         byte_array = QtCore.QByteArray()
         buffer = QtCore.QBuffer(byte_array)
@@ -836,16 +970,16 @@ class DialogCodeImage(QtWidgets.QDialog):
             y2 = y1 + c['height'] * self.scale
             if self.degrees == 90:
                 y1 = (c['x1']) * self.scale
-                x1 = (self.pixmap.height() - c['y1'] - c['height']) * self.scale
+                x1 = (self.image_size.height() - c['y1'] - c['height']) * self.scale
                 y2 = y1 + c['width'] * self.scale
                 x2 = x1 + c['height'] * self.scale
             if self.degrees == 180:
-                x1 = (self.pixmap.width() - c['x1'] - c['width']) * self.scale
-                y1 = (self.pixmap.height() - c['y1'] - c['height']) * self.scale
+                x1 = (self.image_size.width() - c['x1'] - c['width']) * self.scale
+                y1 = (self.image_size.height() - c['y1'] - c['height']) * self.scale
                 x2 = x1 + c['width'] * self.scale
                 y2 = y1 + c['height'] * self.scale
             if self.degrees == 270:
-                y1 = (self.pixmap.width() - c['x1'] - c['width']) * self.scale
+                y1 = (self.image_size.width() - c['x1'] - c['width']) * self.scale
                 x1 = (c['y1']) * self.scale
                 y2 = y1 + c['width'] * self.scale
                 x2 = x1 + c['height'] * self.scale
@@ -1082,6 +1216,8 @@ class DialogCodeImage(QtWidgets.QDialog):
                 self.item_moved_update_data(item, parent)
                 self.update_dialog_codes_and_categories()
                 return True
+        if object_ is self.ui.graphicsView.viewport() and event.type() == QtCore.QEvent.Type.Resize:
+            self.show_tiles()
         if object_ is self.scene:
             if type(event) == QtWidgets.QGraphicsSceneMouseEvent and event.button() == Qt.MouseButton.LeftButton:
                 pos = event.buttonDownScenePos(Qt.MouseButton.LeftButton)
@@ -1105,11 +1241,9 @@ class DialogCodeImage(QtWidgets.QDialog):
         """ Scene context menu for setting importance, unmarking coded areas and adding memos. """
 
         # Outside image area, no context menu
-        for item in self.scene.items():
-            if type(item) == QtWidgets.QGraphicsPixmapItem:
-                if pos.x() > item.boundingRect().width() or pos.y() > item.boundingRect().height():
-                    self.selection = None
-                    return
+        if pos.x() > self.scene.sceneRect().width() or pos.y() > self.scene.sceneRect().height():
+            self.selection = None
+            return
         global_pos = QtGui.QCursor.pos()
         items = self.find_coded_areas_for_pos(pos)
         # Menu for show/hide top panel
@@ -1189,27 +1323,27 @@ class DialogCodeImage(QtWidgets.QDialog):
         if item['x1'] < 0:
             item['x1'] = 0
         # x is past the image size, so resize to 10 wide and 11 back from image x edge
-        if item['x1'] + 11 > self.pixmap.width():
-            item['x1'] = self.pixmap.width() - 11
+        if item['x1'] + 11 > self.image_size.width():
+            item['x1'] = self.image_size.width() - 11
             item['width'] = 10
         item['y1'] += ui.move_y
         if item['y1'] < 0:
             item['y1'] = 0
         # y is past the image size, so resize to 10 wide and 11 back from image y edge
-        if item['y1'] + 11 > self.pixmap.height():
-            item['y1'] = self.pixmap.height() - 11
+        if item['y1'] + 11 > self.image_size.height():
+            item['y1'] = self.image_size.height() - 11
             item['height'] = 10
         item['width'] += ui.resize_x
         if item['width'] < 10:
             item['width'] = 10
-        if item['x1'] + item['width'] > self.pixmap.width():
-            overreach = item['x1'] + item['width'] - self.pixmap.width()
+        if item['x1'] + item['width'] > self.image_size.width():
+            overreach = item['x1'] + item['width'] - self.image_size.width()
             item['width'] -= overreach + 1
         item['height'] += ui.resize_y
         if item['height'] < 10:
             item['height'] = 10
-        if item['y1'] + item['height'] > self.pixmap.height():
-            overreach = item['y1'] + item['height'] - self.pixmap.height()
+        if item['y1'] + item['height'] > self.image_size.height():
+            overreach = item['y1'] + item['height'] - self.image_size.height()
             item['height'] -= overreach + 1
         cur = self.app.conn.cursor()
         cur.execute("update code_image set x1=?,y1=?,width=?,height=? where imid=?",
@@ -1230,8 +1364,8 @@ class DialogCodeImage(QtWidgets.QDialog):
         if self.file_ is None:
             return
         # Reposition pos based on rotation
-        pix_h_scaled = self.pixmap.height() * self.scale
-        pix_w_scaled = self.pixmap.width() * self.scale
+        pix_h_scaled = self.image_size.height() * self.scale
+        pix_w_scaled = self.image_size.width() * self.scale
         if self.degrees == 90:
             pos = QtCore.QPointF(pos.y(), pix_h_scaled - pos.x())
         if self.degrees == 180:
@@ -1263,7 +1397,7 @@ class DialogCodeImage(QtWidgets.QDialog):
             msg += f"\nx:{int(i['x1'])} y:{int(i['y1'])}"
             msg += f" w:{int(i['width'])} h:{int(i['height'])}"
             area = i['width'] * i['height']
-            pic_area = self.pixmap.width() * self.pixmap.height()
+            pic_area = self.image_size.width() * self.image_size.height()
             percent_area = round(area / pic_area * 100, 2)
             msg += f" area: {percent_area}%\n"
             tooltip = msg + "\n" + i['memo']
@@ -1319,10 +1453,11 @@ class DialogCodeImage(QtWidgets.QDialog):
             (item['id'], item['x1'], item['y1'], item['width'], item['height'], item['cid'], item['memo'],
              item['date'], item['owner'], item['important']))
         self.app.conn.commit()
+        self.code_counts.add_codings([item])
         self.undo_deleted_code = []
         self.get_coded_areas()
         self.redraw_scene()
-        self.fill_code_counts_in_tree()
+        self.fill_code_counts_in_tree(reload=False)
         self.app.delete_backup = False
 
     def unmark(self, item):
@@ -1334,9 +1469,10 @@ class DialogCodeImage(QtWidgets.QDialog):
         cur = self.app.conn.cursor()
         cur.execute("delete from code_image where imid=?", [item['imid'], ])
         self.app.conn.commit()
+        self.code_counts.remove_codings([item])
         self.get_coded_areas()
         self.redraw_scene()
-        self.fill_code_counts_in_tree()
+        self.fill_code_counts_in_tree(reload=False)
         self.app.delete_backup = False
 
     def create_code_area(self, p1):
@@ -1353,8 +1489,8 @@ class DialogCodeImage(QtWidgets.QDialog):
             return
         cid = int(code_.text(1)[4:])  # must be integer
         code_name = code_.text(0)
-        pix_h_scaled = self.pixmap.height() * self.scale
-        pix_w_scaled = self.pixmap.width() * self.scale
+        pix_h_scaled = self.image_size.height() * self.scale
+        pix_w_scaled = self.image_size.width() * self.scale
         width = p1.x() - self.selection.x()
         height = p1.y() - self.selection.y()
         x = self.selection.x()
@@ -1380,11 +1516,9 @@ class DialogCodeImage(QtWidgets.QDialog):
             y = y + height
             height = abs(height)
         # Outside image area, do not code
-        for item in self.scene.items():
-            if type(item) == QtWidgets.QGraphicsPixmapItem:
-                if x + width > item.boundingRect().width() or y + height > item.boundingRect().height():
-                    self.selection = None
-                    return
+        if x + width > self.image_size.width() * self.scale or y + height > self.image_size.height() * self.scale:
+            self.selection = None
+            return
         x_unscaled = round(x / self.scale)
         y_unscaled = round(y / self.scale)
         width_unscaled = round(width / self.scale)
@@ -1409,7 +1543,8 @@ class DialogCodeImage(QtWidgets.QDialog):
         self.redraw_scene()
         self.selection = None
         self.app.delete_backup = False
-        self.fill_code_counts_in_tree()
+        self.code_counts.add_codings([item])
+        self.fill_code_counts_in_tree(reload=False)
 
     def item_moved_update_data(self, item, parent):
         """ Called from drop event in treeWidget view port.
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2024 Colin Curtain
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Author: Colin Curtain (ccbogel)
+https://github.com/ccbogel/QualCoder
+https://qualcoder.wordpress.com/
+"""
+
+
+from array import array
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+
+from PyQt6 import QtCore, QtGui
+
+logger = logging.getLogger(__name__)
+
+# Waveforms of audio and video files, for View AV and Code AV.
+# The audio is decoded once by ffmpeg, streamed as 8 kHz mono samples and reduced to minimum and maximum peaks.
+# Level 0 has PEAKS_PER_SECOND peaks, each further level halves the number of peaks, so a waveform image of any
+# width is drawn from a few thousand peaks, without decoding the audio again.
+# Peaks are built by WaveformPeaksWorker and cached in the project folder cache/waveforms directory,
+# keyed by the media path, modification time and size.
+# Used by: view_av
+
+SAMPLE_RATE = 8000  # Samples per second decoded by ffmpeg
+PEAKS_PER_SECOND = 100  # Level 0 resolution
+MIN_LEVEL_PEAKS = 1024  # Levels are added until a level has no more than this many peaks
+READ_PEAKS = 4096  # Peaks computed from each read of the ffmpeg output
+PEAKS_VERSION = 1  # Increase if the peaks format changes, so old cached peaks are not used
+
+
+def reduce_peaks(peaks):
+    """ Halve the resolution of peaks.
+    param:
+        peaks: array of signed bytes, minimum and maximum of each peak
+    return:
+        array of signed bytes
+    """
+
+    reduced = array('b')
+    for i in range(0, len(peaks) - 2, 4):
+        reduced.append(min(peaks[i], peaks[i + 2]))
+        reduced.append(max(peaks[i + 1], peaks[i + 3]))
+    if len(peaks) % 4:
+        reduced.extend(peaks[-2:])
+    return reduced
+
+
+def replace_file(path, data):
+    """ Write data to a uniquely named temporary file, then replace the file at path.
+    Two dialogs may build the same peaks. On Windows, os.replace fails while the other dialog replaces or reads
+    the file, which then has the same content, so the other file is kept.
+    param:
+        path: String
+        data: bytes
+    """
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", prefix=os.path.basename(path) + ".", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        if not os.path.exists(path):
+            raise
+
+
+class WaveformPeaks:
+    """ Peaks of one audio or video file, cached in the project folder cache/waveforms directory. """
+
+    def __init__(self, app, mediapath, abs_path):
+        """ param:
+            app: App
+            mediapath: String source.mediapath
+            abs_path: String absolute path of the media file
+        """
+
+        self.abs_path = abs_path
+        stat = os.stat(abs_path)
+        key = f"{mediapath}|{stat.st_mtime}|{stat.st_size}"
+        self.key = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        directory = os.path.join(app.project_path, "cache", "waveforms")
+        self.index_path = os.path.join(directory, self.key + ".json")
+        self.peaks_path = os.path.join(directory, self.key + ".peaks")
+        self.levels = []  # List of arrays of signed bytes, minimum and maximum of each peak
+        self.cancelled = False
+        self.read_index()
+
+    def read_index(self):
+        """ Read the cached peaks, if they have been built.
+        return:
+            True if the peaks are built
+        """
+
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') != PEAKS_VERSION:
+                return False
+            levels = []
+            with open(self.peaks_path, 'rb') as f:
+                for count in index['counts']:
+                    peaks = array('b')
+                    peaks.fromfile(f, count * 2)
+                    levels.append(peaks)
+        except (OSError, ValueError, KeyError, EOFError):
+            return False
+        self.levels = levels
+        return True
+
+    def is_built(self):
+        return len(self.levels) > 0
+
+    def cancel(self):
+        """ Stop building, e.g. when the dialog is closed. """
+
+        self.cancelled = True
+
+    def build(self):
+        """ Decode the audio with ffmpeg and store the peaks. Slow, so called from WaveformPeaksWorker.
+        Raises OSError if ffmpeg is not installed, or the audio cannot be decoded.
+        """
+
+        command = ['ffmpeg', '-nostdin', '-v', 'error', '-i', self.abs_path, '-map', '0:a:0', '-ac', '1',
+                   '-ar', str(SAMPLE_RATE), '-f', 's16le', '-']
+        creationflags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)  # No console window on Windows
+        samples_per_peak = SAMPLE_RATE // PEAKS_PER_SECOND
+        read_size = samples_per_peak * 2 * READ_PEAKS
+        peaks = array('b')
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              creationflags=creationflags) as process:
+            while not self.cancelled:
+                data = process.stdout.read(read_size)
+                if not data:
+                    break
+                samples = array('h')
+                samples.frombytes(data[:len(data) - len(data) % 2])
+                if sys.byteorder == "big":
+                    samples.byteswap()
+                for i in range(0, len(samples), samples_per_peak):
+                    peak = samples[i:i + samples_per_peak]
+                    peaks.append(min(peak) >> 8)
+                    peaks.append(max(peak) >> 8)
+            if self.cancelled:
+                process.kill()
+                return
+        if not peaks:
+            raise OSError(f"ffmpeg could not decode audio: {self.abs_path}")
+        levels = [peaks]
+        while len(levels[-1]) > MIN_LEVEL_PEAKS * 2:
+            levels.append(reduce_peaks(levels[-1]))
+        os.makedirs(os.path.dirname(self.peaks_path), exist_ok=True)
+        # Index is written last, so partly written peaks are not used
+        replace_file(self.peaks_path, b"".join(level.tobytes() for level in levels))
+        index = {'version': PEAKS_VERSION, 'counts': [len(level) // 2 for level in levels]}
+        replace_file(self.index_path, json.dumps(index).encode('utf-8'))
+        self.levels = levels
+
+    def duration(self):
+        """ return: Integer milliseconds of decoded audio """
+
+        if not self.levels:
+            return 0
+        return len(self.levels[0]) // 2 * 1000 // PEAKS_PER_SECOND
+
+    def image(self, width, height, color, duration_msecs=None):
+        """ Draw the waveform, using the smallest level with at least one peak per pixel.
+        param:
+            width, height: Integers pixels
+            color: QColor
+            duration_msecs: Integer media duration shown across the width, or None for the decoded duration
+        return:
+            QImage with a transparent background
+        """
+
+        image = QtGui.QImage(width, height, QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(QtCore.Qt.GlobalColor.transparent)
+        if not self.levels or width < 1:
+            return image
+        if not duration_msecs or duration_msecs < 1:
+            duration_msecs = self.duration()
+        secs_per_pixel = duration_msecs / 1000 / width
+        level = 0
+        while level + 1 < len(self.levels) and PEAKS_PER_SECOND / 2 ** (level + 1) * secs_per_pixel >= 1:
+            level += 1
+        peaks = self.levels[level]
+        peaks_per_pixel = PEAKS_PER_SECOND / 2 ** level * secs_per_pixel
+        count = len(peaks) // 2
+        middle = height / 2
+        scale = height / 256
+        painter = QtGui.QPainter(image)
+        painter.setPen(QtGui.QPen(color, 1))
+        for x in range(width):
+            start = int(x * peaks_per_pixel)
+            if start >= count:
+                break
+            end = min(count, max(start + 1, int((x + 1) * peaks_per_pixel)))
+            low = min(peaks[start * 2:end * 2:2])
+            high = max(peaks[start * 2 + 1:end * 2:2])
+            painter.drawLine(QtCore.QLineF(x + 0.5, middle - high * scale, x + 0.5, middle - low * scale))
+        painter.end()
+        return image
+
+
+class WaveformPeaksSignals(QtCore.QObject):
+    """ QRunnable is not a QObject, so signals are held here.
+    finished: peaks key, error message or empty String """
+
+    finished = QtCore.pyqtSignal(str, str)
+
+
+class WaveformPeaksWorker(QtCore.QRunnable):
+    """ Build waveform peaks in a QThreadPool thread. Does not use the database connection. """
+
+    def __init__(self, peaks):
+        super().__init__()
+        self.peaks = peaks
+        self.signals = WaveformPeaksSignals()
+
+    def run(self):
+        error = ""
+        try:
+            self.peaks.build()
+        except OSError as err:
+            logger.warning(str(err))
+            error = str(err)
+        self.signals.finished.emit(self.peaks.key, error)